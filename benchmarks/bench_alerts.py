@@ -0,0 +1,94 @@
+# =============================
+# bench_alerts.py - Benchmark du moteur d'alertes sur recherches sauvegardées (module2)
+# Usage: python benchmarks/bench_alerts.py [n_saved_searches] [n_listings]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module2"))
+from alerts import AlertIndex  # noqa: E402
+from inventory import InventoryIndex, haversine_km  # noqa: E402
+from bench_inventory import CENTERS, CITIES, DISTRICTS, TYPES, synthetic_listings  # noqa: E402
+
+
+def synthetic_searches(n: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    kinds = rng.choice(4, n, p=[0.55, 0.25, 0.12, 0.08])  # ville + quartier, ville, rayon, sans lieu
+    cities = rng.integers(0, len(CITIES), n)
+    districts = rng.integers(0, len(DISTRICTS), n)
+    types = rng.integers(0, len(TYPES) + 1, n)  # len(TYPES) = tous types
+    budgets = rng.integers(300, 8000, n) * 1000.0
+    areas = rng.integers(20, 250, n)
+    searches = []
+    for i in range(n):
+        search = {
+            "search_id": f"S{i}",
+            "user_id": f"U{i % 50_000}",
+            "property_type": TYPES[types[i]] if types[i] < len(TYPES) else None,
+            "max_price": float(budgets[i]),
+            "min_area": float(areas[i]) if i % 3 else None,
+        }
+        if kinds[i] == 0:
+            search["location"] = f"{CITIES[cities[i]]} {DISTRICTS[districts[i]]}"
+        elif kinds[i] == 1:
+            search["location"] = CITIES[cities[i]]
+        elif kinds[i] == 2:
+            lat, lon = CENTERS[cities[i]]
+            search.update(latitude=lat + rng.normal(0, 0.03), longitude=lon + rng.normal(0, 0.03),
+                          radius_km=float(rng.integers(1, 10)))
+        searches.append(search)
+    return searches
+
+
+def brute_force(searches, listing):
+    # Référence: chaque recherche testée une par une
+    tokens = set(InventoryIndex._tokens(listing))
+    matched = []
+    for row, s in enumerate(searches):
+        if s.get("property_type") and s["property_type"] != listing["type"]:
+            continue
+        if s["max_price"] < listing["price"] or (s.get("min_area") or 0) > listing["area"]:
+            continue
+        if "radius_km" in s:
+            distance = haversine_km(s["latitude"], s["longitude"], listing["latitude"], listing["longitude"])
+            if distance > s["radius_km"]:
+                continue
+        elif s.get("location") and not set(InventoryIndex._tokens({"address": s["location"]})) <= tokens:
+            continue
+        matched.append(row)
+    return sorted(matched)
+
+
+def main(n_searches: int, n_listings: int) -> None:
+    searches = synthetic_searches(n_searches)
+    listings = synthetic_listings(n_listings, seed=7)
+    started = time.perf_counter()
+    index = AlertIndex()
+    index.add(searches)
+    index.rebuild()
+    print(f"index de {n_searches} recherches sauvegardées: {time.perf_counter() - started:.2f} s, "
+          f"{len(index._trees)} buckets")
+
+    started = time.perf_counter()
+    total = sum(len(index.match(listing)) for listing in listings)
+    elapsed = time.perf_counter() - started
+    print(f"index inversé: {n_listings} biens en {elapsed:.2f} s "
+          f"({elapsed / n_listings * 1e3:.2f} ms/bien, {total / n_listings:.1f} alertes/bien)")
+
+    sample = listings[:10]
+    started = time.perf_counter()
+    expected = [brute_force(searches, listing) for listing in sample]
+    elapsed = time.perf_counter() - started
+    print(f"parcours linéaire: {elapsed / len(sample) * 1e3:.1f} ms/bien")
+    assert all(sorted(index.match(listing)) == rows for listing, rows in zip(sample, expected))
+    print("résultats identiques au parcours linéaire sur l'échantillon")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1_000,
+    )
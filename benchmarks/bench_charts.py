@@ -0,0 +1,63 @@
+# =============================
+# bench_charts.py - Benchmark du rendu des graphiques de rapports (module3)
+# Usage: python benchmarks/bench_charts.py [n_points]
+# =============================
+import os
+import sys
+import tempfile
+import time
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from charts import ChartRenderer, chart_key, downsample, lttb, trend_chart  # noqa: E402
+
+
+def synthetic_history(n: int, n_series: int = 4, seed: int = 0) -> pd.DataFrame:
+    # Séries journalières de prix (marche aléatoire), n points au total
+    rng = np.random.default_rng(seed)
+    per_series = n // n_series
+    days = pd.date_range("2000-01-01", periods=per_series, freq="D")
+    return pd.DataFrame(
+        {
+            "month": np.tile(days.to_numpy(), n_series),
+            "price": (2e6 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_series, per_series)), axis=1))).ravel(),
+            "series": np.repeat([f"R{i}" for i in range(n_series)], per_series),
+        }
+    )
+
+
+def main(n: int) -> None:
+    history = synthetic_history(n)
+    started = time.perf_counter()
+    reduced = downsample(history, "month", "price", "series")
+    print(f"LTTB {n} -> {len(reduced)} points: {(time.perf_counter() - started) * 1e3:.1f} ms")
+    y = history.loc[history["series"] == "R0", "price"].to_numpy()
+    x = np.arange(len(y), dtype=float)
+    kept = lttb(x, y, 400)
+    error = np.abs(np.interp(x, x[kept], y[kept]) / y - 1)
+    print(f"série R0 ({len(y)} points -> 400): écart à la série complète médian {np.median(error):.2%}, "
+          f"amplitude conservée {np.ptp(y[kept]) / np.ptp(y):.0%}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        renderer = ChartRenderer(directory)
+        key = chart_key("trend", {"history": history})
+        started = time.perf_counter()
+        charts = renderer.wait([renderer.submit("trend", key, lambda: trend_chart(history))])
+        print(f"premier rendu ({charts[0]['status']}): {(time.perf_counter() - started) * 1e3:.0f} ms")
+        started = time.perf_counter()
+        renderer.submit("trend", chart_key("trend", {"history": history}), lambda: trend_chart(history))
+        print(f"vue répétée (empreinte + fichier en cache): {(time.perf_counter() - started) * 1e3:.1f} ms")
+        with open(charts[0]["path"], encoding="utf-8") as handle:
+            reduced_kb = len(handle.read()) / 1e3
+        started = time.perf_counter()
+        with alt.data_transformers.disable_max_rows():
+            full = alt.Chart(history).mark_line().encode(x="month:T", y="price:Q", color="series:N").to_html()
+        print(f"rendu sans sous-échantillonnage: {(time.perf_counter() - started) * 1e3:.0f} ms, "
+              f"{len(full) / 1e6:.1f} Mo de HTML (vs {reduced_kb:.0f} ko)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,77 @@
+# =============================
+# bench_confidence.py - Benchmark de la distribution de valeur par bootstrap (module1)
+# Usage: python benchmarks/bench_confidence.py [n_comparables] [n_subjects]
+# =============================
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module1"))
+from confidence import CONFIDENCE_TOLERANCE, bootstrap_portfolio  # noqa: E402
+
+COMPARABLE_SETS = 5
+
+
+def synthetic_properties(n: int, dispersion: float, seed: int):
+    # Prix/m² dépendant de la surface et de l'année, plus une dispersion log-normale propre à chaque bien
+    rng = np.random.default_rng(seed)
+    area = rng.uniform(40, 250, n)
+    bedrooms = np.clip(np.round(area / 40), 1, 6)
+    year = rng.integers(1970, 2024, n)
+    ppsm = 14000 * (1 + 0.004 * (year - 2000)) * (area / 100) ** -0.1 * np.exp(rng.normal(0, dispersion, n))
+    records = [
+        {"area": float(a), "bedrooms": int(b), "year_built": int(y), "price": float(p * a)}
+        for a, b, y, p in zip(area, bedrooms, year, ppsm)
+    ]
+    return records, ppsm * area
+
+
+def main(n_comparables: int, n_subjects: int) -> None:
+    # Calibration moyennée sur plusieurs jeux de comparables (un seul jeu est lui-même un échantillon bruité)
+    for dispersion in (0.1, 0.4):
+        subjects, truth = synthetic_properties(n_subjects, dispersion, seed=99)
+        coverage, scores, hit_rate, elapsed = [], [], [], 0.0
+        for seed in range(COMPARABLE_SETS):
+            comparables, _ = synthetic_properties(n_comparables, dispersion, seed=seed)
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                started = time.perf_counter()
+                results = bootstrap_portfolio(subjects, comparables, n_boot=2000)
+                elapsed += time.perf_counter() - started
+            low = np.array([r["interval_90"][0] for r in results])
+            high = np.array([r["interval_90"][1] for r in results])
+            predicted = np.array([r["predicted_value"] for r in results])
+            coverage.append(((truth >= low) & (truth <= high)).mean())
+            scores.append(np.mean([r["confidence_score"] for r in results]))
+            hit_rate.append((np.abs(truth / predicted - 1) <= CONFIDENCE_TOLERANCE).mean())
+        coverage, scores, hit_rate = np.mean(coverage), np.mean(scores), np.mean(hit_rate)
+        print(f"dispersion {dispersion:.0%}, {n_comparables} comparables, {n_subjects} biens "
+              f"({elapsed / COMPARABLE_SETS:.2f} s par portefeuille): couverture de interval_90 {coverage:.1%}, "
+              f"score moyen {scores:.3f} contre {hit_rate:.3f} biens réellement à ±{CONFIDENCE_TOLERANCE:.0%}")
+        assert 0.83 <= coverage <= 0.95
+        assert abs(scores - hit_rate) < 0.04
+
+    # Valeurs scrapées: chaînes numériques tolérées, comparables illisibles écartés
+    scraped = [
+        {"price": "1 200 000", "area": "100 m2", "bedrooms": "3 ch"},
+        {"total_price": "1 350 000 MAD", "square_footage": "1 184", "bedrooms": "3"},
+        {"price": "sur demande", "area": 90},
+        {"price": 0, "area": 80},
+        {"list_price": 980000, "sqft": 900.0, "bathrooms": "2 sdb"},
+    ]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        result = bootstrap_portfolio([{"area": "95", "bedrooms": "3 ch"}], scraped, n_boot=500)[0]
+    print(f"comparables scrapés: {result['n_comparables']} retenus sur {len(scraped)}, "
+          f"valeur {result['predicted_value']:.0f}, interval_90 {result['interval_90']}")
+    assert result["n_comparables"] == 3
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2000,
+    )
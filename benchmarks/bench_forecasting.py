@@ -0,0 +1,57 @@
+# =============================
+# bench_forecasting.py - Benchmark des prévisions par segment (module3)
+# Usage: python benchmarks/bench_forecasting.py [n_segments] [n_months] [workers]
+# =============================
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from forecasting import FORECAST_WORKERS, ForecastStore, forecast_panel, prepare_series  # noqa: E402
+from trends import MarketPanel  # noqa: E402
+from bench_trends import synthetic_panel  # noqa: E402
+
+
+def truncate(panel: MarketPanel, months: int) -> MarketPanel:
+    return MarketPanel(
+        panel.segment_by, panel.segments, panel.first_month, panel.values[:, :months].copy(), panel.counts[:, :months]
+    )
+
+
+def main(n_segments: int, n_months: int, workers: int) -> None:
+    panel = synthetic_panel(n_segments, n_months)
+    with tempfile.TemporaryDirectory() as directory:
+        store = ForecastStore(os.path.join(directory, "models.sqlite"))
+        # Nuit 1: ajustement à froid sur l'historique moins un mois
+        _, stats = forecast_panel(truncate(panel, n_months - 1), store=store, workers=workers)
+        print(f"à froid, {n_segments} segments × {n_months - 1} mois, {stats['workers']} processus: {stats['seconds']:.1f} s")
+        # Nuit 2: un mois de plus -> raffinement local autour des paramètres de la veille
+        _, stats = forecast_panel(panel, store=store, workers=workers)
+        print(f"à chaud (+1 mois): {stats['seconds']:.1f} s ({stats['warm_refits']} raffinés, "
+              f"{stats['reused_models']} repris)")
+        _, stats = forecast_panel(panel, store=store, workers=workers)
+        print(f"série inchangée: {stats['seconds']:.1f} s ({stats['reused_models']} modèles repris)")
+
+    # Précision hors échantillon sur les 12 derniers mois, contre la prévision naïve (dernier prix)
+    train = truncate(panel, n_months - 12)
+    results, _ = forecast_panel(train, workers=workers)
+    forecast = np.array([[p["forecast_price"] for p in r["forecast"]] for r in results])
+    lower = np.array([[p["lower_80"] for p in r["forecast"]] for r in results])
+    upper = np.array([[p["upper_80"] for p in r["forecast"]] for r in results])
+    series = prepare_series(train)
+    naive = np.exp(series["y"][np.arange(len(series["y"])), series["lengths"] - 1])[:, None]
+    actual = panel.values[:, n_months - 12:]
+    known = ~np.isnan(actual)
+    print(f"MAPE 12 mois: Holt-Winters {np.nanmean(np.abs(forecast / actual - 1)):.2%}, "
+          f"naïf {np.nanmean(np.abs(naive / actual - 1)):.2%}; "
+          f"couverture de l'intervalle à 80 %: {((actual >= lower) & (actual <= upper))[known].mean():.1%}")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 120,
+        int(sys.argv[3]) if len(sys.argv) > 3 else FORECAST_WORKERS,
+    )
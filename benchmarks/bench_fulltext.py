@@ -0,0 +1,88 @@
+# =============================
+# bench_fulltext.py - Benchmark de la recherche plein texte BM25 (module2)
+# Usage: python benchmarks/bench_fulltext.py [n_listings]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module2"))
+from inventory import InventoryIndex  # noqa: E402
+from bench_inventory import synthetic_listings  # noqa: E402
+
+PHRASES = [
+    "lumineux", "avec balcon", "grande terrasse", "proche du tramway", "vue sur mer", "cuisine équipée",
+    "résidence sécurisée", "parking souterrain", "piscine commune", "jardin privatif", "bright living room",
+    "near the tram", "sea view", "fully furnished", "renovated kitchen", "quiet street", "ascenseur",
+    "double vitrage", "climatisation", "proche des écoles", "concierge", "rooftop", "calme", "spacieux",
+]
+
+
+def with_descriptions(listings, seed: int = 2):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(PHRASES), size=(len(listings), 5))
+    for listing, row in zip(listings, picks):
+        listing["description"] = f"{listing['type']} " + ", ".join(PHRASES[i] for i in row)
+    return listings
+
+
+def main(n: int) -> None:
+    listings = with_descriptions(synthetic_listings(n))
+    started = time.perf_counter()
+    index = InventoryIndex()
+    index.insert(listings)
+    index.rebuild()
+    print(f"build {n} listings (dont BM25): {time.perf_counter() - started:.2f} s")
+    stats = index.text.stats()
+    print(f"postings compressés: {stats['compressed_posting_bytes'] / 1e6:.1f} Mo pour {stats['terms']} termes")
+
+    queries = ["appartement lumineux avec balcon proche du tramway", "villa piscine jardin", "sea view rooftop"]
+    for query in queries:
+        repeat = 10
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rows, scores = index.text_search(query, k=10)
+        print(f"BM25 '{query}': {(time.perf_counter() - started) / repeat * 1000:.2f} ms")
+        structured = index.query(location="Casablanca", property_type="Appartement", max_price=2_000_000)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            index.text_search(query, structured, k=10)
+        print(f"  + filtres (Casablanca, Appartement, <= 2M): {(time.perf_counter() - started) / repeat * 1000:.2f} ms")
+
+    words = ["lumineux", "balcon", "tramway"]
+    started = time.perf_counter()
+    naive = [p for p in listings if all(w in p["description"] for w in words)]
+    print(f"référence: scan de sous-chaînes sur {n} descriptions: {(time.perf_counter() - started) * 1000:.1f} ms ({len(naive)} résultats, sans classement)")
+
+
+def update_consistency(n: int) -> None:
+    # Mises à jour et suppressions sans rebuild: statistiques BM25 et scores identiques à un index reconstruit
+    listings = with_descriptions(synthetic_listings(n))
+    index = InventoryIndex(delta_limit=n)
+    index.insert(listings)
+    index.rebuild()
+    updated = with_descriptions([dict(p) for p in listings[: n // 5]], seed=3)
+    index.insert(updated)
+    index.delete([p["property_id"] for p in listings[n // 5 : n // 5 + n // 10]])
+    current = {p["property_id"]: p for p in listings[n // 5 + n // 10 :] + updated}
+    fresh = InventoryIndex()
+    fresh.insert(current.values())
+    stats = (index.text.n_docs, index.text.total_len), (fresh.text.n_docs, fresh.text.total_len)
+    print(f"après {len(updated)} mises à jour et {n // 10} suppressions: documents / longueur totale {stats[0]}, "
+          f"index reconstruit {stats[1]}")
+    assert stats[0] == stats[1]
+    for query in ("vue sur mer", "villa piscine jardin"):
+        scores = [
+            dict(zip((idx.ids[r] for r in rows), np.round(values, 4)))
+            for idx in (index, fresh)
+            for rows, values in [idx.text_search(query, k=None)]
+        ]
+        assert scores[0].keys() == scores[1].keys()
+        assert all(abs(scores[0][k] - scores[1][k]) < 1e-3 for k in scores[0])
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
+    update_consistency(20_000)
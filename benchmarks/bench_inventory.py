@@ -0,0 +1,130 @@
+# =============================
+# bench_inventory.py - Benchmark de l'index d'inventaire (module2)
+# Usage: python benchmarks/bench_inventory.py [n_listings]
+# =============================
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module2"))
+from inventory import InventoryIndex, haversine_km  # noqa: E402
+
+CITIES = ["Casablanca", "Rabat", "Marrakech", "Tanger", "Agadir", "Fes", "Meknes", "El Jadida"]
+DISTRICTS = ["Maarif", "Bourgogne", "Gauthier", "Anfa", "Agdal", "Gueliz", "Centre", "Hivernage", "Palmeraie", "Founty"]
+TYPES = ["Appartement", "Studio", "Villa", "Maison", "Duplex"]
+CENTERS = [(33.5731, -7.5898), (34.0209, -6.8416), (31.6295, -7.9811), (35.7595, -5.8340),
+           (30.4278, -9.5981), (34.0181, -5.0078), (33.8935, -5.5473), (33.2316, -8.5007)]
+
+
+def synthetic_listings(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    cities = rng.integers(0, len(CITIES), n)
+    districts = rng.integers(0, len(DISTRICTS), n)
+    types = rng.integers(0, len(TYPES), n)
+    areas = rng.integers(30, 500, n)
+    prices = areas * rng.integers(8000, 25000, n)
+    # Coordonnées: dispersion de ~5 km autour du centre de la ville
+    centers = np.array(CENTERS)[cities]
+    lats = centers[:, 0] + rng.normal(0, 0.045, n)
+    lons = centers[:, 1] + rng.normal(0, 0.055, n)
+    return [
+        {
+            "property_id": f"P{i}",
+            "address": f"{TYPES[t]} {CITIES[c]} - {DISTRICTS[d]} {i % 997}",
+            "price": float(p),
+            "area": float(a),
+            "type": TYPES[t],
+            "latitude": float(la),
+            "longitude": float(lo),
+        }
+        for i, (c, d, t, a, p, la, lo) in enumerate(zip(cities, districts, types, areas, prices, lats, lons))
+    ]
+
+
+def timed(label, fn, repeat=20):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{label:<45} {elapsed * 1000:9.3f} ms   ({len(result)} résultats)")
+    return result
+
+
+def main(n: int) -> None:
+    listings = synthetic_listings(n)
+    started = time.perf_counter()
+    index = InventoryIndex()
+    index.insert(listings)
+    index.rebuild()
+    print(f"build {n} listings: {time.perf_counter() - started:.2f} s")
+
+    def naive(location, property_type, max_price, min_area):
+        return [
+            p for p in listings
+            if (max_price is None or p["price"] <= max_price)
+            and (min_area is None or p["area"] >= min_area)
+            and (property_type is None or p["type"] == property_type)
+            and (location is None or location in p["address"])
+        ]
+
+    queries = [
+        ("Casablanca", "Appartement", 1_500_000, 80),
+        ("Maarif", "Studio", 600_000, None),
+        (None, "Villa", 12_000_000, 450),
+        ("Casablanca", None, 400_000, None),
+    ]
+    for q in queries:
+        label = f"{q}"
+        fast = timed(f"index  {label}", lambda: index.query(q[0], q[1], None, q[2], q[3], None))
+        slow = timed(f"naive  {label}", lambda: naive(*q), repeat=2)
+        assert len(fast) == len(slow), (len(fast), len(slow))
+
+    # Requêtes spatiales: rayon de 2 km autour de Maarif, polygone sur le centre de Casablanca
+    lat, lon, radius = 33.5830, -7.6320, 2.0
+    lats = np.array([p["latitude"] for p in listings])
+    lons = np.array([p["longitude"] for p in listings])
+    fast = timed("index  rayon 2 km", lambda: index.query(near=(lat, lon, radius)))
+    slow = timed("naive  rayon 2 km (haversine sur tout)", lambda: np.flatnonzero(haversine_km(lat, lon, lats, lons) <= radius), repeat=3)
+    assert len(fast) == len(slow), (len(fast), len(slow))
+    polygon = [[33.57, -7.65], [33.60, -7.65], [33.61, -7.61], [33.57, -7.60]]
+    timed("index  polygone + type + prix", lambda: index.query(property_type="Appartement", max_price=2_000_000, polygon=polygon))
+
+    new = synthetic_listings(1000, seed=1)
+    for i, listing in enumerate(new):
+        listing["property_id"] = f"NEW{i}"
+    started = time.perf_counter()
+    index.insert(new)
+    print(f"insert 1000 listings (delta): {(time.perf_counter() - started) * 1000:.2f} ms")
+    started = time.perf_counter()
+    index.delete([f"P{i}" for i in range(1000)])
+    print(f"delete 1000 listings (tombstones): {(time.perf_counter() - started) * 1000:.2f} ms")
+    timed("index after insert/delete", lambda: index.query("Casablanca", "Appartement", None, 1_500_000, 80, None))
+
+
+def update_round_trip() -> None:
+    # Annonce renvoyée par search_properties, prix modifié, renvoyée à update_inventory: même bien mis à jour
+    directory = tempfile.mkdtemp()
+    for variable, name in (("FEATURE_STORE_PATH", "features.parquet"), ("PROFILE_DB_PATH", "profiles.sqlite"),
+                           ("SAVED_SEARCH_DB_PATH", "alerts.sqlite"), ("EMBEDDING_CACHE_PATH", "embeddings.sqlite")):
+        os.environ[variable] = os.path.join(directory, name)
+    from tools import get_feature_store, search_properties, update_inventory
+
+    found = search_properties.entrypoint(location="Casablanca", property_type=None, max_results=1)["results"][0]
+    before = len(get_feature_store())
+    edited = {**found, "price": found["price"] - 50_000}
+    updated = update_inventory.entrypoint(new_listings=[edited])
+    again = search_properties.entrypoint(location="Casablanca", property_type=None, max_results=100)["results"]
+    copies = [r for r in again if r["id"] == found["id"] or r["id"].endswith(":" + found["id"])]
+    print(f"mise à jour de {found['id']}: {before} -> {len(get_feature_store())} biens, "
+          f"{len(copies)} résultat(s), prix {copies[0]['price']:.0f}")
+    assert updated["added_ids"] == [found["id"]] and len(get_feature_store()) == before
+    assert len(copies) == 1 and copies[0]["price"] == edited["price"]
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
+    update_round_trip()
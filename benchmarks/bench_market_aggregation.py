@@ -0,0 +1,62 @@
+# =============================
+# bench_market_aggregation.py - Benchmark de l'agrégation de marché (module3)
+# Usage: python benchmarks/bench_market_aggregation.py [n_rows]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from aggregation import aggregate_market, normalize_market_frame  # noqa: E402
+
+REGIONS = ["Casablanca", "Rabat", "Marrakech", "Tanger", "Agadir", "Fes", "Meknes", "El Jadida", "Kenitra", "Oujda"]
+TYPES = ["Appartement", "Studio", "Villa", "Maison", "Duplex", "Riad"]
+
+
+def synthetic_market(n: int, seed: int = 0) -> pd.DataFrame:
+    # Historique de ventes / annonces sur 5 ans, colonnes au format des flux bruts (alias compris)
+    rng = np.random.default_rng(seed)
+    area = rng.integers(25, 400, n).astype(float)
+    listed = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 5 * 365, n), unit="D")
+    dom = rng.gamma(2.0, 30.0, n).round()
+    return pd.DataFrame(
+        {
+            "city": np.array(REGIONS)[rng.integers(0, len(REGIONS), n)],
+            "type": np.array(TYPES)[rng.integers(0, len(TYPES), n)],
+            "price": area * rng.normal(14000, 3000, n).clip(4000),
+            "surface": area,
+            "date": (listed + pd.to_timedelta(dom, unit="D")).strftime("%Y-%m-%d"),
+            "days_on_market": dom,
+            "status": np.where(rng.random(n) < 0.3, "active", "sold"),
+        }
+    )
+
+
+def main(n: int) -> None:
+    raw = synthetic_market(n)
+    started = time.perf_counter()
+    frame = normalize_market_frame(raw)
+    normalized = time.perf_counter() - started
+    started = time.perf_counter()
+    groups = aggregate_market(frame)
+    aggregated = time.perf_counter() - started
+    print(f"normalisation de {n} lignes: {normalized:.2f} s")
+    print(f"agrégation région × type × mois: {aggregated:.2f} s "
+          f"({len(groups)} groupes, {n / aggregated / 1e6:.1f} M lignes/s)")
+
+    # Référence: boucle Python par ligne (échantillon de 200k lignes, extrapolé)
+    sample = frame.iloc[:200_000]
+    started = time.perf_counter()
+    buckets = {}
+    for region, kind, month, price in zip(sample["region"], sample["property_type"], sample["month"], sample["price"]):
+        buckets.setdefault((region, kind, month), []).append(price)
+    medians = {key: float(np.median(values)) for key, values in buckets.items()}
+    loop = (time.perf_counter() - started) * n / len(sample)
+    print(f"boucle Python (médiane seule, extrapolée à {n} lignes): {loop:.2f} s ({len(medians)} groupes sur l'échantillon)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
@@ -0,0 +1,74 @@
+# =============================
+# bench_market_cube.py - Benchmark du cube de marché matérialisé (module3)
+# Usage: python benchmarks/bench_market_cube.py [n_rows] [batch_rows]
+# =============================
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from aggregation import aggregate_market, normalize_market_frame  # noqa: E402
+from cube import MarketCube  # noqa: E402
+from bench_market_aggregation import synthetic_market  # noqa: E402
+
+BUILD_ROWS = 250_000
+QUERIES = {
+    "roll-up région": dict(group_by=["region"]),
+    "roll-up type × mois": dict(group_by=["property_type", "month"]),
+    "drill-down Rabat, 12 mois": dict(group_by=["property_type", "month"], region="Rabat",
+                                      month_from="2024-01", month_to="2024-12"),
+    "cellules complètes": dict(group_by=["region", "property_type", "month"]),
+}
+
+
+def main(n: int, batch_rows: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cube.sqlite")
+        cube = MarketCube(path)
+        started = time.perf_counter()
+        for i, start in enumerate(range(0, n, BUILD_ROWS)):
+            cube.add(normalize_market_frame(synthetic_market(min(BUILD_ROWS, n - start), seed=i)))
+        print(f"construction sur {n} transactions: {time.perf_counter() - started:.2f} s, "
+              f"{len(cube.cells)} cellules, {os.path.getsize(path) / 2**20:.1f} Mo sur disque")
+
+        for name, query in QUERIES.items():
+            started = time.perf_counter()
+            groups = cube.query(**query)
+            cold = time.perf_counter() - started
+            started = time.perf_counter()
+            cube.query(**query)
+            print(f"{name:26s} {len(groups):5d} groupes: {cold * 1e3:6.1f} ms (cache {(time.perf_counter() - started) * 1e6:.0f} µs)")
+
+        # Mise à jour incrémentale: lot de nouvelles transactions, UPSERT des seules cellules touchées
+        batch = normalize_market_frame(synthetic_market(batch_rows, seed=999))
+        started = time.perf_counter()
+        touched = cube.add(batch)
+        print(f"ajout de {batch_rows} transactions: {(time.perf_counter() - started) * 1e3:.0f} ms, "
+              f"{touched} cellules réécrites")
+        started = time.perf_counter()
+        cube.query(group_by=["region"])
+        print(f"roll-up région après ajout (cache invalidé): {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+        started = time.perf_counter()
+        reloaded = MarketCube(path)
+        print(f"rechargement depuis SQLite: {(time.perf_counter() - started) * 1e3:.0f} ms")
+        assert reloaded.summary()["transactions"] == n + batch_rows
+
+        # Contrôle: roll-up du cube vs agrégation exacte sur un échantillon reconstruit
+        sample = normalize_market_frame(synthetic_market(BUILD_ROWS, seed=0))
+        small = MarketCube(os.path.join(directory, "sample.sqlite"))
+        small.add(sample)
+        exact, cubed = aggregate_market(sample, ["region"]), small.query(["region"])
+        assert (exact["count"].values == cubed["count"].values).all()
+        error = np.abs(exact["median_price"].values / cubed["median_price"].values - 1)
+        print(f"médiane de prix par région: erreur relative max {error.max():.2%}")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1_000,
+    )
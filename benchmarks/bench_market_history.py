@@ -0,0 +1,60 @@
+# =============================
+# bench_market_history.py - Benchmark de l'historique de marché partitionné (module3)
+# Usage: python benchmarks/bench_market_history.py [n_rows]
+# =============================
+import os
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from aggregation import load_market_frame  # noqa: E402
+from history import MarketHistoryStore, filter_market_frame  # noqa: E402
+from bench_market_aggregation import synthetic_market  # noqa: E402
+
+WRITE_ROWS = 250_000
+QUESTION = dict(region=["Rabat"], month_from="2024-01", month_to="2024-12")
+
+
+def main(n: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl, parquet = os.path.join(directory, "market.jsonl"), os.path.join(directory, "market.parquet")
+        writer = None
+        for i, start in enumerate(range(0, n, WRITE_ROWS)):
+            part = synthetic_market(min(WRITE_ROWS, n - start), seed=i)
+            part.to_json(jsonl, orient="records", lines=True, mode="a")
+            table = pa.Table.from_pandas(part, preserve_index=False)
+            writer = writer or pq.ParquetWriter(parquet, table.schema)
+            writer.write_table(table)
+        writer.close()
+
+        store = MarketHistoryStore(os.path.join(directory, "history"))
+        ingestion = store.ingest_file(parquet)
+        summary = store.summary()
+        print(f"import de {n} transactions: {ingestion['seconds']:.1f} s, {summary['partitions']} partitions, "
+              f"{summary['bytes'] / 2**20:.1f} Mo (JSON Lines {os.path.getsize(jsonl) / 2**20:.0f} Mo)")
+
+        # Question type: une région sur 12 mois, prix médian par type
+        for name, path in (("JSON Lines complet", jsonl), ("Parquet unique", parquet)):
+            started = time.perf_counter()
+            frame = filter_market_frame(load_market_frame(path), **QUESTION)
+            expected = frame.groupby("property_type", observed=True)["price"].agg(["size", "median"])
+            print(f"{name:22s} {time.perf_counter() - started:7.3f} s, {os.path.getsize(path) / 2**20:7.1f} Mo lus")
+        started = time.perf_counter()
+        frame, scan = store.read(["property_type", "month", "price"], **QUESTION)
+        groups = frame.groupby("property_type", observed=True)["price"].agg(["size", "median"])
+        print(f"{'historique partitionné':22s} {time.perf_counter() - started:7.3f} s, "
+              f"{scan['bytes_in_files'] / 2**10:7.0f} ko dans {scan['files_read']}/{scan['files_total']} fichiers")
+        assert groups.equals(expected)
+
+        started = time.perf_counter()
+        store.append(load_market_frame(synthetic_market(10_000, seed=999)))
+        print(f"ajout de 10k transactions (nouveaux fichiers): {time.perf_counter() - started:.2f} s, "
+              f"compactage: {store.compact()} partitions")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
@@ -0,0 +1,98 @@
+# =============================
+# bench_market_streaming.py - Benchmark de l'ingestion par blocs des flux de marché (module3)
+# Usage: python benchmarks/bench_market_streaming.py [n_rows] [chunk_rows]
+# =============================
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from aggregation import GROUP_KEYS, aggregate_market, load_market_frame  # noqa: E402
+import streaming  # noqa: E402
+from streaming import ingest_market_file  # noqa: E402
+from bench_market_aggregation import synthetic_market  # noqa: E402
+
+WRITE_ROWS = 250_000
+PARTIAL_STATUS_ROWS = 20_000
+PARTIAL_STATUS_CHUNK = 4_000
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_files(directory: str, n: int):
+    # Fichiers écrits par morceaux: le jeu complet n'est jamais en mémoire
+    paths = {ext: os.path.join(directory, f"market.{ext}") for ext in ("parquet", "csv", "jsonl")}
+    writer = None
+    for i, start in enumerate(range(0, n, WRITE_ROWS)):
+        part = synthetic_market(min(WRITE_ROWS, n - start), seed=i)
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        writer = writer or pq.ParquetWriter(paths["parquet"], table.schema)
+        writer.write_table(table)
+        part.to_csv(paths["csv"], mode="a", header=(i == 0), index=False)
+        part.to_json(paths["jsonl"], orient="records", lines=True, mode="a")
+    writer.close()
+    return paths
+
+
+def main(n: int, chunk_rows: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_files(directory, n)
+        baseline = peak_rss_mb()
+        print(f"{n} lignes écrites, pic mémoire après écriture: {baseline:.0f} Mo")
+        results = {}
+        for ext, path in paths.items():
+            accumulator, stats = ingest_market_file(path, GROUP_KEYS, chunk_rows)
+            results[ext] = accumulator.result()
+            print(f"{ext:8s} {stats['file_mb']:7.1f} Mo: {stats['seconds']:6.2f} s, "
+                  f"{stats['rows_per_second'] / 1e3:6.0f} k lignes/s, {stats['mb_per_second']:5.1f} Mo/s, "
+                  f"état {stats['state_mb']:.1f} Mo, pic processus {peak_rss_mb():.0f} Mo")
+
+        # Référence exacte (chargement complet) après les ingestions pour ne pas fausser le pic mémoire
+        started = time.perf_counter()
+        exact = aggregate_market(load_market_frame(paths["parquet"]))
+        print(f"chargement complet + agrégation exacte: {time.perf_counter() - started:.2f} s, "
+              f"pic processus {peak_rss_mb():.0f} Mo")
+        merged = exact.merge(results["csv"], on=list(GROUP_KEYS), suffixes=("", "_stream"))
+        assert len(merged) == len(exact) and (merged["count"] == merged["count_stream"]).all()
+        assert (merged["inventory"] == merged["inventory_stream"]).all()
+        for column in ("median_price", "median_price_per_sqm", "median_days_on_market"):
+            error = np.abs(merged[column] / merged[f"{column}_stream"] - 1)
+            print(f"{column}: erreur relative médiane {error.median():.2%}, max {error.max():.2%}")
+        partial_status(directory)
+
+
+def partial_status(directory: str) -> None:
+    # Clé status présente sur le premier quart des enregistrements seulement. Un tableau JSON lu par blocs
+    # donne des blocs sans colonne status, la lecture complète des NaN: même règle, même inventaire
+    frame = synthetic_market(PARTIAL_STATUS_ROWS, seed=7)
+    records = frame.to_dict(orient="records")
+    for record in records[len(records) // 4:]:
+        del record["status"]
+    path = os.path.join(directory, "partial_status.json")
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(records, handle)
+    whole = aggregate_market(load_market_frame(path))
+    threshold, streaming.STREAM_THRESHOLD_BYTES = streaming.STREAM_THRESHOLD_BYTES, 0  # force la lecture par blocs
+    try:
+        accumulator, _ = ingest_market_file(path, GROUP_KEYS, PARTIAL_STATUS_CHUNK)
+    finally:
+        streaming.STREAM_THRESHOLD_BYTES = threshold
+    merged = whole.merge(accumulator.result(), on=list(GROUP_KEYS), suffixes=("", "_stream"))
+    print(f"statut partiel: inventaire lecture complète {int(whole['inventory'].sum())}, "
+          f"par blocs de {PARTIAL_STATUS_CHUNK} {int(merged['inventory_stream'].sum())}")
+    assert len(merged) == len(whole) and (merged["inventory"] == merged["inventory_stream"]).all()
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200_000,
+    )
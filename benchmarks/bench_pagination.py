@@ -0,0 +1,64 @@
+# =============================
+# bench_pagination.py - Benchmark de la pagination par curseur (module2)
+# Usage: python benchmarks/bench_pagination.py [n_listings]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module2"))
+from inventory import InventoryIndex  # noqa: E402
+from pagination import keyset_page, keyset_start, sorted_order  # noqa: E402
+from tools import _cursor_position, _cursor_state, _search_matches  # noqa: E402
+from bench_inventory import CENTERS, synthetic_listings  # noqa: E402
+from bench_fulltext import with_descriptions  # noqa: E402
+
+PAGE = 20
+MODES = {
+    "insertion (ville)": dict(location="Casablanca", property_type=None, center=None, radius_km=None, query=None),
+    "distance (rayon 5 km)": dict(location=None, property_type=None, center=None, radius_km=5.0, query=None),
+    "BM25 (texte libre)": dict(location=None, property_type=None, center=None, radius_km=None, query="vue sur mer"),
+}
+
+
+def page(index, criteria, state):
+    rows, key = _search_matches(
+        index, criteria["location"], criteria["property_type"], None, None,
+        criteria["center"], criteria["radius_km"], None, criteria["query"],
+    )
+    positions = keyset_page(index.seq[rows], PAGE, _cursor_position(index, state), key)
+    last = positions[-1]
+    return _cursor_state(index, "bench", rows[last], None if key is None else key[last]), len(rows)
+
+
+def main(n: int) -> None:
+    index = InventoryIndex()
+    index.insert(with_descriptions(synthetic_listings(n)))
+    index.rebuild()
+    MODES["distance (rayon 5 km)"]["center"] = list(CENTERS[0])
+    for name, criteria in MODES.items():
+        state, total = page(index, criteria, None)
+        timings = []
+        for _ in range(50):
+            started = time.perf_counter()
+            state, _ = page(index, criteria, state)
+            timings.append(time.perf_counter() - started)
+        print(f"{name:24s} {total:8d} résultats  page de {PAGE}: {np.median(timings) * 1e3:6.2f} ms (médiane)")
+
+    # Parcours complet (iter_search_results): tri unique puis tranches
+    criteria = MODES["insertion (ville)"]
+    started = time.perf_counter()
+    rows, key = _search_matches(index, criteria["location"], None, None, None, None, None, None, None)
+    seq = index.seq[rows]
+    order = sorted_order(seq, key)
+    position, produced = keyset_start(seq[order], None), 0
+    while position < len(order):
+        produced += len(index.records_at(rows[order[position : position + 1000]]))
+        position += 1000
+    print(f"parcours complet: {produced} biens en {time.perf_counter() - started:.2f} s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
@@ -0,0 +1,80 @@
+# =============================
+# bench_quantile_sketches.py - Benchmark des sketches de quantiles fusionnables (module3)
+# Usage: python benchmarks/bench_quantile_sketches.py [n_rows]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from bench_market_aggregation import synthetic_market  # noqa: E402
+from aggregation import aggregate_market, normalize_market_frame  # noqa: E402
+from sketches import SKETCH_ALPHA, merge_sketches  # noqa: E402
+from streaming import MarketAccumulator  # noqa: E402
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+WORKERS = 8
+
+
+def max_error(estimates: pd.DataFrame, exact: pd.DataFrame) -> float:
+    return float(np.nanmax(np.abs(estimates.to_numpy() / exact.to_numpy() - 1)))
+
+
+def main(n: int) -> None:
+    frame = normalize_market_frame(synthetic_market(n))
+    keys = ["region", "property_type", "month"]
+    grouped = frame.groupby(keys, observed=True, sort=True)["price"]
+
+    # Référence exacte: quantiles pandas (tri complet par groupe)
+    started = time.perf_counter()
+    exact = grouped.quantile(list(QUANTILES)).unstack()
+    pandas_elapsed = time.perf_counter() - started
+
+    # Un passage: accumulateur unique
+    single = MarketAccumulator(keys)
+    started = time.perf_counter()
+    single.fold(frame)
+    result = single.result(quantiles=QUANTILES)
+    sketch_elapsed = time.perf_counter() - started
+    columns = [f"p{round(q * 100):g}_price" for q in QUANTILES]
+    estimates = result.set_index(keys)[columns].reindex(exact.index)
+    print(f"{n} ventes, {len(exact)} groupes: quantiles pandas {pandas_elapsed:.2f} s, sketches {sketch_elapsed:.2f} s, "
+          f"erreur relative max {max_error(estimates, exact):.2%} (borne {SKETCH_ALPHA / (1 - SKETCH_ALPHA):.2%})")
+
+    # Travailleurs indépendants (blocs du fichier) fusionnés: identique au passage unique
+    parts = []
+    for chunk in np.array_split(np.arange(len(frame)), WORKERS):
+        part = MarketAccumulator(keys)
+        part.fold(frame.iloc[chunk])
+        parts.append(part)
+    started = time.perf_counter()
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    merge_elapsed = time.perf_counter() - started
+    replayed = merged.result(quantiles=QUANTILES).set_index(keys)[columns].reindex(exact.index)
+    print(f"{WORKERS} accumulateurs fusionnés en {merge_elapsed * 1000:.0f} ms, "
+          f"identiques au passage unique: {np.allclose(replayed.to_numpy(), estimates.to_numpy(), equal_nan=True)}")
+
+    # Sketches sérialisés par groupe mensuel, fusionnés en distributions annuelles par région
+    monthly = aggregate_market(frame, ["region", "month"], sketches=True)
+    encoded = monthly["price_sketch"].dropna()
+    raw_bytes = 8 * n
+    sketch_bytes = int(encoded.str.len().sum())
+    print(f"{len(encoded)} sketches mensuels: {sketch_bytes / 1e6:.2f} Mo en base64 contre {raw_bytes / 1e6:.2f} Mo de prix bruts")
+    year = (monthly["month"] // 12).rename("year")
+    started = time.perf_counter()
+    yearly = {key: merge_sketches(group) for key, group in encoded.groupby([monthly["region"], year])}
+    rollup_elapsed = time.perf_counter() - started
+    truth = frame.groupby([frame["region"], (frame["month"] // 12).rename("year")], observed=True)["price"].median()
+    errors = [abs(yearly[key].quantile(0.5) / truth[key] - 1) for key in yearly]
+    print(f"roll-up mois -> année: {len(yearly)} fusions en {rollup_elapsed * 1000:.0f} ms, "
+          f"erreur max sur la médiane {max(errors):.2%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
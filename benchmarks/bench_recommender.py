@@ -0,0 +1,61 @@
+# =============================
+# bench_recommender.py - Benchmark de l'index ANN du recommandeur (module2)
+# Usage: python benchmarks/bench_recommender.py [n_listings]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module2"))
+from recommender import IVFIndex, ListingEncoder, evaluate_recall  # noqa: E402
+from bench_inventory import CITIES, DISTRICTS, TYPES, synthetic_listings  # noqa: E402
+
+
+def main(n: int) -> None:
+    listings = synthetic_listings(n)
+    encoder = ListingEncoder()
+    started = time.perf_counter()
+    vectors = encoder.encode_listings(listings)
+    print(f"encode {n} listings: {time.perf_counter() - started:.2f} s")
+
+    started = time.perf_counter()
+    index = IVFIndex(encoder.dim)
+    index.add([l["property_id"] for l in listings], vectors, [l["price"] for l in listings], [l["type"] for l in listings])
+    index.build()
+    print(f"build IVF ({len(index.centroids)} listes): {time.perf_counter() - started:.2f} s")
+
+    rng = np.random.default_rng(3)
+    profiles = [
+        {
+            "budget": float(rng.integers(5, 60) * 100_000),
+            "type": TYPES[rng.integers(len(TYPES))],
+            "location": f"{CITIES[rng.integers(len(CITIES))]} {DISTRICTS[rng.integers(len(DISTRICTS))]}",
+        }
+        for _ in range(200)
+    ]
+    queries = np.stack([encoder.encode_profile(p) for p in profiles])
+
+    print("\n-- sans filtre")
+    for row in evaluate_recall(index, queries, k=10):
+        print(row)
+    print("\n-- filtré (budget + type)")
+    filters = [{"max_price": p["budget"], "property_type": p["type"]} for p in profiles]
+    for row in evaluate_recall(index, queries, k=10, filters=filters):
+        print(row)
+
+    started = time.perf_counter()
+    for _ in range(20):
+        index.exact_search(queries[0], 10, **filters[0])
+    print(f"\nrecherche exacte filtrée: {(time.perf_counter() - started) / 20 * 1000:.2f} ms")
+
+    new = synthetic_listings(1000, seed=1)
+    started = time.perf_counter()
+    index.add([f"NEW{i}" for i in range(len(new))], encoder.encode_listings(new), [l["price"] for l in new], [l["type"] for l in new])
+    index.delete([f"P{i}" for i in range(1000)])
+    print(f"ajout + suppression de 1000 biens (incrémental): {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
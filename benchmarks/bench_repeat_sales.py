@@ -0,0 +1,90 @@
+# =============================
+# bench_repeat_sales.py - Benchmark de l'indice de ventes répétées (module3)
+# Usage: python benchmarks/bench_repeat_sales.py [n_properties] [n_months]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from aggregation import normalize_market_frame  # noqa: E402
+from repeat_sales import RepeatSalesIndex  # noqa: E402
+
+N_REGIONS = 10
+BATCHES = 12
+
+
+def synthetic_resales(n_properties: int, n_months: int, seed: int = 0):
+    # Biens revendus 1 à 4 fois; les biens de meilleure qualité se vendent plus tard (composition qui dérive,
+    # ce qui biaise la médiane). Renvoie les ventes et l'indice log vrai par région × mois.
+    rng = np.random.default_rng(seed)
+    region = rng.integers(0, N_REGIONS, n_properties)
+    quality = rng.normal(0, 0.5, n_properties)
+    truth = np.cumsum(rng.normal(0.004, 0.01, (N_REGIONS, n_months)), axis=1)
+    truth -= truth[:, :1]
+    sale_of = np.repeat(np.arange(n_properties), rng.integers(1, 5, n_properties))
+    month = np.clip((rng.random(len(sale_of)) * n_months + 20 * quality[sale_of]).astype(int), 0, n_months - 1)
+    price = np.exp(13 + quality[sale_of] + truth[region[sale_of], month] + rng.normal(0, 0.05, len(sale_of)))
+    sales = pd.DataFrame(
+        {
+            "city": np.array([f"R{i}" for i in range(N_REGIONS)])[region[sale_of]],
+            "type": "Appartement",
+            "price": price,
+            "date": (pd.Timestamp("2015-01-01") + pd.to_timedelta(month * 30.44, unit="D")).strftime("%Y-%m-%d"),
+            "property_id": sale_of,
+        }
+    )
+    return sales, truth
+
+
+def log_error(panel_values: np.ndarray, truth: np.ndarray) -> float:
+    # Écart moyen entre indices log centrés (le niveau n'est pas comparé, seule l'évolution)
+    estimate = np.log(panel_values)
+    estimate -= np.nanmean(estimate, axis=1, keepdims=True)
+    reference = truth[:, : estimate.shape[1]] - truth[:, : estimate.shape[1]].mean(axis=1, keepdims=True)
+    return float(np.nanmean(np.abs(estimate - reference)))
+
+
+def main(n_properties: int, n_months: int) -> None:
+    raw, truth = synthetic_resales(n_properties, n_months)
+    frame = normalize_market_frame(raw)
+    regions = [f"R{i}" for i in range(N_REGIONS)]
+
+    index = RepeatSalesIndex()
+    started = time.perf_counter()
+    pairs = index.update(frame)
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    panel = index.panel()
+    solve = time.perf_counter() - started
+    order = [panel.segments.index((r,)) for r in regions]
+    print(f"{len(frame)} ventes, {n_properties} biens: {pairs} paires en {elapsed:.2f} s, "
+          f"{index.summary()['cells']} cellules, résolution {solve * 1000:.0f} ms")
+
+    # Précision contre l'indice vrai, face à la médiane mensuelle (biaisée par la composition)
+    months = frame["month"] - frame["month"].min()
+    medians = frame.groupby([frame["region"].astype(str), months], observed=True)["price"].median().unstack()
+    median_values = medians.loc[regions].to_numpy()
+    print(f"erreur moyenne de l'indice (log): ventes répétées {log_error(panel.values[order], truth):.2%}, "
+          f"médiane {log_error(median_values, truth):.2%}")
+
+    # Flux mensuel: lots successifs intégrés sans relire les paires déjà vues
+    incremental = RepeatSalesIndex()
+    started = time.perf_counter()
+    for batch in np.array_split(np.argsort(frame["month"].to_numpy(), kind="stable"), BATCHES):
+        incremental.update(frame.iloc[batch])
+    elapsed = time.perf_counter() - started
+    replayed = incremental.panel()
+    replayed_order = [replayed.segments.index((r,)) for r in regions]
+    same = np.allclose(replayed.values[replayed_order], panel.values[order], equal_nan=True)
+    print(f"{BATCHES} lots incrémentaux: {elapsed:.2f} s au total, indice identique au calcul en un passage: {same}")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 120,
+    )
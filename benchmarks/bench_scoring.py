@@ -0,0 +1,92 @@
+# =============================
+# bench_scoring.py - Benchmark du score multi-critères (module2)
+# Usage: python benchmarks/bench_scoring.py [n_candidates]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module2"))
+from common.geo import get_gazetteer  # noqa: E402
+from scoring import CandidateMatrix, feature_scores, rank  # noqa: E402
+from recommender import ListingEncoder  # noqa: E402
+from bench_inventory import synthetic_listings  # noqa: E402
+
+
+def main(n: int) -> None:
+    candidates = synthetic_listings(n)
+    encoder = ListingEncoder()
+    vectors = encoder.encode_listings(candidates)
+    profile = {"budget": 2_000_000, "preferred_type": "Appartement", "preferred_location": "Casablanca Maarif", "area": 90}
+    interaction = vectors[:5].mean(axis=0)
+    interaction /= np.linalg.norm(interaction)
+
+    started = time.perf_counter()
+    matrix = CandidateMatrix(candidates, vectors)
+    print(f"matrice de {n} candidats (une fois): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    repeat = 20
+    started = time.perf_counter()
+    for _ in range(repeat):
+        ranked = rank(matrix, profile, k=10, interaction_vector=interaction)
+    print(f"score + top-10 (vectorisé, argpartition): {(time.perf_counter() - started) / repeat * 1000:.2f} ms")
+
+    # Référence: même score, tri complet Python
+    features = feature_scores(matrix, profile, interaction)
+    weights = np.array([0.3, 0.2, 0.25, 0.15, 0.1])
+    started = time.perf_counter()
+    rows = [(i, sum(float(f) * w for f, w in zip(features[i], weights))) for i in range(n)]
+    baseline = sorted(rows, key=lambda x: x[1], reverse=True)[:10]
+    print(f"référence boucle Python + tri complet: {(time.perf_counter() - started) * 1000:.1f} ms")
+    assert np.isclose(ranked[0]["score"], baseline[0][1], atol=1e-4)
+    print(ranked[0])
+    city_preference()
+    city_named_resolution()
+
+
+def city_preference() -> None:
+    # Régression: préférence au niveau ville. Un bien de la ville situé loin du centroïde garde le score plein
+    # (adresse qui cite la ville, rayon de la ville), un bien d'une autre ville reste derrière.
+    casablanca = get_gazetteer().resolve("Casablanca")
+    profile = {
+        "budget": 2_000_000, "preferred_type": "Appartement", "preferred_location": "Casablanca", "area": 90,
+        "location_coordinates": [casablanca["lat"], casablanca["lon"]], "location_extent_km": casablanca["extent_km"],
+    }
+    candidates = [
+        {"property_id": "rabat", "address": "Appartement Rabat - Agdal", "price": 1_800_000, "area": 90,
+         "type": "Appartement", "latitude": 33.9990, "longitude": -6.8480},
+        {"property_id": "casa-sidi-maarouf", "address": "Appartement Casablanca - Sidi Maarouf", "price": 1_800_000,
+         "area": 90, "type": "Appartement", "latitude": 33.5300, "longitude": -7.6400},
+        {"property_id": "casa-sans-ville", "address": "Appartement Ain Diab", "price": 1_800_000, "area": 90,
+         "type": "Appartement", "latitude": 33.5930, "longitude": -7.6890},
+    ]
+    location = feature_scores(CandidateMatrix(candidates), profile)[:, 2]
+    ranked = [candidates[r["index"]]["property_id"] for r in rank(CandidateMatrix(candidates), profile, k=3)]
+    print(f"préférence 'Casablanca' (rayon {casablanca['extent_km']} km): score de localisation "
+          f"{dict(zip((c['property_id'] for c in candidates), location.round(3).tolist()))}, classement {ranked}")
+    assert location[1] == 1.0 and location[2] > 0.99 and location[0] < 0.01
+    assert ranked[-1] == "rabat"
+
+
+def city_named_resolution() -> None:
+    # Régression: la ville citée l'emporte sur un quartier non ambigu d'une autre ville
+    gazetteer = get_gazetteer()
+    cases = {
+        "Boulevard Hassan II, Casablanca": ("Casablanca", "Casablanca"),
+        "Avenue Anfa Rabat": ("Rabat", "Rabat"),
+        "Rue Oasis Marrakech": ("Marrakech", "Marrakech"),
+        "Maarif Casablanca": ("Maarif", "Casablanca"),
+        "Maarif": ("Maarif", "Casablanca"),
+    }
+    for text, expected in cases.items():
+        place = gazetteer.resolve(text)
+        print(f"{text!r} -> {place['name']} ({place['city']})")
+        assert (place["name"], place["city"]) == expected
+    assert gazetteer.resolve("Agdal", city="Casablanca")["name"] == "Casablanca"
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
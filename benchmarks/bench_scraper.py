@@ -0,0 +1,114 @@
+# =============================
+# bench_scraper.py - Benchmark du moteur de fetch asynchrone contre un serveur HTTP simulé (module1)
+# Usage: python benchmarks/bench_scraper.py [n_urls] [latency_ms]
+# =============================
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module1"))
+from scraper import FetchEngine, HttpDiskCache  # noqa: E402
+
+DOMAINS = 8
+PER_DOMAIN = 3
+
+
+def listing_page(i: int) -> bytes:
+    # Page d'annonce avec JSON-LD et un long corps, servie en plusieurs blocs
+    filler = "<p>" + "Appartement lumineux, proche du tramway. " * 400 + "</p>"
+    return (
+        "<html><head><script type=\"application/ld+json\">"
+        f"{{\"@type\": \"Apartment\", \"offers\": {{\"price\": \"{1_000_000 + i} MAD\"}}, "
+        f"\"address\": {{\"streetAddress\": \"{i} rue Ibnou Sina\", \"addressLocality\": \"Rabat\"}}, "
+        f"\"floorSize\": {{\"value\": {60 + i % 90}}}, \"numberOfRooms\": {1 + i % 5}}}"
+        f"</script></head><body>{filler}<span data-bathrooms>{1 + i % 3}</span></body></html>"
+    ).encode("utf-8")
+
+
+class StubServer:
+    # Serveur simulé (httpx.MockTransport): latence fixe, ETag par page, suivi des requêtes simultanées par domaine
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+        self.in_flight = defaultdict(int)
+        self.peak = defaultdict(int)
+        self.statuses = defaultdict(int)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        domain = request.url.host
+        self.in_flight[domain] += 1
+        self.peak[domain] = max(self.peak[domain], self.in_flight[domain])
+        try:
+            await asyncio.sleep(self.latency_s)
+            i = int(request.url.path.rsplit("/", 1)[-1])
+            if i < 0:
+                return self._status(404, b"")
+            if i == 0:
+                # JSON-LD invalide et balisage cassé: l'annonce doit rester isolée des autres
+                return self._status(200, b"<script type=\"application/ld+json\">{not json</script><div data-price>",
+                                    {"etag": "\"0\""})
+            etag = f"\"{i}\""
+            if request.headers.get("if-none-match") == etag:
+                return self._status(304, b"", {"etag": etag})
+            return self._status(200, listing_page(i), {"etag": etag, "content-type": "text/html; charset=utf-8"})
+        finally:
+            self.in_flight[domain] -= 1
+
+    def _status(self, code: int, body: bytes, headers=None) -> httpx.Response:
+        self.statuses[code] += 1
+        return httpx.Response(code, content=body, headers=headers)
+
+
+def run(urls, latency_s: float, cache_dir: str, **engine_kwargs):
+    server = StubServer(latency_s)
+    engine = FetchEngine(cache=HttpDiskCache(cache_dir), transport=httpx.MockTransport(server.handle), **engine_kwargs)
+    started = time.perf_counter()
+    listings = asyncio.run(engine.fetch_all(urls))
+    return listings, engine.stats, server, time.perf_counter() - started
+
+
+def main(n: int, latency_ms: float) -> None:
+    latency_s = latency_ms / 1000.0
+    urls = [f"https://site{i % DOMAINS}.ma/annonce/{i + 1}" for i in range(n)]
+
+    # Passage de la concurrence: 1 requête à la fois contre 32 (au plus PER_DOMAIN par domaine)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        _, _, _, serial = run(urls[: n // 4], latency_s, cache_dir, max_concurrency=1, per_domain_concurrency=1)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        listings, stats, server, elapsed = run(urls, latency_s, cache_dir, per_domain_concurrency=PER_DOMAIN)
+        serial_rate, rate = (n // 4) / serial, n / elapsed
+        print(f"{n} URLs, {DOMAINS} domaines, latence {latency_ms:.0f} ms: séquentiel {serial_rate:.0f} pages/s, "
+              f"concurrent {rate:.0f} pages/s (x{rate / serial_rate:.1f}), {stats['bytes'] / 1e6:.1f} Mo")
+        assert rate > 5 * serial_rate
+        assert max(server.peak.values()) <= PER_DOMAIN, dict(server.peak)
+        print(f"pic de requêtes simultanées par domaine: {max(server.peak.values())} (limite {PER_DOMAIN})")
+        assert all(l.get("list_price") == 1_000_000 + int(u.rsplit("/", 1)[-1]) for l, u in zip(listings, urls))
+
+        # Revalidation: second passage sur le même cache, réponses 304 et annonces identiques
+        replayed, stats, server, elapsed = run(urls, latency_s, cache_dir, per_domain_concurrency=PER_DOMAIN)
+        print(f"revalidation: {stats['not_modified']} réponses 304 sur {n}, {stats['bytes']} octets téléchargés, "
+              f"annonces identiques: {replayed == listings}")
+        assert stats["not_modified"] == n and server.statuses[304] == n and replayed == listings
+
+        # Débit par domaine: PER_DOMAIN requêtes, espacées d'au moins 50 ms sur un même domaine
+        one_domain = [f"https://lent.ma/annonce/{i + 1}" for i in range(10)]
+        _, _, server, elapsed = run(one_domain, 0.0, cache_dir, per_domain_interval_s=0.05)
+        print(f"10 pages d'un domaine à 50 ms d'intervalle: {elapsed:.2f} s")
+        assert elapsed >= 0.45
+
+        # Erreurs isolées par URL: 404 et page illisible n'interrompent pas le lot
+        mixed = urls[:5] + ["https://site0.ma/annonce/-1", "https://site1.ma/annonce/0"]
+        results, stats, _, _ = run(mixed, 0.0, cache_dir)
+        print(f"lot avec une 404 et une page cassée: {len(results)} résultats, {stats['errors']} erreurs")
+        assert "error" in results[5] and results[6]["url"] == mixed[6] and len(results) == len(mixed)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 400,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 20.0,
+    )
@@ -0,0 +1,78 @@
+# =============================
+# bench_trends.py - Benchmark du moteur de tendances (module3)
+# Usage: python benchmarks/bench_trends.py [n_segments] [n_months]
+# =============================
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "modules", "module3"))
+from aggregation import normalize_market_frame  # noqa: E402
+from trends import MarketPanel, OnlineTrendEngine, compute_trends, panel_from_frame  # noqa: E402
+from bench_market_aggregation import synthetic_market  # noqa: E402
+
+
+def synthetic_panel(n_segments: int, n_months: int, seed: int = 0) -> MarketPanel:
+    # Marche aléatoire log-normale + saisonnalité, 10 % de mois sans vente
+    rng = np.random.default_rng(seed)
+    drift = np.cumsum(rng.normal(0.003, 0.02, (n_segments, n_months)), axis=1)
+    season = 0.03 * np.sin(2 * np.pi * np.arange(n_months) / 12)
+    values = rng.uniform(5e5, 5e6, (n_segments, 1)) * np.exp(drift + season)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    counts = np.where(np.isnan(values), 0, rng.integers(1, 200, values.shape))
+    segments = [(f"R{i // 10}", f"T{i % 10}") for i in range(n_segments)]
+    return MarketPanel(("region", "property_type"), segments, 2015 * 12, values, counts)
+
+
+def pandas_reference(panel: MarketPanel, sample: int) -> float:
+    # Référence: séries pandas segment par segment (rolling / pct_change), sur un échantillon
+    started = time.perf_counter()
+    for row in panel.values[:sample]:
+        s = pd.Series(row)
+        smoothed = s.rolling(3, min_periods=1).median()
+        smoothed.pct_change(1, fill_method=None)
+        smoothed.pct_change(12, fill_method=None)
+        np.log(s / s.shift(1)).rolling(12, min_periods=3).std()
+        s.rolling(3, min_periods=1).mean() / s.rolling(12, min_periods=1).mean()
+    return (time.perf_counter() - started) * len(panel.values) / sample
+
+
+def main(n_segments: int, n_months: int) -> None:
+    panel = synthetic_panel(n_segments, n_months)
+    started = time.perf_counter()
+    compute_trends(panel)
+    elapsed = time.perf_counter() - started
+    print(f"indicateurs vectorisés, {n_segments} segments × {n_months} mois: {elapsed * 1e3:.0f} ms")
+    print(f"pandas segment par segment (extrapolé): {pandas_reference(panel, 200):.1f} s")
+
+    # Mode en ligne: ventes une à une (O(1)) et lots fusionnés (Chan)
+    frame = normalize_market_frame(synthetic_market(500_000))
+    engine = OnlineTrendEngine()
+    started = time.perf_counter()
+    engine.update(frame.iloc[:450_000])
+    batch = time.perf_counter() - started
+    sample = frame.iloc[450_000:460_000]
+    segments = list(zip(sample["region"].astype(str), sample["property_type"].astype(str)))
+    started = time.perf_counter()
+    for segment, month, price in zip(segments, sample["month"], sample["price"]):
+        engine.add(segment, month, price)
+    single = (time.perf_counter() - started) / len(sample)
+    started = time.perf_counter()
+    compute_trends(engine.panel())
+    read = time.perf_counter() - started
+    print(f"en ligne: lot de 450k ventes {batch:.2f} s, vente unitaire {single * 1e6:.0f} µs, "
+          f"lecture des indicateurs {read * 1e3:.1f} ms")
+    full = normalize_market_frame(synthetic_market(460_000))
+    started = time.perf_counter()
+    compute_trends(panel_from_frame(full))
+    print(f"recalcul complet (médianes mensuelles sur 460k ventes): {time.perf_counter() - started:.2f} s")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 120,
+    )
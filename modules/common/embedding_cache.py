@@ -0,0 +1,240 @@
+# =============================
+# embedding_cache.py - Shared (tous modules)
+# Cache disque des embeddings devant MistralEmbedder
+# =============================
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from agno.knowledge.embedder.base import Embedder
+
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "cache", "embeddings.sqlite"),
+)
+DEFAULT_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+# =============================
+# Stockage SQLite (float16, éviction LRU bornée en taille)
+# =============================
+class EmbeddingCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # WAL: plusieurs modules / processus peuvent lire pendant une écriture
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access);
+            """
+        )
+        self._total_bytes = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, dimensions: Optional[int], text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{dimensions}:{digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self.conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32).tolist()
+                if found:
+                    self.conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE key IN ({marks})", [time.time(), *batch]
+                    )
+            self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            if not vector:
+                continue
+            blob = np.asarray(vector, dtype=np.float16).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            for key, _, nbytes, _ in rows:
+                old = self.conn.execute("SELECT nbytes FROM embeddings WHERE key = ?", (key,)).fetchone()
+                self._total_bytes += nbytes - (old[0] if old else 0)
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        # Supprime les entrées les moins récemment utilisées jusqu'à 90% du budget
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self.conn.execute(
+                "SELECT key, nbytes FROM embeddings ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            evicted = []
+            for key, nbytes in rows:
+                evicted.append((key,))
+                self._total_bytes -= nbytes
+                if self._total_bytes <= target:
+                    break
+            self.conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+_shared_cache: Optional[EmbeddingCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    # Une seule instance par processus, partagée par tous les modules
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
+
+
+# =============================
+# Embedder agno avec cache
+# =============================
+@dataclass
+class CachedEmbedder(Embedder):
+    embedder: Optional[Embedder] = None
+    cache: Optional[EmbeddingCache] = None
+    api_calls: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        if self.embedder is None:
+            raise ValueError("CachedEmbedder requires an embedder")
+        self.dimensions = self.embedder.dimensions
+        self.enable_batch = self.embedder.enable_batch
+        self.batch_size = self.embedder.batch_size
+        if self.cache is None:
+            self.cache = get_embedding_cache()
+
+    @property
+    def id(self) -> str:
+        return getattr(self.embedder, "id", type(self.embedder).__name__)
+
+    def _key(self, text: str) -> str:
+        return EmbeddingCache.make_key(self.id, self.dimensions, text)
+
+    def _embed_misses(self, texts: List[str]) -> List[List[float]]:
+        client = getattr(self.embedder, "client", None)
+        if client is not None and hasattr(client, "embeddings"):
+            # MistralEmbedder: un appel API par lot
+            vectors: List[List[float]] = []
+            for i in range(0, len(texts), self.batch_size):
+                batch = texts[i : i + self.batch_size]
+                response = client.embeddings.create(
+                    inputs=batch, model=self.id, **(getattr(self.embedder, "request_params", None) or {})
+                )
+                vectors.extend([d.embedding for d in response.data])
+                self.api_calls += 1
+            return vectors
+        self.api_calls += len(texts)
+        return [self.embedder.get_embedding(t) for t in texts]
+
+    def get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+        if missing:
+            vectors = self._embed_misses(missing)
+            fresh = {self._key(t): v for t, v in zip(missing, vectors)}
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return [found.get(k, []) for k in keys]
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding_and_usage(text)[0]
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        key = self._key(text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key], None
+        embedding, usage = self.embedder.get_embedding_and_usage(text)
+        self.api_calls += 1
+        self.cache.put_many({key: embedding})
+        return embedding, usage
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return (await self.async_get_embedding_and_usage(text))[0]
+
+    async def async_get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        key = self._key(text)
+        found = await asyncio.to_thread(self.cache.get_many, [key])
+        if key in found:
+            return found[key], None
+        embedding, usage = await self.embedder.async_get_embedding_and_usage(text)
+        self.api_calls += 1
+        await asyncio.to_thread(self.cache.put_many, {key: embedding})
+        return embedding, usage
+
+    async def async_get_embeddings_batch_and_usage(
+        self, texts: List[str]
+    ) -> Tuple[List[List[float]], List[Optional[Dict[str, Any]]]]:
+        keys = [self._key(t) for t in texts]
+        found = await asyncio.to_thread(self.cache.get_many, list(dict.fromkeys(keys)))
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+        usage_by_key: Dict[str, Optional[Dict[str, Any]]] = {}
+        if missing:
+            vectors, usages = await self.embedder.async_get_embeddings_batch_and_usage(missing)
+            self.api_calls += 1
+            fresh = {self._key(t): v for t, v in zip(missing, vectors)}
+            usage_by_key = {self._key(t): u for t, u in zip(missing, usages)}
+            await asyncio.to_thread(self.cache.put_many, fresh)
+            found.update(fresh)
+        return [found.get(k, []) for k in keys], [usage_by_key.get(k) for k in keys]
+
+
+def cached_mistral_embedder(api_key: Optional[str] = None, dimensions: int = 1024) -> CachedEmbedder:
+    from agno.knowledge.embedder.mistral import MistralEmbedder
+
+    return CachedEmbedder(embedder=MistralEmbedder(api_key=api_key, dimensions=dimensions))
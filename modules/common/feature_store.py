@@ -0,0 +1,364 @@
+# =============================
+# feature_store.py - Shared (tous modules)
+# Feature store colonnaire (Arrow / Parquet) des biens, indexé par property_id
+# =============================
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .geo import get_gazetteer
+
+
+DEFAULT_STORE_PATH = os.getenv(
+    "FEATURE_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "store", "properties.parquet"),
+)
+# Chaque écriture ajoute un segment; la base est réécrite quand les segments dépassent sa taille ou ce nombre
+MAX_SEGMENTS = int(os.getenv("FEATURE_STORE_MAX_SEGMENTS", "64"))
+
+PROPERTY_SCHEMA = pa.schema(
+    [
+        pa.field("property_id", pa.string(), nullable=False),
+        pa.field("address", pa.string()),
+        pa.field("city", pa.string()),
+        pa.field("district", pa.string()),
+        pa.field("type", pa.string()),
+        pa.field("price", pa.float64()),
+        pa.field("area", pa.float64()),  # m²
+        pa.field("sqft", pa.float64()),
+        pa.field("price_per_sqm", pa.float64()),
+        pa.field("bedrooms", pa.int32()),
+        pa.field("bathrooms", pa.float64()),
+        pa.field("lot_size", pa.float64()),
+        pa.field("year_built", pa.int32()),
+        pa.field("amenities", pa.list_(pa.string())),
+        pa.field("description", pa.string()),
+        pa.field("latitude", pa.float64()),
+        pa.field("longitude", pa.float64()),
+        pa.field("source", pa.string()),
+        pa.field("updated_at", pa.timestamp("us")),
+    ]
+)
+
+# Segment: lignes complètes des biens écrits, ou pierres tombales (deleted) des biens retirés
+SEGMENT_SCHEMA = PROPERTY_SCHEMA.append(pa.field("deleted", pa.bool_()))
+
+# Alias rencontrés dans les tools et les fichiers documents1 / documents2 (property_id est canonique; un "id"
+# générique n'est qu'un numéro de ligne propre à sa source, voir normalize_record)
+FIELD_ALIASES = {
+    "price": ("price", "list_price", "total_price", "sale_price"),
+    "area": ("area", "surface", "area_sqm"),
+    "sqft": ("sqft", "square_footage"),
+    "description": ("description", "notes"),
+}
+AMENITY_FLAGS = ("balcony", "parking", "garden", "pool", "garage", "fireplace")
+SQFT_PER_SQM = 10.7639
+PROPERTY_TYPES = ("appartement", "studio", "villa", "maison", "duplex", "riad", "bureau", "terrain")
+
+
+# =============================
+# Normalisation d'un enregistrement
+# =============================
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def make_property_id(address: Optional[str]) -> str:
+    key = re.sub(r"\W+", " ", _fold(address or "")).strip()
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def split_address(address: Optional[str]) -> Dict[str, Optional[str]]:
+    # "Appartement à Casablanca - Maarif" -> city=Casablanca, district=Maarif
+    if not address or " - " not in address:
+        return {"city": None, "district": None}
+    left, district = address.rsplit(" - ", 1)
+    words = [w for w in left.replace(",", " ").split() if _fold(w) not in PROPERTY_TYPES + ("a",)]
+    return {"city": " ".join(words) or None, "district": district.strip() or None}
+
+
+def _first(record: Dict[str, Any], field: str) -> Any:
+    for alias in FIELD_ALIASES.get(field, (field,)):
+        if record.get(alias) not in (None, ""):
+            return record[alias]
+    return None
+
+
+def _number(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_record(record: Dict[str, Any], source: Optional[str] = None) -> Dict[str, Any]:
+    address = record.get("address")
+    parts = split_address(address)
+    area = _number(_first(record, "area"))
+    sqft = _number(_first(record, "sqft"))
+    if area is None and sqft is not None:
+        area = round(sqft / SQFT_PER_SQM, 2)
+    if sqft is None and area is not None:
+        sqft = round(area * SQFT_PER_SQM, 2)
+    price = _number(_first(record, "price"))
+    price_per_sqm = _number(record.get("price_per_sqm"))
+    if price_per_sqm is None and price and area:
+        price_per_sqm = round(price / area, 2)
+
+    amenities = list(record.get("amenities") or [])
+    amenities += [flag for flag in AMENITY_FLAGS if record.get(flag) is True and flag not in amenities]
+    description = _first(record, "description")
+    if isinstance(description, list):
+        description = ". ".join(str(d) for d in description)
+
+    latitude, longitude = _number(record.get("latitude")), _number(record.get("longitude"))
+    if latitude is None or longitude is None:
+        # Coordonnées approchées (centre du quartier / de la ville) depuis le gazetteer hors-ligne
+        latitude, longitude = get_gazetteer().geocode(
+            {"address": address, "city": record.get("city") or parts["city"], "district": record.get("district") or parts["district"]}
+        )
+    source = source or record.get("source")
+    property_id = record.get("property_id")
+    if property_id in (None, "") and record.get("id") not in (None, "") and source:
+        # "1", "2"... d'un scraper ou d'un document: préfixés par la source pour ne pas écraser ceux d'une autre
+        property_id = f"{source}:{record['id']}"
+    bedrooms = _number(record.get("bedrooms"))
+    year_built = _number(record.get("year_built"))
+    return {
+        "property_id": str(property_id) if property_id not in (None, "") else make_property_id(address),
+        "address": address,
+        "city": record.get("city") or parts["city"],
+        "district": record.get("district") or parts["district"],
+        "type": record.get("type") or record.get("property_type"),
+        "price": price,
+        "area": area,
+        "sqft": sqft,
+        "price_per_sqm": price_per_sqm,
+        "bedrooms": int(bedrooms) if bedrooms is not None else None,
+        "bathrooms": _number(record.get("bathrooms")),
+        "lot_size": _number(record.get("lot_size")),
+        "year_built": int(year_built) if year_built is not None else None,
+        "amenities": amenities,
+        "description": description,
+        "latitude": latitude,
+        "longitude": longitude,
+        "source": source,
+        "updated_at": datetime.now(),
+    }
+
+
+# =============================
+# Store
+# =============================
+class PropertyFeatureStore:
+    # Journal de segments Parquet: une écriture ajoute un fichier de la taille du lot (jamais de réécriture du
+    # store); au chargement, la base compactée puis les segments sont rejoués dans l'ordre (dernière version gagne).
+    # compact() réécrit la base quand les segments dépassent sa taille, coût amorti sur les écritures.
+    def __init__(self, path: str = DEFAULT_STORE_PATH, max_segments: int = MAX_SEGMENTS):
+        self.path = path
+        self.segments_dir = os.path.splitext(path)[0] + ".segments"
+        self.max_segments = max_segments
+        self.version = 0
+        self._lock = threading.RLock()
+        self._table: Optional[pa.Table] = None
+        self._base_rows = 0
+        self._segments: List[str] = []
+        self._segment_rows = 0
+
+    @property
+    def table(self) -> pa.Table:
+        with self._lock:
+            if self._table is None:
+                self._table = self._load()
+            return self._table
+
+    def _load(self) -> pa.Table:
+        if os.path.exists(self.path):
+            # memory_map: les colonnes de la base sont lues sans copie depuis le fichier
+            base = pq.read_table(self.path, schema=PROPERTY_SCHEMA, memory_map=True)
+        else:
+            base = PROPERTY_SCHEMA.empty_table()
+        self._base_rows = base.num_rows
+        self._segments = sorted(
+            os.path.join(self.segments_dir, name)
+            for name in (os.listdir(self.segments_dir) if os.path.isdir(self.segments_dir) else [])
+            if name.endswith(".parquet")
+        )
+        if not self._segments:
+            self._segment_rows = 0
+            return base
+        segments = [pq.read_table(f, schema=SEGMENT_SCHEMA) for f in self._segments]
+        self._segment_rows = sum(t.num_rows for t in segments)
+        log = pa.concat_tables(
+            [base.append_column("deleted", pa.array([False] * base.num_rows, pa.bool_()))] + segments
+        )
+        log = log.append_column("_row", pa.array(range(log.num_rows), pa.int64()))
+        # Dernière écriture de chaque bien, dans l'ordre du journal; les biens supprimés en dernier sont écartés
+        last = log.group_by("property_id", use_threads=False).aggregate([("_row", "max")])["_row_max"]
+        latest = log.take(last.take(pc.sort_indices(last)))
+        latest = latest.filter(pc.invert(latest["deleted"]))
+        return latest.select(PROPERTY_SCHEMA.names).combine_chunks()
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def upsert(self, records: Iterable[Dict[str, Any]], source: Optional[str] = None) -> List[str]:
+        records = list(records)
+        with self._lock:
+            # Un "id" déjà présent dans le store (ex. "documents2:1" renvoyé par une recherche) désigne ce bien:
+            # il met à jour la ligne existante au lieu d'être préfixé par la source en un nouveau bien
+            echoed = [
+                str(r["id"]) for r in records if r.get("property_id") in (None, "") and r.get("id") not in (None, "")
+            ]
+            stored = set(self.get(echoed, ["property_id"])["property_id"].to_pylist()) if echoed else set()
+            rows = {}
+            for record in records:
+                if record.get("property_id") in (None, "") and str(record.get("id")) in stored:
+                    record = {**record, "property_id": str(record["id"])}
+                row = normalize_record(record, source)
+                rows[row["property_id"]] = row
+            if not rows:
+                return []
+            # Fusion: un champ absent de la nouvelle source garde la valeur déjà connue
+            for known in self.get(list(rows)).to_pylist():
+                row = rows[known["property_id"]]
+                for key, value in known.items():
+                    if row.get(key) in (None, []):
+                        row[key] = value
+            incoming = pa.Table.from_pylist(list(rows.values()), schema=PROPERTY_SCHEMA)
+            current = self.table
+            keep = pc.invert(pc.is_in(current["property_id"], value_set=incoming["property_id"]))
+            self._table = pa.concat_tables([current.filter(keep), incoming]).combine_chunks()
+            self._append_segment(incoming, deleted=False)
+            self.version += 1
+        return list(rows)
+
+    def delete(self, property_ids: List[str]) -> int:
+        with self._lock:
+            current = self.table
+            removed_ids = pa.array([str(i) for i in property_ids], pa.string())
+            keep = pc.invert(pc.is_in(current["property_id"], value_set=removed_ids))
+            self._table = current.filter(keep)
+            removed = current.num_rows - self._table.num_rows
+            if removed:
+                # Pierres tombales: identifiant seul, autres colonnes nulles
+                gone = current.filter(pc.invert(keep))["property_id"]
+                tombstones = pa.table(
+                    [gone if f.name == "property_id" else pa.nulls(removed, f.type) for f in PROPERTY_SCHEMA],
+                    schema=PROPERTY_SCHEMA,
+                )
+                self._append_segment(tombstones, deleted=True)
+                self.version += 1
+            return removed
+
+    def _append_segment(self, rows: pa.Table, deleted: bool) -> None:
+        # Segment numéroté (ordre de rejeu) écrit atomiquement; O(lot), pas O(store)
+        os.makedirs(self.segments_dir, exist_ok=True)
+        segment = rows.append_column("deleted", pa.array([deleted] * rows.num_rows, pa.bool_()))
+        sequence = int(os.path.basename(self._segments[-1]).split("-", 1)[0]) + 1 if self._segments else 0
+        path = os.path.join(self.segments_dir, f"{sequence:010d}-{uuid.uuid4().hex[:8]}.parquet")
+        pq.write_table(segment, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self._segments.append(path)
+        self._segment_rows += rows.num_rows
+        if len(self._segments) > self.max_segments or self._segment_rows > max(self._base_rows, 1024):
+            self.compact()
+
+    def compact(self) -> None:
+        # Base réécrite depuis l'état en mémoire, puis segments intégrés supprimés (un arrêt entre les deux ne fait
+        # que rejouer des segments déjà appliqués)
+        with self._lock:
+            table = self.table
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, self.path)
+            for segment in self._segments:
+                os.remove(segment)
+            self._segments, self._segment_rows, self._base_rows = [], 0, table.num_rows
+
+    def seed_file(self, path: str, source: str) -> List[str]:
+        # Chargement initial d'un fichier de référence, une seule fois par store: une source déjà présente (ou
+        # vidée depuis) n'est jamais réimportée en silence
+        with self._lock:
+            marker = os.path.join(self.segments_dir, f"seeded-{source}")
+            if os.path.exists(marker):
+                return []
+            ids = [] if self.scan(["property_id"], source=source).num_rows else self.ingest_file(path, source)
+            os.makedirs(self.segments_dir, exist_ok=True)
+            with open(marker, "w", encoding="utf-8") as f:
+                f.write(path)
+            return ids
+
+    def get(self, property_ids: List[str], columns: Optional[List[str]] = None) -> pa.Table:
+        table = self.table
+        mask = pc.is_in(table["property_id"], value_set=pa.array([str(i) for i in property_ids], pa.string()))
+        table = table.filter(mask)
+        return table.select(columns) if columns else table
+
+    def get_record(self, property_id: str) -> Optional[Dict[str, Any]]:
+        rows = self.get([property_id]).to_pylist()
+        return rows[0] if rows else None
+
+    def scan(self, columns: Optional[List[str]] = None, source: Union[None, str, Iterable[str]] = None) -> pa.Table:
+        table = self.table
+        if source is not None:
+            sources = [source] if isinstance(source, str) else list(source)
+            table = table.filter(pc.is_in(table["source"], value_set=pa.array(sources, pa.string())))
+        return table.select(columns) if columns else table
+
+    def slice(self, offset: int, length: int, columns: Optional[List[str]] = None) -> pa.Table:
+        # Slice Arrow: vue sans copie sur les buffers existants
+        table = self.table.slice(offset, length)
+        return table.select(columns) if columns else table
+
+    def ingest_file(self, path: str, source: Optional[str] = None) -> List[str]:
+        source = source or os.path.basename(os.path.dirname(path))
+        if path.lower().endswith(".csv"):
+            with open(path, "r", encoding="utf-8") as f:
+                return self.upsert(csv.DictReader(f), source)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            # {"comparables": [...]} ou {"property_details": {...}}
+            values = list(data.values())
+            data = values[0] if len(values) == 1 else [data]
+        if isinstance(data, dict):
+            data = [data]
+        return self.upsert([d for d in data if isinstance(d, dict) and d.get("address")], source)
+
+
+def records_from_table(table: pa.Table) -> List[Dict[str, Any]]:
+    # Sortie JSON-compatible pour les agents (timestamps en ISO, sans colonnes nulles)
+    rows = table.to_pylist()
+    for row in rows:
+        if isinstance(row.get("updated_at"), datetime):
+            row["updated_at"] = row["updated_at"].isoformat()
+    return [{k: v for k, v in row.items() if v is not None} for row in rows]
+
+
+_shared_store: Optional[PropertyFeatureStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_feature_store() -> PropertyFeatureStore:
+    # Une seule instance par processus: un bien est parsé une fois puis partagé
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = PropertyFeatureStore()
+        return _shared_store
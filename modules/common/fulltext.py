@@ -0,0 +1,277 @@
+# =============================
+# fulltext.py - Shared (tous modules)
+# Index inversé BM25 (FR/EN): texte des annonces, bases de connaissances; postings compressés (varint)
+# =============================
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+STOPWORDS = frozenset(
+    """
+    a au aux avec ce ces dans de des du en et la le les leur lui ma mais me mon ne nos notre nous on ou par pas
+    pour qu que qui sa se ses son sur ta te tes ton tu un une vos votre vous y est sont tres plus
+    an and are as at be by for from has have in is it its of on or the this to with near very
+    """.split()
+)
+
+# Suffixes retirés du plus long au plus court (stemming léger français / anglais)
+_SUFFIXES = (
+    "issements", "issement", "ations", "ation", "ements", "ement", "ments", "ment", "euses", "euse",
+    "ances", "ance", "ences", "ence", "ables", "able", "iques", "ique", "istes", "iste", "eaux", "eux",
+    "ives", "ive", "ifs", "if", "ness", "ings", "ing", "edly", "ies", "ied", "ly", "ed", "es", "s", "x", "e",
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=200_000)
+def stem(token: str) -> str:
+    if token.isdigit() or len(token) <= 3:
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[: -len(suffix)]
+            break
+    # Consonne finale doublée ("balconn", "terrass") -> simple
+    if len(token) > 4 and token[-1] == token[-2] and token[-1] not in "aeiou":
+        token = token[:-1]
+    return token
+
+
+def analyze(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return [stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+# =============================
+# Varint (LEB128) vectorisé
+# =============================
+def varint_sizes(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        nbytes += values >= np.uint64(1 << shift)
+    return nbytes
+
+
+def varint_encode(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return np.empty(0, dtype=np.uint8)
+    nbytes = varint_sizes(values)
+    starts = np.cumsum(nbytes) - nbytes
+    owner = np.repeat(np.arange(len(values)), nbytes)
+    position = np.arange(int(nbytes.sum())) - starts[owner]
+    payload = (values[owner] >> (np.uint64(7) * position.astype(np.uint64))) & np.uint64(0x7F)
+    more = (position < nbytes[owner] - 1).astype(np.uint64) << np.uint64(7)
+    return (payload | more).astype(np.uint8)
+
+
+def varint_decode(data: np.ndarray) -> np.ndarray:
+    if not len(data):
+        return np.empty(0, dtype=np.int64)
+    is_last = data < 0x80
+    starts = np.concatenate([[0], np.flatnonzero(is_last)[:-1] + 1])
+    group = np.cumsum(np.concatenate([[0], is_last[:-1]]))
+    position = np.arange(len(data)) - starts[group]
+    parts = (data & 0x7F).astype(np.int64) << (7 * position)
+    return np.add.reduceat(parts, starts)
+
+
+# =============================
+# Index BM25
+# =============================
+class BM25Index:
+    # Les numéros de document sont ceux de l'appelant (ex. lignes d'InventoryIndex): delete() enregistre ses
+    # tombstones (statistiques BM25 à jour, postings purgés au compact()), et compact() applique sa renumérotation
+    # lors d'un rebuild.
+    def __init__(self, k1: float = 1.2, b: float = 0.75, decoded_cache_terms: int = 64):
+        self.k1 = k1
+        self.b = b
+        self.decoded_cache_terms = decoded_cache_terms
+        self._lock = threading.RLock()
+        self.doc_len = np.zeros(1024, dtype=np.int32)
+        self.live = np.zeros(1024, dtype=bool)
+        self.n_docs = 0
+        self.total_len = 0
+        # Partie compressée: un buffer varint des écarts de doc ids + tf (uint8 saturé) par posting
+        self._data = np.empty(0, dtype=np.uint8)
+        self._tfs = np.empty(0, dtype=np.uint8)
+        self._terms: Dict[str, Tuple[int, int, int, int]] = {}  # terme -> (octet début, fin, posting début, fin)
+        self._delta: Dict[str, List[Tuple[int, int]]] = {}
+        # Postings décompressés des termes fréquemment demandés (LRU) et normes BM25 par document
+        self._decoded: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._norm: Optional[np.ndarray] = None
+
+    def add(self, rows: Sequence[int], texts: Iterable[Optional[str]]) -> None:
+        with self._lock:
+            for row, text in zip(rows, texts):
+                tokens = analyze(text)
+                if row >= len(self.doc_len):
+                    size = max(row + 1, 2 * len(self.doc_len))
+                    self.doc_len = np.concatenate([self.doc_len, np.zeros(size - len(self.doc_len), dtype=np.int32)])
+                    self.live = np.concatenate([self.live, np.zeros(size - len(self.live), dtype=bool)])
+                self.doc_len[row] = len(tokens)
+                self.live[row] = True
+                self.n_docs += 1
+                self.total_len += len(tokens)
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, tf in counts.items():
+                    self._delta.setdefault(token, []).append((row, tf))
+            self._norm = None
+
+    def delete(self, rows: Iterable[int]) -> int:
+        # Tombstones: nombre de documents et longueur totale décrémentés tout de suite (IDF et longueur moyenne
+        # exactes entre deux compactions); les postings des lignes supprimées restent jusqu'au compact()
+        with self._lock:
+            rows = np.unique(np.fromiter(rows, dtype=np.int64))
+            rows = rows[(rows >= 0) & (rows < len(self.live))]
+            rows = rows[self.live[rows]]
+            if len(rows):
+                self.live[rows] = False
+                self.n_docs -= len(rows)
+                self.total_len -= int(self.doc_len[rows].sum())
+                self._norm = None
+            return len(rows)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        parts_rows, parts_tfs = [], []
+        if term in self._terms:
+            cached = self._decoded.get(term)
+            if cached is None:
+                byte_lo, byte_hi, post_lo, post_hi = self._terms[term]
+                cached = np.cumsum(varint_decode(self._data[byte_lo:byte_hi])), self._tfs[post_lo:post_hi]
+                self._decoded[term] = cached
+                if len(self._decoded) > self.decoded_cache_terms:
+                    self._decoded.popitem(last=False)
+            else:
+                self._decoded.move_to_end(term)
+            parts_rows.append(cached[0])
+            parts_tfs.append(cached[1])
+        if term in self._delta:
+            delta = np.array(self._delta[term], dtype=np.int64)
+            parts_rows.append(delta[:, 0])
+            parts_tfs.append(delta[:, 1])
+        if not parts_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        if len(parts_rows) == 1:
+            return parts_rows[0], parts_tfs[0]
+        return np.concatenate(parts_rows), np.concatenate(parts_tfs).astype(np.int64)
+
+    def compact(self, new_row: np.ndarray, n_rows: int) -> None:
+        # Renumérotation (new_row[ancien] = nouveau ou -1) et fusion du delta dans la partie compressée
+        with self._lock:
+            terms, all_rows, all_tfs, lengths = [], [], [], []
+            for term in self._terms.keys() | self._delta.keys():
+                rows, tfs = self.postings(term)
+                rows = new_row[rows]
+                keep = rows >= 0
+                if not keep.any():
+                    continue
+                rows, tfs = rows[keep], tfs[keep]
+                order = np.argsort(rows, kind="stable")
+                terms.append(term)
+                all_rows.append(rows[order])
+                all_tfs.append(tfs[order])
+                lengths.append(int(keep.sum()))
+            doc_len = np.zeros(max(n_rows, 1024), dtype=np.int32)
+            alive_old = np.flatnonzero(new_row >= 0)
+            doc_len[new_row[alive_old]] = self.doc_len[alive_old]
+            self.doc_len = doc_len
+            self.live = np.zeros(len(doc_len), dtype=bool)
+            self.live[:n_rows] = True
+            self.n_docs = n_rows
+            self.total_len = int(doc_len[:n_rows].sum())
+            self._delta = {}
+            self._decoded.clear()
+            self._norm = None
+            if not terms:
+                self._data, self._tfs, self._terms = np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.uint8), {}
+                return
+            # Écarts entre doc ids successifs d'un même terme (le premier écart part de 0)
+            rows = np.concatenate(all_rows)
+            post_offsets = np.concatenate([[0], np.cumsum(lengths)])
+            gaps = np.diff(rows, prepend=0)
+            gaps[post_offsets[:-1]] = rows[post_offsets[:-1]]
+            encoded_sizes = np.add.reduceat(varint_sizes(gaps), post_offsets[:-1])
+            byte_offsets = np.concatenate([[0], np.cumsum(encoded_sizes)])
+            self._data = varint_encode(gaps)
+            self._tfs = np.minimum(np.concatenate(all_tfs), 255).astype(np.uint8)
+            self._terms = {
+                term: (int(byte_offsets[i]), int(byte_offsets[i + 1]), int(post_offsets[i]), int(post_offsets[i + 1]))
+                for i, term in enumerate(terms)
+            }
+
+    def search(
+        self,
+        query: str,
+        k: Optional[int] = 10,
+        allowed: Optional[np.ndarray] = None,
+        alive: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # allowed: masque booléen par ligne (filtres structurés); alive: masque des tombstones.
+        # k=None: toutes les correspondances, par ligne croissante (pagination par l'appelant)
+        with self._lock:
+            terms = list(dict.fromkeys(analyze(query)))
+            if not terms or not self.n_docs:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            if self._norm is None:
+                avgdl = self.total_len / self.n_docs
+                self._norm = (self.k1 * (1.0 - self.b + self.b * self.doc_len / avgdl)).astype(np.float32)
+            rows_parts, score_parts = [], []
+            for term in terms:
+                rows, tfs = self.postings(term)
+                df = int(np.count_nonzero(self.live[rows]))  # postings des lignes supprimées exclus
+                if not df:
+                    continue
+                idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+                tfs = tfs.astype(np.float32)
+                rows_parts.append(rows)
+                score_parts.append(np.float32(idf * (self.k1 + 1.0)) * tfs / (tfs + self._norm[rows]))
+            if not rows_parts:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            rows = np.concatenate(rows_parts)
+            scores = np.concatenate(score_parts)
+            if len(rows) * 8 > self.n_docs:
+                # Beaucoup de postings: accumulation dense (bincount, sans tri) puis masques
+                size = max(int(rows.max()) + 1, 1)
+                dense = np.bincount(rows, weights=scores, minlength=size)
+                if alive is not None:
+                    dense[~alive[:size]] = 0.0
+                if allowed is not None:
+                    dense[~allowed[:size]] = 0.0
+                rows = np.flatnonzero(dense)
+                scores = dense[rows]
+            else:
+                keep = np.ones(len(rows), dtype=bool)
+                if alive is not None:
+                    keep &= alive[rows]
+                if allowed is not None:
+                    keep &= allowed[rows]
+                rows, inverse = np.unique(rows[keep], return_inverse=True)
+                scores = np.bincount(inverse, weights=scores[keep], minlength=len(rows))
+            if k is None:
+                return rows, scores
+            if len(rows) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            return rows[order], scores[order]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "documents": self.n_docs,
+            "terms": len(self._terms.keys() | self._delta.keys()),
+            "compressed_posting_bytes": int(self._data.nbytes + self._tfs.nbytes),
+            "delta_terms": len(self._delta),
+        }
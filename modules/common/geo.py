@@ -0,0 +1,196 @@
+# =============================
+# geo.py - Shared (tous modules)
+# Gazetteer hors-ligne (villes / quartiers) + index spatial en grille (rayon, polygone)
+# =============================
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "gazetteer.json")
+EARTH_RADIUS_KM = 6371.0088
+# Rayon approché d'un lieu (extent_km): ville = quartier le plus éloigné du centre, quartier = moitié de la distance
+# au quartier voisin le plus proche, bornés par ces valeurs
+CITY_EXTENT_KM = (3.0, 15.0)
+DISTRICT_EXTENT_KM = (0.5, 2.5)
+
+
+# =============================
+# Géométrie vectorisée
+# =============================
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def points_in_polygon(lat: np.ndarray, lon: np.ndarray, polygon: Sequence[Sequence[float]]) -> np.ndarray:
+    # Ray casting vectorisé sur les points; polygon = [[lat, lon], ...] (fermeture implicite)
+    vertices = np.asarray(polygon, dtype=np.float64)
+    if len(vertices) < 3:
+        raise ValueError("Un polygone nécessite au moins 3 sommets")
+    inside = np.zeros(len(lat), dtype=bool)
+    y1, x1 = vertices[-1]
+    for y2, x2 in vertices:
+        crosses = (y2 > lat) != (y1 > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = x2 + (lat - y2) * (x1 - x2) / (y1 - y2)
+        inside ^= crosses & (lon < x_at)
+        y1, x1 = y2, x2
+    return inside
+
+
+# =============================
+# Gazetteer
+# =============================
+def _fold(text: str) -> str:
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class Gazetteer:
+    def __init__(self, path: str = GAZETTEER_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.places: List[Dict[str, Any]] = []
+        self._names: Dict[str, List[int]] = {}
+        for city, info in data.items():
+            self._add({"name": city, "kind": "city", "city": city, "district": None, "lat": info["lat"], "lon": info["lon"]}, info)
+            for district, d_info in (info.get("districts") or {}).items():
+                place = {"name": district, "kind": "district", "city": city, "district": district,
+                         "lat": d_info["lat"], "lon": d_info["lon"]}
+                self._add(place, d_info)
+        self._max_words = max(len(name.split()) for name in self._names)
+        self._set_extents()
+
+    def _set_extents(self) -> None:
+        by_city: Dict[str, List[Dict[str, Any]]] = {}
+        for place in self.places:
+            if place["kind"] == "district":
+                by_city.setdefault(place["city"], []).append(place)
+        for place in self.places:
+            if place["kind"] == "city":
+                districts = by_city.get(place["city"], [])
+                spread = max((float(haversine_km(place["lat"], place["lon"], d["lat"], d["lon"])) for d in districts),
+                             default=CITY_EXTENT_KM[1])
+                place["extent_km"] = round(min(max(spread, CITY_EXTENT_KM[0]), CITY_EXTENT_KM[1]), 2)
+            else:
+                siblings = [d for d in by_city[place["city"]] if d is not place]
+                nearest = min((float(haversine_km(place["lat"], place["lon"], d["lat"], d["lon"])) for d in siblings),
+                              default=2 * DISTRICT_EXTENT_KM[1])
+                place["extent_km"] = round(min(max(nearest / 2, DISTRICT_EXTENT_KM[0]), DISTRICT_EXTENT_KM[1]), 2)
+
+    def _add(self, place: Dict[str, Any], info: Dict[str, Any]) -> None:
+        self.places.append(place)
+        for name in [place["name"]] + list(info.get("aliases", [])):
+            self._names.setdefault(_fold(name), []).append(len(self.places) - 1)
+
+    def _matches(self, text: str) -> List[Dict[str, Any]]:
+        words = _fold(text).split()
+        found = []
+        for size in range(min(self._max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                for i in self._names.get(" ".join(words[start : start + size]), ()):
+                    if self.places[i] not in found:
+                        found.append(self.places[i])
+        return found
+
+    def resolve(self, text: Optional[str], city: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # Ville citée (celle du champ city en priorité): seuls ses quartiers sont acceptés, sinon la ville
+        # elle-même. Un quartier d'une autre ville ("Hassan" dans "Boulevard Hassan II, Casablanca") est ignoré
+        if not text:
+            return None
+        matches = self._matches(f"{text} {city or ''}")
+        named = [p for p in self._matches(city) if p["kind"] == "city"] if city else []
+        city_matches = named or [p for p in matches if p["kind"] == "city"]
+        districts = [p for p in matches if p["kind"] == "district"]
+        if city_matches:
+            cities = {p["city"] for p in city_matches}
+            in_city = [p for p in districts if p["city"] in cities]
+            return dict((in_city or city_matches)[0])
+        # Nom de quartier seul: accepté seulement s'il n'est pas ambigu ("Centre" existe dans plusieurs villes)
+        unambiguous = [p for p in districts if len(self._names[_fold(p["name"])]) == 1]
+        return dict(unambiguous[0]) if unambiguous else None
+
+    def geocode(self, record: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+        text = " ".join(str(record.get(k) or "") for k in ("district", "address"))
+        place = self.resolve(text, record.get("city"))
+        return (place["lat"], place["lon"]) if place else (None, None)
+
+
+_shared_gazetteer: Optional[Gazetteer] = None
+_shared_lock = threading.Lock()
+
+
+def get_gazetteer() -> Gazetteer:
+    global _shared_gazetteer
+    with _shared_lock:
+        if _shared_gazetteer is None:
+            _shared_gazetteer = Gazetteer()
+        return _shared_gazetteer
+
+
+# =============================
+# Index spatial en grille
+# =============================
+class GridIndex:
+    # Cellules de cell_km: clé = iy * width + ix, lignes triées par clé. Les cellules d'une même
+    # rangée iy sont contiguës dans l'ordre des clés -> une requête = 2 searchsorted par rangée.
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, rows: Optional[np.ndarray] = None, cell_km: float = 1.0):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        rows = np.arange(len(lat)) if rows is None else np.asarray(rows)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        self.lat, self.lon, self.rows = lat[valid], lon[valid], rows[valid]
+        self.cell_lat = cell_km / 111.32
+        # Largeur en longitude fixée à la latitude la plus éloignée de l'équateur (cellules jamais trop étroites)
+        ref_lat = float(np.max(np.abs(self.lat))) if len(self.lat) else 0.0
+        self.cell_lon = cell_km / (111.32 * max(math.cos(math.radians(min(ref_lat, 89.0))), 1e-6))
+        self.width = int(360 / self.cell_lon) + 2
+        keys = self._keys(self.lat, self.lon)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.lat, self.lon, self.rows = self.lat[order], self.lon[order], self.rows[order]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _cell(self, lat, lon):
+        iy = np.floor((np.asarray(lat) + 90.0) / self.cell_lat).astype(np.int64)
+        ix = np.floor((np.asarray(lon) + 180.0) / self.cell_lon).astype(np.int64)
+        return iy, ix
+
+    def _keys(self, lat, lon) -> np.ndarray:
+        iy, ix = self._cell(lat, lon)
+        return iy * self.width + ix
+
+    def _bbox_positions(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> np.ndarray:
+        (iy0, iy1), (ix0, ix1) = self._cell([lat_min, lat_max], [lon_min, lon_max])
+        iy = np.arange(iy0, iy1 + 1)
+        lo = np.searchsorted(self.keys, iy * self.width + ix0, side="left")
+        hi = np.searchsorted(self.keys, iy * self.width + ix1, side="right")
+        if not len(lo) or not (hi - lo).sum():
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in zip(lo, hi) if b > a])
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        dlat = radius_km / 111.32
+        dlon = radius_km / (111.32 * max(math.cos(math.radians(min(abs(lat) + dlat, 89.0))), 1e-6))
+        positions = self._bbox_positions(lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+        distances = haversine_km(lat, lon, self.lat[positions], self.lon[positions])
+        keep = distances <= radius_km
+        return self.rows[positions[keep]], distances[keep]
+
+    def within_polygon(self, polygon: Sequence[Sequence[float]]) -> np.ndarray:
+        vertices = np.asarray(polygon, dtype=np.float64)
+        positions = self._bbox_positions(
+            vertices[:, 0].min(), vertices[:, 0].max(), vertices[:, 1].min(), vertices[:, 1].max()
+        )
+        return self.rows[positions[points_in_polygon(self.lat[positions], self.lon[positions], vertices)]]
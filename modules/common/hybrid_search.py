@@ -0,0 +1,296 @@
+# =============================
+# hybrid_search.py - Shared (tous modules)
+# Recherche hybride des bases de connaissances: BM25 local + base vectorielle en parallèle, fusion RRF, filtres
+# =============================
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from agno.knowledge import Knowledge
+from agno.knowledge.content import ContentStatus
+from agno.knowledge.document import Document
+from agno.utils.log import log_debug, log_warning
+
+try:
+    from .fulltext import BM25Index
+except ImportError:
+    from fulltext import BM25Index
+
+
+SEARCH_MODES = ("hybrid", "vector", "keyword")
+DEFAULT_SEARCH_MODE = os.getenv("KB_SEARCH_MODE", "hybrid")
+RRF_K = 60  # constante usuelle de la fusion RRF: atténue l'écart entre les premiers rangs
+
+# Recherche vectorielle (embedding + requête base) lancée pendant le BM25 local
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="kb-hybrid")
+
+
+def document_key(content: str) -> str:
+    # Même identifiant que LanceDb (md5 du contenu nettoyé): un chunk trouvé des deux côtés est fusionné
+    return hashlib.md5(content.replace("\x00", "\ufffd").encode()).hexdigest()
+
+
+def matches_filters(meta_data: Optional[Dict[str, Any]], filters: Optional[Dict[str, Any]]) -> bool:
+    # Égalité par clé; une liste attendue vaut "une des valeurs", une métadonnée liste vaut "contient"
+    if not filters:
+        return True
+    meta_data = meta_data or {}
+    for key, expected in filters.items():
+        value = meta_data.get(key)
+        values = value if isinstance(value, list) else [value]
+        accepted = expected if isinstance(expected, (list, tuple, set)) else [expected]
+        if not any(v in accepted for v in values):
+            return False
+    return True
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    k: int = RRF_K,
+    weights: Optional[Sequence[float]] = None,
+) -> List[Tuple[str, float]]:
+    # score(d) = Σ w_i / (k + rang_i(d)); indépendant des échelles de score BM25 / cosinus
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda kv: -kv[1])
+
+
+# =============================
+# Index mot-clé local
+# =============================
+class KeywordIndex:
+    # Miroir mémoire des chunks de la base vectorielle (contenu + métadonnées), indexé en BM25.
+    # Remplacement / suppression en tombstones, compaction quand la moitié des lignes est morte.
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.text = BM25Index()
+        self.documents: List[Document] = []
+        self.keys: List[str] = []
+        self.alive = np.zeros(1024, dtype=bool)
+        self.row_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def add(self, documents: Sequence[Document], filters: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            start = len(self.documents)
+            added, replaced = [], []
+            for document in documents:
+                if filters:
+                    document = replace(document, meta_data={**(document.meta_data or {}), **filters})
+                key = document_key(document.content)
+                old = self.row_of.get(key)
+                if old is not None:
+                    replaced.append(old)
+                self.row_of[key] = start + len(added)
+                added.append(document)
+            if not added:
+                return 0
+            if start + len(added) > len(self.alive):
+                grown = np.zeros(max(2 * len(self.alive), start + len(added)), dtype=bool)
+                grown[:start] = self.alive[:start]
+                self.alive = grown
+            self.alive[start : start + len(added)] = True
+            # Tombstones après le marquage du lot: une clé répétée dans le même lot remplace une ligne de ce lot
+            self.alive[replaced] = False
+            self.documents.extend(added)
+            self.keys.extend(document_key(d.content) for d in added)
+            self.text.add(range(start, start + len(added)), (f"{d.name or ''} {d.content}" for d in added))
+            self.text.delete(replaced)
+            return len(added)
+
+    def remove(self, predicate: Callable[[Document], bool]) -> int:
+        with self._lock:
+            removed = []
+            for key, row in list(self.row_of.items()):
+                if predicate(self.documents[row]):
+                    self.alive[row] = False
+                    del self.row_of[key]
+                    removed.append(row)
+            self.text.delete(removed)
+            if removed and len(self.row_of) * 2 < len(self.documents):
+                self._compact()
+            return len(removed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.__init__()
+
+    def _compact(self) -> None:
+        n_rows = len(self.documents)
+        keep = np.flatnonzero(self.alive[:n_rows])
+        new_row = np.full(n_rows, -1, dtype=np.int64)
+        new_row[keep] = np.arange(len(keep))
+        self.text.compact(new_row, len(keep))
+        self.documents = [self.documents[i] for i in keep]
+        self.keys = [self.keys[i] for i in keep]
+        self.alive = np.zeros(max(1024, len(keep)), dtype=bool)
+        self.alive[: len(keep)] = True
+        self.row_of = {key: row for row, key in enumerate(self.keys)}
+
+    def search(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        with self._lock:
+            n_rows = len(self.documents)
+            allowed = None
+            if filters:
+                allowed = np.fromiter(
+                    (matches_filters(d.meta_data, filters) for d in self.documents), dtype=bool, count=n_rows
+                )
+            rows, scores = self.text.search(query, k, allowed=allowed, alive=self.alive[:n_rows])
+            return [replace(self.documents[r], reranking_score=float(s)) for r, s in zip(rows, scores)]
+
+
+def documents_from_vector_db(vector_db: Any) -> List[Document]:
+    # Chunks indexés lors d'un processus précédent: relus une fois pour construire le miroir mot-clé
+    table = getattr(vector_db, "table", None)
+    if table is None:
+        return []
+    if hasattr(table, "to_arrow"):
+        # LanceDb: colonne payload JSON
+        payloads = [json.loads(p) for p in table.to_arrow().column("payload").to_pylist()]
+        return [
+            Document(
+                content=p["content"], name=p.get("name"), meta_data=p.get("meta_data") or {},
+                content_id=p.get("content_id"),
+            )
+            for p in payloads
+        ]
+    if hasattr(vector_db, "Session"):
+        # PgVector (SQLAlchemy)
+        from sqlalchemy import select
+
+        columns = table.c
+        with vector_db.Session() as session:
+            rows = session.execute(
+                select(columns.name, columns.meta_data, columns.content, columns.content_id)
+            ).fetchall()
+        return [Document(content=c, name=n, meta_data=m or {}, content_id=i) for n, m, c, i in rows]
+    return []
+
+
+# =============================
+# Knowledge agno hybride
+# =============================
+@dataclass
+class HybridKnowledge(Knowledge):
+    search_mode: str = DEFAULT_SEARCH_MODE
+    rrf_k: int = RRF_K
+    candidate_multiplier: int = 4  # profondeur de chaque liste avant fusion = max_results × multiplicateur
+    keyword_weight: float = 1.0
+    vector_weight: float = 1.0
+    keyword_index: KeywordIndex = field(default_factory=KeywordIndex, init=False)
+    retrieval_stats: Dict[str, int] = field(default_factory=dict, init=False)
+
+    def __post_init__(self):
+        super().__post_init__()
+        if self.search_mode not in SEARCH_MODES:
+            raise ValueError(f"search_mode inconnu: {self.search_mode} (attendu: {SEARCH_MODES})")
+        self._sync_lock = threading.Lock()
+        self._synced = False
+        self.retrieval_stats.update(searches=0, fused_results=0, keyword_only=0, vector_only=0, both=0)
+
+    # -----------------------------
+    # Miroir mot-clé
+    # -----------------------------
+    def _ensure_keyword_index(self) -> None:
+        with self._sync_lock:
+            if self._synced:
+                return
+            self._synced = True
+            try:
+                documents = documents_from_vector_db(self.vector_db)
+            except Exception as e:
+                log_warning(f"Index mot-clé: lecture de la base vectorielle impossible ({e})")
+                return
+            self.keyword_index.add(documents)
+            log_debug(f"Index mot-clé {self.name}: {len(self.keyword_index)} chunks")
+
+    async def _handle_vector_db_insert(self, content, read_documents, upsert):
+        await super()._handle_vector_db_insert(content, read_documents, upsert)
+        if content.status != ContentStatus.FAILED:
+            self._ensure_keyword_index()
+            self.keyword_index.add(read_documents, content.metadata)
+
+    def remove_vectors_by_name(self, name: str) -> bool:
+        self.keyword_index.remove(lambda d: d.name == name)
+        return super().remove_vectors_by_name(name)
+
+    def remove_vectors_by_metadata(self, metadata: Dict[str, Any]) -> bool:
+        self.keyword_index.remove(lambda d: matches_filters(d.meta_data, metadata))
+        return super().remove_vectors_by_metadata(metadata)
+
+    def remove_content_by_id(self, content_id: str):
+        self.keyword_index.remove(lambda d: d.content_id == content_id)
+        return super().remove_content_by_id(content_id)
+
+    def remove_all_content(self):
+        self.keyword_index.clear()
+        return super().remove_all_content()
+
+    # -----------------------------
+    # Recherche
+    # -----------------------------
+    def _keyword_search(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Document]:
+        self._ensure_keyword_index()
+        return self.keyword_index.search(query, limit, filters)
+
+    def _fuse(self, keyword: List[Document], vector: List[Document], limit: int, filters) -> List[Document]:
+        # Les bases vectorielles n'appliquent pas toutes les filtres avant la limite: revérifiés ici
+        vector = [d for d in vector if matches_filters(d.meta_data, filters)]
+        by_key: Dict[str, Document] = {}
+        for document in keyword + vector:
+            by_key[document_key(document.content)] = document  # instance vectorielle prioritaire
+        keyword_keys = [document_key(d.content) for d in keyword]
+        vector_keys = [document_key(d.content) for d in vector]
+        fused = reciprocal_rank_fusion(
+            [keyword_keys, vector_keys], k=self.rrf_k, weights=[self.keyword_weight, self.vector_weight]
+        )[:limit]
+        keyword_set, vector_set = set(keyword_keys), set(vector_keys)
+        stats = self.retrieval_stats
+        stats["searches"] += 1
+        stats["fused_results"] += len(fused)
+        for key, _ in fused:
+            origin = "both" if key in keyword_set and key in vector_set else (
+                "keyword_only" if key in keyword_set else "vector_only"
+            )
+            stats[origin] += 1
+        return [replace(by_key[key], reranking_score=round(score, 6)) for key, score in fused]
+
+    def search(
+        self, query: str, max_results: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        limit = max_results or self.max_results
+        if self.search_mode == "vector":
+            return super().search(query=query, max_results=limit, filters=filters)
+        pool = limit * self.candidate_multiplier
+        if self.search_mode == "keyword":
+            return self._keyword_search(query, limit, filters)
+        # Base vectorielle dans un thread pendant le BM25 local
+        vector_future = _executor.submit(super().search, query, pool, filters)
+        keyword = self._keyword_search(query, pool, filters)
+        return self._fuse(keyword, vector_future.result(), limit, filters)
+
+    async def async_search(
+        self, query: str, max_results: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        limit = max_results or self.max_results
+        if self.search_mode == "vector":
+            return await super().async_search(query=query, max_results=limit, filters=filters)
+        pool = limit * self.candidate_multiplier
+        if self.search_mode == "keyword":
+            return await asyncio.to_thread(self._keyword_search, query, limit, filters)
+        vector, keyword = await asyncio.gather(
+            super().async_search(query=query, max_results=pool, filters=filters),
+            asyncio.to_thread(self._keyword_search, query, pool, filters),
+        )
+        return self._fuse(keyword, vector, limit, filters)
@@ -0,0 +1,188 @@
+# =============================
+# confidence.py - Property Valuation Module
+# Distribution de valeur par bootstrap (vectorisé NumPy) sur les comparables, calibrée sur leurs erreurs leave-one-out
+# =============================
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+PERCENTILES = (5, 25, 50, 75, 95)
+SIMILARITY_FEATURES = ("area", "bedrooms", "bathrooms", "year_built")
+PRICE_FIELDS = ("price", "list_price", "total_price", "sale_price")
+SQFT_PER_SQM = 10.7639
+CONFIDENCE_TOLERANCE = 0.10  # score: probabilité que la valeur réelle soit à ±10 % de predicted_value
+_NUMBER_RE = re.compile(r"-?\d[\d\s.,]*")
+LOO_BLOCK = 512  # lignes de la matrice de similarité comparables × comparables calculées à la fois
+
+
+# =============================
+# Préparation des comparables
+# =============================
+def _number(value: Any) -> Optional[float]:
+    # Valeurs scrapées tolérées ("1 200 000", "3 ch", "85 m2"); None si illisible
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    # Premier nombre du texte: espaces et virgules suivies de 3 chiffres = séparateurs de milliers
+    match = _NUMBER_RE.search(str(value))
+    if match is None:
+        return None
+    text = re.sub(r",(?=\d{3}(?!\d))", "", re.sub(r"\s", "", match.group()).rstrip(".,")).replace(",", ".")
+    if text.count(".") > 1:
+        text = text.replace(".", "")
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _positive(value: Any) -> Optional[float]:
+    number = _number(value)
+    return number if number is not None and number > 0 else None
+
+
+def _area(record: Dict[str, Any]) -> Optional[float]:
+    area = _positive(record.get("area"))
+    if area:
+        return area
+    sqft = _positive(record.get("sqft")) or _positive(record.get("square_footage"))
+    return sqft / SQFT_PER_SQM if sqft else None
+
+
+def _price(record: Dict[str, Any]) -> Optional[float]:
+    for key in PRICE_FIELDS:
+        price = _positive(record.get(key))
+        if price:
+            return price
+    return None
+
+
+def _features(record: Dict[str, Any], area: Optional[float]) -> List[float]:
+    values = [area] + [_number(record.get(f)) for f in SIMILARITY_FEATURES[1:]]
+    return [np.nan if v is None else v for v in values]
+
+
+def comparables_matrix(comparables: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    # Comparables sans prix ou surface lisibles écartés
+    rows = [(c, _price(c), _area(c)) for c in comparables]
+    rows = [(c, p, a) for c, p, a in rows if p and a]
+    features = np.array([_features(c, a) for c, _, a in rows], dtype=float).reshape(len(rows), len(SIMILARITY_FEATURES))
+    return {
+        "price_per_sqm": np.array([p / a for _, p, a in rows], dtype=float),
+        "features": features,
+    }
+
+
+def similarity_weights(subjects: np.ndarray, features: np.ndarray) -> np.ndarray:
+    # Distance normalisée par l'écart-type de chaque feature (NaN ignorés) -> poids 1/(1+d)
+    # (écart-type calculé à la main: une colonne absente donnerait un RuntimeWarning avec np.nanstd)
+    finite = np.isfinite(features)
+    count = finite.sum(axis=0)
+    mean = np.where(finite, features, 0.0).sum(axis=0) / np.maximum(count, 1)
+    scale = np.sqrt(np.where(finite, np.square(features - mean), 0.0).sum(axis=0) / np.maximum(count, 1))
+    scale[(count < 2) | (scale == 0)] = 1.0
+    diff = (subjects[:, None, :] - features[None, :, :]) / scale
+    valid = np.isfinite(diff)
+    distance = np.sqrt(np.where(valid, np.square(diff), 0.0).sum(axis=2) / np.maximum(valid.sum(axis=2), 1))
+    return 1.0 / (1.0 + distance)
+
+
+def loo_residuals(ppsm: np.ndarray, features: np.ndarray) -> np.ndarray:
+    # Erreur log de chaque comparable estimé par les autres, avec la même pondération que pour un bien sujet:
+    # distribution empirique des erreurs de l'estimateur, qui calibre intervalles et score
+    residuals = np.empty(len(ppsm))
+    for start in range(0, len(ppsm), LOO_BLOCK):
+        weights = similarity_weights(features[start : start + LOO_BLOCK], features)
+        rows = np.arange(len(weights))
+        weights[rows, start + rows] = 0.0
+        residuals[start : start + len(weights)] = np.log(ppsm[start : start + len(weights)] / (weights @ ppsm / weights.sum(axis=1)))
+    return residuals
+
+
+# =============================
+# Bootstrap
+# =============================
+def bootstrap_portfolio(
+    subjects: List[Dict[str, Any]],
+    comparables: List[Dict[str, Any]],
+    n_boot: int = 5000,
+    seed: Optional[int] = 42,
+) -> List[Dict[str, Any]]:
+    comps = comparables_matrix(comparables)
+    ppsm = comps["price_per_sqm"]
+    n = len(ppsm)
+    if n < 2:
+        return [{"error": "Au moins 2 comparables avec prix et surface sont nécessaires"} for _ in subjects]
+
+    subject_features = np.array([_features(s, _area(s)) for s in subjects], dtype=float).reshape(
+        len(subjects), len(SIMILARITY_FEATURES)
+    )
+    areas = subject_features[:, 0]
+    weights = similarity_weights(subject_features, comps["features"])
+    residuals = loo_residuals(ppsm, comps["features"])
+
+    # Un seul tirage pour tout le portefeuille, stocké en comptes (B x n):
+    # moyenne pondérée du ré-échantillon b = (C[b] @ (w * ppsm)) / (C[b] @ w)
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, n, size=(n_boot, n))
+    counts = np.bincount((idx + np.arange(n_boot)[:, None] * n).ravel(), minlength=n_boot * n)
+    counts = counts.reshape(n_boot, n).astype(float)
+    boot_ppsm = (counts @ (weights * ppsm).T) / (counts @ weights.T)  # (B, S)
+
+    # Valeur du bien, pas seulement de la moyenne: chaque tirage reçoit l'erreur leave-one-out d'un comparable
+    # choisi selon sa similarité au bien sujet (inverse de la CDF des poids, tous sujets en un searchsorted)
+    subjects_range = np.arange(len(subjects))
+    cumulative = np.cumsum(weights, axis=1)
+    cumulative = cumulative / cumulative[:, -1:] + subjects_range[:, None]
+    picked = np.searchsorted(cumulative.ravel(), rng.random((n_boot, len(subjects))) + subjects_range)
+    picked = np.minimum(picked - subjects_range * n, n - 1)
+    values = boot_ppsm * np.exp(residuals[picked]) * areas  # (B, S)
+
+    bands = np.percentile(values, PERCENTILES, axis=0)  # (P, S)
+    point = (weights * ppsm).sum(axis=1) / weights.sum(axis=1) * areas
+    stds = values.std(axis=0)
+    within = (np.abs(values / point - 1.0) <= CONFIDENCE_TOLERANCE).mean(axis=0)
+    loo_hit_rate = float((np.abs(np.expm1(residuals)) <= CONFIDENCE_TOLERANCE).mean())
+
+    results: List[Dict[str, Any]] = []
+    for j in range(len(subjects)):
+        if not np.isfinite(areas[j]):
+            results.append({"error": "Surface du bien sujet manquante"})
+            continue
+        results.append(_summarize(point[j], stds[j], bands[:, j], within[j], loo_hit_rate, n, n_boot))
+    return results
+
+
+def _summarize(point: float, std: float, bands: np.ndarray, within: float, loo_hit_rate: float,
+               n_comparables: int, n_boot: int) -> Dict[str, Any]:
+    median = float(bands[PERCENTILES.index(50)])
+    relative_width = float((bands[-1] - bands[0]) / median) if median else float("inf")
+    # Score: probabilité que la valeur soit à ±CONFIDENCE_TOLERANCE de l'estimation, lue sur la distribution
+    # (erreurs leave-one-out réelles + incertitude du bootstrap); loo_hit_rate en est le pendant observé
+    return {
+        "predicted_value": round(float(point), 2),
+        "bootstrap_median": round(median, 2),
+        "std": round(float(std), 2),
+        "percentiles": {f"p{p}": round(float(b), 2) for p, b in zip(PERCENTILES, bands)},
+        "interval_90": [round(float(bands[0]), 2), round(float(bands[-1]), 2)],
+        "relative_interval_width": round(relative_width, 4),
+        "confidence_score": round(float(within), 4),
+        "confidence_tolerance": CONFIDENCE_TOLERANCE,
+        "loo_hit_rate": round(loo_hit_rate, 4),
+        "n_comparables": n_comparables,
+        "n_boot": n_boot,
+    }
+
+
+def bootstrap_valuation(
+    subject: Dict[str, Any],
+    comparables: List[Dict[str, Any]],
+    n_boot: int = 5000,
+    seed: Optional[int] = 42,
+) -> Dict[str, Any]:
+    return bootstrap_portfolio([subject], comparables, n_boot=n_boot, seed=seed)[0]
@@ -0,0 +1,254 @@
+# =============================
+# dedup.py - Property Valuation Module
+# Normalisation d'adresses + détection de quasi-doublons (MinHash / LSH)
+# =============================
+import math
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+ADDRESS_ABBREVIATIONS = {
+    "st": "street",
+    "str": "street",
+    "ave": "avenue",
+    "av": "avenue",
+    "bd": "boulevard",
+    "bld": "boulevard",
+    "blvd": "boulevard",
+    "rd": "road",
+    "dr": "drive",
+    "ln": "lane",
+    "apt": "appartement",
+    "app": "appartement",
+    "appt": "appartement",
+    "imm": "immeuble",
+    "res": "residence",
+    "n": "",
+    "no": "",
+    "num": "",
+}
+
+# Mot de voie: le nombre qui le précède est le numéro de rue
+STREET_WORDS = frozenset(
+    ["rue", "avenue", "boulevard", "street", "road", "drive", "lane", "place", "route", "impasse", "allee", "derb", "zanka"]
+)
+PRICE_FIELDS = ("list_price", "price", "total_price")
+SQFT_FIELDS = ("sqft", "square_footage")
+SQFT_PER_SQM = 10.7639
+
+_NUMBER_RE = re.compile(r"-?\d[\d\s.,]*")
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+# =============================
+# Normalisation
+# =============================
+def fold_accents(text: str) -> str:
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def normalize_address(address: Optional[str]) -> str:
+    if not address:
+        return ""
+    text = fold_accents(str(address)).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    tokens = [ADDRESS_ABBREVIATIONS.get(t, t) for t in text.split()]
+    return " ".join(t for t in tokens if t)
+
+
+def street_number(normalized_address: str) -> Optional[str]:
+    # Numéro précédant le mot de voie ("appartement 4, 12 rue ...") ou nombre en tête d'adresse ("12 ...").
+    # Les autres nombres (code postal, étage, lot) ne sont pas des numéros de rue
+    words = normalized_address.split()
+    for previous, word in zip(words, words[1:]):
+        if word in STREET_WORDS and previous[:1].isdigit():
+            return previous
+    return words[0] if words and words[0][:1].isdigit() else None
+
+
+def _number(value: Any) -> Optional[float]:
+    # Valeurs scrapées tolérées ("1 200 000 MAD", "85 m2"); None si illisible
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    # Premier nombre du texte: espaces et virgules suivies de 3 chiffres = séparateurs de milliers
+    match = _NUMBER_RE.search(str(value))
+    if match is None:
+        return None
+    text = re.sub(r",(?=\d{3}(?!\d))", "", re.sub(r"\s", "", match.group()).rstrip(".,")).replace(",", ".")
+    if text.count(".") > 1:
+        text = text.replace(".", "")
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _first_number(listing: Dict[str, Any], fields) -> Optional[float]:
+    for field in fields:
+        number = _number(listing.get(field))
+        if number is not None:
+            return number
+    return None
+
+
+def _size_token(name: str, value: Optional[float]) -> Optional[str]:
+    # Petites variations (5 %) => même jeton; valeurs nulles ou négatives ignorées
+    if value is None or value <= 0:
+        return None
+    return f"{name}:{round(math.log(value) / math.log(1.05))}"
+
+
+def _shingles(listing: Dict[str, Any], normalized_address: str) -> List[str]:
+    # Mots et bigrammes de l'adresse normalisée (le numéro de rue est en plus une contrainte de fusion)
+    words = normalized_address.split()
+    shingles = set(words)
+    shingles.update(f"{a}_{b}" for a, b in zip(words, words[1:]))
+    text = fold_accents(str(listing.get("description") or listing.get("title") or "")).lower()
+    text_words = re.findall(r"\w+", text)
+    shingles.update(f"txt:{a}_{b}" for a, b in zip(text_words, text_words[1:]))
+    # Attributs discrétisés, surfaces ramenées en m² quelle que soit la colonne source
+    area = _number(listing.get("area"))
+    if area is None:
+        sqft = _first_number(listing, SQFT_FIELDS)
+        area = sqft / SQFT_PER_SQM if sqft is not None else None
+    for token in (_size_token("price", _first_number(listing, PRICE_FIELDS)), _size_token("area", area)):
+        if token:
+            shingles.add(token)
+    for key in ("bedrooms", "bathrooms", "type"):
+        if listing.get(key) is not None:
+            shingles.add(f"{key}:{listing[key]}")
+    return sorted(shingles)
+
+
+# =============================
+# MinHash + LSH
+# =============================
+class MinHashLSH:
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.7, seed: int = 7):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        # a, b < 2^32 et h < 2^32: a*h + b tient dans un uint64 sans débordement
+        self._a = rng.integers(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 1 << 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+
+    def signatures(self, shingle_sets: List[List[str]], chunk_size: int = 4096) -> np.ndarray:
+        out = np.full((len(shingle_sets), self.num_perm), _MAX_HASH, dtype=np.uint32)
+        for start in range(0, len(shingle_sets), chunk_size):
+            chunk = shingle_sets[start : start + chunk_size]
+            lengths = np.fromiter((len(s) for s in chunk), dtype=np.int64, count=len(chunk))
+            if not lengths.sum():
+                continue
+            hashes = np.fromiter(
+                (zlib.crc32(sh.encode("utf-8")) for s in chunk for sh in s), dtype=np.uint64, count=int(lengths.sum())
+            )
+            # (a*h + b) mod p pour toutes les permutations, puis min par enregistrement (reduceat)
+            permuted = ((np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+            nonempty = np.flatnonzero(lengths)
+            offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])[nonempty]
+            out[start + nonempty] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        return out
+
+    def candidate_pairs(self, signatures: np.ndarray) -> np.ndarray:
+        pairs = []
+        for band in range(self.bands):
+            rows = signatures[:, band * self.rows : (band + 1) * self.rows].astype(np.uint64)
+            keys = (rows * self._band_mix).sum(axis=1)  # hash 64 bits de la bande (modulo 2^64)
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            same = np.flatnonzero(sorted_keys[1:] == sorted_keys[:-1]) + 1
+            if not len(same):
+                continue
+            # Paires consécutives + paires (tête de bucket, membre): linéaire par bucket
+            starts = np.zeros(len(keys), dtype=np.int64)
+            new_group = np.ones(len(keys), dtype=bool)
+            new_group[same] = False
+            starts[new_group] = np.flatnonzero(new_group)
+            starts = np.maximum.accumulate(starts)
+            pairs.append(np.column_stack([order[same - 1], order[same]]))
+            pairs.append(np.column_stack([order[starts[same]], order[same]]))
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64)
+        pairs = np.unique(np.sort(np.concatenate(pairs), axis=1), axis=0)
+        # Vérification: Jaccard estimé = fraction de composantes de signature égales
+        similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        return pairs[similarity >= self.threshold]
+
+
+# =============================
+# Clustering & enregistrement canonique
+# =============================
+def _completeness(listing: Dict[str, Any]) -> tuple:
+    filled = sum(1 for v in listing.values() if v not in (None, "", []))
+    return filled, str(listing.get("date") or "")
+
+
+def deduplicate_listings(
+    listings: List[Dict[str, Any]],
+    threshold: float = 0.7,
+    num_perm: int = 128,
+    bands: int = 16,
+) -> Dict[str, Any]:
+    index = MinHashLSH(num_perm=num_perm, bands=bands, threshold=threshold)
+    addresses = [normalize_address(listing.get("address")) for listing in listings]
+    shingle_sets = [_shingles(listing, a) for listing, a in zip(listings, addresses)]
+    # Annonce sans aucun shingle (page scrapée quasi vide): signature constante, partagée par toutes les autres
+    # annonces vides -> tenue hors du LSH, elle reste seule dans son cluster
+    described = np.array([i for i, shingles in enumerate(shingle_sets) if shingles], dtype=np.int64)
+    signatures = index.signatures([shingle_sets[i] for i in described])
+    parent = list(range(len(listings)))
+    # Numéro de rue de chaque cluster: deux numéros différents ne fusionnent jamais, même via une annonce sans numéro
+    numbers = [street_number(a) for a in addresses]
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in described[index.candidate_pairs(signatures)].tolist():
+        ri, rj = find(i), find(j)
+        if ri == rj or (numbers[ri] and numbers[rj] and numbers[ri] != numbers[rj]):
+            continue
+        parent[ri] = rj
+        numbers[rj] = numbers[rj] or numbers[ri]
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(listings)):
+        clusters[find(i)].append(i)
+
+    canonical: List[Dict[str, Any]] = []
+    duplicate_groups: List[List[int]] = []
+    for members in clusters.values():
+        best = members[0] if len(members) == 1 else max(members, key=lambda i: _completeness(listings[i]))
+        record = dict(listings[best])
+        if len(members) > 1:
+            duplicate_groups.append(members)
+            sources = {listings[i].get("source") for i in members if listings[i].get("source")}
+            record["sources"] = sorted(sources)
+            record["duplicates_merged"] = len(members) - 1
+        record["normalized_address"] = addresses[best]
+        canonical.append(record)
+
+    return {
+        "listings": canonical,
+        "input_count": len(listings),
+        "canonical_count": len(canonical),
+        "duplicate_groups": duplicate_groups,
+    }
@@ -0,0 +1,268 @@
+# =============================
+# ingestion.py - Property Valuation Module
+# Ingestion incrémentale (hash des chunks) pour la base de connaissance
+# =============================
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from agno.knowledge.document import Document
+
+
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "kb_index", "manifest.sqlite")
+SUPPORTED_EXTENSIONS = (".md", ".txt", ".json", ".csv")
+
+
+# =============================
+# Documents déjà embeddés
+# =============================
+class EmbeddedDocument(Document):
+    # Les vector DB agno appellent doc.embed() à chaque upsert: on saute l'appel
+    # quand l'embedding a déjà été calculé par lot.
+    def embed(self, embedder=None) -> None:
+        if self.embedding is None:
+            super().embed(embedder)
+
+
+# =============================
+# Chunking & hashing
+# =============================
+def chunk_text(text: str, chunk_size: int = 1500) -> List[str]:
+    chunks: List[str] = []
+    current = ""
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # Paragraphe trop long: découpe brute à chunk_size
+        while len(paragraph) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:chunk_size])
+            paragraph = paragraph[chunk_size:]
+        if current and len(current) + len(paragraph) + 2 > chunk_size:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def iter_source_files(paths: Iterable[str]) -> List[str]:
+    files: List[str] = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        files.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            files.append(path)
+    return sorted(set(files))
+
+
+# =============================
+# Embedding par lots
+# =============================
+def embed_texts(embedder: Any, texts: List[str], batch_size: int = 64) -> Tuple[List[List[float]], int]:
+    embeddings: List[List[float]] = []
+    calls = 0
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i : i + batch_size]
+        if hasattr(embedder, "get_embeddings_batch"):
+            embeddings.extend(embedder.get_embeddings_batch(batch))
+        else:
+            # MistralEmbedder: un seul appel API par lot (inputs=[...])
+            response = embedder.client.embeddings.create(
+                inputs=batch, model=embedder.id, **(embedder.request_params or {})
+            )
+            embeddings.extend([d.embedding for d in response.data])
+        calls += 1
+    return embeddings, calls
+
+
+# =============================
+# Manifest SQLite (source -> chunks indexés)
+# =============================
+class IngestionManifest:
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                collection TEXT, source TEXT, size INTEGER, mtime_ns INTEGER,
+                PRIMARY KEY (collection, source)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                collection TEXT, source TEXT, chunk_hash TEXT, doc_id TEXT,
+                PRIMARY KEY (collection, source, chunk_hash)
+            );
+            """
+        )
+
+    def file_stats(self, collection: str) -> Dict[str, Tuple[int, int]]:
+        rows = self.conn.execute(
+            "SELECT source, size, mtime_ns FROM files WHERE collection = ?", (collection,)
+        )
+        return {source: (size, mtime_ns) for source, size, mtime_ns in rows}
+
+    def chunks(self, collection: str, source: str) -> Dict[str, str]:
+        rows = self.conn.execute(
+            "SELECT chunk_hash, doc_id FROM chunks WHERE collection = ? AND source = ?",
+            (collection, source),
+        )
+        return dict(rows.fetchall())
+
+    def record(self, collection: str, source: str, size: int, mtime_ns: int, chunks: Dict[str, str]) -> None:
+        self.forget(collection, source)
+        self.conn.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?)", (collection, source, size, mtime_ns)
+        )
+        self.conn.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+            [(collection, source, h, doc_id) for h, doc_id in chunks.items()],
+        )
+
+    def forget(self, collection: str, source: str) -> None:
+        self.conn.execute("DELETE FROM files WHERE collection = ? AND source = ?", (collection, source))
+        self.conn.execute("DELETE FROM chunks WHERE collection = ? AND source = ?", (collection, source))
+
+    def clear(self, collection: str) -> None:
+        self.conn.execute("DELETE FROM files WHERE collection = ?", (collection,))
+        self.conn.execute("DELETE FROM chunks WHERE collection = ?", (collection,))
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+# =============================
+# Pipeline d'ingestion incrémentale
+# =============================
+def ingest_incremental(
+    paths: List[str],
+    collection: str,
+    vector_db_factory: Callable[[], Any],
+    embedder: Any,
+    recreate: bool = False,
+    chunk_size: int = 1500,
+    batch_size: int = 64,
+    manifest_path: str = DEFAULT_MANIFEST_PATH,
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    manifest = IngestionManifest(manifest_path)
+    vector_db: Optional[Any] = None
+
+    def get_vector_db() -> Any:
+        # La connexion à la vector DB n'est ouverte que s'il y a quelque chose à écrire
+        nonlocal vector_db
+        if vector_db is None:
+            vector_db = vector_db_factory()
+            if recreate and vector_db.exists():
+                vector_db.drop()
+            vector_db.create()
+        return vector_db
+
+    try:
+        if recreate:
+            manifest.clear(collection)
+            get_vector_db()
+
+        files = iter_source_files(paths)
+        known_stats = manifest.file_stats(collection)
+        roots = [os.path.abspath(p) for p in paths]
+
+        stats = {
+            "files_scanned": len(files),
+            "files_unchanged": 0,
+            "files_removed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "chunks_deleted": 0,
+            "embedding_calls": 0,
+        }
+        pending: List[Tuple[str, os.stat_result, Dict[str, str], Dict[str, str]]] = []
+
+        for source in files:
+            st = os.stat(source)
+            if known_stats.get(source) == (st.st_size, st.st_mtime_ns):
+                stats["files_unchanged"] += 1
+                stats["chunks_total"] += len(manifest.chunks(collection, source))
+                continue
+            with open(source, "r", encoding="utf-8", errors="ignore") as f:
+                chunks = {hash_text(c): c for c in chunk_text(f.read(), chunk_size)}
+            stats["chunks_total"] += len(chunks)
+            pending.append((source, st, chunks, manifest.chunks(collection, source)))
+
+        # Fichiers supprimés du disque (sous les chemins ingérés)
+        current = set(files)
+        for source in known_stats:
+            in_scope = any(source == r or source.startswith(r.rstrip(os.sep) + os.sep) for r in roots)
+            if in_scope and source not in current:
+                stale_ids = list(manifest.chunks(collection, source).values())
+                for doc_id in stale_ids:
+                    get_vector_db().delete_by_id(doc_id)
+                stats["chunks_deleted"] += len(stale_ids)
+                stats["files_removed"] += 1
+                manifest.forget(collection, source)
+
+        # Embedding par lots des seuls chunks nouveaux ou modifiés
+        to_embed: List[Tuple[str, str, str]] = []
+        for source, _, chunks, known in pending:
+            to_embed.extend((source, h, text) for h, text in chunks.items() if h not in known)
+        embeddings, stats["embedding_calls"] = embed_texts(embedder, [t for _, _, t in to_embed], batch_size)
+        embedded = {(source, h): vec for (source, h, _), vec in zip(to_embed, embeddings)}
+        stats["chunks_embedded"] = len(embedded)
+
+        for source, st, chunks, known in pending:
+            documents: List[Document] = []
+            doc_ids: Dict[str, str] = {}
+            for h, text in chunks.items():
+                doc_ids[h] = known.get(h) or hash_text(f"{collection}:{source}:{h}")
+                if h in known:
+                    continue
+                documents.append(
+                    EmbeddedDocument(
+                        content=text,
+                        id=doc_ids[h],
+                        name=os.path.basename(source),
+                        meta_data={"source": source, "chunk_hash": h},
+                        embedding=embedded[(source, h)],
+                    )
+                )
+            if documents:
+                # L'upsert PgVector supprime d'abord toutes les lignes de même content_hash: hash des seuls doc_ids
+                # insérés par cet appel (absents du manifeste), jamais celui d'une version antérieure du fichier
+                # dont des chunks sont encore indexés (v1 -> v2 -> v1 effacerait les chunks communs)
+                content_hash = hash_text(f"{collection}:" + "".join(sorted(d.id for d in documents)))
+                get_vector_db().upsert(content_hash, documents)
+            stale_ids = [doc_id for h, doc_id in known.items() if h not in chunks]
+            for doc_id in stale_ids:
+                get_vector_db().delete_by_id(doc_id)
+            stats["chunks_deleted"] += len(stale_ids)
+            manifest.record(collection, source, st.st_size, st.st_mtime_ns, doc_ids)
+            manifest.commit()
+    finally:
+        manifest.commit()
+        manifest.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **stats,
+        "elapsed_s": round(elapsed, 3),
+        "chunks_per_s": round(stats["chunks_total"] / elapsed, 1) if elapsed > 0 else None,
+        "embedded_per_s": round(stats["chunks_embedded"] / elapsed, 1) if elapsed > 0 else None,
+    }
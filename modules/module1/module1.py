@@ -1,6 +1,7 @@
 # module1.py - Property Valuation Module
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from agno.agent import Agent
@@ -14,7 +15,6 @@ from agno.tools.calculator import CalculatorTools
 from agno.knowledge.reader.markdown_reader import MarkdownReader
 from agno.knowledge import Knowledge
 from agno.vectordb.pgvector import PgVector
-from agno.knowledge.embedder.mistral import MistralEmbedder
 
 # Import des outils custom
 try:
@@ -22,18 +22,28 @@ try:
         avm_engine,
         web_property_scraper,
         document_property_parser,
+        comparables_deduplicator,
         kb_ingest_indexer,
         valuation_model_runner,
+        portfolio_valuation_confidence,
     )
 except ImportError:
     from tools import (
         avm_engine,
         web_property_scraper,
         document_property_parser,
+        comparables_deduplicator,
         kb_ingest_indexer,
         valuation_model_runner,
+        portfolio_valuation_confidence,
     )
 
+try:
+    from ..common.embedding_cache import cached_mistral_embedder
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    from common.embedding_cache import cached_mistral_embedder
+
 # ----------------------------
 # Load environment variables
 # ----------------------------
@@ -50,7 +60,7 @@ markdown_reader = MarkdownReader(name="Property Valuation Reader")
 vector_db = PgVector(
     table_name="property_valuation_docs",
     db_url=db_url,
-    embedder=MistralEmbedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024)
+    embedder=cached_mistral_embedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024)
 )
 
 knowledge_base = Knowledge(
@@ -72,6 +82,7 @@ DataCollectorAgent = Agent(
         avm_engine,
         web_property_scraper,
         document_property_parser,
+        comparables_deduplicator,
         kb_ingest_indexer,
     ],
     description="""
@@ -91,6 +102,7 @@ DataCollectorAgent = Agent(
     ## Tool Usage Guidelines
     - avm_engine pour estimation initiale.
     - web_property_scraper et document_property_parser pour collecter et normaliser les attributs du bien.
+    - comparables_deduplicator pour fusionner les comparables multi-sources sans doublons.
     - GoogleSearchTools et PandasTools pour compléter et nettoyer les données.
     - kb_ingest_indexer pour ingérer et indexer les données collectées dans la KB.
 
@@ -114,6 +126,7 @@ ValuationModelAgent = Agent(
         CalculatorTools(),
         avm_engine,
         valuation_model_runner,
+        portfolio_valuation_confidence,
     ],
     description="""
     Un agent IA focalisé sur l'estimation de la valeur du bien via des modèles multiples:
@@ -132,7 +145,9 @@ ValuationModelAgent = Agent(
     - PandasTools pour préparer et nettoyer les données.
     - CalculatorTools pour conversions et calculs intermédiaires.
     - avm_engine pour estimation automatique rapide.
-    - valuation_model_runner pour exécuter les modèles ML/AutoML et produire des prédictions détaillées.
+    - valuation_model_runner pour exécuter les modèles ML/AutoML et produire des prédictions détaillées;
+      passez les comparables pour obtenir la distribution de valeur et un score de confiance calibré.
+    - portfolio_valuation_confidence pour valoriser plusieurs biens en une passe.
 
     ## Sortie attendue
     - valuation_methods
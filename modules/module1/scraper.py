@@ -0,0 +1,373 @@
+# =============================
+# scraper.py - Property Valuation Module
+# Moteur de fetch asynchrone (httpx) avec cache HTTP disque et limites par domaine
+# =============================
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+
+DEFAULT_HTTP_CACHE_DIR = os.path.join(os.path.dirname(__file__), "http_cache")
+READ_CHUNK_BYTES = 64 * 1024  # relecture du corps en cache (réponse 304) par blocs
+
+
+# =============================
+# Cache HTTP disque (corps + validateurs ETag / Last-Modified)
+# =============================
+class HttpDiskCache:
+    def __init__(self, cache_dir: str = DEFAULT_HTTP_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".json", base + ".body"
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        # Métadonnées seules; le corps se relit par blocs (iter_body)
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(body_path) else None
+
+    def iter_body(self, url: str, chunk_bytes: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+        with open(self._paths(url)[1], "rb") as f:
+            while True:
+                chunk = f.read(chunk_bytes)
+                if not chunk:
+                    return
+                yield chunk
+
+    def open_body(self, url: str) -> "CachedBody":
+        # Corps écrit au fil des blocs reçus, publié par commit() seulement s'il est complet
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        return CachedBody(url, meta_path, body_path)
+
+    def put(self, url: str, body: bytes, headers: httpx.Headers) -> None:
+        writer = self.open_body(url)
+        writer.write(body)
+        writer.commit(headers)
+
+
+class CachedBody:
+    def __init__(self, url: str, meta_path: str, body_path: str):
+        self.url = url
+        self.meta_path = meta_path
+        self.body_path = body_path
+        # Fichier temporaire unique: deux fetchs simultanés de la même URL ne se mélangent pas
+        self.tmp_path = f"{body_path}.{uuid.uuid4().hex}.tmp"
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def commit(self, headers: httpx.Headers) -> None:
+        meta = {
+            "url": self.url,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "content_type": headers.get("content-type"),
+            "stored_at": time.time(),
+        }
+        # Écriture atomique: le corps d'abord, puis les métadonnées
+        self._file.close()
+        os.replace(self.tmp_path, self.body_path)
+        tmp_meta = f"{self.meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, self.meta_path)
+
+    def discard(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+# =============================
+# Limites par domaine (concurrence + débit)
+# =============================
+class DomainLimiter:
+    def __init__(self, max_concurrency: int = 4, min_interval_s: float = 0.0):
+        self.max_concurrency = max_concurrency
+        self.min_interval_s = min_interval_s
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._next_slot: Dict[str, float] = {}
+
+    def semaphore(self, domain: str) -> asyncio.Semaphore:
+        if domain not in self._semaphores:
+            self._semaphores[domain] = asyncio.Semaphore(self.max_concurrency)
+            self._locks[domain] = asyncio.Lock()
+        return self._semaphores[domain]
+
+    async def wait_turn(self, domain: str) -> None:
+        if self.min_interval_s <= 0:
+            return
+        async with self._locks[domain]:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(domain, 0.0))
+            self._next_slot[domain] = slot + self.min_interval_s
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# =============================
+# Parsing d'une page d'annonce
+# =============================
+_LISTING_TAGS = frozenset(["script", "meta", "h1", "span", "div", "li", "dd", "p"])
+_VOID_TAGS = frozenset(["meta", "br", "img", "input", "link", "hr", "source", "wbr"])
+
+# Repli quand le JSON-LD est absent: premier élément portant l'un de ces attributs (ordre du document)
+_ATTRIBUTE_FIELDS = (
+    ("address", (("itemprop", "address"), ("data-address", None))),
+    ("list_price", (("itemprop", "price"), ("data-price", None))),
+    ("sqft", (("itemprop", "floorSize"), ("data-sqft", None), ("data-area", None))),
+    ("bedrooms", (("data-bedrooms", None),)),
+    ("bathrooms", (("data-bathrooms", None),)),
+    ("year_built", (("data-year-built", None),)),
+)
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    digits = re.sub(r"[^\d.,]", "", str(value)).replace(",", "")
+    try:
+        return float(digits) if digits else None
+    except ValueError:
+        return None
+
+
+def _charset(content_type: Optional[str]) -> str:
+    match = re.search(r"charset=[\"']?([\w.:-]+)", content_type or "", re.I)
+    if match:
+        try:
+            return codecs.lookup(match.group(1)).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+class ListingParser(HTMLParser):
+    # Parseur incrémental: feed() reçoit les blocs du corps au fil du téléchargement, close() renvoie l'annonce.
+    # Seuls les scripts JSON-LD et le texte des éléments candidats sont conservés, jamais le document entier.
+    def __init__(self, url: str, content_type: Optional[str] = None):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self._decoder = codecs.getincrementaldecoder(_charset(content_type))(errors="replace")
+        self._json_ld: List[List[str]] = []
+        self._in_json_ld = False
+        self._found: Dict[str, Optional[str]] = {}
+        self._captures: List[Tuple[str, List[str], List[int]]] = []  # (champ, morceaux de texte, [profondeur])
+
+    def feed_bytes(self, chunk: bytes) -> None:
+        self.feed(self._decoder.decode(chunk))
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag not in _LISTING_TAGS:
+            return
+        for _, pieces, depth in self._captures:
+            pieces.append("")  # frontière de balise: nouveau morceau de texte
+            if tag not in _VOID_TAGS:
+                depth[0] += 1
+        values = dict(attrs)
+        if tag == "script":
+            self._in_json_ld = (values.get("type") or "").lower() == "application/ld+json"
+            if self._in_json_ld:
+                self._json_ld.append([])
+            return
+        for key, selectors in _ATTRIBUTE_FIELDS:
+            if key in self._found or not any(
+                name in values and (expected is None or values[name] == expected) for name, expected in selectors
+            ):
+                continue
+            if values.get("content") or tag in _VOID_TAGS:
+                self._found[key] = values.get("content") or ""
+            else:
+                self._found[key] = None
+                self._captures.append((key, [""], [1]))
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag not in _LISTING_TAGS:
+            return
+        if tag == "script":
+            self._in_json_ld = False
+        for capture in list(self._captures):
+            capture[1].append("")
+            capture[2][0] -= 1
+            if capture[2][0] <= 0:
+                self._finish(capture)
+
+    def handle_data(self, data: str) -> None:
+        if self._in_json_ld:
+            self._json_ld[-1].append(data)
+        for _, pieces, _ in self._captures:
+            pieces[-1] += data  # un texte coupé entre deux blocs reste un seul morceau
+
+    def _finish(self, capture: Tuple[str, List[str], List[int]]) -> None:
+        key, pieces, _ = capture
+        self._found[key] = " ".join(p.strip() for p in pieces if p.strip())
+        self._captures.remove(capture)
+
+    def close(self) -> Dict[str, Any]:
+        self.feed(self._decoder.decode(b"", final=True))
+        super().close()
+        for capture in list(self._captures):
+            self._finish(capture)
+        listing: Dict[str, Any] = {"url": self.url, "source": urlparse(self.url).netloc}
+
+        # 1) Données structurées schema.org (JSON-LD)
+        for pieces in self._json_ld:
+            try:
+                data = json.loads("".join(pieces))
+            except ValueError:
+                continue
+            for item in data if isinstance(data, list) else [data]:
+                if not isinstance(item, dict):
+                    continue
+                offer = item.get("offers") or {}
+                address = item.get("address")
+                if isinstance(address, dict):
+                    address = ", ".join(
+                        str(address[k]) for k in ("streetAddress", "addressLocality") if address.get(k)
+                    )
+                floor = item.get("floorSize") or {}
+                listing.setdefault("address", address)
+                listing.setdefault("list_price", _to_number(offer.get("price") if isinstance(offer, dict) else None))
+                listing.setdefault("sqft", _to_number(floor.get("value") if isinstance(floor, dict) else floor))
+                listing.setdefault("bedrooms", _to_number(item.get("numberOfRooms") or item.get("numberOfBedrooms")))
+                listing.setdefault("bathrooms", _to_number(item.get("numberOfBathroomsTotal")))
+                listing.setdefault("year_built", _to_number(item.get("yearBuilt")))
+
+        # 2) Repli: attributs itemprop / data-*
+        for key, _ in _ATTRIBUTE_FIELDS:
+            if listing.get(key) is not None or key not in self._found:
+                continue
+            raw = self._found[key] or ""
+            listing[key] = raw.strip() if key == "address" else _to_number(raw)
+        return listing
+
+
+def parse_listing(html: bytes, url: str, content_type: Optional[str] = None) -> Dict[str, Any]:
+    # Document déjà complet (même parseur que le flux)
+    parser = ListingParser(url, content_type)
+    parser.feed_bytes(html)
+    return parser.close()
+
+
+# =============================
+# Moteur de fetch
+# =============================
+class FetchEngine:
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        per_domain_concurrency: int = 4,
+        per_domain_interval_s: float = 0.0,
+        timeout_s: float = 15.0,
+        cache: Optional[HttpDiskCache] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.limiter = DomainLimiter(per_domain_concurrency, per_domain_interval_s)
+        self.timeout_s = timeout_s
+        self.cache = cache or HttpDiskCache()
+        self.transport = transport
+        self.stats = {"fetched": 0, "not_modified": 0, "errors": 0, "bytes": 0}
+
+    async def _fetch_one(self, client: httpx.AsyncClient, url: str) -> Dict[str, Any]:
+        domain = urlparse(url).netloc
+        cached = self.cache.get(url)
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self.limiter.semaphore(domain), self._slots:
+            await self.limiter.wait_turn(domain)
+            writer: Optional[CachedBody] = None
+            try:
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached:
+                        self.stats["not_modified"] += 1
+                        parser = ListingParser(url, cached.get("content_type"))
+                        chunks = None
+                    else:
+                        response.raise_for_status()
+                        parser = ListingParser(url, response.headers.get("content-type"))
+                        writer = self.cache.open_body(url)
+                        chunks = response.aiter_bytes()
+                    if chunks is not None:
+                        # Chaque bloc est écrit en cache et parsé dès réception (parsing hors de la boucle asyncio)
+                        async for chunk in chunks:
+                            writer.write(chunk)
+                            self.stats["bytes"] += len(chunk)
+                            await asyncio.to_thread(parser.feed_bytes, chunk)
+                        writer.commit(response.headers)
+                        writer = None
+                        self.stats["fetched"] += 1
+                if chunks is None:
+                    for chunk in self.cache.iter_body(url):
+                        await asyncio.to_thread(parser.feed_bytes, chunk)
+                return await asyncio.to_thread(parser.close)
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                return {"url": url, "error": str(e)}
+            except Exception as e:
+                # Page illisible (parsing, cache): erreur pour cette URL seulement, le lot continue
+                self.stats["errors"] += 1
+                return {"url": url, "error": f"{type(e).__name__}: {e}"}
+            finally:
+                if writer is not None:
+                    writer.discard()
+
+    async def fetch_all(self, urls: List[str]) -> List[Dict[str, Any]]:
+        # Plafond global appliqué par le moteur: les limites du pool httpx ne valent pas pour un transport fourni
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(
+            limits=limits,
+            timeout=self.timeout_s,
+            follow_redirects=True,
+            transport=self.transport,
+            headers={"User-Agent": "Real-Estate-OS/1.0"},
+        ) as client:
+            return await asyncio.gather(*(self._fetch_one(client, url) for url in urls))
+
+
+def scrape_listings(urls: List[str], **engine_kwargs: Any) -> Dict[str, Any]:
+    engine = FetchEngine(**engine_kwargs)
+    started = time.perf_counter()
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        listings = asyncio.run(engine.fetch_all(urls))
+    else:
+        # Appel depuis une boucle déjà active (agent async): thread dédié
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            listings = executor.submit(asyncio.run, engine.fetch_all(urls)).result()
+    return {
+        "listings": listings,
+        "stats": {**engine.stats, "elapsed_s": round(time.perf_counter() - started, 3)},
+    }
@@ -4,7 +4,39 @@
 from agno.tools import tool
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+import os
 import re
+import sys
+
+try:
+    from .ingestion import ingest_incremental
+except ImportError:
+    from ingestion import ingest_incremental
+
+try:
+    from .scraper import scrape_listings
+except ImportError:
+    from scraper import scrape_listings
+
+try:
+    from .dedup import deduplicate_listings
+except ImportError:
+    from dedup import deduplicate_listings
+
+try:
+    from .confidence import bootstrap_portfolio, bootstrap_valuation
+except ImportError:
+    from confidence import bootstrap_portfolio, bootstrap_valuation
+
+try:
+    from ..common.embedding_cache import cached_mistral_embedder
+    from ..common.feature_store import get_feature_store
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.embedding_cache import cached_mistral_embedder
+    from common.feature_store import get_feature_store
+
+KB_DB_URL = os.getenv("KB_DB_URL", "postgresql+psycopg://ai:ai@localhost:5432/ai")
 
 
 # =============================
@@ -20,8 +52,11 @@ def web_property_scraper(
     location: str,
     max_results: int = 50,
     radius_km: float = 3.0,
+    urls: Optional[List[str]] = None,
+    per_domain_concurrency: int = 4,
 ) -> Dict[str, Any]:
     normalized_results: List[Dict[str, Any]] = []
+    fetch_stats: Optional[Dict[str, Any]] = None
 
     sample = [
         {
@@ -50,6 +85,16 @@ def web_property_scraper(
         },
     ]
 
+    if urls:
+        # Pages d'annonces réelles: fetch concurrent + cache HTTP conditionnel
+        scraped = scrape_listings(urls[:max_results], per_domain_concurrency=per_domain_concurrency)
+        fetch_stats = scraped["stats"]
+        sample = [
+            {**item, "date": datetime.now().strftime("%Y-%m-%d")}
+            for item in scraped["listings"]
+            if "error" not in item
+        ]
+
     for item in sample[: max_results]:
         ppsf = None
         if item.get("list_price") and item.get("sqft"):
@@ -59,12 +104,20 @@ def web_property_scraper(
                 ppsf = None
         normalized_results.append({**item, "price_per_sqft": ppsf})
 
+    deduplicated = deduplicate_listings(normalized_results)
+    # Partage avec les autres modules via le feature store
+    property_ids = get_feature_store().upsert(deduplicated["listings"], source="web")
+    for item, property_id in zip(deduplicated["listings"], property_ids):
+        item["property_id"] = property_id
+
     return {
         "query": query,
         "location": location,
         "radius_km": radius_km,
-        "results": normalized_results,
+        "results": deduplicated["listings"],
+        "duplicates_removed": deduplicated["input_count"] - deduplicated["canonical_count"],
         "normalized": True,
+        "fetch_stats": fetch_stats,
         "collected_at": datetime.now().isoformat(),
     }
 
@@ -92,6 +145,19 @@ def document_property_parser(
     }
     matched_lines: List[str] = []
 
+    if file_path.lower().endswith((".json", ".csv")):
+        # Fichiers structurés (documents1): chargés tels quels dans le feature store
+        try:
+            property_ids = get_feature_store().ingest_file(file_path, source="document")
+        except Exception as e:
+            return {"error": f"Lecture impossible: {str(e)}", "file_path": file_path, "doc_type": doc_type}
+        return {
+            "file_path": file_path,
+            "doc_type": doc_type,
+            "property_ids": property_ids,
+            "parsed_at": datetime.now().isoformat(),
+        }
+
     try:
         with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
             content = f.read()
@@ -131,14 +197,40 @@ def document_property_parser(
         if re.search(rf"\b{amenity}\b", content, re.IGNORECASE):
             extracted["amenities"].append(amenity)
 
+    property_id = None
+    if extracted["address"]:
+        property_id = get_feature_store().upsert([extracted], source="document")[0]
+
     return {
         "file_path": file_path,
         "doc_type": doc_type,
+        "property_id": property_id,
         "extracted": extracted,
         "matched_examples": matched_lines[:5],
         "parsed_at": datetime.now().isoformat(),
     }
 
+# =============================
+# Tool 2b: Comparables Deduplicator (Agent 1)
+# =============================
+@tool(
+    name="comparables_deduplicator",
+    description="Fusionne les annonces multi-sources (web + documents) et supprime les quasi-doublons de comparables",
+    show_result=True,
+)
+def comparables_deduplicator(
+    listings: List[Dict[str, Any]],
+    similarity_threshold: float = 0.7,
+) -> Dict[str, Any]:
+    result = deduplicate_listings(listings, threshold=similarity_threshold)
+    return {
+        "comparables": result["listings"],
+        "input_count": result["input_count"],
+        "canonical_count": result["canonical_count"],
+        "duplicate_groups": result["duplicate_groups"],
+        "deduplicated_at": datetime.now().isoformat(),
+    }
+
 # =============================
 # Tool 0: AVM Engine (Agent 1 & 2)
 # =============================
@@ -174,13 +266,29 @@ def avm_engine(property_features: Dict[str, Any]) -> Dict[str, Any]:
 )
 def kb_ingest_indexer(
     paths: List[str],
-    collection: str,
+    collection: str = "property_valuation_docs",
     recreate: bool = False,
 ) -> Dict[str, Any]:
+    from agno.vectordb.pgvector import PgVector
+
+    embedder = cached_mistral_embedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024)
+    try:
+        report = ingest_incremental(
+            paths=paths,
+            collection=collection,
+            vector_db_factory=lambda: PgVector(table_name=collection, db_url=KB_DB_URL, embedder=embedder),
+            embedder=embedder,
+            recreate=recreate,
+        )
+    except Exception as e:
+        return {"error": f"Ingestion impossible: {str(e)}", "collection": collection, "paths": paths}
+
     return {
         "collection": collection,
-        "ingested_items": len(paths),
+        "ingested_items": report["chunks_embedded"],
         "recreated": recreate,
+        "report": report,
+        "embedding_cache": embedder.cache.stats(),
         "indexed_at": datetime.now().isoformat(),
     }
 
@@ -197,13 +305,55 @@ def valuation_model_runner(
     model_name: str,
     features: Dict[str, Any],
     version: Optional[str] = None,
+    comparables: Optional[List[Dict[str, Any]]] = None,
+    n_boot: int = 5000,
 ) -> Dict[str, Any]:
+    predicted_value: Optional[float] = 250000  # valeur simulée sans comparables
+    confidence: Optional[float] = None
+    distribution: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    if comparables:
+        # Distribution de valeur par bootstrap des comparables (prix/m² pondéré par similarité)
+        distribution = bootstrap_valuation(features, comparables, n_boot=n_boot)
+        if "error" in distribution:
+            # Pas de valeur simulée à côté d'un échec: l'appelant ne doit pas la prendre pour une estimation
+            predicted_value, error = None, distribution["error"]
+        else:
+            predicted_value = distribution["predicted_value"]
+            confidence = distribution["confidence_score"]
+
     return {
+        **({"error": error} if error else {}),
         "model_name": model_name,
         "features": features,
-        "predicted_value": 250000,  # valeur simulée
-        "confidence": 0.87,
+        "predicted_value": predicted_value,
+        "confidence": confidence,
+        "value_distribution": distribution,
         "version": version or "v1.0",
         "run_at": datetime.now().isoformat(),
         "explanations": {"ppsf_adjustment": 0, "comparables_delta": 0},
     }
+
+
+# =============================
+# Tool 5: Portfolio Valuation Confidence (Agent 3)
+# =============================
+@tool(
+    name="portfolio_valuation_confidence",
+    description="Valorise un portefeuille de biens avec intervalles de confiance bootstrap sur un même jeu de comparables",
+    show_result=True,
+)
+def portfolio_valuation_confidence(
+    properties: List[Dict[str, Any]],
+    comparables: List[Dict[str, Any]],
+    n_boot: int = 5000,
+) -> Dict[str, Any]:
+    results = bootstrap_portfolio(properties, comparables, n_boot=n_boot)
+    valued = [r for r in results if "error" not in r]
+    return {
+        "valuations": [{"property": p, **r} for p, r in zip(properties, results)],
+        "portfolio_value": round(sum(r["predicted_value"] for r in valued), 2),
+        "mean_confidence": round(sum(r["confidence_score"] for r in valued) / len(valued), 4) if valued else None,
+        "run_at": datetime.now().isoformat(),
+    }
@@ -0,0 +1,432 @@
+# =============================
+# alerts.py - Property Search & Recommendation Module
+# Recherches sauvegardées en index inversé (buckets type × lieu, arbres d'intervalles prix / surface) + flux d'alertes
+# =============================
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .inventory import InventoryIndex, haversine_km, location_tokens
+except ImportError:
+    from inventory import InventoryIndex, haversine_km, location_tokens
+
+
+DEFAULT_ALERT_DB_PATH = os.getenv(
+    "SAVED_SEARCH_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "alerts", "saved_searches.sqlite"),
+)
+ANY = "*"
+LEAF_SIZE = 32
+CELL_KM = 5.0  # cellules du bucket spatial des recherches par rayon
+MAX_CELLS = 400  # au-delà (rayon très large), la recherche va dans le bucket sans lieu
+_CELL_DEG = CELL_KM / 111.32
+
+
+def _bound(value: Any, default: float) -> float:
+    try:
+        return float(value) if value is not None and value != "" else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _num(value: Any) -> float:
+    return _bound(value, np.nan)
+
+
+def _cell(lat: float, lon: float) -> Tuple[str, int, int]:
+    return ("cell", int(math.floor((lat + 90.0) / _CELL_DEG)), int(math.floor((lon + 180.0) / _CELL_DEG)))
+
+
+# =============================
+# Arbre d'intervalles
+# =============================
+class _Node:
+    __slots__ = ("center", "left", "right", "lo", "lo_ids", "hi", "hi_ids")
+
+
+class IntervalTree:
+    # Arbre centré statique: chaque nœud garde les intervalles contenant son centre, triés par borne
+    # basse et par borne haute -> une requête ponctuelle coûte O(log n + k) searchsorted/tranches.
+    # Bornes absentes = ±inf; une valeur NaN ne satisfait que les intervalles non bornés.
+    def __init__(self, lo: np.ndarray, hi: np.ndarray, ids: np.ndarray):
+        lo, hi, ids = np.asarray(lo, dtype=np.float64), np.asarray(hi, dtype=np.float64), np.asarray(ids)
+        self.size = len(ids)
+        self.unbounded = ids[np.isneginf(lo) & np.isposinf(hi)]
+        self._nodes: List[_Node] = []
+        self._root = self._build(lo, hi, ids) if len(ids) else -1
+
+    def _build(self, lo: np.ndarray, hi: np.ndarray, ids: np.ndarray) -> int:
+        node = _Node()
+        position = len(self._nodes)
+        self._nodes.append(node)
+        endpoints = np.concatenate([lo, hi])
+        finite = endpoints[np.isfinite(endpoints)]
+        center = float(np.median(finite)) if len(finite) else 0.0
+        left, right = hi < center, lo > center
+        if len(ids) <= LEAF_SIZE or left.all() or right.all():
+            # Feuille: filtre linéaire (center=None)
+            node.center, node.left, node.right = None, -1, -1
+            node.lo, node.hi, node.lo_ids = lo, hi, ids
+            return position
+        mid = ~(left | right)
+        by_lo, by_hi = np.argsort(lo[mid], kind="stable"), np.argsort(hi[mid], kind="stable")
+        node.center = center
+        node.lo, node.lo_ids = lo[mid][by_lo], ids[mid][by_lo]
+        node.hi, node.hi_ids = hi[mid][by_hi], ids[mid][by_hi]
+        node.left = self._build(lo[left], hi[left], ids[left]) if left.any() else -1
+        node.right = self._build(lo[right], hi[right], ids[right]) if right.any() else -1
+        return position
+
+    def stab(self, x: float) -> np.ndarray:
+        if x != x:
+            return self.unbounded
+        parts = []
+        position = self._root
+        while position >= 0:
+            node = self._nodes[position]
+            if node.center is None:
+                parts.append(node.lo_ids[(node.lo <= x) & (node.hi >= x)])
+                break
+            if x < node.center:
+                parts.append(node.lo_ids[: np.searchsorted(node.lo, x, side="right")])
+                position = node.left
+            elif x > node.center:
+                parts.append(node.hi_ids[np.searchsorted(node.hi, x, side="left") :])
+                position = node.right
+            else:
+                parts.append(node.lo_ids)
+                break
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+# =============================
+# Index inversé des recherches sauvegardées
+# =============================
+class AlertIndex:
+    # Une recherche est rangée dans un seul bucket (type ou *, lieu): son jeton de localisation le
+    # moins fréquent, les cellules couvertes par son rayon, ou * sans lieu. Un bien ne sonde que les
+    # buckets de son type et de ses jetons / sa cellule, puis les arbres prix et surface du bucket.
+    # Ajouts en delta filtré linéairement, suppressions en tombstones; rebuild des buckets modifiés.
+    def __init__(self, delta_limit: int = 2048, capacity: int = 1024):
+        self.delta_limit = delta_limit
+        self._lock = threading.RLock()
+        self.size = 0
+        self.search_ids = np.empty(capacity, dtype=object)
+        self.user_ids = np.empty(capacity, dtype=object)
+        self.min_price = np.empty(capacity, dtype=np.float64)
+        self.max_price = np.empty(capacity, dtype=np.float64)
+        self.min_area = np.empty(capacity, dtype=np.float64)
+        self.max_area = np.empty(capacity, dtype=np.float64)
+        self.lat = np.empty(capacity, dtype=np.float64)
+        self.lon = np.empty(capacity, dtype=np.float64)
+        self.radius = np.empty(capacity, dtype=np.float64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.n_tokens = np.zeros(capacity, dtype=np.int32)
+        # Jetons de chaque recherche en CSR (tok_start[row], n_tokens[row]) sur un vocabulaire commun
+        self.tok_start = np.zeros(capacity, dtype=np.int64)
+        self._tok_ids = np.empty(4 * capacity, dtype=np.int32)
+        self._tok_size = 0
+        self.vocabulary: Dict[str, int] = {}
+        self.tokens: List[frozenset] = []
+        self.keys_of: List[List[tuple]] = []
+        self.row_of: Dict[str, int] = {}
+        self._buckets: Dict[tuple, List[int]] = {}
+        self._trees: Dict[tuple, Tuple[IntervalTree, IntervalTree]] = {}
+        self._delta: Dict[tuple, List[int]] = {}
+        self._delta_count = 0
+        self._dirty: set = set()
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed <= len(self.search_ids):
+            return
+        capacity = max(needed, 2 * len(self.search_ids))
+        for name in ("search_ids", "user_ids", "min_price", "max_price", "min_area", "max_area", "lat", "lon",
+                     "radius", "alive", "n_tokens", "tok_start"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype) if name in ("alive", "n_tokens", "tok_start") else np.empty(capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+
+    def _add_tokens(self, row: int, tokens: frozenset) -> None:
+        ids = [self.vocabulary.setdefault(t, len(self.vocabulary)) for t in sorted(tokens)]
+        if self._tok_size + len(ids) > len(self._tok_ids):
+            grown = np.empty(max(2 * len(self._tok_ids), self._tok_size + len(ids)), dtype=np.int32)
+            grown[: self._tok_size] = self._tok_ids[: self._tok_size]
+            self._tok_ids = grown
+        self._tok_ids[self._tok_size : self._tok_size + len(ids)] = ids
+        self.tok_start[row] = self._tok_size
+        self.n_tokens[row] = len(ids)
+        self._tok_size += len(ids)
+
+    def _has_tokens(self, rows: np.ndarray, tokens: Iterable[str]) -> np.ndarray:
+        # Tous les jetons de chaque recherche présents dans ceux du bien (vectorisé sur le CSR)
+        counts = self.n_tokens[rows].astype(np.int64)
+        offsets = np.cumsum(counts) - counts
+        flat = np.repeat(self.tok_start[rows] - offsets, counts) + np.arange(int(counts.sum()))
+        listing_ids = [self.vocabulary[t] for t in tokens if t in self.vocabulary]
+        present = np.isin(self._tok_ids[flat], listing_ids)
+        return np.add.reduceat(present, offsets) == counts
+
+    def _bucket_keys(self, row: int, type_key: str) -> List[tuple]:
+        if self.radius[row] == self.radius[row]:
+            lat, lon, radius = self.lat[row], self.lon[row], self.radius[row]
+            dlat = radius / 111.32
+            dlon = radius / (111.32 * max(math.cos(math.radians(min(abs(lat) + dlat, 89.0))), 1e-6))
+            _, iy0, ix0 = _cell(lat - dlat, lon - dlon)
+            _, iy1, ix1 = _cell(lat + dlat, lon + dlon)
+            if (iy1 - iy0 + 1) * (ix1 - ix0 + 1) <= MAX_CELLS:
+                return [(type_key, ("cell", iy, ix)) for iy in range(iy0, iy1 + 1) for ix in range(ix0, ix1 + 1)]
+            return [(type_key, ANY)]
+        if self.tokens[row]:
+            # Jeton le moins représenté parmi les buckets existants (les autres sont vérifiés au match)
+            token = min(sorted(self.tokens[row]), key=lambda t: len(self._buckets.get((type_key, t), ())))
+            return [(type_key, token)]
+        return [(type_key, ANY)]
+
+    def add(self, searches: Iterable[Dict[str, Any]]) -> List[str]:
+        # search: search_id, user_id, location, property_type, min/max_price, min/max_area,
+        # et pour une recherche par rayon: latitude, longitude, radius_km
+        with self._lock:
+            searches = list(searches)
+            ids = [str(s["search_id"]) for s in searches]
+            self.remove(ids)
+            self._reserve(len(searches))
+            for search_id, search in zip(ids, searches):
+                row = self.size
+                self.search_ids[row] = search_id
+                self.user_ids[row] = search.get("user_id")
+                self.min_price[row] = _bound(search.get("min_price"), -np.inf)
+                self.max_price[row] = _bound(search.get("max_price"), np.inf)
+                self.min_area[row] = _bound(search.get("min_area"), -np.inf)
+                self.max_area[row] = _bound(search.get("max_area"), np.inf)
+                self.lat[row] = _num(search.get("latitude"))
+                self.lon[row] = _num(search.get("longitude"))
+                self.radius[row] = _num(search.get("radius_km")) if self.lat[row] == self.lat[row] else np.nan
+                spatial = self.radius[row] == self.radius[row]
+                self.tokens.append(frozenset() if spatial else frozenset(location_tokens(search.get("location"))))
+                self._add_tokens(row, self.tokens[row])
+                self.alive[row] = True
+                self.row_of[search_id] = row
+                self.keys_of.append(self._bucket_keys(row, search.get("property_type") or ANY))
+                for key in self.keys_of[row]:
+                    self._buckets.setdefault(key, []).append(row)
+                    self._delta.setdefault(key, []).append(row)
+                    self._delta_count += 1
+                self.size += 1
+            if self._delta_count > self.delta_limit:
+                self.rebuild()
+            return ids
+
+    def remove(self, search_ids: Iterable[str]) -> int:
+        with self._lock:
+            removed = 0
+            for search_id in search_ids:
+                row = self.row_of.pop(str(search_id), None)
+                if row is not None:
+                    self.alive[row] = False  # tombstone, purgé du bucket à son prochain rebuild
+                    self._dirty.update(self.keys_of[row])
+                    self._delta_count += 1
+                    removed += 1
+            if self._delta_count > self.delta_limit:
+                self.rebuild()
+            return removed
+
+    def rebuild(self) -> None:
+        # Reconstruction des arbres des seuls buckets ayant reçu des ajouts ou perdu des recherches
+        with self._lock:
+            dirty = set(self._delta) | self._dirty
+            for key in dirty:
+                rows = np.array(self._buckets.get(key, ()), dtype=np.int64)
+                rows = rows[self.alive[rows]] if len(rows) else rows
+                if not len(rows):
+                    self._buckets.pop(key, None)
+                    self._trees.pop(key, None)
+                    continue
+                self._buckets[key] = rows.tolist()
+                self._trees[key] = (
+                    IntervalTree(self.min_price[rows], self.max_price[rows], rows),
+                    IntervalTree(self.min_area[rows], self.max_area[rows], rows),
+                )
+            self._delta = {}
+            self._delta_count = 0
+            self._dirty = set()
+
+    def _bucket_candidates(self, key: tuple, price: float, area: float) -> np.ndarray:
+        parts = []
+        trees = self._trees.get(key)
+        if trees is not None:
+            parts.append(np.intersect1d(trees[0].stab(price), trees[1].stab(area), assume_unique=True))
+        delta = self._delta.get(key)
+        if delta:
+            rows = np.array(delta, dtype=np.int64)
+            with np.errstate(invalid="ignore"):
+                if price == price:
+                    rows = rows[(self.min_price[rows] <= price) & (self.max_price[rows] >= price)]
+                else:
+                    rows = rows[np.isneginf(self.min_price[rows]) & np.isposinf(self.max_price[rows])]
+                if area == area:
+                    rows = rows[(self.min_area[rows] <= area) & (self.max_area[rows] >= area)]
+                else:
+                    rows = rows[np.isneginf(self.min_area[rows]) & np.isposinf(self.max_area[rows])]
+            parts.append(rows)
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def match(self, record: Dict[str, Any]) -> np.ndarray:
+        # Lignes des recherches sauvegardées satisfaites par le bien
+        with self._lock:
+            price, area = _num(record.get("price")), _num(record.get("area"))
+            lat, lon = _num(record.get("latitude")), _num(record.get("longitude"))
+            tokens = set(InventoryIndex._tokens(record))
+            places: List[Any] = sorted(tokens) + [ANY]
+            if lat == lat and lon == lon:
+                places.append(_cell(lat, lon))
+            types = [ANY] + ([record["type"]] if record.get("type") else [])
+            matched = []
+            for type_key in types:
+                for place in places:
+                    rows = self._bucket_candidates((type_key, place), price, area)
+                    if not len(rows):
+                        continue
+                    rows = rows[self.alive[rows]]
+                    spatial = self.radius[rows] == self.radius[rows]
+                    if spatial.any():
+                        with np.errstate(invalid="ignore"):
+                            near = haversine_km(lat, lon, self.lat[rows], self.lon[rows]) <= self.radius[rows]
+                        rows = rows[~spatial | near]
+                    # Le jeton du bucket est déjà garanti: seules les recherches à plusieurs jetons sont vérifiées
+                    multi = self.n_tokens[rows] > 1
+                    if multi.any():
+                        keep = ~multi
+                        keep[multi] = self._has_tokens(rows[multi], tokens)
+                        rows = rows[keep]
+                    matched.append(rows)
+            return np.concatenate(matched) if matched else np.empty(0, dtype=np.int64)
+
+
+# =============================
+# Store SQLite + flux d'alertes
+# =============================
+class AlertEngine:
+    def __init__(self, path: str = DEFAULT_ALERT_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS saved_searches (
+                search_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                criteria TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS alert_feed (
+                alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                search_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                property_id TEXT NOT NULL,
+                listing TEXT NOT NULL,
+                matched_at REAL NOT NULL,
+                UNIQUE (search_id, property_id)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS alert_feed_user ON alert_feed (user_id, alert_id)")
+        self.conn.commit()
+        self.index = AlertIndex()
+        saved = self.conn.execute("SELECT search_id, user_id, criteria FROM saved_searches").fetchall()
+        self.index.add({**json.loads(c), "search_id": s, "user_id": u} for s, u, c in saved)
+        self.index.rebuild()
+
+    def save(self, user_id: str, criteria: Dict[str, Any], search_id: Optional[str] = None) -> str:
+        search_id = search_id or uuid.uuid4().hex[:16]
+        criteria = {k: v for k, v in criteria.items() if v is not None}
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO saved_searches VALUES (?, ?, ?, ?)",
+                (search_id, str(user_id), json.dumps(criteria), time.time()),
+            )
+            self.conn.commit()
+            self.index.add([{**criteria, "search_id": search_id, "user_id": str(user_id)}])
+        return search_id
+
+    def delete(self, search_id: str) -> bool:
+        with self._lock:
+            self.conn.execute("DELETE FROM saved_searches WHERE search_id = ?", (str(search_id),))
+            self.conn.commit()
+            return self.index.remove([str(search_id)]) > 0
+
+    def searches(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT search_id, criteria, created_at FROM saved_searches WHERE user_id = ? ORDER BY created_at",
+            (str(user_id),),
+        ).fetchall()
+        return [{"search_id": s, **json.loads(c), "created_at": t} for s, c, t in rows]
+
+    def process(self, records: List[Dict[str, Any]], listing_view=None) -> int:
+        # Lot de biens nouveaux / modifiés -> alertes ajoutées au flux en une transaction.
+        # Un bien n'alerte qu'une fois par recherche (UNIQUE), même s'il est modifié ensuite.
+        now = time.time()
+        with self._lock:
+            alerts = []
+            for record in records:
+                listing = json.dumps(listing_view(record) if listing_view else record, default=str)
+                property_id = str(record.get("property_id", record.get("id")))
+                for row in self.index.match(record):
+                    alerts.append((self.index.search_ids[row], self.index.user_ids[row], property_id, listing, now))
+            if not alerts:
+                return 0
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO alert_feed (search_id, user_id, property_id, listing, matched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                alerts,
+            )
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def feed(self, user_id: Optional[str] = None, after_id: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        # Lecture incrémentale: l'appelant repasse le dernier alert_id reçu
+        sql = "SELECT alert_id, search_id, user_id, property_id, listing, matched_at FROM alert_feed WHERE alert_id > ?"
+        params: List[Any] = [int(after_id)]
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params.append(str(user_id))
+        rows = self.conn.execute(sql + " ORDER BY alert_id LIMIT ?", params + [int(limit)]).fetchall()
+        return [
+            {"alert_id": a, "search_id": s, "user_id": u, "property_id": p, "listing": json.loads(l), "matched_at": t}
+            for a, s, u, p, l, t in rows
+        ]
+
+
+_shared_engine: Optional[AlertEngine] = None
+_shared_lock = threading.Lock()
+
+
+def get_alert_engine() -> AlertEngine:
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            _shared_engine = AlertEngine()
+        return _shared_engine
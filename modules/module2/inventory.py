@@ -0,0 +1,294 @@
+# =============================
+# inventory.py - Property Search & Recommendation Module
+# Index d'inventaire colonnaire: tableaux triés (prix, surface) par type, jetons de localisation, grille spatiale
+# =============================
+import os
+import re
+import sys
+import threading
+import unicodedata
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from ..common.fulltext import BM25Index
+    from ..common.geo import GridIndex, haversine_km, points_in_polygon
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.fulltext import BM25Index
+    from common.geo import GridIndex, haversine_km, points_in_polygon
+
+
+ANY_TYPE = "*"
+_EMPTY = np.empty(0, dtype=np.int64)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def location_tokens(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(value) if value is not None and value != "" else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class _SortedColumn:
+    # Valeurs triées + numéros de ligne correspondants: une plage = deux searchsorted
+    def __init__(self, values: np.ndarray, rows: np.ndarray):
+        valid = ~np.isnan(values)
+        values, rows = values[valid], rows[valid]
+        order = np.argsort(values, kind="stable")
+        self.values = values[order]
+        self.rows = rows[order]
+
+    def bounds(self, low: Optional[float], high: Optional[float]):
+        lo = 0 if low is None else int(np.searchsorted(self.values, low, side="left"))
+        hi = len(self.values) if high is None else int(np.searchsorted(self.values, high, side="right"))
+        return lo, max(lo, hi)
+
+
+class InventoryIndex:
+    def __init__(self, delta_limit: int = 4096, capacity: int = 1024):
+        self.delta_limit = delta_limit
+        self._lock = threading.RLock()
+        self.size = 0
+        self.ids = np.empty(capacity, dtype=object)
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.area = np.empty(capacity, dtype=np.float64)
+        self.type_code = np.empty(capacity, dtype=np.int32)
+        self.lat = np.empty(capacity, dtype=np.float64)
+        self.lon = np.empty(capacity, dtype=np.float64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # Numéro d'insertion stable (conservé par rebuild) et identifiant de cette instance:
+        # base des curseurs de pagination, contrairement aux numéros de ligne
+        self.seq = np.empty(capacity, dtype=np.int64)
+        self._next_seq = 0
+        self.generation = uuid.uuid4().hex[:12]
+        self.records: List[Dict[str, Any]] = []
+        self.row_of: Dict[str, int] = {}
+        self.type_codes: Dict[str, int] = {}
+        self.version = 0
+        # Partie principale indexée [0, _indexed_rows) + delta non trié au-delà
+        self._indexed_rows = 0
+        self._sorted: Dict[tuple, _SortedColumn] = {}
+        self._postings: Dict[str, np.ndarray] = {}
+        self._delta_postings: Dict[str, List[int]] = {}
+        self._grid: Optional[GridIndex] = None
+        self.text = BM25Index()
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    # -----------------------------
+    # Écritures
+    # -----------------------------
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed <= len(self.ids):
+            return
+        capacity = max(needed, 2 * len(self.ids))
+        for name in ("ids", "price", "area", "type_code", "lat", "lon", "alive", "seq"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype) if name == "alive" else np.empty(capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+
+    def insert(self, records: Iterable[Dict[str, Any]]) -> List[str]:
+        with self._lock:
+            records = list(records)
+            ids = [str(r.get("property_id", r.get("id"))) for r in records]
+            # Un id déjà présent est remplacé (tombstone + nouvelle ligne)
+            self.delete(ids)
+            self._reserve(len(records))
+            self.text.add(range(self.size, self.size + len(records)), (self._text(r) for r in records))
+            for property_id, record in zip(ids, records):
+                row = self.size
+                self.ids[row] = property_id
+                self.price[row] = _num(record.get("price"))
+                self.area[row] = _num(record.get("area"))
+                self.type_code[row] = self.type_codes.setdefault(record.get("type") or "", len(self.type_codes))
+                self.lat[row] = _num(record.get("latitude"))
+                self.lon[row] = _num(record.get("longitude"))
+                self.alive[row] = True
+                self.seq[row] = self._next_seq
+                self._next_seq += 1
+                self.records.append(record)
+                self.row_of[property_id] = row
+                for token in set(self._tokens(record)):
+                    self._delta_postings.setdefault(token, []).append(row)
+                self.size += 1
+            self.version += 1
+            if self.size - self._indexed_rows > self.delta_limit:
+                self.rebuild()
+            return ids
+
+    def delete(self, property_ids: Iterable[str]) -> int:
+        with self._lock:
+            rows = []
+            for property_id in property_ids:
+                row = self.row_of.pop(str(property_id), None)
+                if row is not None:
+                    self.alive[row] = False  # tombstone, purgé au prochain rebuild
+                    rows.append(row)
+            if rows:
+                self.text.delete(rows)
+                self.version += 1
+            return len(rows)
+
+    def rebuild(self) -> None:
+        with self._lock:
+            # Compaction des tombstones puis reconstruction des index triés et des postings
+            keep = np.flatnonzero(self.alive[: self.size])
+            n = len(keep)
+            new_row = np.full(self.size, -1, dtype=np.int64)
+            new_row[keep] = np.arange(n)
+            for name in ("ids", "price", "area", "type_code", "lat", "lon", "alive", "seq"):
+                column = getattr(self, name)
+                column[:n] = column[keep]
+                if name == "alive":
+                    column[n:] = False
+            self.records = [self.records[i] for i in keep]
+            self.size = n
+            self.row_of = {pid: row for row, pid in enumerate(self.ids[:n])}
+            rows = np.arange(n)
+            price, area, type_code = self.price[:n], self.area[:n], self.type_code[:n]
+            self._sorted = {
+                (ANY_TYPE, "price"): _SortedColumn(price, rows),
+                (ANY_TYPE, "area"): _SortedColumn(area, rows),
+            }
+            for type_name, code in self.type_codes.items():
+                mask = type_code == code
+                self._sorted[(type_name, "price")] = _SortedColumn(price[mask], rows[mask])
+                self._sorted[(type_name, "area")] = _SortedColumn(area[mask], rows[mask])
+            # Postings existants renumérotés (pas de re-tokenisation des adresses)
+            postings: Dict[str, np.ndarray] = {}
+            for token in self._postings.keys() | self._delta_postings.keys():
+                old = np.concatenate(
+                    [self._postings.get(token, _EMPTY), np.array(self._delta_postings.get(token, ()), dtype=np.int64)]
+                )
+                rows_of_token = new_row[old]
+                rows_of_token = rows_of_token[rows_of_token >= 0]
+                if len(rows_of_token):
+                    postings[token] = rows_of_token
+            self._postings = postings
+            self._delta_postings = {}
+            self._grid = GridIndex(self.lat[:n], self.lon[:n])
+            self.text.compact(new_row, n)
+            self._indexed_rows = n
+
+    @staticmethod
+    def _tokens(record: Dict[str, Any]) -> List[str]:
+        return location_tokens(" ".join(str(record.get(k) or "") for k in ("address", "city", "district")))
+
+    @staticmethod
+    def _text(record: Dict[str, Any]) -> str:
+        parts = [str(record.get(k) or "") for k in ("type", "title", "address", "district", "description")]
+        return " ".join(parts + [str(a) for a in record.get("amenities") or []])
+
+    # -----------------------------
+    # Lecture
+    # -----------------------------
+    def query(
+        self,
+        location: Optional[str] = None,
+        property_type: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_area: Optional[float] = None,
+        max_area: Optional[float] = None,
+        near: Optional[Tuple[float, float, float]] = None,
+        polygon: Optional[Sequence[Sequence[float]]] = None,
+    ) -> np.ndarray:
+        # Retourne les numéros de ligne correspondants, dans l'ordre d'insertion.
+        # near = (lat, lon, rayon_km); polygon = [[lat, lon], ...]
+        with self._lock:
+            if property_type is not None and property_type not in self.type_codes:
+                return _EMPTY
+            tokens = location_tokens(location)
+            type_key = ANY_TYPE if property_type is None else property_type
+
+            indexed = self._indexed_candidates(
+                type_key, tokens, min_price, max_price, min_area, max_area, near, polygon
+            )
+            if tokens:
+                for token in tokens:
+                    indexed = indexed[np.isin(indexed, self._postings.get(token, _EMPTY), assume_unique=True)]
+                delta = sorted(set.intersection(*(set(self._delta_postings.get(t, ())) for t in tokens)))
+                delta = np.array(delta, dtype=np.int64)
+            else:
+                delta = np.arange(self._indexed_rows, self.size)
+            rows = np.concatenate([indexed, delta]).astype(np.int64)
+
+            # Filtre vectorisé des prédicats restants (les candidats sont déjà peu nombreux)
+            mask = self.alive[rows]
+            if property_type is not None:
+                mask &= self.type_code[rows] == self.type_codes[property_type]
+            if min_price is not None:
+                mask &= self.price[rows] >= min_price
+            if max_price is not None:
+                mask &= self.price[rows] <= max_price
+            if min_area is not None:
+                mask &= self.area[rows] >= min_area
+            if max_area is not None:
+                mask &= self.area[rows] <= max_area
+            if near is not None:
+                mask &= self.distances_km(rows, near[0], near[1]) <= near[2]
+            if polygon is not None:
+                mask &= points_in_polygon(self.lat[rows], self.lon[rows], polygon)
+            return np.sort(rows[mask])
+
+    def _indexed_candidates(
+        self, type_key, tokens, min_price, max_price, min_area, max_area, near, polygon
+    ) -> np.ndarray:
+        if not self._indexed_rows:
+            return _EMPTY
+        # Choix du prédicat le plus sélectif: longueur de posting, largeur de plage (O(log n))
+        # ou nombre de points dans la zone (grille)
+        options = []
+        if near is not None:
+            in_radius = self._grid.within_radius(*near)[0]
+            options.append((len(in_radius), lambda: np.sort(in_radius)))
+        if polygon is not None:
+            in_polygon = self._grid.within_polygon(polygon)
+            options.append((len(in_polygon), lambda: np.sort(in_polygon)))
+        if tokens:
+            smallest = min((self._postings.get(t, _EMPTY) for t in tokens), key=len)
+            options.append((len(smallest), lambda: smallest))
+        for column, low, high in (("price", min_price, max_price), ("area", min_area, max_area)):
+            index = self._sorted.get((type_key, column))
+            if index is None:
+                return _EMPTY
+            if low is not None or high is not None:
+                lo, hi = index.bounds(low, high)
+                options.append((hi - lo, lambda index=index, lo=lo, hi=hi: np.sort(index.rows[lo:hi])))
+        if not options:
+            if type_key == ANY_TYPE:
+                return np.arange(self._indexed_rows)
+            return np.flatnonzero(self.type_code[: self._indexed_rows] == self.type_codes[type_key])
+        return min(options, key=lambda option: option[0])[1]()
+
+    def text_search(self, query: str, rows: Optional[np.ndarray] = None, k: Optional[int] = 10):
+        # BM25 sur le texte des annonces, restreint aux lignes issues de query() si fournies
+        # (k=None: toutes les lignes correspondantes, non triées)
+        with self._lock:
+            allowed = None
+            if rows is not None:
+                allowed = np.zeros(self.size, dtype=bool)
+                allowed[rows] = True
+            return self.text.search(query, k, allowed=allowed, alive=self.alive[: self.size])
+
+    def distances_km(self, rows: np.ndarray, lat: float, lon: float) -> np.ndarray:
+        # NaN pour les biens sans coordonnées
+        return haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+
+    def records_at(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        return [self.records[i] for i in rows]
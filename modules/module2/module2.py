@@ -12,9 +12,15 @@ from agno.tools.pandas import PandasTools
 
 # Import des outils custom
 try:
-    from .tools import search_properties, generate_user_profile, recommend_properties
+    from .tools import (
+        search_properties, generate_user_profile, recommend_properties, update_inventory, record_interaction,
+        search_cache_stats, save_search, delete_saved_search, get_alert_feed,
+    )
 except ImportError:
-    from tools import search_properties, generate_user_profile, recommend_properties
+    from tools import (
+        search_properties, generate_user_profile, recommend_properties, update_inventory, record_interaction,
+        search_cache_stats, save_search, delete_saved_search, get_alert_feed,
+    )
 
 # ----------------------------
 # Load environment variables
@@ -26,7 +32,7 @@ load_dotenv()
 SearchQueryAgent = Agent(
     name="Search Query Agent",
     model=MistralChat(id="mistral-small-latest", api_key=os.getenv("MISTRAL_API_KEY")),
-    tools=[GoogleSearchTools(), PandasTools(), search_properties],
+    tools=[GoogleSearchTools(), PandasTools(), search_properties, update_inventory, search_cache_stats],
     description="""
     Un agent IA chargé de rechercher et collecter les biens immobiliers correspondant aux critères
     spécifiés par l'utilisateur (localisation, budget, type de propriété).
@@ -43,7 +49,13 @@ SearchQueryAgent = Agent(
     ## Tool Usage Guidelines
     - GoogleSearchTools pour rechercher les listings web.
     - PandasTools pour nettoyer et organiser les données.
-    - search_properties pour interroger la base de données vectorisée.
+    - search_properties pour interroger la base de données vectorisée. Pour une demande du type
+      "à moins de 2 km de Maarif", passez radius_km (résultats triés par distance) ou un polygone.
+      Les résultats arrivent par pages de max_results (total_results donne le nombre total):
+      pour la page suivante, rappelez search_properties avec les mêmes critères et cursor=next_cursor.
+    - update_inventory pour ajouter ou retirer des annonces de l'inventaire.
+    - search_cache_stats pour consulter le taux de succès du cache de recherche (les recherches
+      identiques sont servies depuis le cache tant que l'inventaire concerné n'a pas changé).
 
     ## Sortie attendue
     - candidate_properties
@@ -58,7 +70,7 @@ SearchQueryAgent = Agent(
 UserPreferenceAgent = Agent(
     name="User Preference Agent",
     model=MistralChat(id="mistral-small-latest", api_key=os.getenv("MISTRAL_API_KEY")),
-    tools=[PandasTools(), generate_user_profile],
+    tools=[PandasTools(), generate_user_profile, record_interaction, save_search, delete_saved_search, get_alert_feed],
     description="""
     Un agent IA qui construit un profil utilisateur basé sur les préférences explicites et les
     interactions, afin de personnaliser les recommandations de biens.
@@ -73,7 +85,12 @@ UserPreferenceAgent = Agent(
 
     ## Tool Usage Guidelines
     - PandasTools pour traiter et analyser les données utilisateur.
-    - generate_user_profile pour créer le vecteur utilisateur final.
+    - generate_user_profile pour créer le vecteur utilisateur final (profile_vector), dans le même
+      espace que les biens; transmettez les biens consultés via interactions. Avec un user_id, le profil
+      est persistant: seules les nouvelles préférences / interactions sont à transmettre.
+    - record_interaction pour enregistrer au fil de l'eau une vue, une sauvegarde ou un rejet.
+    - save_search quand l'utilisateur veut être prévenu des nouveaux biens correspondant à ses critères
+      (delete_saved_search pour arrêter); get_alert_feed pour lire les alertes reçues depuis next_after_id.
 
     ## Sortie attendue
     - user_profile_vector
@@ -104,7 +121,9 @@ RecommendationEngineAgent = Agent(
 
     ## Tool Usage Guidelines
     - PandasTools pour manipuler et traiter les données.
-    - recommend_properties pour produire la liste finale des recommandations.
+    - recommend_properties pour produire la liste finale des recommandations (un user_profile réduit à
+      {"user_id": ...} suffit pour un profil persistant). Sans biens candidats,
+      l'outil interroge directement l'index ANN de l'inventaire (filtres budget et type).
 
     ## Sortie attendue
     - recommended_properties
@@ -0,0 +1,79 @@
+# =============================
+# pagination.py - Property Search & Recommendation Module
+# Pagination par curseur (keyset) : jeton opaque qui reprend le parcours de l'index là où la page précédente s'arrêtait
+# =============================
+import base64
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+CURSOR_VERSION = 1
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    # Jeton opaque pour l'appelant: JSON compact en base64 url-safe, sans padding
+    blob = json.dumps({"v": CURSOR_VERSION, **state}, separators=(",", ":"), sort_keys=True)
+    return base64.urlsafe_b64encode(blob.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, criteria_key: str) -> Dict[str, Any]:
+    # Un curseur n'est valable que pour les critères qui l'ont produit
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError(f"Curseur invalide: {token!r}") from exc
+    if not isinstance(state, dict) or state.get("v") != CURSOR_VERSION or "s" not in state:
+        raise ValueError(f"Curseur invalide: {token!r}")
+    if state.get("k") != criteria_key:
+        raise ValueError("Curseur obtenu avec d'autres critères de recherche")
+    return state
+
+
+def keyset_page(
+    seq: np.ndarray,
+    limit: int,
+    after: Optional[Tuple[Optional[float], int]] = None,
+    key: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    # Positions des `limit` éléments suivant `after` dans l'ordre total (key, seq) — seq seul si key est None.
+    # seq est unique par bien: l'ordre est total et une page ne répète ni ne saute aucun élément
+    # encore présent, même si l'inventaire change entre deux pages.
+    if limit <= 0 or not len(seq):
+        return np.empty(0, dtype=np.int64)
+    if key is None:
+        # seq croissant dans l'ordre des lignes: la reprise est un searchsorted
+        start = 0 if after is None else int(np.searchsorted(seq, after[1], side="right"))
+        return np.arange(start, min(start + limit, len(seq)))
+    positions = np.arange(len(seq))
+    if after is not None:
+        last_key, last_seq = after
+        mask = (key > last_key) | ((key == last_key) & (seq > last_seq))
+        positions = positions[mask]
+    if len(positions) > limit:
+        # Sélection partielle sur la clé, puis départage des ex aequo par seq
+        threshold = key[positions[np.argpartition(key[positions], limit - 1)[:limit]]].max()
+        positions = positions[key[positions] <= threshold]
+    order = np.lexsort((seq[positions], key[positions]))
+    return positions[order[:limit]]
+
+
+def sorted_order(seq: np.ndarray, key: Optional[np.ndarray] = None) -> np.ndarray:
+    # Ordre total complet (key, seq): pour un parcours séquentiel, tri unique puis tranches
+    return np.arange(len(seq)) if key is None else np.lexsort((seq, key))
+
+
+def keyset_start(
+    seq: np.ndarray,
+    after: Optional[Tuple[Optional[float], int]],
+    key: Optional[np.ndarray] = None,
+) -> int:
+    # Position de reprise dans des tableaux déjà triés par sorted_order
+    if after is None:
+        return 0
+    if key is None:
+        return int(np.searchsorted(seq, after[1], side="right"))
+    last_key, last_seq = after
+    return int(np.count_nonzero((key < last_key) | ((key == last_key) & (seq <= last_seq))))
@@ -0,0 +1,269 @@
+# =============================
+# profiles.py - Property Search & Recommendation Module
+# Store persistant des profils utilisateurs, mis à jour incrémentalement par événements (avec décroissance)
+# =============================
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+DEFAULT_PROFILE_DB_PATH = os.getenv(
+    "USER_PROFILE_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "profiles", "user_profiles.sqlite"),
+)
+DEFAULT_HALF_LIFE_DAYS = float(os.getenv("USER_PROFILE_HALF_LIFE_DAYS", "30"))
+
+# Poids signé par type d'événement: un rejet éloigne le profil du bien
+EVENT_WEIGHTS = {"view": 1.0, "click": 1.0, "save": 3.0, "favorite": 3.0, "contact": 4.0, "reject": -2.0}
+EVIDENCE_PRIOR = 5.0  # poids d'interactions pour lequel historique et préférences explicites pèsent autant
+MAX_CATEGORIES = 20
+
+
+def _top(counts: Dict[str, float], n: int = 3) -> List[str]:
+    return [k for k, v in sorted(counts.items(), key=lambda kv: -kv[1])[:n] if v > 0]
+
+
+class UserProfile:
+    # Accumulateurs décroissants: chaque valeur est ramenée à l'instant courant par exp(-λ·Δt)
+    # avant d'ajouter l'événement -> O(1) par événement, sans relire l'historique.
+    def __init__(self, user_id: str, dim: int):
+        self.user_id = user_id
+        self.preferences: Dict[str, Any] = {}
+        self.explicit = np.zeros(dim, dtype=np.float32)
+        self.interaction_sum = np.zeros(dim, dtype=np.float32)
+        self.evidence = 0.0
+        self.stats: Dict[str, Any] = {
+            "price": [0.0, 0.0, 0.0],
+            "area": [0.0, 0.0, 0.0],
+            "types": {},
+            "locations": {},
+            "rejected_types": {},
+        }
+        self.event_count = 0
+        self.updated_at = time.time()
+
+    def decay_to(self, now: float, half_life_s: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed <= 0:
+            return
+        factor = math.exp(-math.log(2) * elapsed / half_life_s)
+        self.interaction_sum *= factor
+        self.evidence *= factor
+        for key in ("price", "area"):
+            self.stats[key] = [v * factor for v in self.stats[key]]
+        for key in ("types", "locations", "rejected_types"):
+            self.stats[key] = {k: v * factor for k, v in self.stats[key].items() if v * factor > 1e-3}
+        self.updated_at = now
+
+    def fold(self, weight: float, vector: Optional[np.ndarray], features: Dict[str, Any]) -> None:
+        if vector is not None:
+            self.interaction_sum += weight * vector
+        self.evidence += abs(weight)
+        self.event_count += 1
+        if weight < 0:
+            if features.get("type"):
+                rejected = self.stats["rejected_types"]
+                rejected[features["type"]] = rejected.get(features["type"], 0.0) - weight
+            return
+        # Statistiques pondérées (log prix / log surface): somme des poids, Σwx, Σwx²
+        for key in ("price", "area"):
+            value = features.get(key)
+            if value and value > 0:
+                x = math.log(float(value))
+                acc = self.stats[key]
+                acc[0] += weight
+                acc[1] += weight * x
+                acc[2] += weight * x * x
+        for key, value in (("types", features.get("type")), ("locations", features.get("district") or features.get("city"))):
+            if value:
+                counts = self.stats[key]
+                counts[value] = counts.get(value, 0.0) + weight
+                if len(counts) > MAX_CATEGORIES:
+                    del counts[min(counts, key=counts.get)]
+
+    def vector(self) -> np.ndarray:
+        # Mélange préférences explicites / historique, la part de l'historique croît avec les preuves
+        explicit = self.explicit
+        norm = float(np.linalg.norm(self.interaction_sum))
+        if norm == 0:
+            return explicit
+        share = self.evidence / (self.evidence + EVIDENCE_PRIOR)
+        blended = (1 - share) * explicit + share * (self.interaction_sum / norm)
+        return blended / (np.linalg.norm(blended) or 1.0)
+
+    def interaction_vector(self) -> Optional[np.ndarray]:
+        norm = float(np.linalg.norm(self.interaction_sum))
+        return self.interaction_sum / norm if norm else None
+
+    def _range(self, key: str) -> Optional[List[float]]:
+        w, s, s2 = self.stats[key]
+        if w < 1e-6:
+            return None
+        mean = s / w
+        std = math.sqrt(max(s2 / w - mean * mean, 0.0))
+        return [round(math.exp(mean - std), 0), round(math.exp(mean + std), 0)]
+
+    def summary(self) -> Dict[str, Any]:
+        # Résumé compact pour les prompts: taille constante quel que soit l'historique
+        return {
+            "user_id": self.user_id,
+            "budget": self.preferences.get("budget"),
+            "preferred_type": self.preferences.get("type"),
+            "preferred_location": self.preferences.get("location"),
+            "learned": {
+                "price_range": self._range("price"),
+                "area_range": self._range("area"),
+                "top_types": _top(self.stats["types"]),
+                "top_locations": _top(self.stats["locations"]),
+                "rejected_types": _top(self.stats["rejected_types"]),
+            },
+            "event_count": self.event_count,
+            "evidence": round(self.evidence, 3),
+            "updated_at": self.updated_at,
+        }
+
+
+class ProfileStore:
+    def __init__(
+        self,
+        dim: int,
+        path: str = DEFAULT_PROFILE_DB_PATH,
+        half_life_days: float = DEFAULT_HALF_LIFE_DAYS,
+        cache_size: int = 10_000,
+    ):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.dim = dim
+        self.path = path
+        self.half_life_s = half_life_days * 86400.0
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, UserProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                user_id TEXT PRIMARY KEY,
+                preferences TEXT NOT NULL,
+                explicit BLOB NOT NULL,
+                interaction_sum BLOB NOT NULL,
+                evidence REAL NOT NULL,
+                stats TEXT NOT NULL,
+                event_count INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def _load(self, user_id: str) -> UserProfile:
+        profile = self._cache.get(user_id)
+        if profile is not None:
+            self._cache.move_to_end(user_id)
+            return profile
+        profile = UserProfile(user_id, self.dim)
+        row = self.conn.execute(
+            "SELECT preferences, explicit, interaction_sum, evidence, stats, event_count, updated_at "
+            "FROM profiles WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        if row:
+            profile.preferences = json.loads(row[0])
+            profile.explicit = np.frombuffer(row[1], dtype=np.float32).copy()
+            profile.interaction_sum = np.frombuffer(row[2], dtype=np.float32).copy()
+            profile.evidence, profile.stats = row[3], json.loads(row[4])
+            profile.event_count, profile.updated_at = row[5], row[6]
+        self._cache[user_id] = profile
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return profile
+
+    def _save(self, profile: UserProfile) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                profile.user_id,
+                json.dumps(profile.preferences),
+                profile.explicit.astype(np.float32).tobytes(),
+                profile.interaction_sum.astype(np.float32).tobytes(),
+                profile.evidence,
+                json.dumps(profile.stats),
+                profile.event_count,
+                profile.updated_at,
+            ),
+        )
+        self.conn.commit()
+
+    def get(self, user_id: str, now: Optional[float] = None) -> UserProfile:
+        with self._lock:
+            profile = self._load(str(user_id))
+            profile.decay_to(now or time.time(), self.half_life_s)
+            return profile
+
+    def exists(self, user_id: str) -> bool:
+        with self._lock:
+            if str(user_id) in self._cache:
+                return True
+            return self.conn.execute("SELECT 1 FROM profiles WHERE user_id = ?", (str(user_id),)).fetchone() is not None
+
+    def set_preferences(self, user_id: str, preferences: Dict[str, Any], explicit_vector: np.ndarray) -> UserProfile:
+        with self._lock:
+            profile = self._load(str(user_id))
+            profile.preferences.update({k: v for k, v in preferences.items() if v is not None})
+            profile.explicit = np.asarray(explicit_vector, dtype=np.float32)
+            self._save(profile)
+            return profile
+
+    def record_event(
+        self,
+        user_id: str,
+        event: str,
+        vector: Optional[np.ndarray] = None,
+        features: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[float] = None,
+    ) -> UserProfile:
+        return self.record_events(user_id, [(event, vector, features or {}, timestamp)])
+
+    def record_events(self, user_id: str, events: List[tuple]) -> UserProfile:
+        # events: [(type, vecteur, features, timestamp)], une seule écriture SQLite pour le lot
+        # Lot validé en entier avant toute modification du profil en cache
+        unknown = sorted({event for event, *_ in events if event not in EVENT_WEIGHTS})
+        if unknown:
+            raise ValueError(f"Type d'événement inconnu: {unknown} (attendu: {sorted(EVENT_WEIGHTS)})")
+        with self._lock:
+            profile = self._load(str(user_id))
+            try:
+                for event, vector, features, timestamp in events:
+                    timestamp = timestamp or time.time()
+                    weight = EVENT_WEIGHTS[event]
+                    if timestamp < profile.updated_at:
+                        # Événement arrivé en retard: pondéré directement par son âge
+                        weight *= math.exp(-math.log(2) * (profile.updated_at - timestamp) / self.half_life_s)
+                    else:
+                        profile.decay_to(timestamp, self.half_life_s)
+                    profile.fold(weight, vector, features or {})
+                self._save(profile)
+            except Exception:
+                # Échec en cours de lot (vecteur invalide, SQLite): le cache ne doit pas diverger de la base
+                self._cache.pop(profile.user_id, None)
+                raise
+            return profile
+
+
+_shared_store: Optional[ProfileStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_profile_store(dim: int) -> ProfileStore:
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ProfileStore(dim)
+        return _shared_store
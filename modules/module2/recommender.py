@@ -0,0 +1,386 @@
+# =============================
+# recommender.py - Property Search & Recommendation Module
+# Espace vectoriel partagé biens / profils + index ANN (IVF) avec recherche filtrée
+# =============================
+import math
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from .inventory import location_tokens
+except ImportError:
+    from inventory import location_tokens
+
+
+# =============================
+# Encodeur: biens et profils dans le même espace
+# =============================
+# Centres de référence (log) fixes: un vecteur ne dépend pas du reste de l'inventaire,
+# ce qui permet les ajouts incrémentaux sans ré-encoder l'index.
+_LOG_CENTERS = {"price": math.log(1_500_000), "area": math.log(100), "price_per_sqm": math.log(12_000)}
+_NUMERIC = ("price", "area", "price_per_sqm", "bedrooms")
+_TYPE_DIMS = 8
+
+
+def _hash(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _positive(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 and math.isfinite(value) else None
+
+
+class ListingEncoder:
+    def __init__(self, dim: int = 64, numeric_weight: float = 1.0, type_weight: float = 1.0, location_weight: float = 1.0):
+        if dim <= len(_NUMERIC) + _TYPE_DIMS:
+            raise ValueError(f"dim must be greater than {len(_NUMERIC) + _TYPE_DIMS}")
+        self.dim = dim
+        self.numeric_weight = numeric_weight
+        self.type_weight = type_weight
+        self.location_weight = location_weight
+        self._location_offset = len(_NUMERIC) + _TYPE_DIMS
+        self._location_dims = dim - self._location_offset
+
+    def _fill(self, out: np.ndarray, features: Dict[str, Optional[float]], type_name: Optional[str], location: str) -> None:
+        # Valeur manquante = 0 (neutre): un profil sans surface cible ne pénalise aucune surface
+        for j, name in enumerate(_NUMERIC):
+            value = features.get(name)
+            if value is None:
+                continue
+            if name == "bedrooms":
+                out[j] = self.numeric_weight * (value - 2.5) / 2.0
+            else:
+                out[j] = self.numeric_weight * (math.log(value) - _LOG_CENTERS[name])
+        if type_name:
+            out[len(_NUMERIC) + _hash(type_name.strip().lower()) % _TYPE_DIMS] = self.type_weight
+        tokens = set(location_tokens(location))
+        if tokens:
+            weight = self.location_weight / math.sqrt(len(tokens))
+            for token in tokens:
+                h = _hash(token)
+                out[self._location_offset + h % self._location_dims] += weight if (h >> 31) & 1 else -weight
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def encode_listings(self, records: Sequence[Dict[str, Any]]) -> np.ndarray:
+        out = np.zeros((len(records), self.dim), dtype=np.float32)
+        for i, record in enumerate(records):
+            price, area = _positive(record.get("price")), _positive(record.get("area"))
+            features = {
+                "price": price,
+                "area": area,
+                "price_per_sqm": _positive(record.get("price_per_sqm")) or (price / area if price and area else None),
+                "bedrooms": _positive(record.get("bedrooms")),
+            }
+            location = " ".join(str(record.get(k) or "") for k in ("address", "city", "district"))
+            self._fill(out[i], features, record.get("type"), location)
+        return self._normalize(out)
+
+    def encode_profile(
+        self,
+        preferences: Dict[str, Any],
+        interaction_vectors: Optional[np.ndarray] = None,
+        interaction_weight: float = 0.5,
+    ) -> np.ndarray:
+        # Préférences explicites -> vecteur cible; les interactions tirent le profil vers les biens consultés
+        budget = _positive(preferences.get("budget"))
+        area = _positive(preferences.get("area") or preferences.get("min_area"))
+        features = {
+            "price": budget * 0.9 if budget else None,
+            "area": area,
+            "price_per_sqm": budget * 0.9 / area if budget and area else None,
+            "bedrooms": _positive(preferences.get("bedrooms")),
+        }
+        explicit = np.zeros((1, self.dim), dtype=np.float32)
+        self._fill(explicit[0], features, preferences.get("type"), str(preferences.get("location") or ""))
+        profile = self._normalize(explicit)[0]
+        if interaction_vectors is not None and len(interaction_vectors):
+            centroid = self._normalize(interaction_vectors.mean(axis=0, keepdims=True))[0]
+            profile = (1 - interaction_weight) * profile + interaction_weight * centroid
+        return self._normalize(profile[None, :])[0]
+
+
+# =============================
+# Index IVF (k-means + listes inversées) avec filtres prix / type
+# =============================
+def _kmeans(vectors: np.ndarray, n_clusters: int, iterations: int, seed: int) -> np.ndarray:
+    # k-means sphérique (produit scalaire sur vecteurs normalisés)
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=n_clusters)
+        empty = counts == 0
+        # Cluster vide: réinitialisé sur un point aléatoire
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        out[start : start + chunk_size] = np.argmax(vectors[start : start + chunk_size] @ centroids.T, axis=1)
+    return out
+
+
+class IVFIndex:
+    def __init__(
+        self,
+        dim: int,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        delta_limit: int = 8192,
+        train_sample: int = 65536,
+        kmeans_iterations: int = 10,
+        seed: int = 0,
+    ):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.delta_limit = delta_limit
+        self.train_sample = train_sample
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self._lock = threading.RLock()
+        self.size = 0
+        self.vectors = np.empty((1024, dim), dtype=np.float32)
+        self.ids = np.empty(1024, dtype=object)
+        self.price = np.empty(1024, dtype=np.float64)
+        self.type_code = np.empty(1024, dtype=np.int32)
+        self.alive = np.zeros(1024, dtype=bool)
+        self.row_of: Dict[str, int] = {}
+        self.type_codes: Dict[str, int] = {}
+        self.version = 0
+        # Listes inversées au format CSR: rows triées par liste + offsets; delta non indexé au-delà
+        self.centroids: Optional[np.ndarray] = None
+        self._list_rows = np.empty(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+        self._indexed_rows = 0
+        self._trained_on = 0
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    # -----------------------------
+    # Écritures
+    # -----------------------------
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed <= len(self.ids):
+            return
+        capacity = max(needed, 2 * len(self.ids))
+        for name in ("vectors", "ids", "price", "type_code", "alive"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+
+    def add(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        prices: Optional[Sequence[Any]] = None,
+        types: Optional[Sequence[Optional[str]]] = None,
+    ) -> None:
+        with self._lock:
+            ids = [str(i) for i in ids]
+            self.delete(ids)  # un id existant est remplacé
+            n = len(ids)
+            self._reserve(n)
+            rows = slice(self.size, self.size + n)
+            self.vectors[rows] = vectors
+            self.ids[rows] = ids
+            self.price[rows] = [_positive(p) or np.nan for p in prices] if prices is not None else np.nan
+            self.type_code[rows] = [
+                self.type_codes.setdefault(t or "", len(self.type_codes)) for t in (types or [None] * n)
+            ]
+            self.alive[rows] = True
+            self.row_of.update(zip(ids, range(self.size, self.size + n)))
+            self.size += n
+            self.version += 1
+            if self.size - self._indexed_rows > self.delta_limit:
+                self.build()
+
+    def delete(self, ids: Iterable[str]) -> int:
+        with self._lock:
+            removed = 0
+            for property_id in ids:
+                row = self.row_of.pop(str(property_id), None)
+                if row is not None:
+                    self.alive[row] = False
+                    removed += 1
+            if removed:
+                self.version += 1
+            return removed
+
+    def build(self, retrain: bool = False) -> None:
+        with self._lock:
+            # Compaction des tombstones
+            keep = np.flatnonzero(self.alive[: self.size])
+            n = len(keep)
+            old_list = None
+            if self.centroids is not None and self._indexed_rows:
+                old_list = np.full(self.size, -1, dtype=np.int64)
+                sizes = np.diff(self._list_offsets)
+                old_list[self._list_rows] = np.repeat(np.arange(len(sizes)), sizes)
+                old_list = old_list[keep]
+            for name in ("vectors", "ids", "price", "type_code", "alive"):
+                column = getattr(self, name)
+                column[:n] = column[keep]
+                if name == "alive":
+                    column[n:] = False
+            self.size = n
+            self.row_of = {pid: row for row, pid in enumerate(self.ids[:n])}
+            if not n:
+                self.centroids, self._indexed_rows = None, 0
+                self._list_rows, self._list_offsets = np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+                return
+
+            # Ré-entraînement du quantifieur quand l'inventaire a doublé depuis le dernier k-means
+            if retrain or self.centroids is None or n >= 2 * max(self._trained_on, 1):
+                n_lists = self.n_lists or max(1, int(math.sqrt(n)))
+                n_lists = min(n_lists, n)
+                rng = np.random.default_rng(self.seed)
+                sample = self.vectors[:n]
+                if n > self.train_sample:
+                    sample = sample[np.sort(rng.choice(n, size=self.train_sample, replace=False))]
+                self.centroids = _kmeans(sample, n_lists, self.kmeans_iterations, self.seed)
+                self._trained_on = n
+                assign = _nearest(self.vectors[:n], self.centroids)
+            else:
+                # Seules les nouvelles lignes sont affectées; les autres gardent leur liste
+                assign = old_list if old_list is not None else np.full(n, -1, dtype=np.int64)
+                pending = np.flatnonzero(assign < 0)
+                if len(pending):
+                    assign[pending] = _nearest(self.vectors[pending], self.centroids)
+
+            order = np.argsort(assign, kind="stable")
+            self._list_rows = order
+            self._list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(self.centroids)))])
+            self._indexed_rows = n
+
+    # -----------------------------
+    # Lecture
+    # -----------------------------
+    def _mask(self, rows: np.ndarray, max_price: Optional[float], property_type: Optional[str]) -> np.ndarray:
+        mask = self.alive[rows]
+        if max_price is not None:
+            mask &= self.price[rows] <= max_price
+        if property_type is not None:
+            mask &= self.type_code[rows] == self.type_codes[property_type]
+        return mask
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        max_price: Optional[float] = None,
+        property_type: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            if property_type is not None and property_type not in self.type_codes:
+                return {"ids": [], "scores": [], "probed_lists": 0, "candidates": 0}
+            query = np.asarray(query, dtype=np.float32)
+            # Le delta (ajouts depuis le dernier build) est toujours parcouru exhaustivement
+            delta = np.arange(self._indexed_rows, self.size)
+            candidates = [delta[self._mask(delta, max_price, property_type)]]
+            probed = 0
+            if self.centroids is not None:
+                nprobe = min(nprobe or self.nprobe, len(self.centroids))
+                list_order = np.argsort(-(self.centroids @ query))
+                found = len(candidates[0])
+                # Recherche filtrée: on sonde des listes supplémentaires tant que les filtres
+                # laissent moins de k candidats
+                while probed < len(list_order) and (probed < nprobe or found < k):
+                    step = nprobe if probed < nprobe else probed
+                    lists = list_order[probed : probed + step]
+                    rows = np.concatenate(
+                        [self._list_rows[self._list_offsets[l] : self._list_offsets[l + 1]] for l in lists]
+                    )
+                    rows = rows[self._mask(rows, max_price, property_type)]
+                    candidates.append(rows)
+                    found += len(rows)
+                    probed += len(lists)
+            return self._top_k(np.concatenate(candidates), query, k, probed)
+
+    def exact_search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        max_price: Optional[float] = None,
+        property_type: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            if property_type is not None and property_type not in self.type_codes:
+                return {"ids": [], "scores": [], "probed_lists": 0, "candidates": 0}
+            rows = np.arange(self.size)
+            rows = rows[self._mask(rows, max_price, property_type)]
+            return self._top_k(rows, np.asarray(query, dtype=np.float32), k, 0)
+
+    def _top_k(self, rows: np.ndarray, query: np.ndarray, k: int, probed: int) -> Dict[str, Any]:
+        scores = self.vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return {
+            "ids": [self.ids[r] for r in rows[order]],
+            "scores": scores[order].tolist(),
+            "probed_lists": probed,
+            "candidates": len(scores),
+        }
+
+    def vectors_for(self, ids: Iterable[str]) -> np.ndarray:
+        rows = [self.row_of[str(i)] for i in ids if str(i) in self.row_of]
+        return self.vectors[rows]
+
+
+# =============================
+# Compromis rappel / latence
+# =============================
+def evaluate_recall(
+    index: IVFIndex,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32),
+    filters: Optional[Sequence[Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    filters = filters or [{}] * len(queries)
+    truth = [set(index.exact_search(q, k, **f)["ids"]) for q, f in zip(queries, filters)]
+    report = []
+    for nprobe in nprobes:
+        hits, expected, latencies = 0, 0, []
+        for query, f, exact in zip(queries, filters, truth):
+            started = time.perf_counter()
+            found = index.search(query, k, nprobe=nprobe, **f)["ids"]
+            latencies.append(time.perf_counter() - started)
+            hits += len(exact.intersection(found))
+            expected += len(exact)
+        latencies_ms = np.array(latencies) * 1000
+        report.append(
+            {
+                "nprobe": nprobe,
+                f"recall@{k}": round(hits / expected, 4) if expected else None,
+                "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 3),
+                "latency_ms_p95": round(float(np.percentile(latencies_ms, 95)), 3),
+            }
+        )
+    return report
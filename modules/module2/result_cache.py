@@ -0,0 +1,157 @@
+# =============================
+# result_cache.py - Property Search & Recommendation Module
+# Cache des résultats (search / recommend) indexé par critères normalisés, invalidation sélective
+# =============================
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+try:
+    from .inventory import location_tokens
+except ImportError:
+    from inventory import location_tokens
+
+
+ANY_BUCKET = "*"
+
+
+def normalize_criteria(criteria: Dict[str, Any]) -> Dict[str, Any]:
+    # Deux requêtes équivalentes ("Casablanca, Maarif" / "maarif casablanca", 2e6 / 2000000) -> même clé
+    normalized = {}
+    for key, value in criteria.items():
+        if value is None or value == [] or value == {}:
+            continue
+        if key in ("location", "preferred_location") and isinstance(value, str):
+            value = " ".join(sorted(set(location_tokens(value))))
+        elif key == "query" and isinstance(value, str):
+            value = " ".join(value.lower().split())
+        elif isinstance(value, bool):
+            pass
+        elif isinstance(value, (int, float)):
+            value = float(value)
+        normalized[key] = value
+    return normalized
+
+
+class _Entry:
+    __slots__ = ("payload", "version", "bucket", "predicate", "result_ids", "hits")
+
+    def __init__(self, payload, version, bucket, predicate, result_ids):
+        self.payload = payload
+        self.version = version
+        self.bucket = bucket
+        self.predicate = predicate
+        self.result_ids = result_ids
+        self.hits = 0
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.version: Any = None
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: Dict[str, Set[str]] = {}  # type de bien -> clés (filtre de premier niveau)
+        self._by_id: Dict[str, Set[str]] = {}  # property_id présent dans un résultat -> clés
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "invalidated": 0, "evicted": 0, "full_resets": 0}
+
+    @staticmethod
+    def make_key(kind: str, criteria: Dict[str, Any]) -> str:
+        blob = json.dumps({"kind": kind, **normalize_criteria(criteria)}, sort_keys=True, default=str)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def _sync_version(self, version: Any) -> None:
+        # Version d'inventaire inconnue (modification hors update_inventory): on ne sait pas
+        # quels biens ont changé -> remise à zéro complète
+        if version != self.version:
+            if self._entries:
+                self.metrics["full_resets"] += 1
+            self._entries.clear()
+            self._buckets.clear()
+            self._by_id.clear()
+            self.version = version
+
+    def get(self, key: str, version: Any) -> Optional[Any]:
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.metrics["hits"] += 1
+            return entry.payload
+
+    def put(
+        self,
+        key: str,
+        payload: Any,
+        version: Any,
+        bucket: Optional[str] = None,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        result_ids: Iterable[str] = (),
+    ) -> None:
+        # predicate(record) -> True si un bien ajouté / modifié pourrait entrer dans ce résultat;
+        # None = résultat indépendant de l'inventaire
+        with self._lock:
+            self._sync_version(version)
+            self._remove(key)
+            entry = _Entry(payload, version, bucket or ANY_BUCKET, predicate, {str(i) for i in result_ids})
+            self._entries[key] = entry
+            if predicate is not None:
+                self._buckets.setdefault(entry.bucket, set()).add(key)
+            for property_id in entry.result_ids:
+                self._by_id.setdefault(property_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.metrics["evicted"] += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._buckets.get(entry.bucket, set()).discard(key)
+        for property_id in entry.result_ids:
+            keys = self._by_id.get(property_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_id[property_id]
+
+    def apply_changes(
+        self,
+        changed_records: List[Dict[str, Any]],
+        removed_ids: Iterable[str],
+        new_version: Any,
+    ) -> int:
+        # Invalide uniquement les entrées touchées: résultat contenant un bien modifié / retiré,
+        # ou prédicat satisfait par un bien ajouté / modifié (candidats limités au bucket du type)
+        with self._lock:
+            stale: Set[str] = set()
+            for property_id in list(removed_ids) + [str(r.get("property_id")) for r in changed_records]:
+                stale |= self._by_id.get(str(property_id), set())
+            for record in changed_records:
+                for bucket in (record.get("type") or "", ANY_BUCKET):
+                    for key in self._buckets.get(bucket, ()):
+                        if key not in stale and self._entries[key].predicate(record):
+                            stale.add(key)
+            for key in stale:
+                self._remove(key)
+            self.metrics["invalidated"] += len(stale)
+            self.version = new_version
+            return len(stale)
+
+    def stats(self, top: int = 5) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            popular = sorted(self._entries.items(), key=lambda kv: -kv[1].hits)[:top]
+            return {
+                **self.metrics,
+                "entries": len(self._entries),
+                "hit_rate": round(self.metrics["hits"] / lookups, 4) if lookups else None,
+                "inventory_version": self.version,
+                "popular": [{"key": k[:12], "hits": e.hits, "version": e.version} for k, e in popular if e.hits],
+            }
@@ -0,0 +1,158 @@
+# =============================
+# scoring.py - Property Search & Recommendation Module
+# Score multi-critères vectorisé (matrice de features) + sélection top-k partielle
+# =============================
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from .inventory import location_tokens, haversine_km
+except ImportError:
+    from inventory import location_tokens, haversine_km
+
+
+CRITERIA = ("price_fit", "area", "location", "type_match", "interaction")
+DEFAULT_WEIGHTS = {"price_fit": 0.3, "area": 0.2, "location": 0.25, "type_match": 0.15, "interaction": 0.1}
+DISTANCE_SCALE_KM = 3.0  # rayon du lieu préféré quand le profil n'en donne pas (location_extent_km)
+
+
+def _column(records: Sequence[Dict[str, Any]], key: str) -> np.ndarray:
+    values = np.empty(len(records), dtype=np.float64)
+    for i, record in enumerate(records):
+        try:
+            values[i] = float(record.get(key))
+        except (TypeError, ValueError):
+            values[i] = np.nan
+    return values
+
+
+# =============================
+# Matrice des candidats (construite une fois, réutilisable pour plusieurs profils)
+# =============================
+class CandidateMatrix:
+    def __init__(self, records: Sequence[Dict[str, Any]], vectors: Optional[np.ndarray] = None):
+        self.records = records
+        self.size = len(records)
+        self.price = _column(records, "price")
+        self.area = _column(records, "area")
+        self.lat = _column(records, "latitude")
+        self.lon = _column(records, "longitude")
+        self.vectors = vectors
+        types = [str(r.get("type") or "") for r in records]
+        self.type_vocab = {t: i for i, t in enumerate(dict.fromkeys(types))}
+        self.type_code = np.fromiter((self.type_vocab[t] for t in types), dtype=np.int32, count=self.size)
+        # Jetons de localisation à plat (id de jeton, ligne) pour un recouvrement vectorisé
+        self.token_vocab: Dict[str, int] = {}
+        token_ids: List[int] = []
+        lengths = np.zeros(self.size, dtype=np.int64)
+        for i, record in enumerate(records):
+            tokens = set(location_tokens(" ".join(str(record.get(k) or "") for k in ("address", "city", "district"))))
+            lengths[i] = len(tokens)
+            token_ids.extend(self.token_vocab.setdefault(t, len(self.token_vocab)) for t in tokens)
+        self.token_ids = np.array(token_ids, dtype=np.int64)
+        self.token_rows = np.repeat(np.arange(self.size), lengths)
+
+    def location_overlap(self, location: Optional[str]) -> np.ndarray:
+        # Fraction des jetons de la localisation préférée présents dans l'adresse du bien
+        tokens = set(location_tokens(location))
+        if not tokens or not len(self.token_ids):
+            return np.zeros(self.size)
+        wanted = np.zeros(len(self.token_vocab), dtype=bool)
+        wanted[[self.token_vocab[t] for t in tokens if t in self.token_vocab]] = True
+        counts = np.bincount(self.token_rows[wanted[self.token_ids]], minlength=self.size)
+        return counts / len(tokens)
+
+
+# =============================
+# Scoring
+# =============================
+def feature_scores(
+    matrix: CandidateMatrix,
+    profile: Dict[str, Any],
+    interaction_vector: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    # Une colonne par critère, chaque score dans [0, 1]; calcul en mémoire contiguë par critère (C x n)
+    features = np.zeros((len(CRITERIA), matrix.size), dtype=np.float64)
+    budget = profile.get("budget")
+    if budget:
+        # Meilleur score autour de 90% du budget, décroissance linéaire, 0 au-delà du budget
+        fit = features[0]
+        np.multiply(matrix.price, 1.0 / float(budget), out=fit)
+        over_budget = ~(fit <= 1.0)
+        fit -= 0.9
+        np.abs(fit, out=fit)
+        np.multiply(fit, -1.0 / 0.6, out=fit)
+        fit += 1.0
+        np.maximum(fit, 0.0, out=fit)
+        fit[over_budget] = 0.0
+    target_area = profile.get("area") or profile.get("min_area")
+    if target_area:
+        np.minimum(matrix.area * (1.0 / float(target_area)), 1.0, out=features[1])
+    elif matrix.size:
+        # Sans surface cible: plus grand = mieux, relativement aux candidats
+        largest = np.nanmax(matrix.area) if np.isfinite(matrix.area).any() else 0.0
+        features[1] = matrix.area / largest if largest > 0 else 0.0
+    features[2] = matrix.location_overlap(profile.get("preferred_location") or profile.get("location"))
+    coordinates = profile.get("location_coordinates")
+    if coordinates:
+        # Score plein dans le rayon du lieu préféré (ville ou quartier), puis décroissance à la même échelle;
+        # combiné au recouvrement de jetons (une adresse qui cite le lieu garde son score)
+        extent = float(profile.get("location_extent_km") or DISTANCE_SCALE_KM)
+        distance = haversine_km(coordinates[0], coordinates[1], matrix.lat, matrix.lon)
+        located = np.isfinite(distance)
+        decay = np.exp(-np.maximum(distance[located] - extent, 0.0) / extent)
+        features[2][located] = np.maximum(features[2][located], decay)
+    preferred_type = profile.get("preferred_type") or profile.get("type")
+    if preferred_type in matrix.type_vocab:
+        features[3] = matrix.type_code == matrix.type_vocab[preferred_type]
+    if interaction_vector is not None and matrix.vectors is not None:
+        np.maximum(matrix.vectors @ interaction_vector.astype(matrix.vectors.dtype), 0.0, out=features[4])
+    features[np.isnan(features)] = 0.0
+    return features.T
+
+
+def normalize_weights(weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    merged = {**DEFAULT_WEIGHTS, **(weights or {})}
+    unknown = set(merged) - set(CRITERIA)
+    if unknown:
+        raise ValueError(f"Critères inconnus: {sorted(unknown)}")
+    w = np.array([max(float(merged[c]), 0.0) for c in CRITERIA])
+    return w / w.sum() if w.sum() else w
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # argpartition O(n) puis tri des k seuls gagnants
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64)
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def rank(
+    matrix: CandidateMatrix,
+    profile: Dict[str, Any],
+    k: int = 10,
+    weights: Optional[Dict[str, float]] = None,
+    interaction_vector: Optional[np.ndarray] = None,
+) -> List[Dict[str, Any]]:
+    w = normalize_weights(weights)
+    if interaction_vector is None or matrix.vectors is None:
+        # Pas d'historique exploitable: son poids est redistribué sur les autres critères
+        w[CRITERIA.index("interaction")] = 0.0
+        w = w / w.sum() if w.sum() else w
+    features = feature_scores(matrix, profile, interaction_vector)
+    scores = features @ w
+    best = top_k(scores, k)
+    contributions = features[best] * w  # explications uniquement pour les k retenus
+    return [
+        {
+            "index": int(i),
+            "score": round(float(scores[i]), 4),
+            "contributions": {c: round(float(v), 4) for c, v in zip(CRITERIA, row)},
+        }
+        for i, row in zip(best, contributions)
+    ]
@@ -2,15 +2,264 @@
 # tools.py - Property Search & Recommendation Module
 # =============================
 from agno.tools import tool
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
+import os
+import sys
+import threading
+
+import numpy as np
+
+try:
+    from .inventory import InventoryIndex
+    from .recommender import IVFIndex, ListingEncoder
+    from .scoring import CandidateMatrix, rank
+    from .profiles import get_profile_store
+    from .result_cache import ResultCache
+    from .inventory import location_tokens, haversine_km, points_in_polygon
+    from .pagination import decode_cursor, encode_cursor, keyset_page, keyset_start, sorted_order
+    from .alerts import get_alert_engine
+except ImportError:
+    from inventory import InventoryIndex
+    from recommender import IVFIndex, ListingEncoder
+    from scoring import CandidateMatrix, rank
+    from profiles import get_profile_store
+    from result_cache import ResultCache
+    from inventory import location_tokens, haversine_km, points_in_polygon
+    from pagination import decode_cursor, encode_cursor, keyset_page, keyset_start, sorted_order
+    from alerts import get_alert_engine
+
+try:
+    from ..common.feature_store import get_feature_store, records_from_table
+    from ..common.geo import get_gazetteer
+    from ..common.fulltext import analyze
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.feature_store import get_feature_store, records_from_table
+    from common.geo import get_gazetteer
+    from common.fulltext import analyze
+
+INVENTORY_CSV = os.path.join(os.path.dirname(__file__), "documents2", "candidate_properties.csv")
+# Sources du store qui forment l'inventaire de recherche (biens scrapés / extraits par module1 exclus)
+INVENTORY_SOURCES = ("documents2", "listing")
+SEARCH_COLUMNS = [
+    "property_id", "address", "city", "district", "price", "area", "type", "latitude", "longitude",
+    "description", "amenities",
+]
+EMBEDDING_COLUMNS = SEARCH_COLUMNS + ["bedrooms", "price_per_sqm"]
+
+_inventory_lock = threading.Lock()
+_inventory: Dict[str, Any] = {"index": None, "store_version": None, "seeded": False}
+_recommender: Dict[str, Any] = {"index": None, "store_version": None}
+_encoder = ListingEncoder()
+_result_cache = ResultCache()
+
+
+def seed_inventory() -> List[str]:
+    # Amorçage explicite: documents2 entre une seule fois dans le feature store (seed_file s'en souvient, même si
+    # ces biens sont retirés ensuite); vérifié une fois par processus
+    with _inventory_lock:
+        if _inventory["seeded"]:
+            return []
+        added = get_feature_store().seed_file(INVENTORY_CSV, source="documents2")
+        _inventory["seeded"] = True
+        return added
+
+
+def _inventory_store():
+    seed_inventory()
+    return get_feature_store()
+
+
+def _inventory_records(columns: List[str]) -> List[Dict[str, Any]]:
+    return records_from_table(get_feature_store().scan(columns, source=INVENTORY_SOURCES))
+
+
+def get_inventory() -> InventoryIndex:
+    # Index reconstruit seulement si le feature store a changé hors de ce module
+    store = _inventory_store()
+    with _inventory_lock:
+        if _inventory["index"] is None or _inventory["store_version"] != store.version:
+            index = InventoryIndex()
+            index.insert(_with_coordinates(_inventory_records(SEARCH_COLUMNS)))
+            index.rebuild()
+            _inventory.update(index=index, store_version=store.version)
+        return _inventory["index"]
+
+
+def _with_coordinates(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Biens enregistrés avant le géocodage du store: coordonnées approchées via le gazetteer
+    gazetteer = get_gazetteer()
+    for record in records:
+        if record.get("latitude") is None or record.get("longitude") is None:
+            lat, lon = gazetteer.geocode(record)
+            if lat is not None:
+                record.update(latitude=lat, longitude=lon)
+    return records
+
+
+def _location_coordinates(location: Optional[str]) -> Optional[List[float]]:
+    place = get_gazetteer().resolve(location)
+    return [place["lat"], place["lon"]] if place else None
+
+
+def _location_fields(location: Optional[str]) -> Dict[str, Any]:
+    # Centre et rayon du lieu préféré (ville ou quartier) pour le score de localisation
+    place = get_gazetteer().resolve(location)
+    if not place:
+        return {"location_coordinates": None, "location_extent_km": None}
+    return {"location_coordinates": [place["lat"], place["lon"]], "location_extent_km": place["extent_km"]}
+
+
+def get_recommender() -> IVFIndex:
+    # Index ANN des biens encodés, reconstruit seulement si le feature store a changé hors de ce module
+    store = _inventory_store()
+    with _inventory_lock:
+        if _recommender["index"] is None or _recommender["store_version"] != store.version:
+            index = IVFIndex(_encoder.dim)
+            _add_to_recommender(index, _inventory_records(EMBEDDING_COLUMNS))
+            index.build()
+            _recommender.update(index=index, store_version=store.version)
+        return _recommender["index"]
+
+
+def _add_to_recommender(index: IVFIndex, records: List[Dict[str, Any]]) -> None:
+    if records:
+        index.add(
+            [r["property_id"] for r in records],
+            _encoder.encode_listings(records),
+            prices=[r.get("price") for r in records],
+            types=[r.get("type") for r in records],
+        )
+
+
+def _interaction_vectors(interactions: List[Dict[str, Any]]):
+    # Bien déjà indexé -> son vecteur; sinon encodage du bien décrit dans l'interaction
+    index = get_recommender()
+    known = [str(i.get("property_id", i.get("id"))) for i in interactions]
+    vectors = index.vectors_for(known)
+    unknown = [i for i, pid in zip(interactions, known) if pid not in index.row_of and (i.get("price") or i.get("address"))]
+    if unknown:
+        vectors = np.concatenate([vectors, _encoder.encode_listings(unknown)])
+    return vectors
+
+
+def _interaction_event(interaction: Dict[str, Any]) -> tuple:
+    # (type, vecteur, features, timestamp) à partir d'un bien de l'inventaire ou décrit dans l'interaction
+    property_id = str(interaction.get("property_id", interaction.get("id")))
+    inventory = get_inventory()
+    if property_id in inventory.row_of:
+        features = inventory.records[inventory.row_of[property_id]]
+    else:
+        features = interaction
+    vectors = get_recommender().vectors_for([property_id])
+    vector = vectors[0] if len(vectors) else (
+        _encoder.encode_listings([features])[0] if features.get("price") or features.get("address") else None
+    )
+    timestamp = interaction.get("timestamp")
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp).timestamp()
+    return interaction.get("event", "view"), vector, features, timestamp
+
+
+def _inventory_version() -> Any:
+    get_inventory()
+    return _inventory["store_version"]
+
+
+def _search_predicate(location, property_type, max_price, min_area, center, radius_km, polygon, query):
+    # Un bien ajouté / modifié pourrait-il apparaître dans ce résultat ? (mêmes filtres que la recherche)
+    wanted_tokens = set(location_tokens(location)) if center is None and polygon is None else set()
+    wanted_terms = set(analyze(query)) if query else set()
+
+    def predicate(record: Dict[str, Any]) -> bool:
+        if property_type is not None and record.get("type") != property_type:
+            return False
+        if max_price is not None and not (record.get("price") is not None and record["price"] <= max_price):
+            return False
+        if min_area is not None and not (record.get("area") is not None and record["area"] >= min_area):
+            return False
+        if wanted_tokens and not wanted_tokens <= set(InventoryIndex._tokens(record)):
+            return False
+        lat, lon = record.get("latitude"), record.get("longitude")
+        if center is not None and (lat is None or haversine_km(center[0], center[1], lat, lon) > radius_km):
+            return False
+        if polygon is not None and (lat is None or not points_in_polygon(np.array([lat]), np.array([lon]), polygon)[0]):
+            return False
+        if wanted_terms and not wanted_terms & set(analyze(InventoryIndex._text(record))):
+            return False
+        return True
+
+    return predicate
+
+
+def _search_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    row = {k: v for k, v in record.items() if k in SEARCH_COLUMNS}
+    return {"id": row.pop("property_id"), **row}
+
+
+def _search_matches(index, location, property_type, max_price, min_area, center, radius_km, polygon, query):
+    # Lignes correspondantes + clé de tri croissante (None = ordre d'insertion):
+    # -score BM25 si texte libre, sinon distance au centre si rayon
+    spatial = center is not None or polygon is not None
+    rows = index.query(
+        location=None if spatial else location,
+        property_type=property_type,
+        max_price=max_price,
+        min_area=min_area,
+        near=(center[0], center[1], radius_km) if center else None,
+        polygon=polygon,
+    )
+    if query:
+        rows, scores = index.text_search(query, rows, k=None)
+        return rows, -scores
+    if center:
+        return rows, index.distances_km(rows, center[0], center[1])
+    return rows, None
+
+
+def _page_results(index, rows, key, center, query) -> List[Dict[str, Any]]:
+    results = []
+    distances = index.distances_km(rows, center[0], center[1]) if center else None
+    for i, row in enumerate(rows):
+        result = _search_row(index.records[row])
+        if query:
+            result["text_score"] = round(float(-key[i]), 4)
+        if center:
+            result["distance_km"] = round(float(distances[i]), 3)
+        results.append(result)
+    return results
+
+
+def _cursor_position(index, state: Optional[Dict[str, Any]]) -> Optional[Tuple[Optional[float], int]]:
+    # (clé, seq) du dernier bien renvoyé. Index reconstruit depuis (numéros d'insertion différents):
+    # reprise à partir du dernier bien, retrouvé par son id
+    if state is None:
+        return None
+    if state.get("g") == index.generation:
+        return state.get("p"), int(state["s"])
+    row = index.row_of.get(state.get("id"))
+    if row is None:
+        raise ValueError("Curseur expiré: l'inventaire a été reconstruit; relancez la recherche sans cursor")
+    return state.get("p"), int(index.seq[row])
+
+
+def _cursor_state(index, criteria_key: str, row: int, key_value) -> Dict[str, Any]:
+    return {
+        "k": criteria_key,
+        "g": index.generation,
+        "s": int(index.seq[row]),
+        "id": index.ids[row],
+        "p": None if key_value is None else float(key_value),
+    }
+
 
 # =============================
 # Tool 1: Search Properties (SearchQueryAgent)
 # =============================
 @tool(
     name="search_properties",
-    description="Recherche des biens immobiliers candidats à partir des critères utilisateur",
+    description="Recherche des biens immobiliers candidats à partir des critères utilisateur, une page de max_results à la fois (next_cursor à repasser dans cursor pour la page suivante); option: rayon en km autour du lieu ou polygone, tri par distance; query: texte libre classé par BM25",
     show_result=True,
 )
 def search_properties(
@@ -18,76 +267,398 @@ def search_properties(
     property_type: Optional[str] = "Appartement",
     max_price: Optional[float] = None,
     min_area: Optional[float] = None,
-    max_results: int = 10
+    max_results: int = 10,
+    radius_km: Optional[float] = None,
+    polygon: Optional[List[List[float]]] = None,
+    query: Optional[str] = None,
+    cursor: Optional[str] = None,
 ) -> Dict[str, Any]:
-    # Exemple simulé : liste de biens fictifs
-    sample_properties = [
-        {"id": 1, "address": f"Appartement {location} - Bourgogne", "price": 1800000, "area": 120, "type": "Appartement"},
-        {"id": 2, "address": f"Appartement {location} - Maarif", "price": 1147500, "area": 85, "type": "Appartement"},
-        {"id": 3, "address": f"Studio {location} - Gauthier", "price": 800000, "area": 50, "type": "Studio"},
-    ]
-    filtered = [
-        p for p in sample_properties
-        if (max_price is None or p["price"] <= max_price)
-        and (min_area is None or p["area"] >= min_area)
-        and (property_type is None or p["type"] == property_type)
-    ][:max_results]
+    version = _inventory_version()
+    criteria = {
+        "location": location, "property_type": property_type, "max_price": max_price, "min_area": min_area,
+        "radius_km": radius_km, "polygon": polygon, "query": query,
+    }
+    criteria_key = ResultCache.make_key("search", criteria)[:16]
+    state = decode_cursor(cursor, criteria_key) if cursor else None
+    cache_key = ResultCache.make_key("search", {**criteria, "max_results": max_results, "cursor": cursor})
+    cached = _result_cache.get(cache_key, version)
+    if cached is not None:
+        return {**cached, "cache": "hit", "searched_at": datetime.now().isoformat()}
 
-    return {
+    index = get_inventory()
+    # Rayon autour du lieu résolu par le gazetteer (ou polygone [[lat, lon], ...]) à la place
+    # de la correspondance textuelle sur l'adresse
+    center = _location_coordinates(location) if radius_km is not None else None
+    rows, key = _search_matches(index, location, property_type, max_price, min_area, center, radius_km, polygon, query)
+    # Pagination keyset: la page reprend après le dernier bien renvoyé (ordre total clé puis
+    # numéro d'insertion), sans décalage ni doublon si l'inventaire change entre deux pages
+    positions = keyset_page(index.seq[rows], max_results + 1, _cursor_position(index, state), key)
+    has_more = len(positions) > max_results
+    positions = positions[:max_results]
+    page_rows = rows[positions]
+    page_key = None if key is None else key[positions]
+    filtered = _page_results(index, page_rows, page_key, center, query)
+    next_cursor = None
+    if has_more:
+        last = len(page_rows) - 1
+        next_cursor = encode_cursor(
+            _cursor_state(index, criteria_key, page_rows[last], None if key is None else page_key[last])
+        )
+
+    payload = {
         "location": location,
-        "criteria": {"property_type": property_type, "max_price": max_price, "min_area": min_area},
+        "criteria": {
+            "property_type": property_type,
+            "max_price": max_price,
+            "min_area": min_area,
+            "radius_km": radius_km,
+            "center": center,
+            "polygon": polygon,
+            "query": query,
+        },
         "results": filtered,
-        "searched_at": datetime.now().isoformat(),
+        "total_results": int(len(rows)),
+        "next_cursor": next_cursor,
+        "inventory_version": version,
     }
+    _result_cache.put(
+        cache_key,
+        payload,
+        version,
+        bucket=property_type,
+        predicate=_search_predicate(location, property_type, max_price, min_area, center, radius_km, polygon, query),
+        result_ids=[r["id"] for r in filtered],
+    )
+    return {**payload, "cache": "miss", "searched_at": datetime.now().isoformat()}
+
+
+def iter_search_results(
+    location: str,
+    property_type: Optional[str] = "Appartement",
+    max_price: Optional[float] = None,
+    min_area: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    polygon: Optional[List[List[float]]] = None,
+    query: Optional[str] = None,
+    page_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+    # Parcours complet pour les traitements batch (hors agent, sans cache): seules les lignes
+    # correspondantes sont triées une fois, les résultats sont matérialisés page par page.
+    # Si l'inventaire change en cours de route, le tri est refait et le parcours reprend après
+    # le dernier bien produit.
+    center = _location_coordinates(location) if radius_km is not None else None
+    snapshot = None
+    after = None
+    while True:
+        index = get_inventory()
+        if snapshot is None or snapshot[0] is not index or snapshot[1] != index.version:
+            rows, key = _search_matches(
+                index, location, property_type, max_price, min_area, center, radius_km, polygon, query
+            )
+            seq = index.seq[rows]
+            order = sorted_order(seq, key)
+            rows, seq = rows[order], seq[order]
+            key = None if key is None else key[order]
+            if after is not None and snapshot is not None and snapshot[0] is not index:
+                after = _cursor_position(index, {"p": after[0], "id": after[2]})
+            position = keyset_start(seq, None if after is None else after[:2], key)
+            snapshot = (index, index.version, rows, seq, key)
+        _, _, rows, seq, key = snapshot
+        page_rows = rows[position : position + page_size]
+        if not len(page_rows):
+            return
+        page_key = None if key is None else key[position : position + page_size]
+        yield from _page_results(index, page_rows, page_key, center, query)
+        position += len(page_rows)
+        last = position - 1
+        after = (None if key is None else float(key[last]), int(seq[last]), index.ids[rows[last]])
 
 # =============================
 # Tool 2: Generate User Profile (UserPreferenceAgent)
 # =============================
 @tool(
     name="generate_user_profile",
-    description="Génère un vecteur de profil utilisateur à partir de préférences explicites",
+    description="Génère (ou met à jour, si user_id est fourni) le profil utilisateur persistant à partir des préférences explicites et des interactions",
     show_result=True,
 )
 def generate_user_profile(
     preferences: Dict[str, Any],
-    interactions: Optional[List[Dict[str, Any]]] = None
+    interactions: Optional[List[Dict[str, Any]]] = None,
+    user_id: Optional[str] = None,
 ) -> Dict[str, Any]:
-    profile = {
-        "budget": preferences.get("budget", 1000000),
-        "preferred_type": preferences.get("type", "Appartement"),
-        "preferred_location": preferences.get("location", "Casablanca"),
-        "interactions": interactions or [],
+    interactions = interactions or []
+    if user_id is None:
+        # Profil éphémère (sans historique persistant)
+        preferences = {"budget": 1000000, "type": "Appartement", "location": "Casablanca", **preferences}
+        vector = _encoder.encode_profile(preferences, _interaction_vectors(interactions) if interactions else None)
+        return {
+            "budget": preferences["budget"],
+            "preferred_type": preferences["type"],
+            "preferred_location": preferences["location"],
+            **_location_fields(preferences["location"]),
+            "interactions": interactions,
+            "profile_vector": [round(float(v), 5) for v in vector],
+            "generated_at": datetime.now().isoformat(),
+        }
+
+    # Profil persistant: préférences fusionnées, interactions repliées comme événements (O(1) chacune).
+    # Le vecteur reste dans le store: le résumé renvoyé garde une taille constante.
+    store = get_profile_store(_encoder.dim)
+    if preferences or not store.exists(user_id):
+        merged = {"budget": 1000000, "type": "Appartement", "location": "Casablanca"}
+        merged.update(store.get(user_id).preferences)
+        merged.update({k: v for k, v in preferences.items() if v is not None})
+        store.set_preferences(user_id, merged, _encoder.encode_profile(merged))
+    if interactions:
+        store.record_events(user_id, [_interaction_event(i) for i in interactions])
+    summary = store.get(user_id).summary()
+    return {
+        **summary,
+        **_location_fields(summary["preferred_location"]),
+        "updated_at": datetime.fromtimestamp(summary["updated_at"]).isoformat(),
         "generated_at": datetime.now().isoformat(),
     }
-    return profile
 
 # =============================
 # Tool 3: Recommend Properties (RecommendationEngineAgent)
 # =============================
 @tool(
     name="recommend_properties",
-    description="Recommande les propriétés les mieux adaptées au profil utilisateur",
+    description="Recommande les propriétés selon un score multi-critères pondéré (prix, surface, localisation, type, historique) avec le détail de chaque critère; recherche ANN filtrée sur l'inventaire si aucun candidat n'est fourni",
     show_result=True,
 )
 def recommend_properties(
-    candidate_properties: List[Dict[str, Any]],
+    candidate_properties: Optional[List[Dict[str, Any]]],
     user_profile: Dict[str, Any],
-    top_k: int = 3
+    top_k: int = 3,
+    weights: Optional[Dict[str, float]] = None,
+    nprobe: int = 8,
 ) -> Dict[str, Any]:
-    budget = user_profile.get("budget", float("inf"))
+    stored = None
+    if user_profile.get("user_id") is not None:
+        store = get_profile_store(_encoder.dim)
+        if store.exists(user_profile["user_id"]):
+            # Profil persistant: vecteur et historique lus dans le store, pas dans le prompt
+            stored = store.get(user_profile["user_id"])
+    version = _inventory_version()
+    # Clé: entrées + état du profil persistant (nombre d'événements, préférences)
+    cache_key = ResultCache.make_key("recommend", {
+        "candidates": candidate_properties, "user_profile": user_profile, "top_k": top_k, "weights": weights,
+        "nprobe": nprobe, "profile_events": stored.event_count if stored else None,
+        "profile_preferences": stored.preferences if stored else None,
+    })
+    cached = _result_cache.get(cache_key, version)
+    if cached is not None:
+        return {**cached, "cache": "hit", "recommended_at": datetime.now().isoformat()}
+    if stored is not None:
+        user_profile = {**stored.summary(), **{k: v for k, v in user_profile.items() if v is not None}}
+    budget = user_profile.get("budget")
     preferred_type = user_profile.get("preferred_type")
-    preferred_location = user_profile.get("preferred_location")
+    interactions = user_profile.get("interactions") or []
+    if not user_profile.get("location_coordinates"):
+        user_profile = {**user_profile, **_location_fields(user_profile.get("preferred_location"))}
+    interaction_vector = None
+    if stored is not None:
+        interaction_vector = stored.interaction_vector()
+    elif interactions:
+        vectors = _interaction_vectors(interactions)
+        if len(vectors):
+            interaction_vector = vectors.mean(axis=0)
+            interaction_vector /= np.linalg.norm(interaction_vector) or 1.0
 
-    filtered = [
-        p for p in candidate_properties
-        if p.get("price", float("inf")) <= budget
-        and (preferred_type is None or p.get("type") == preferred_type)
-        and (preferred_location is None or preferred_location in p.get("address", ""))
-    ]
-    sorted_props = sorted(filtered, key=lambda x: x.get("area", 0), reverse=True)[:top_k]
+    if candidate_properties:
+        # Candidats fournis par SearchQueryAgent: filtres stricts budget / type puis score multi-critères
+        candidates = _with_coordinates([
+            dict(p) for p in candidate_properties
+            if (budget is None or (p.get("price") or float("inf")) <= budget)
+            and (preferred_type is None or p.get("type") == preferred_type)
+        ])
+        vectors = _encoder.encode_listings(candidates) if interaction_vector is not None and candidates else None
+        search_stats = {"mode": "exact", "candidates": len(candidates)}
+    else:
+        # Sinon: pré-sélection ANN filtrée (budget, type) sur tout l'inventaire, puis re-classement
+        if stored is not None:
+            query = stored.vector()
+        elif user_profile.get("profile_vector"):
+            query = np.asarray(user_profile["profile_vector"], dtype=np.float32)
+        else:
+            query = _encoder.encode_profile(
+                {"budget": budget, "type": preferred_type, "location": user_profile.get("preferred_location")}
+            )
+        index = get_recommender()
+        inventory = get_inventory()
+        hits = index.search(query, max(20 * top_k, 100), nprobe=nprobe, max_price=budget, property_type=preferred_type)
+        ids = [pid for pid in hits["ids"] if pid in inventory.row_of]
+        candidates = [_search_row(inventory.records[inventory.row_of[pid]]) for pid in ids]
+        vectors = index.vectors_for(ids)
+        search_stats = {"mode": "ann", "probed_lists": hits["probed_lists"], "candidates": hits["candidates"]}
 
+    ranked = rank(CandidateMatrix(candidates, vectors), user_profile, top_k, weights, interaction_vector)
+    recommended = [{**candidates[r["index"]], "score": r["score"], "score_breakdown": r["contributions"]} for r in ranked]
+
+    payload = {
+        "recommended": recommended,
+        "user_profile": {k: v for k, v in user_profile.items() if k != "profile_vector"},
+        "search": search_stats,
+    }
+    # Candidats fournis: résultat indépendant de l'inventaire; sinon invalidé par un bien du bon type sous le budget
+    predicate = None
+    if not candidate_properties:
+        def predicate(record: Dict[str, Any]) -> bool:
+            return (preferred_type is None or record.get("type") == preferred_type) and (
+                budget is None or (record.get("price") is not None and record["price"] <= budget)
+            )
+    _result_cache.put(
+        cache_key, payload, version, bucket=preferred_type, predicate=predicate,
+        result_ids=[r.get("id") for r in recommended if r.get("id") is not None],
+    )
+    return {**payload, "cache": "miss", "recommended_at": datetime.now().isoformat()}
+
+
+# =============================
+# Tool 4: Update Inventory (SearchQueryAgent)
+# =============================
+@tool(
+    name="update_inventory",
+    description="Ajoute, met à jour ou retire des annonces de l'inventaire de recherche (mise à jour incrémentale)",
+    show_result=True,
+)
+def update_inventory(
+    new_listings: Optional[List[Dict[str, Any]]] = None,
+    removed_ids: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    store = get_feature_store()
+    index = get_inventory()
+    recommender = get_recommender()
+    with _inventory_lock:
+        added_ids = store.upsert(new_listings or [], source="listing") if new_listings else []
+        removed = store.delete([str(i) for i in removed_ids]) if removed_ids else 0
+        # Même normalisation que le store, puis insertion incrémentale dans l'index
+        changed = []
+        if added_ids:
+            changed = _with_coordinates(records_from_table(store.get(added_ids, SEARCH_COLUMNS)))
+            index.insert(changed)
+            _add_to_recommender(recommender, records_from_table(store.get(added_ids, EMBEDDING_COLUMNS)))
+        if removed_ids:
+            index.delete([str(i) for i in removed_ids])
+            recommender.delete([str(i) for i in removed_ids])
+        _inventory["store_version"] = _recommender["store_version"] = store.version
+        # Seules les entrées de cache touchées par ces biens sont invalidées
+        invalidated = _result_cache.apply_changes(changed, [str(i) for i in removed_ids or []], store.version)
+    # Biens nouveaux / modifiés confrontés aux recherches sauvegardées -> flux d'alertes
+    alerts = get_alert_engine().process(changed, listing_view=_search_row) if changed else 0
     return {
-        "recommended": sorted_props,
-        "user_profile": user_profile,
-        "recommended_at": datetime.now().isoformat(),
-    }
\ No newline at end of file
+        "added_ids": added_ids,
+        "removed_count": removed,
+        "inventory_size": len(index),
+        "cache_entries_invalidated": invalidated,
+        "alerts_emitted": alerts,
+        "updated_at": datetime.now().isoformat(),
+    }
+
+
+# =============================
+# Tool 5: Record Interaction (UserPreferenceAgent)
+# =============================
+@tool(
+    name="record_interaction",
+    description="Enregistre une interaction utilisateur (view, save, reject, contact...) et met à jour son profil persistant de façon incrémentale",
+    show_result=True,
+)
+def record_interaction(
+    user_id: str,
+    property_id: str,
+    event: str = "view",
+    listing: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    event, vector, features, timestamp = _interaction_event({**(listing or {}), "property_id": property_id, "event": event})
+    profile = get_profile_store(_encoder.dim).record_event(user_id, event, vector, features, timestamp)
+    summary = profile.summary()
+    return {**summary, "updated_at": datetime.fromtimestamp(summary["updated_at"]).isoformat()}
+
+
+# =============================
+# Tool 6: Search Cache Stats (SearchQueryAgent)
+# =============================
+@tool(
+    name="search_cache_stats",
+    description="Statistiques du cache de résultats de recherche / recommandation (taux de succès, invalidations, requêtes populaires)",
+    show_result=True,
+)
+def search_cache_stats() -> Dict[str, Any]:
+    return {**_result_cache.stats(), "collected_at": datetime.now().isoformat()}
+
+
+# =============================
+# Tool 7: Save Search (UserPreferenceAgent)
+# =============================
+@tool(
+    name="save_search",
+    description="Enregistre une recherche pour un utilisateur: il sera alerté dès qu'un bien correspondant est ajouté à l'inventaire (option: rayon en km autour du lieu)",
+    show_result=True,
+)
+def save_search(
+    user_id: str,
+    location: Optional[str] = None,
+    property_type: Optional[str] = "Appartement",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_area: Optional[float] = None,
+    max_area: Optional[float] = None,
+    radius_km: Optional[float] = None,
+) -> Dict[str, Any]:
+    center = _location_coordinates(location) if radius_km is not None else None
+    if radius_km is not None and center is None:
+        raise ValueError(f"Lieu introuvable pour une recherche par rayon: {location!r}")
+    criteria = {
+        "location": location,
+        "property_type": property_type,
+        "min_price": min_price,
+        "max_price": max_price,
+        "min_area": min_area,
+        "max_area": max_area,
+        "radius_km": radius_km,
+        "latitude": center[0] if center else None,
+        "longitude": center[1] if center else None,
+    }
+    engine = get_alert_engine()
+    search_id = engine.save(user_id, criteria)
+    return {
+        "search_id": search_id,
+        "user_id": user_id,
+        "criteria": {k: v for k, v in criteria.items() if v is not None},
+        "saved_searches": len(engine.searches(user_id)),
+        "saved_at": datetime.now().isoformat(),
+    }
+
+
+# =============================
+# Tool 8: Delete Saved Search (UserPreferenceAgent)
+# =============================
+@tool(
+    name="delete_saved_search",
+    description="Supprime une recherche sauvegardée (plus aucune alerte pour elle)",
+    show_result=True,
+)
+def delete_saved_search(search_id: str) -> Dict[str, Any]:
+    return {"search_id": search_id, "deleted": get_alert_engine().delete(search_id)}
+
+
+# =============================
+# Tool 9: Alert Feed (UserPreferenceAgent)
+# =============================
+@tool(
+    name="get_alert_feed",
+    description="Flux des nouveaux biens correspondant aux recherches sauvegardées, lu par lots (repasser next_after_id pour la suite)",
+    show_result=True,
+)
+def get_alert_feed(user_id: Optional[str] = None, after_id: int = 0, limit: int = 50) -> Dict[str, Any]:
+    alerts = get_alert_engine().feed(user_id, after_id, limit)
+    for alert in alerts:
+        alert["matched_at"] = datetime.fromtimestamp(alert["matched_at"]).isoformat()
+    return {
+        "user_id": user_id,
+        "alerts": alerts,
+        "next_after_id": alerts[-1]["alert_id"] if alerts else after_id,
+        "retrieved_at": datetime.now().isoformat(),
+    }
@@ -0,0 +1,237 @@
+# =============================
+# aggregation.py - Market Analysis Module
+# Moteur d'agrégation vectorisé (pandas / Arrow): prix, prix au m², délais de vente, stock par région × type × mois
+# =============================
+import ast
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .sketches import SketchTable
+except ImportError:
+    from sketches import SketchTable
+
+
+DOCUMENTS_DIR = os.path.join(os.path.dirname(__file__), "documents3")
+DEFAULT_MARKET_FILE = os.path.join(DOCUMENTS_DIR, "market_data.json")
+
+# Alias rencontrés dans les flux de marché (documents3, exports portails, historiques de ventes)
+MARKET_ALIASES = {
+    "region": ("region", "location", "city"),
+    "property_type": ("property_type", "type"),
+    "price": ("price", "sale_price", "list_price", "total_price"),
+    "area": ("area", "surface", "area_sqm"),
+    "date": ("date", "sale_date", "sold_date", "listed_date", "listing_date"),
+    "listed_date": ("listed_date", "listing_date", "listed_at"),
+    "sold_date": ("sold_date", "sale_date", "sold_at"),
+    "days_on_market": ("days_on_market", "dom"),
+    "status": ("status", "listing_status"),
+    "property_id": ("property_id", "listing_id", "property_ref", "parcel_id"),
+}
+GROUP_KEYS = ("region", "property_type", "month")
+ACTIVE_STATUSES = ("active", "listed", "for_sale", "en_vente", "disponible")
+UNKNOWN = "Inconnu"
+SKETCH_METRICS = ("price", "price_per_sqm")  # sketches de quantiles sérialisés (colonnes <métrique>_sketch)
+
+
+# =============================
+# Lecture
+# =============================
+def read_market_file(path: str) -> pd.DataFrame:
+    # JSON (tableau, éventuellement au format repr Python comme documents3), JSON Lines, CSV, Parquet
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        return pd.read_parquet(path)
+    if extension == ".csv":
+        return pd.read_csv(path)
+    if extension in (".jsonl", ".ndjson"):
+        return pd.read_json(path, lines=True)
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        rows = json.loads(text)
+    except json.JSONDecodeError:
+        rows = ast.literal_eval(text)
+    return pd.DataFrame.from_records(rows)
+
+
+def _column(frame: pd.DataFrame, field: str) -> Optional[pd.Series]:
+    # Première colonne non vide parmi les alias, complétée par les suivantes
+    found = None
+    for alias in MARKET_ALIASES.get(field, (field,)):
+        if alias in frame.columns:
+            found = frame[alias] if found is None else found.fillna(frame[alias])
+    return found
+
+
+def _to_datetime(values: pd.Series) -> pd.Series:
+    # ISO 8601 en une passe vectorisée; seules les valeurs restantes passent par le parseur générique
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return parsed
+
+
+def _month_codes(dates: pd.Series) -> np.ndarray:
+    # Mois en entier (année × 12 + mois - 1), -1 si date absente / invalide
+    parsed = _to_datetime(dates)
+    codes = (parsed.dt.year * 12 + parsed.dt.month - 1).to_numpy(dtype=np.float64)
+    return np.where(np.isnan(codes), -1, codes).astype(np.int32)
+
+
+def month_label(code: int) -> Optional[str]:
+    return None if code < 0 else f"{code // 12:04d}-{code % 12 + 1:02d}"
+
+
+def normalize_market_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    # Colonnes canoniques: region / property_type (catégories), month (entier), price, area,
+    # price_per_sqm, days_on_market, active (bien encore en vente), property_id (catégorie, vide si absent)
+    n_rows = len(frame)
+
+    def numbers(field: str) -> np.ndarray:
+        column = _column(frame, field)
+        if column is None:
+            return np.full(n_rows, np.nan)
+        return pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64)
+
+    def labels(field: str) -> pd.Categorical:
+        column = _column(frame, field)
+        if column is None:
+            return pd.Categorical(np.full(n_rows, UNKNOWN))
+        # Nettoyage sur les catégories (quelques dizaines) plutôt que sur chaque ligne
+        categorical = pd.Categorical(column)
+        cleaned = pd.Index(categorical.categories.astype(str).str.strip())
+        codes = categorical.codes
+        categories = cleaned.unique().append(pd.Index([UNKNOWN])).unique()
+        remap = np.append(categories.get_indexer(cleaned), categories.get_loc(UNKNOWN))
+        return pd.Categorical.from_codes(remap[codes], categories=categories)
+
+    price, area = numbers("price"), numbers("area")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_per_sqm = np.where(area > 0, price / area, np.nan)
+
+    days = numbers("days_on_market")
+    listed, sold = _column(frame, "listed_date"), _column(frame, "sold_date")
+    if listed is not None and sold is not None:
+        # Délai déduit des dates d'annonce et de vente quand il n'est pas fourni
+        elapsed = (_to_datetime(sold) - _to_datetime(listed)).dt.days.to_numpy(dtype=np.float64)
+        days = np.where(np.isnan(days), elapsed, days)
+
+    # Une seule règle: sans statut (colonne absente, NaN ou vide), la ligne compte comme une offre observée.
+    # Un fichier lu par blocs dont certains n'ont aucun statut donne ainsi le même inventaire qu'une lecture complète.
+    status = _column(frame, "status")
+    if status is None:
+        active = np.ones(n_rows, dtype=bool)
+    else:
+        categorical = pd.Categorical(status)
+        names = categorical.categories.astype(str).str.strip().str.lower()
+        flags = names.isin(ACTIVE_STATUSES) | (names == "")
+        active = np.append(flags, True)[categorical.codes]
+
+    # Identifiant du bien (ventes répétées): NaN si absent; les identifiants numériques deviennent des chaînes
+    ids = _column(frame, "property_id")
+    if ids is None:
+        property_id = pd.Categorical.from_codes(np.full(n_rows, -1, dtype=np.int8), categories=pd.Index([], dtype=object))
+    else:
+        codes, uniques = pd.factorize(ids)
+        uniques = pd.Index(uniques)
+        if pd.api.types.is_float_dtype(uniques) and (uniques == np.round(uniques)).all():
+            uniques = uniques.astype(np.int64)  # identifiants entiers lus en flottants à cause des NaN
+        cleaned = pd.Index(uniques.astype(str).str.strip())
+        categories = cleaned.unique()
+        remap = np.append(categories.get_indexer(cleaned), -1)
+        property_id = pd.Categorical.from_codes(remap[codes], categories=categories)
+
+    dates = _column(frame, "date")
+    return pd.DataFrame(
+        {
+            "region": labels("region"),
+            "property_type": labels("property_type"),
+            "month": _month_codes(dates) if dates is not None else np.full(n_rows, -1, dtype=np.int32),
+            "price": price,
+            "area": area,
+            "price_per_sqm": price_per_sqm,
+            "days_on_market": days,
+            "active": active,
+            "property_id": property_id,
+        }
+    )
+
+
+def resolve_market_path(path: Optional[str] = None) -> str:
+    # Chemin absolu / relatif au répertoire courant, sinon relatif à documents3
+    if path is None:
+        return DEFAULT_MARKET_FILE
+    return path if os.path.isabs(path) or os.path.exists(path) else os.path.join(DOCUMENTS_DIR, path)
+
+
+def load_market_frame(
+    source: Union[None, str, pd.DataFrame, Iterable[Dict[str, Any]]] = None,
+) -> pd.DataFrame:
+    # Liste de dicts (tool), DataFrame ou chemin de fichier -> frame normalisée
+    if source is None or isinstance(source, str):
+        frame = read_market_file(resolve_market_path(source))
+    elif isinstance(source, pd.DataFrame):
+        frame = source
+    else:
+        frame = pd.DataFrame.from_records(list(source))
+    return normalize_market_frame(frame)
+
+
+# =============================
+# Agrégation
+# =============================
+def check_group_by(group_by: Sequence[str]) -> None:
+    if not group_by:
+        raise ValueError(f"Au moins une clé de regroupement est requise (parmi {GROUP_KEYS})")
+    unknown = set(group_by) - set(GROUP_KEYS)
+    if unknown:
+        raise ValueError(f"Clés de regroupement inconnues: {sorted(unknown)} (attendu: {GROUP_KEYS})")
+
+
+def aggregate_market(frame: pd.DataFrame, group_by: Sequence[str] = GROUP_KEYS, sketches: bool = False) -> pd.DataFrame:
+    # Une passe groupby (clés catégorielles / entières, agrégations cython) sur toute la frame; sketches:
+    # sketches de quantiles sérialisés par groupe, comme MarketAccumulator.result (médianes restant exactes)
+    check_group_by(group_by)
+    grouped = frame.groupby(list(group_by), observed=True, sort=True)
+    result = grouped.agg(
+        count=("price", "size"),
+        median_price=("price", "median"),
+        mean_price=("price", "mean"),
+        median_price_per_sqm=("price_per_sqm", "median"),
+        mean_price_per_sqm=("price_per_sqm", "mean"),
+        median_days_on_market=("days_on_market", "median"),
+        mean_days_on_market=("days_on_market", "mean"),
+        inventory=("active", "sum"),
+    ).reset_index()
+    if sketches:
+        codes = grouped.ngroup().to_numpy()
+        for metric in SKETCH_METRICS:
+            values = frame[metric].to_numpy(dtype=np.float64)
+            ok = ~np.isnan(values) & (codes >= 0)
+            table = SketchTable()
+            table.add(codes[ok], values[ok])
+            bounds = grouped[metric].agg(["min", "max"])
+            result[f"{metric}_sketch"] = table.encode(
+                np.arange(len(result)), bounds["min"].to_numpy(), bounds["max"].to_numpy()
+            )
+    for column in ("region", "property_type"):
+        if column in result:
+            result[column] = result[column].astype(str)
+    return result
+
+
+def groups_to_records(groups: pd.DataFrame, decimals: int = 2) -> List[Dict[str, Any]]:
+    # Sortie tool: mois en "AAAA-MM", NaN -> None, nombres arrondis
+    groups = groups.round(decimals)
+    if "month" in groups:
+        groups = groups.assign(month=[month_label(int(m)) for m in groups["month"]])
+    groups = groups.astype(object).where(groups.notna(), None)
+    return groups.to_dict(orient="records")
@@ -0,0 +1,293 @@
+# =============================
+# charts.py - Market Analysis Module
+# Graphiques des rapports (altair -> HTML dans reports3): cache par empreinte données + spec, LTTB, rendu en tâche de fond
+# =============================
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import altair as alt
+import numpy as np
+import pandas as pd
+from agno.utils.log import log_warning
+
+
+REPORTS_DIR = os.getenv("MARKET_REPORTS_DIR", os.path.join(os.path.dirname(__file__), "reports3"))
+MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "400"))  # points par série après sous-échantillonnage
+MAX_CACHED_CHARTS = int(os.getenv("CHART_CACHE_MAX", "500"))
+MAX_SERIES = 8
+MAX_SEGMENTS = 20
+CHART_KINDS = ("trend", "forecast", "segments", "dashboard")
+SPEC_VERSION = "1"  # à incrémenter quand une spec change: invalide les rendus en cache
+
+
+# =============================
+# Sous-échantillonnage LTTB
+# =============================
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int = MAX_POINTS) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: indices des points conservés (premier et dernier inclus). Chaque tranche
+    # garde le point formant le plus grand triangle avec le point retenu avant et la moyenne de la tranche suivante.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(frame: pd.DataFrame, x: str, y: str, by: Optional[str] = None, threshold: int = MAX_POINTS) -> pd.DataFrame:
+    # LTTB série par série (colonne by); x trié, valeurs manquantes de y écartées
+    parts = []
+    for _, series in (frame.groupby(by, sort=False) if by else [(None, frame)]):
+        series = series[series[y].notna()].sort_values(x)
+        axis = series[x].to_numpy()
+        axis = axis.astype("datetime64[s]").astype(np.int64) if np.issubdtype(axis.dtype, np.datetime64) else axis
+        parts.append(series.iloc[lttb(axis, series[y].to_numpy(), threshold)])
+    return pd.concat(parts, ignore_index=True) if parts else frame.iloc[:0]
+
+
+# =============================
+# Specs altair
+# =============================
+def _months(labels: Sequence[str]) -> pd.Series:
+    return pd.to_datetime(pd.Series(labels, dtype=object).str[:7], format="%Y-%m")
+
+
+def trend_chart(history: pd.DataFrame) -> alt.Chart:
+    # history: month, price, series
+    return (
+        alt.Chart(downsample(history, "month", "price", "series"))
+        .mark_line(point=len(history) <= 60)
+        .encode(
+            x=alt.X("month:T", title="Mois"),
+            y=alt.Y("price:Q", title="Prix médian (MAD)", scale=alt.Scale(zero=False)),
+            color=alt.Color("series:N", title="Segment"),
+            tooltip=[alt.Tooltip("series:N"), alt.Tooltip("month:T", format="%Y-%m"), alt.Tooltip("price:Q", format=",.0f")],
+        )
+        .properties(title="Évolution des prix", width=640, height=280)
+    )
+
+
+def forecast_chart(forecast: pd.DataFrame, history: Optional[pd.DataFrame] = None) -> alt.LayerChart:
+    # forecast: month, forecast_price, lower, upper; history (optionnel): month, price
+    base = alt.Chart(forecast).encode(x=alt.X("month:T", title="Mois"))
+    band = base.mark_area(opacity=0.25, color="#4c78a8").encode(
+        y=alt.Y("lower:Q", title="Prix (MAD)", scale=alt.Scale(zero=False)), y2="upper:Q"
+    )
+    line = base.mark_line(color="#4c78a8", strokeDash=[6, 3]).encode(
+        y="forecast_price:Q",
+        tooltip=[
+            alt.Tooltip("month:T", format="%Y-%m"),
+            alt.Tooltip("forecast_price:Q", format=",.0f"),
+            alt.Tooltip("lower:Q", format=",.0f"),
+            alt.Tooltip("upper:Q", format=",.0f"),
+        ],
+    )
+    layers = [band, line]
+    if history is not None and len(history):
+        observed = alt.Chart(downsample(history, "month", "price")).mark_line(color="#333333").encode(
+            x="month:T", y="price:Q", tooltip=[alt.Tooltip("month:T", format="%Y-%m"), alt.Tooltip("price:Q", format=",.0f")]
+        )
+        layers.insert(0, observed)
+    return alt.layer(*layers).properties(title="Prévision du marché et intervalle", width=640, height=280)
+
+
+def segment_chart(segments: pd.DataFrame) -> alt.LayerChart:
+    # segments: segment, forecast_price, lower, upper (fin d'horizon)
+    order = alt.SortField("forecast_price", order="descending")
+    bars = alt.Chart(segments).mark_bar(color="#72b7b2").encode(
+        y=alt.Y("segment:N", sort=order, title=None),
+        x=alt.X("forecast_price:Q", title="Prix prévu en fin d'horizon (MAD)"),
+        tooltip=[
+            alt.Tooltip("segment:N"),
+            alt.Tooltip("forecast_price:Q", format=",.0f"),
+            alt.Tooltip("lower:Q", format=",.0f"),
+            alt.Tooltip("upper:Q", format=",.0f"),
+        ],
+    )
+    errors = alt.Chart(segments).mark_rule(color="#333333").encode(
+        y=alt.Y("segment:N", sort=order), x="lower:Q", x2="upper:Q"
+    )
+    return alt.layer(bars, errors).properties(title="Comparaison des segments", width=640, height=18 * max(len(segments), 4))
+
+
+# =============================
+# Cache et rendu en tâche de fond
+# =============================
+def view_key(*inputs: Any) -> str:
+    # Empreinte des entrées brutes d'un tool: une vue répétée évite même la préparation des tables. Mémo en
+    # mémoire seulement (pickle dépend de l'ordre des clés: au pire un raté, rattrapé par chart_key)
+    return hashlib.sha256(pickle.dumps((SPEC_VERSION, inputs), protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()[:20]
+
+
+def chart_key(kind: str, frames: Dict[str, Optional[pd.DataFrame]], options: Optional[Dict[str, Any]] = None) -> str:
+    # Empreinte des données (hash pandas ligne par ligne), des colonnes, des options et de la version des specs
+    digest = hashlib.sha256(f"{SPEC_VERSION}|{kind}|{sorted((options or {}).items())!r}".encode())
+    for name in sorted(frames):
+        frame = frames[name]
+        digest.update(f"|{name}:".encode())
+        if frame is not None:
+            digest.update(repr(list(frame.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:20]
+
+
+class ChartRenderer:
+    # Un fichier par (type, empreinte): une vue répétée relit le HTML existant sans rien recalculer.
+    # Les rendus absents partent dans un thread; deux demandes identiques partagent le même rendu.
+    def __init__(self, directory: str = REPORTS_DIR, workers: int = 2):
+        self.directory = directory
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reports3")
+        self._pending: Dict[str, Future] = {}
+        self._views: "OrderedDict[str, List[tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, f"{kind}-{key}.html")
+
+    def cached_view(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        # Graphiques d'une vue déjà demandée, si tous ses rendus sont encore sur disque
+        with self._lock:
+            charts = self._views.get(key)
+            if charts is None or not all(os.path.exists(self.path(kind, k)) for kind, k in charts):
+                return None
+            self._views.move_to_end(key)
+        return [{"kind": kind, "path": self.path(kind, k), "status": "cached"} for kind, k in charts]
+
+    def remember_view(self, key: str, charts: List[tuple]) -> None:
+        with self._lock:
+            self._views[key] = charts
+            while len(self._views) > MAX_CACHED_CHARTS:
+                self._views.popitem(last=False)
+
+    def submit(self, kind: str, key: str, build: Callable[[], alt.TopLevelMixin]) -> Dict[str, Any]:
+        path = self.path(kind, key)
+        with self._lock:
+            if os.path.exists(path):
+                return {"kind": kind, "path": path, "status": "cached"}
+            future = self._pending.get(path)
+            if future is None:
+                future = self._pending[path] = self._executor.submit(self._render, path, build)
+        return {"kind": kind, "path": path, "status": "rendering", "future": future}
+
+    def _render(self, path: str, build: Callable[[], alt.TopLevelMixin]) -> str:
+        try:
+            html = build().to_html()
+            os.makedirs(self.directory, exist_ok=True)
+            partial = f"{path}.{threading.get_ident()}.tmp"
+            with open(partial, "w", encoding="utf-8") as handle:
+                handle.write(html)
+            os.replace(partial, path)  # jamais de fichier partiel servi comme rendu en cache
+            self._prune()
+            return path
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def _prune(self) -> None:
+        # Au-delà de CHART_CACHE_MAX rendus, suppression des moins récemment écrits
+        entries = [
+            e for e in os.scandir(self.directory)
+            if e.name.endswith(".html") and e.name.split("-", 1)[0] in CHART_KINDS
+        ]
+        if len(entries) <= MAX_CACHED_CHARTS:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[: len(entries) - MAX_CACHED_CHARTS]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def wait(self, charts: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        # Attend les rendus lancés; statut "ready" ou "failed" (erreur journalisée)
+        for chart in charts:
+            future = chart.pop("future", None)
+            if future is None:
+                continue
+            try:
+                future.result(timeout)
+                chart["status"] = "ready"
+            except Exception as error:
+                log_warning(f"Rendu du graphique {chart['path']} impossible: {error}")
+                chart["status"], chart["error"] = "failed", str(error)
+        return charts
+
+
+_shared_renderer: Optional[ChartRenderer] = None
+_shared_lock = threading.Lock()
+
+
+def get_chart_renderer() -> ChartRenderer:
+    global _shared_renderer
+    with _shared_lock:
+        if _shared_renderer is None:
+            _shared_renderer = ChartRenderer()
+        return _shared_renderer
+
+
+# =============================
+# Tables des graphiques à partir des sorties des tools
+# =============================
+def forecast_table(predictions: List[Dict[str, Any]]) -> Optional[pd.DataFrame]:
+    # future_market_predictions -> month, forecast_price, lower, upper (bornes lower_XX / upper_XX)
+    if not predictions:
+        return None
+    frame = pd.DataFrame.from_records(predictions)
+    lower = next((c for c in frame.columns if c.startswith("lower_")), "forecast_price")
+    upper = next((c for c in frame.columns if c.startswith("upper_")), "forecast_price")
+    return pd.DataFrame(
+        {"month": _months(frame["month"]), "forecast_price": frame["forecast_price"],
+         "lower": frame[lower], "upper": frame[upper]}
+    )
+
+
+def segment_table(segment_forecasts: List[Dict[str, Any]], segment_by: Sequence[str]) -> Optional[pd.DataFrame]:
+    # Dernier mois prévu de chaque segment (MAX_SEGMENTS premiers, déjà triés par historique)
+    rows = []
+    for record in segment_forecasts[:MAX_SEGMENTS]:
+        if not record.get("forecast"):
+            continue
+        last = record["forecast"][-1]
+        bounds = [v for k, v in last.items() if k.startswith(("lower_", "upper_"))]
+        rows.append(
+            {
+                "segment": " / ".join(str(record.get(k)) for k in segment_by) or "marché",
+                "forecast_price": last["forecast_price"],
+                "lower": min(bounds, default=last["forecast_price"]),
+                "upper": max(bounds, default=last["forecast_price"]),
+            }
+        )
+    return pd.DataFrame(rows) if rows else None
+
+
+def history_table(panel: Any) -> Optional[pd.DataFrame]:
+    # MarketPanel -> month, price, series (les MAX_SERIES segments les plus actifs)
+    if not len(panel.segments):
+        return None
+    top = np.argsort(-panel.counts.sum(axis=1), kind="stable")[:MAX_SERIES]
+    n_months = panel.values.shape[1]
+    codes = panel.first_month + np.arange(n_months)
+    months = pd.to_datetime({"year": codes // 12, "month": codes % 12 + 1, "day": 1})
+    frame = pd.DataFrame(
+        {
+            "month": np.tile(months.to_numpy(), len(top)),
+            "price": panel.values[top].ravel(),
+            "series": np.repeat([" / ".join(map(str, panel.segments[i])) or "marché" for i in top], n_months),
+        }
+    )
+    return frame[frame["price"].notna()].reset_index(drop=True)
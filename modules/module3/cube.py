@@ -0,0 +1,238 @@
+# =============================
+# cube.py - Market Analysis Module
+# Cube de marché matérialisé région × type × mois (SQLite): mise à jour incrémentale, roll-up / drill-down
+# =============================
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .aggregation import GROUP_KEYS, check_group_by, month_label, normalize_market_frame, resolve_market_path
+    from .sketches import unpack_groups
+    from .streaming import CHUNK_ROWS, METRICS, MarketAccumulator, iter_market_chunks
+    from .trends import month_code
+except ImportError:
+    from aggregation import GROUP_KEYS, check_group_by, month_label, normalize_market_frame, resolve_market_path
+    from sketches import unpack_groups
+    from streaming import CHUNK_ROWS, METRICS, MarketAccumulator, iter_market_chunks
+    from trends import month_code
+
+
+DEFAULT_CUBE_DB_PATH = os.getenv(
+    "MARKET_CUBE_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "cube", "market_cube.sqlite"),
+)
+QUERY_QUANTILES = (0.25, 0.75)
+QUERY_CACHE_SIZE = 256
+def _as_set(value: Union[None, str, Iterable[str]]) -> Optional[set]:
+    if value is None:
+        return None
+    return {value} if isinstance(value, str) else set(value)
+
+
+class MarketCube:
+    # Une cellule par (région, type, mois): compte, stock, sommes, min / max et sketches de quantiles des
+    # métriques (fusionnables: un roll-up additionne les cellules). Seules les cellules touchées par un lot sont
+    # réécrites.
+    def __init__(self, path: str = DEFAULT_CUBE_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cube_cells (
+                region TEXT NOT NULL,
+                property_type TEXT NOT NULL,
+                month INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                inventory INTEGER NOT NULL,
+                sums BLOB NOT NULL,
+                observed BLOB NOT NULL,
+                lows BLOB NOT NULL,
+                highs BLOB NOT NULL,
+                sketches BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (region, property_type, month)
+            )
+            """
+        )
+        self.conn.commit()
+        self.cells = MarketAccumulator(GROUP_KEYS)
+        self.version = 0
+        self._cache: Dict[Tuple, pd.DataFrame] = {}
+        self._key_arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._load()
+
+    # -----------------------------
+    # Persistance
+    # -----------------------------
+    def _load(self) -> None:
+        rows = self.conn.execute(
+            "SELECT region, property_type, month, count, inventory, sums, observed, lows, highs, sketches "
+            "FROM cube_cells"
+        ).fetchall()
+        if not rows:
+            return
+        cells = self.cells
+        ids = cells._group_ids([(r, t, int(m)) for r, t, m, *_ in rows])
+        blobs = []
+        for gid, (_, _, _, count, inventory, sums, observed, lows, highs, sketches) in zip(ids, rows):
+            cells.counts[gid], cells.inventory[gid] = count, inventory
+            cells.sums[gid] = np.frombuffer(sums, dtype=np.float64)
+            cells.observed[gid] = np.frombuffer(observed, dtype=np.int64)
+            cells.lows[gid] = np.frombuffer(lows, dtype=np.float64)
+            cells.highs[gid] = np.frombuffer(highs, dtype=np.float64)
+            blobs.append(sketches)
+        # Sketches creux des métriques (seaux, comptes en varint) concaténés dans une colonne par cellule
+        for metric, (blob, buckets, counts) in zip(METRICS, unpack_groups(blobs, len(METRICS))):
+            cells.sketches[metric].add_buckets(ids[blob], buckets, counts)
+        cells.rows = int(cells.counts[: len(cells)].sum())
+
+    def _persist(self, touched: np.ndarray) -> None:
+        # UPSERT des seules cellules modifiées, en une transaction
+        cells, now = self.cells, time.time()
+        touched = np.unique(touched)
+        packed = [cells.sketches[m].pack(touched) for m in METRICS]
+        payload = []
+        for i, gid in enumerate(touched):
+            region, property_type, month = cells.keys[gid]
+            payload.append(
+                (
+                    region, property_type, int(month), int(cells.counts[gid]), int(cells.inventory[gid]),
+                    cells.sums[gid].tobytes(), cells.observed[gid].tobytes(), cells.lows[gid].tobytes(),
+                    cells.highs[gid].tobytes(), b"".join(p[i] for p in packed), now,
+                )
+            )
+        self.conn.executemany("INSERT OR REPLACE INTO cube_cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", payload)
+        self.conn.commit()
+
+    # -----------------------------
+    # Mise à jour incrémentale
+    # -----------------------------
+    def add(self, frame: pd.DataFrame) -> int:
+        # Nouvelles transactions normalisées (normalize_market_frame) -> cellules mises à jour; renvoie leur nombre.
+        # Le cube ne dédoublonne pas: n'envoyer que les transactions non encore intégrées.
+        with self._lock:
+            touched = self.cells.fold_groups(frame)
+            if len(touched):
+                self._persist(touched)
+                self._invalidate()
+            return len(np.unique(touched))
+
+    def ingest_file(self, path: Optional[str] = None, chunk_rows: int = CHUNK_ROWS) -> Dict[str, Any]:
+        # Fichier volumineux lu par blocs; cellules touchées écrites une fois à la fin
+        path = resolve_market_path(path)
+        started = time.perf_counter()
+        rows, touched = 0, []
+        with self._lock:
+            for raw in iter_market_chunks(path, chunk_rows):
+                touched.append(self.cells.fold_groups(normalize_market_frame(raw)))
+                rows += len(raw)
+            cells = np.unique(np.concatenate(touched)) if touched else np.zeros(0, dtype=np.int64)
+            if len(cells):
+                self._persist(cells)
+                self._invalidate()
+        return {"rows": rows, "cells_updated": len(cells), "seconds": round(time.perf_counter() - started, 3)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM cube_cells")
+            self.conn.commit()
+            self.cells = MarketAccumulator(GROUP_KEYS)
+            self._invalidate()
+
+    def _invalidate(self) -> None:
+        self.version += 1
+        self._cache.clear()
+        self._key_arrays = None
+
+    # -----------------------------
+    # Requêtes
+    # -----------------------------
+    def _keys(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._key_arrays is None:
+            keys = self.cells.keys
+            self._key_arrays = (
+                np.array([k[0] for k in keys], dtype=object),
+                np.array([k[1] for k in keys], dtype=object),
+                np.array([k[2] for k in keys], dtype=np.int64),
+            )
+        return self._key_arrays
+
+    def select(
+        self,
+        region: Union[None, str, Iterable[str]] = None,
+        property_type: Union[None, str, Iterable[str]] = None,
+        month_from: Union[None, str, int] = None,
+        month_to: Union[None, str, int] = None,
+    ) -> np.ndarray:
+        # Cellules retenues par les filtres (tranche du cube)
+        regions, types, months = self._keys()
+        mask = np.ones(len(months), dtype=bool)
+        for values, wanted in ((regions, _as_set(region)), (types, _as_set(property_type))):
+            if wanted is not None:
+                mask &= np.isin(values, list(wanted))
+        if month_from is not None:
+            mask &= months >= month_code(month_from)
+        if month_to is not None:
+            mask &= months <= month_code(month_to)
+        return np.flatnonzero(mask)
+
+    def query(
+        self,
+        group_by: Sequence[str] = ("region",),
+        region: Union[None, str, Iterable[str]] = None,
+        property_type: Union[None, str, Iterable[str]] = None,
+        month_from: Union[None, str, int] = None,
+        month_to: Union[None, str, int] = None,
+        quantiles: Sequence[float] = QUERY_QUANTILES,
+        sketches: bool = False,
+    ) -> pd.DataFrame:
+        # Roll-up (group_by plus grossier que la cellule) ou drill-down (filtre sur un parent + clés plus fines);
+        # résultats mis en cache jusqu'à la prochaine mise à jour du cube. sketches: sketches de prix sérialisés
+        # par groupe (fusionnables avec ceux d'autres requêtes)
+        check_group_by(group_by)
+        key = (
+            tuple(group_by), tuple(sorted(_as_set(region) or ())), region is None,
+            tuple(sorted(_as_set(property_type) or ())), property_type is None,
+            month_from, month_to, tuple(quantiles), sketches,
+        )
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+            rows = self.select(region, property_type, month_from, month_to)
+            result = self.cells.rollup(group_by, rows).result(quantiles, sketches)
+            if len(self._cache) >= QUERY_CACHE_SIZE:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = result
+            return result
+
+    def summary(self) -> Dict[str, Any]:
+        _, _, months = self._keys()
+        return {
+            "cells": len(self.cells),
+            "transactions": int(self.cells.counts[: len(self.cells)].sum()),
+            "first_month": month_label(int(months.min())) if len(months) else None,
+            "last_month": month_label(int(months.max())) if len(months) else None,
+            "version": self.version,
+        }
+
+
+_shared_cube: Optional[MarketCube] = None
+_shared_lock = threading.Lock()
+
+
+def get_market_cube() -> MarketCube:
+    global _shared_cube
+    with _shared_lock:
+        if _shared_cube is None:
+            _shared_cube = MarketCube()
+        return _shared_cube
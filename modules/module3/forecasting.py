@@ -0,0 +1,342 @@
+# =============================
+# forecasting.py - Market Analysis Module
+# Prévision par segment: Holt-Winters amorti saisonnier (ETS A,Ad,A sur log-prix), intervalles de prévision,
+# ajustement vectorisé par blocs de segments sur un pool de processus, redémarrage à chaud depuis SQLite
+# =============================
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .aggregation import month_label
+    from .trends import MarketPanel
+except ImportError:
+    from aggregation import month_label
+    from trends import MarketPanel
+
+
+SEASON = 12
+MIN_SEASONAL = 2 * SEASON  # deux saisons complètes pour initialiser la composante saisonnière
+MIN_POINTS = 4  # en dessous: marche aléatoire
+FALLBACK_SIGMA = 0.05  # écart-type mensuel (log) supposé quand l'historique est trop court pour l'estimer
+BLOCK_SEGMENTS = int(os.getenv("FORECAST_BLOCK_SEGMENTS", "500"))
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "0")) or os.cpu_count() or 1
+DEFAULT_FORECAST_DB_PATH = os.getenv(
+    "FORECAST_MODEL_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "forecasts", "models.sqlite"),
+)
+Z_SCORES = {80: 1.2816, 90: 1.6449, 95: 1.96}
+
+# Grille de départ (α, β, γ, φ) puis un raffinement local autour du meilleur point
+GRID = np.array(list(product((0.1, 0.3, 0.5, 0.7, 0.9), (0.0, 0.05, 0.15), (0.0, 0.1, 0.3), (0.9, 0.98))))
+STEPS = np.array([0.1, 0.03, 0.05])
+RANDOM_WALK = np.array([1.0, 0.0, 0.0, 0.9])
+
+
+# =============================
+# Séries
+# =============================
+def prepare_series(panel: MarketPanel) -> Dict[str, np.ndarray]:
+    # Log-prix alignés à gauche (premier mois observé en colonne 0), mois manquants interpolés
+    values = panel.values
+    n_segments = values.shape[0]
+    observed = ~np.isnan(values)
+    has_data = observed.any(axis=1) if values.size else np.zeros(n_segments, dtype=bool)
+    first = np.argmax(observed, axis=1) if values.size else np.zeros(n_segments, dtype=int)
+    last = values.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1) if values.size else first
+    lengths = np.where(has_data, last - first + 1, 0)
+    y = np.full((n_segments, max(int(lengths.max()), 1) if n_segments else 1), np.nan)
+    for i in np.flatnonzero(has_data):
+        window = np.log(values[i, first[i] : last[i] + 1])
+        known = ~np.isnan(window)
+        if not known.all():
+            steps = np.arange(len(window))
+            window = np.interp(steps, steps[known], window[known])
+        y[i, : len(window)] = window
+    checksum = np.nansum(y, axis=1)
+    return {
+        "y": y,
+        "lengths": lengths,
+        "first_month": panel.first_month + first,
+        "last_month": panel.first_month + last,
+        "checksum": checksum,
+    }
+
+
+# =============================
+# Filtre et recherche des paramètres
+# =============================
+def _initial_state(y: np.ndarray, lengths: np.ndarray, seasonal: np.ndarray):
+    # Saisonnier: niveau = moyenne de la 1re saison, pente = écart entre les deux premières saisons
+    n_segments = len(y)
+    level = y[:, 0].copy()
+    span = np.clip(np.minimum(lengths - 1, 3), 1, None)
+    trend = np.where(
+        lengths >= MIN_POINTS, (y[np.arange(n_segments), np.minimum(span, y.shape[1] - 1)] - level) / span, 0.0
+    )  # historique trop court: pas de pente (marche aléatoire pure)
+    seasonals = np.zeros((n_segments, SEASON))
+    if seasonal.any():
+        first = np.nanmean(y[seasonal, :SEASON], axis=1)
+        second = np.nanmean(y[seasonal, SEASON:MIN_SEASONAL], axis=1)
+        level[seasonal] = first
+        trend[seasonal] = (second - first) / SEASON
+        seasonals[seasonal] = y[seasonal, :SEASON] - first[:, None]
+    return level, np.nan_to_num(trend), seasonals
+
+
+def _run_filter(
+    y: np.ndarray, lengths: np.ndarray, seasonal: np.ndarray, lane_segment: np.ndarray, params: np.ndarray
+):
+    # Récursion ETS(A,Ad,A) en forme de correction d'erreur, un pas de temps pour toutes les voies
+    # (segment × jeu de paramètres) à la fois; une voie se fige après la fin de sa série
+    alpha, beta, gamma, phi = params.T
+    level, trend, seasonals = (a[lane_segment] for a in _initial_state(y, lengths, seasonal))
+    lane_lengths = lengths[lane_segment]
+    sse = np.zeros(len(lane_segment))
+    for t in range(int(lengths.max())):
+        active = t < lane_lengths
+        column = t % SEASON
+        season = seasonals[:, column]
+        damped = phi * trend
+        error = np.where(active, y[lane_segment, t] - (level + damped + season), 0.0)
+        if t:
+            sse += error * error
+        level = np.where(active, level + damped + alpha * error, level)
+        trend = np.where(active, damped + beta * error, trend)
+        seasonals[:, column] = season + gamma * error
+    return sse, level, trend, seasonals
+
+
+def _search(y, lengths, seasonal, candidates: np.ndarray):
+    # candidates: S × K × 4; garde pour chaque segment le jeu de paramètres de plus faible SSE
+    n_segments, k, _ = candidates.shape
+    lane_segment = np.repeat(np.arange(n_segments), k)
+    flat = candidates.reshape(-1, 4)
+    sse, level, trend, seasonals = _run_filter(y, lengths, seasonal, lane_segment, flat)
+    lanes = np.arange(n_segments) * k + np.argmin(sse.reshape(n_segments, k), axis=1)
+    return flat[lanes], sse[lanes], level[lanes], trend[lanes], seasonals[lanes]
+
+
+def _constrain(candidates: np.ndarray, seasonal: np.ndarray) -> np.ndarray:
+    # 0 < α < 1, 0 <= β <= α, 0 <= γ <= 1 - α; pas de saisonnalité sans deux saisons d'historique
+    alpha = np.clip(candidates[..., 0], 0.01, 0.99)
+    beta = np.clip(candidates[..., 1], 0.0, alpha)
+    gamma = np.where(seasonal[:, None], np.clip(candidates[..., 2], 0.0, 1.0 - alpha), 0.0)
+    return np.stack([alpha, beta, gamma, candidates[..., 3]], axis=-1)
+
+
+def _neighbours(params: np.ndarray, seasonal: np.ndarray) -> np.ndarray:
+    # 27 voisins (α, β, γ ± pas) du point courant, φ conservé
+    offsets = np.array(list(product((-1, 0, 1), repeat=3))) * STEPS
+    candidates = np.repeat(params[:, None, :], len(offsets), axis=1)
+    candidates[..., :3] += offsets[None]
+    return _constrain(candidates, seasonal)
+
+
+def fit_block(y: np.ndarray, lengths: np.ndarray, warm: np.ndarray, refit: np.ndarray) -> Dict[str, np.ndarray]:
+    # warm: paramètres précédents (NaN = ajustement à froid); refit=False: paramètres repris tels quels
+    n_segments = len(y)
+    seasonal = lengths >= MIN_SEASONAL
+    short = lengths < MIN_POINTS
+    params = np.zeros((n_segments, 4))
+    sse = np.zeros(n_segments)
+    level, trend = np.zeros(n_segments), np.zeros(n_segments)
+    seasonals = np.zeros((n_segments, SEASON))
+
+    def run(rows: np.ndarray, candidates: np.ndarray) -> None:
+        if len(rows):
+            found = _search(y[rows], lengths[rows], seasonal[rows], candidates)
+            params[rows], sse[rows], level[rows], trend[rows], seasonals[rows] = found
+
+    cold = np.flatnonzero(np.isnan(warm[:, 0]) & ~short)
+    if len(cold):
+        grid = np.repeat(GRID[None], len(cold), axis=0)
+        run(cold, _constrain(grid, seasonal[cold]))
+        run(cold, _neighbours(params[cold], seasonal[cold]))
+    hot = np.flatnonzero(~np.isnan(warm[:, 0]) & ~short)
+    refine, reuse = hot[refit[hot]], hot[~refit[hot]]
+    run(refine, _neighbours(warm[refine], seasonal[refine]))
+    run(reuse, warm[reuse][:, None, :])
+    walk = np.flatnonzero(short & (lengths > 0))
+    run(walk, np.repeat(RANDOM_WALK[None, None], len(walk), axis=0))
+
+    free = np.where(seasonal, 4, 3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = np.sqrt(sse / np.maximum(lengths - 1 - free, 1))
+    sigma = np.where(short | ~np.isfinite(sigma), np.maximum(np.nan_to_num(sigma), FALLBACK_SIGMA), sigma)
+    return {"params": params, "sigma": sigma, "level": level, "trend": trend, "seasonals": seasonals}
+
+
+def fit_segments(
+    y: np.ndarray, lengths: np.ndarray, warm: np.ndarray, refit: np.ndarray, workers: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    # Blocs de BLOCK_SEGMENTS segments répartis sur le pool de processus (inline s'il n'y a qu'un bloc)
+    workers = workers or FORECAST_WORKERS
+    blocks = [slice(i, i + BLOCK_SEGMENTS) for i in range(0, len(y), BLOCK_SEGMENTS)]
+    args = [(y[b], lengths[b], warm[b], refit[b]) for b in blocks]
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks))) as pool:
+            results = list(pool.map(fit_block, *zip(*args)))
+    else:
+        results = [fit_block(*a) for a in args]
+    if not results:
+        return fit_block(y, lengths, warm, refit)
+    return {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+
+
+def forecast_paths(fit: Dict[str, np.ndarray], lengths: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Moyenne (log) et écart-type de prévision à h pas: σ²(1 + Σ_{j<h} c_j²), c_j = α + β(φ + … + φ^j) + γ·1{j ≡ 0 [12]}
+    alpha, beta, gamma, phi = fit["params"].T
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(phi[:, None] ** steps[None], axis=1)  # φ + … + φ^h
+    columns = (lengths[:, None] + steps[None] - 1) % SEASON
+    season = np.take_along_axis(fit["seasonals"], columns, axis=1)
+    mean = fit["level"][:, None] + damped * fit["trend"][:, None] + season
+    c = alpha[:, None] + beta[:, None] * damped + gamma[:, None] * (steps[None] % SEASON == 0)
+    variance = np.concatenate([np.zeros((len(alpha), 1)), np.cumsum(c[:, :-1] ** 2, axis=1)], axis=1) + 1.0
+    return mean, fit["sigma"][:, None] * np.sqrt(variance)
+
+
+# =============================
+# Modèles sauvegardés (redémarrage à chaud)
+# =============================
+class ForecastStore:
+    # Paramètres retenus par segment + empreinte de la série: série inchangée -> paramètres repris sans
+    # recherche, mois nouveaux -> raffinement local autour des paramètres précédents
+    def __init__(self, path: str = DEFAULT_FORECAST_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS forecast_models (
+                segment_by TEXT NOT NULL,
+                segment TEXT NOT NULL,
+                first_month INTEGER NOT NULL,
+                last_month INTEGER NOT NULL,
+                checksum REAL NOT NULL,
+                params TEXT NOT NULL,
+                fitted_at REAL NOT NULL,
+                PRIMARY KEY (segment_by, segment)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def load(self, segment_by: Sequence[str]) -> Dict[Tuple[str, ...], Tuple[int, int, float, List[float]]]:
+        rows = self.conn.execute(
+            "SELECT segment, first_month, last_month, checksum, params FROM forecast_models WHERE segment_by = ?",
+            (json.dumps(list(segment_by)),),
+        ).fetchall()
+        return {tuple(json.loads(s)): (f, l, c, json.loads(p)) for s, f, l, c, p in rows}
+
+    def save(self, segment_by: Sequence[str], rows: Sequence[Tuple[Tuple[str, ...], int, int, float, List[float]]]):
+        key, now = json.dumps(list(segment_by)), time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO forecast_models VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(key, json.dumps(list(s)), f, l, c, json.dumps(p), now) for s, f, l, c, p in rows],
+            )
+            self.conn.commit()
+
+
+_shared_store: Optional[ForecastStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_forecast_store() -> ForecastStore:
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ForecastStore()
+        return _shared_store
+
+
+# =============================
+# Prévision d'un panneau
+# =============================
+def forecast_panel(
+    panel: MarketPanel,
+    horizon: int = 12,
+    confidence: int = 80,
+    store: Optional[ForecastStore] = None,
+    workers: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    if horizon < 1:
+        raise ValueError("L'horizon de prévision doit être d'au moins un mois")
+    if confidence not in Z_SCORES:
+        raise ValueError(f"Niveau de confiance non supporté: {confidence} (attendu: {sorted(Z_SCORES)})")
+    started = time.perf_counter()
+    series = prepare_series(panel)
+    lengths, n_segments = series["lengths"], len(panel.segments)
+    warm = np.full((n_segments, 4), np.nan)
+    refit = np.ones(n_segments, dtype=bool)
+    # Modèles rangés par segmentation, et par statistique hors médiane (un même segment peut avoir des séries
+    # de moyennes ou d'indice de ventes répétées)
+    model_key = list(panel.segment_by) + ([f"@{panel.statistic}"] if panel.statistic != "median" else [])
+    stored = store.load(model_key) if store is not None else {}
+    for i, segment in enumerate(panel.segments):
+        previous = stored.get(tuple(segment))
+        if previous is not None and previous[0] == series["first_month"][i]:
+            warm[i] = previous[3]
+            same = abs(previous[2] - series["checksum"][i]) <= 1e-9 * max(1.0, abs(previous[2]))
+            refit[i] = previous[1] != series["last_month"][i] or not same
+    fit = fit_segments(series["y"], lengths, warm, refit, workers)
+    mean, spread = forecast_paths(fit, lengths, horizon)
+    z = Z_SCORES[confidence]
+    forecast = np.exp(mean).round(2).tolist()
+    lower = np.exp(mean - z * spread).round(2).tolist()
+    upper = np.exp(mean + z * spread).round(2).tolist()
+    if store is not None:
+        store.save(
+            model_key,
+            [
+                (tuple(s), int(series["first_month"][i]), int(series["last_month"][i]),
+                 float(series["checksum"][i]), [float(p) for p in fit["params"][i]])
+                for i, s in enumerate(panel.segments) if lengths[i] > 0
+            ],
+        )
+
+    results, labels = [], {}
+    for i, segment in enumerate(panel.segments):
+        if not lengths[i]:
+            continue
+        last = int(series["last_month"][i])
+        alpha, beta, gamma, phi = fit["params"][i].tolist()
+        if last not in labels:
+            labels[last] = [month_label(last + h + 1) for h in range(horizon)]
+        results.append(
+            {
+                **dict(zip(panel.segment_by, segment)),
+                "last_observed_month": month_label(last),
+                "history_months": int(lengths[i]),
+                "model": "holt_winters_damped_seasonal" if lengths[i] >= MIN_SEASONAL else (
+                    "holt_damped" if lengths[i] >= MIN_POINTS else "random_walk"
+                ),
+                "params": {"alpha": round(alpha, 3), "beta": round(beta, 3), "gamma": round(gamma, 3), "phi": phi},
+                "forecast": [
+                    {"month": m, "forecast_price": f, f"lower_{confidence}": lo, f"upper_{confidence}": hi}
+                    for m, f, lo, hi in zip(labels[last], forecast[i], lower[i], upper[i])
+                ],
+            }
+        )
+    reused = int((~np.isnan(warm[:, 0]) & ~refit).sum())
+    warm_started = int((~np.isnan(warm[:, 0]) & refit).sum())
+    stats = {
+        "segments": len(results),
+        "cold_fits": len(results) - reused - warm_started,
+        "warm_refits": warm_started,
+        "reused_models": reused,
+        "workers": min(workers or FORECAST_WORKERS, max(1, -(-n_segments // BLOCK_SEGMENTS))),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    return results, stats
@@ -0,0 +1,272 @@
+# =============================
+# history.py - Market Analysis Module
+# Historique de marché en Parquet partitionné (région / mois): ajout de partitions, lecture avec filtres poussés et projection
+# =============================
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    from .aggregation import normalize_market_frame, resolve_market_path
+    from .streaming import CHUNK_ROWS, iter_market_chunks
+    from .trends import month_code
+except ImportError:
+    from aggregation import normalize_market_frame, resolve_market_path
+    from streaming import CHUNK_ROWS, iter_market_chunks
+    from trends import month_code
+
+
+DEFAULT_HISTORY_DIR = os.getenv("MARKET_HISTORY_DIR", os.path.join(os.path.dirname(__file__), "history"))
+MAX_PARTITION_FILES = int(os.getenv("MARKET_HISTORY_MAX_FILES", "8"))  # au-delà, la partition est compactée
+APPEND_ROWS = 1_000_000  # lignes regroupées par écriture lors d'un import de fichier
+
+# Colonnes normalisées (normalize_market_frame); region et month ne sont pas stockées dans les fichiers mais
+# dans les répertoires region=<r>/month=<code> (valeurs encodées en URI)
+HISTORY_COLUMNS = (
+    "region", "property_type", "month", "price", "area", "price_per_sqm", "days_on_market", "active", "property_id",
+)
+FILE_SCHEMA = pa.schema(
+    [
+        ("property_type", pa.dictionary(pa.int32(), pa.string())),
+        ("price", pa.float64()),
+        ("area", pa.float64()),
+        ("price_per_sqm", pa.float64()),
+        ("days_on_market", pa.float64()),
+        ("active", pa.bool_()),
+        ("property_id", pa.string()),  # chaîne simple: un dictionnaire Arrow serait recopié en entier dans chaque fichier
+    ]
+)
+PARTITION_SCHEMA = pa.schema([("region", pa.string()), ("month", pa.int32())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+DATASET_SCHEMA = pa.schema(list(FILE_SCHEMA) + list(PARTITION_SCHEMA))
+
+
+def _as_list(value: Union[None, str, Iterable[str]]) -> Optional[List[str]]:
+    if value is None:
+        return None
+    return [value] if isinstance(value, str) else list(value)
+
+
+def history_filter(
+    region: Union[None, str, Iterable[str]] = None,
+    property_type: Union[None, str, Iterable[str]] = None,
+    month_from: Union[None, str, int] = None,
+    month_to: Union[None, str, int] = None,
+) -> Optional[ds.Expression]:
+    # region / month: élagage des répertoires; property_type: statistiques des row groups (fichiers triés)
+    terms = []
+    for field, values in (("region", _as_list(region)), ("property_type", _as_list(property_type))):
+        if values is not None:
+            terms.append(ds.field(field).isin(values))
+    if month_from is not None:
+        terms.append(ds.field("month") >= month_code(month_from))
+    if month_to is not None:
+        terms.append(ds.field("month") <= month_code(month_to))
+    expression = None
+    for term in terms:
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def filter_market_frame(
+    frame: pd.DataFrame,
+    region: Union[None, str, Iterable[str]] = None,
+    property_type: Union[None, str, Iterable[str]] = None,
+    month_from: Union[None, str, int] = None,
+    month_to: Union[None, str, int] = None,
+) -> pd.DataFrame:
+    # Mêmes filtres que history_filter sur une frame en mémoire: ventes normalisées (mois en code) ou
+    # groupes agrégés (mois "AAAA-MM")
+    mask = pd.Series(True, index=frame.index)
+    for field, values in (("region", _as_list(region)), ("property_type", _as_list(property_type))):
+        if values is not None:
+            mask &= frame[field].isin(values)
+    if month_from is not None or month_to is not None:
+        months = frame["month"]
+        if not pd.api.types.is_numeric_dtype(months):
+            months = months.map(month_code)
+        if month_from is not None:
+            mask &= months >= month_code(month_from)
+        if month_to is not None:
+            mask &= months <= month_code(month_to)
+    return frame if mask.all() else frame[mask]
+
+
+class MarketHistoryStore:
+    # Chaque ajout écrit de nouveaux fichiers dans les partitions concernées (jamais de réécriture des existants);
+    # compact() fusionne les partitions fragmentées. Pas de dédoublonnage: n'ajouter que des transactions nouvelles.
+    def __init__(self, root: str = DEFAULT_HISTORY_DIR):
+        self.root = root
+        self._lock = threading.RLock()
+        self._dataset: Optional[ds.Dataset] = None
+
+    # -----------------------------
+    # Écriture
+    # -----------------------------
+    def _table(self, frame: pd.DataFrame) -> pa.Table:
+        # Frame normalisée -> table Arrow triée par type (row groups sélectifs sur property_type)
+        frame = frame.sort_values(["property_type", "month"], kind="stable")
+        columns = {
+            "region": pa.array(frame["region"].astype(str), pa.string()),
+            "month": pa.array(frame["month"], pa.int32()),
+        }
+        columns.update({field.name: pa.array(frame[field.name]).cast(field.type) for field in FILE_SCHEMA})
+        return pa.table(columns)
+
+    def append(self, frame: pd.DataFrame) -> Dict[str, Any]:
+        # Frame normalisée (normalize_market_frame) -> nouvelles partitions / nouveaux fichiers
+        if not len(frame):
+            return {"rows": 0, "partitions": 0}
+        table = self._table(frame)
+        written: List[str] = []
+        with self._lock:
+            ds.write_dataset(
+                table,
+                self.root,
+                format="parquet",
+                partitioning=PARTITIONING,
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                file_visitor=lambda written_file: written.append(written_file.path),
+            )
+            self._dataset = None
+        return {"rows": len(frame), "partitions": len(written)}
+
+    def ingest_file(self, path: Optional[str] = None, chunk_rows: int = CHUNK_ROWS) -> Dict[str, Any]:
+        # Fichier lu par blocs, regroupés par APPEND_ROWS lignes pour limiter le nombre de petits fichiers
+        path = resolve_market_path(path)
+        started = time.perf_counter()
+        rows, partitions, pending = 0, 0, []
+
+        def flush():
+            nonlocal partitions
+            if pending:
+                partitions += self.append(pd.concat(pending, ignore_index=True))["partitions"]
+                pending.clear()
+
+        for raw in iter_market_chunks(path, chunk_rows):
+            pending.append(normalize_market_frame(raw))
+            rows += len(raw)
+            if sum(len(p) for p in pending) >= APPEND_ROWS:
+                flush()
+        flush()
+        compacted = self.compact()
+        return {
+            "rows": rows,
+            "files_written": partitions,
+            "partitions_compacted": compacted,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def compact(self, max_files: int = MAX_PARTITION_FILES) -> int:
+        # Partitions de plus de max_files fichiers réécrites en un seul (nouveau fichier écrit avant suppression)
+        with self._lock:
+            by_partition: Dict[str, List[str]] = defaultdict(list)
+            for fragment in self.dataset().get_fragments():
+                by_partition[os.path.dirname(fragment.path)].append(fragment.path)
+            compacted = 0
+            for directory, files in by_partition.items():
+                if len(files) <= max_files:
+                    continue
+                table = pa.concat_tables([pq.read_table(f, schema=FILE_SCHEMA) for f in files])
+                table = table.take(pc.sort_indices(table["property_type"].cast(pa.string()))).unify_dictionaries()
+                pq.write_table(table, os.path.join(directory, f"part-{uuid.uuid4().hex}-0.parquet"))
+                for f in files:
+                    os.remove(f)
+                compacted += 1
+            if compacted:
+                self._dataset = None
+            return compacted
+
+    def clear(self) -> None:
+        with self._lock:
+            for fragment in self.dataset().get_fragments():
+                os.remove(fragment.path)
+            self._dataset = None
+
+    # -----------------------------
+    # Lecture
+    # -----------------------------
+    def dataset(self) -> ds.Dataset:
+        # Découverte des fichiers mise en cache jusqu'au prochain ajout de ce processus (refresh() sinon)
+        with self._lock:
+            if self._dataset is None:
+                os.makedirs(self.root, exist_ok=True)
+                self._dataset = ds.dataset(
+                    self.root, format="parquet", partitioning=PARTITIONING, schema=DATASET_SCHEMA,
+                )
+            return self._dataset
+
+    def refresh(self) -> None:
+        with self._lock:
+            self._dataset = None
+
+    def __bool__(self) -> bool:
+        return bool(self.dataset().files)
+
+    def read(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        region: Union[None, str, Iterable[str]] = None,
+        property_type: Union[None, str, Iterable[str]] = None,
+        month_from: Union[None, str, int] = None,
+        month_to: Union[None, str, int] = None,
+    ) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        # Frame au format normalize_market_frame restreinte aux colonnes demandées (toutes par défaut);
+        # seuls les fichiers des partitions retenues sont ouverts
+        columns = list(columns or HISTORY_COLUMNS)
+        unknown = set(columns) - set(HISTORY_COLUMNS)
+        if unknown:
+            raise ValueError(f"Colonnes d'historique inconnues: {sorted(unknown)} (attendu: {HISTORY_COLUMNS})")
+        started = time.perf_counter()
+        dataset = self.dataset()
+        expression = history_filter(region, property_type, month_from, month_to)
+        files = [fragment.path for fragment in dataset.get_fragments(filter=expression)]
+        table = dataset.to_table(columns=columns, filter=expression)
+        for column in ("region", "property_id"):
+            if column in columns:
+                # Catégories comme normalize_market_frame (encodage fait côté Arrow)
+                index = table.schema.get_field_index(column)
+                table = table.set_column(index, column, table[column].dictionary_encode())
+        frame = table.to_pandas()
+        stats = {
+            "rows": len(frame),
+            "files_read": len(files),
+            "files_total": len(dataset.files),
+            "bytes_in_files": sum(os.path.getsize(f) for f in files),
+            "columns": columns,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+        return frame, stats
+
+    def summary(self) -> Dict[str, Any]:
+        dataset = self.dataset()
+        partitions = {os.path.dirname(f) for f in dataset.files}
+        return {
+            "root": self.root,
+            "files": len(dataset.files),
+            "partitions": len(partitions),
+            "rows": dataset.count_rows() if dataset.files else 0,
+            "bytes": sum(os.path.getsize(f) for f in dataset.files),
+        }
+
+
+_shared_store: Optional[MarketHistoryStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_history_store() -> MarketHistoryStore:
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = MarketHistoryStore()
+        return _shared_store
@@ -16,9 +16,15 @@ from agno.tools.file import FileTools
 
 # Import des outils custom
 try:
-    from .tools import aggregate_market_data, analyze_trends, forecast_market, generate_visual_reports
+    from .tools import (
+        aggregate_market_data, analyze_trends, forecast_market, generate_visual_reports, price_distribution,
+        query_market_cube, update_market_cube, update_market_history,
+    )
 except ImportError:
-    from tools import aggregate_market_data, analyze_trends, forecast_market, generate_visual_reports
+    from tools import (
+        aggregate_market_data, analyze_trends, forecast_market, generate_visual_reports, price_distribution,
+        query_market_cube, update_market_cube, update_market_history,
+    )
 
 # ----------------------------
 # Load environment variables
@@ -33,7 +39,15 @@ load_dotenv()
 DataAggregatorAgent = Agent(
     name="Data Aggregator Agent",
     model=MistralChat(id="mistral-small-latest", api_key=os.getenv("MISTRAL_API_KEY")),
-    tools=[PandasTools(), FileTools(base_dir=Path(os.path.join(os.path.dirname(__file__), "documents3"))), aggregate_market_data],
+    tools=[
+        PandasTools(),
+        FileTools(base_dir=Path(os.path.join(os.path.dirname(__file__), "documents3"))),
+        aggregate_market_data,
+        update_market_history,
+        update_market_cube,
+        query_market_cube,
+        price_distribution,
+    ],
     description="""
     Un agent IA centré sur la collecte et l'agrégation des données de marché
     depuis datasets historiques, listings publics et autres sources fiables.
@@ -49,7 +63,21 @@ DataAggregatorAgent = Agent(
     ## Tool Usage Guidelines
     - PandasTools pour la manipulation et nettoyage des données.
     - FileTools pour lire/écrire fichiers locaux.
-    - aggregate_market_data pour l'agrégation des datasets.
+    - aggregate_market_data pour l'agrégation des datasets (médianes / moyennes de prix et de prix au m²,
+      délais de vente, stock par région, type et mois). Pour un fichier volumineux de documents3,
+      passez source_path plutôt que de recopier les lignes dans datasets: au-delà de quelques centaines
+      de Mo il est lu par blocs à mémoire constante (stream=True pour le forcer), les médianes sont
+      alors approchées (~1 %) et le débit est rapporté dans ingestion.
+    - update_market_history pour verser les nouvelles transactions dans l'historique local partitionné
+      (région / mois, Parquet), une seule fois par transaction. Sans datasets ni source_path, les tools du
+      module lisent cet historique directement: filtrez avec region, month_from et month_to ("AAAA-MM")
+      pour ne charger que les partitions utiles (history_scan indique le volume lu).
+    - update_market_cube pour ajouter les nouvelles transactions au cube persistant (région × type × mois),
+      une seule fois par transaction; query_market_cube pour relire des agrégats sans retraiter l'historique.
+    - price_distribution pour les percentiles et la répartition par tranches de prix d'un groupe ou du
+      marché. Avec sketches=True, aggregate_market_data et query_market_cube joignent à chaque groupe des
+      sketches de quantiles sérialisés: des sorties de plusieurs appels (lots, périodes) se combinent alors
+      dans price_distribution sans relire les ventes.
 
     ## Sortie attendue
     - aggregated_market_data
@@ -66,7 +94,7 @@ DataAggregatorAgent = Agent(
 TrendAnalysisAgent = Agent(
     name="Trend Analysis Agent",
     model=MistralChat(id="mistral-small-latest", api_key=os.getenv("MISTRAL_API_KEY")),
-    tools=[CalculatorTools(), analyze_trends],
+    tools=[CalculatorTools(), analyze_trends, query_market_cube, price_distribution],
     description="""
     Un agent IA qui analyse les tendances de prix et fluctuations sur le marché immobilier.
     """,
@@ -80,11 +108,23 @@ TrendAnalysisAgent = Agent(
 
     ## Tool Usage Guidelines
     - CalculatorTools pour calculs et statistiques.
-    - analyze_trends pour produire les métriques de tendance.
+    - analyze_trends pour produire les métriques de tendance par segment (région, type): médiane glissante,
+      variations mensuelle (mom_change_pct) et annuelle (yoy_change_pct), volatilité, momentum et direction.
+      Passez de préférence la sortie d'aggregate_market_data (aggregated_market_data) ou un source_path;
+      online=True ajoute les nouvelles ventes à l'état incrémental sans relire l'historique.
+      Sans market_data ni source_path, l'historique partitionné est lu avec les filtres region / month_from /
+      month_to.
+      method="repeat_sales" remplace la médiane par un indice de ventes répétées (même bien revendu,
+      property_id requis): à privilégier quand la composition des ventes change d'un mois à l'autre.
+    - query_market_cube pour un roll-up (ex. group_by=['region']) ou un drill-down (ex. region=['Rabat'],
+      group_by=['property_type', 'month']) sur le cube matérialisé; sa sortie avec 'month' dans group_by
+      peut être passée telle quelle à analyze_trends, qui segmente alors par défaut selon les autres clés
+      de group_by (ici property_type).
+    - price_distribution pour la dispersion des prix d'un segment (percentiles p10-p90, tranches de prix).
 
     ## Sortie attendue
-    - trend_indicators
-    - price_fluctuation_metrics
+    - trend_indicators (segments)
+    - price_fluctuation_metrics (high_variation_segments)
     - analyzed_at
     """,
     markdown=True,
@@ -111,10 +151,15 @@ ForecastingAgent = Agent(
     3. Fournir une estimation claire pour chaque période.
 
     ## Tool Usage Guidelines
-    - forecast_market pour produire les prévisions de prix.
-    
+    - forecast_market pour produire les prévisions de prix: passez l'historique (market_data, sortie
+      d'aggregate_market_data ou source_path). Chaque prévision porte un intervalle (lower_80 / upper_80
+      par défaut, confidence=95 pour un intervalle plus large) à restituer avec le prix prévu.
+      Sans historique fourni, l'historique partitionné local est lu (filtres region / month_from / month_to).
+      method="repeat_sales" prévoit l'indice de ventes répétées par région (ventes avec property_id).
+
     ## Sortie attendue
-    - future_market_predictions
+    - future_market_predictions (marché entier)
+    - segment_forecasts (par région et type)
     - forecast_generated_at
     """,
     markdown=True,
@@ -140,11 +185,15 @@ VisualizationAgent = Agent(
     3. Sauvegarder les rapports localement.
 
     ## Tool Usage Guidelines
-    - generate_visual_reports pour créer les summaries et graphiques.
+    - generate_visual_reports pour créer les summaries et graphiques (HTML dans reports3): évolution des prix
+      par région, prévision avec intervalle, comparaison des segments et tableau de bord. Passez forecast_data
+      (sortie de forecast_market) et, pour l'historique, market_data (ventes ou agrégats mensuels).
+      Les graphiques déjà produits pour les mêmes données sont renvoyés immédiatement (status "cached");
+      les nouveaux sont rendus en tâche de fond (status "rendering"), wait=True pour attendre les fichiers.
     - FileTools pour gérer l'enregistrement des fichiers.
 
     ## Sortie attendue
-    - visual_reports
+    - visual_reports (charts: fichiers HTML de reports3)
     - generated_at
     - output_file
     """,
@@ -0,0 +1,245 @@
+# =============================
+# repeat_sales.py - Market Analysis Module
+# Indice de ventes répétées (type Case-Shiller): paires de ventes d'un même bien, moindres carrés pondérés creux
+# =============================
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .trends import MarketPanel, check_segment_by
+except ImportError:
+    from trends import MarketPanel, check_segment_by
+
+
+REPEAT_SEGMENT_KEYS = ("region",)
+BASE_INDEX = 100.0
+ANCHOR_MONTHS = 12  # niveau de prix: ventes des 12 derniers mois indexés du segment
+MAX_LOG_RETURN = np.log(5.0)  # paires à ×5 ou ÷5 écartées (erreurs de saisie, biens transformés)
+MIN_VARIANCE = 1e-4  # plancher de la variance d'erreur modélisée (étape 2)
+MONTH_BITS = 20  # codes mois < 2^20; clé de cellule = segment | mois d'achat | mois de revente
+MONTH_MASK = (1 << MONTH_BITS) - 1
+
+
+def _merge_sparse(keys: np.ndarray, stats: np.ndarray, new_keys: np.ndarray, new_stats: np.ndarray):
+    # Statistiques additives indexées par clé entière: union triée des clés, sommes par clé
+    keys, inverse = np.unique(np.concatenate([keys, new_keys]), return_inverse=True)
+    values = np.concatenate([stats, new_stats])
+    merged = np.stack([np.bincount(inverse, values[:, j], len(keys)) for j in range(values.shape[1])], axis=1)
+    return keys, merged
+
+
+def _components(i0: np.ndarray, i1: np.ndarray, size: int) -> np.ndarray:
+    # Composantes connexes du graphe des mois (une arête par cellule): propagation du plus petit label
+    labels = np.arange(size)
+    while True:
+        low = np.minimum(labels[i0], labels[i1])
+        updated = labels.copy()
+        np.minimum.at(updated, i0, low)
+        np.minimum.at(updated, i1, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _normal_solve(i0: np.ndarray, i1: np.ndarray, weight: np.ndarray, rhs_sum: np.ndarray, size: int) -> np.ndarray:
+    # Moindres carrés y = b[t1] - b[t0], b[0] = 0. La matrice de design (deux non-zéros par paire) n'est jamais
+    # construite: ses équations normales forment un laplacien pondéré accumulé par bincount.
+    diagonal = np.bincount(i0, weight, size) + np.bincount(i1, weight, size)
+    off = np.bincount(i0 * size + i1, weight, size * size).reshape(size, size)
+    normal = np.diag(diagonal) - off - off.T
+    rhs = np.bincount(i1, rhs_sum, size) - np.bincount(i0, rhs_sum, size)
+    beta = np.zeros(size)
+    try:
+        beta[1:] = np.linalg.solve(normal[1:, 1:], rhs[1:])
+    except np.linalg.LinAlgError:
+        beta[1:] = np.linalg.lstsq(normal[1:, 1:], rhs[1:], rcond=None)[0]
+    return beta
+
+
+class RepeatSalesIndex:
+    # État incrémental: dernière vente connue par bien, et par cellule (segment, mois d'achat, mois de revente)
+    # les sommes n, Σy, Σy² des rendements logarithmiques y. Ces statistiques suffisent aux trois étapes de
+    # Case-Shiller (MCO, variance des résidus selon l'écart de détention, MCO pondérés): un nouveau lot de
+    # ventes se fusionne sans relire les paires déjà vues.
+    def __init__(self, segment_by: Sequence[str] = REPEAT_SEGMENT_KEYS):
+        check_segment_by(segment_by)
+        self.segment_by = tuple(segment_by)
+        self._lock = threading.RLock()
+        self.segments: List[Tuple[str, ...]] = []
+        self.segment_of: Dict[Tuple[str, ...], int] = {}
+        self.last = pd.DataFrame({"segment": np.zeros(0, np.int64), "month": np.zeros(0, np.int64), "log_price": np.zeros(0)})
+        self.cell_keys, self.cell_stats = np.zeros(0, dtype=np.int64), np.zeros((0, 3))
+        self.level_keys, self.level_stats = np.zeros(0, dtype=np.int64), np.zeros((0, 2))
+        self.sales = 0
+        self.pairs = 0
+
+    def _segment_codes(self, frame: pd.DataFrame) -> np.ndarray:
+        if not self.segment_by:
+            if not self.segments:
+                self.segment_of[()] = 0
+                self.segments.append(())
+            return np.zeros(len(frame), dtype=np.int64)
+        local, uniques = pd.MultiIndex.from_arrays([frame[k] for k in self.segment_by]).factorize()
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, values in enumerate(uniques):
+            segment = tuple(map(str, values))
+            code = self.segment_of.get(segment)
+            if code is None:
+                code = self.segment_of[segment] = len(self.segments)
+                self.segments.append(segment)
+            mapping[i] = code
+        return mapping[local]
+
+    def update(self, frame: pd.DataFrame) -> int:
+        # Ventes normalisées avec property_id: appariement avec la vente précédente du même bien (état ou lot),
+        # puis fusion des statistiques de cellules. Renvoie le nombre de nouvelles paires.
+        frame = frame[(frame["month"] >= 0) & (frame["price"] > 0) & frame["property_id"].notna()]
+        if frame.empty:
+            return 0
+        with self._lock:
+            segment = self._segment_codes(frame)
+            ids = frame["property_id"].astype(str).to_numpy()
+            month = frame["month"].to_numpy(dtype=np.int64)
+            log_price = np.log(frame["price"].to_numpy(dtype=np.float64))
+
+            known = self.last.index.intersection(pd.unique(ids))
+            previous = self.last.loc[known]
+            all_ids = np.concatenate([previous.index.to_numpy(dtype=object), ids])
+            codes, uniques = pd.factorize(all_ids)
+            segment = np.concatenate([previous["segment"].to_numpy(), segment])
+            month = np.concatenate([previous["month"].to_numpy(), month])
+            log_price = np.concatenate([previous["log_price"].to_numpy(), log_price])
+            fresh = np.r_[np.zeros(len(previous), dtype=bool), np.ones(len(frame), dtype=bool)]
+            order = np.lexsort((fresh, month, codes))  # à mois égal, l'état connu passe avant le lot
+            codes, segment, month, log_price, fresh = codes[order], segment[order], month[order], log_price[order], fresh[order]
+
+            # Paires consécutives d'un même bien dont au moins une vente est nouvelle (pas de double comptage)
+            y = log_price[1:] - log_price[:-1]
+            pair = (
+                (codes[1:] == codes[:-1]) & (fresh[1:] | fresh[:-1]) & (month[1:] > month[:-1])
+                & (segment[1:] == segment[:-1]) & (np.abs(y) <= MAX_LOG_RETURN)
+            )
+            s, t0, t1, y = segment[1:][pair], month[:-1][pair], month[1:][pair], y[pair]
+            keys = (s << (2 * MONTH_BITS)) | (t0 << MONTH_BITS) | t1
+            cells, inverse = np.unique(keys, return_inverse=True)
+            stats = np.stack(
+                [np.bincount(inverse, None, len(cells)), np.bincount(inverse, y, len(cells)),
+                 np.bincount(inverse, y * y, len(cells))], axis=1,
+            )
+            self.cell_keys, self.cell_stats = _merge_sparse(self.cell_keys, self.cell_stats, cells, stats)
+
+            # Niveau de prix (moyenne des log-prix) par segment × mois, pour exprimer l'indice en prix
+            levels, inverse = np.unique((segment[fresh] << MONTH_BITS) | month[fresh], return_inverse=True)
+            level_stats = np.stack(
+                [np.bincount(inverse, None, len(levels)), np.bincount(inverse, log_price[fresh], len(levels))], axis=1
+            )
+            self.level_keys, self.level_stats = _merge_sparse(self.level_keys, self.level_stats, levels, level_stats)
+
+            # Dernière vente de chaque bien (la plus récente, état compris)
+            last = np.r_[codes[1:] != codes[:-1], True]
+            latest = pd.DataFrame(
+                {"segment": segment[last], "month": month[last], "log_price": log_price[last]},
+                index=pd.Index(uniques[codes[last]], dtype=object),
+            )
+            self.last = pd.concat([self.last[~self.last.index.isin(latest.index)], latest])
+            self.sales += len(frame)
+            self.pairs += len(y)
+            return len(y)
+
+    def _solve(self, segment: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Indice (log) d'un segment: mois de la composante connexe la plus fournie en paires, base = premier mois
+        start, stop = np.searchsorted(self.cell_keys, [segment << (2 * MONTH_BITS), (segment + 1) << (2 * MONTH_BITS)])
+        keys, stats = self.cell_keys[start:stop], self.cell_stats[start:stop]
+        if not len(keys):
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        t0, t1 = (keys >> MONTH_BITS) & MONTH_MASK, keys & MONTH_MASK
+        n, sum_y, sum_y2 = stats.T
+        months = np.unique(np.concatenate([t0, t1]))
+        i0, i1 = np.searchsorted(months, t0), np.searchsorted(months, t1)
+        labels = _components(i0, i1, len(months))
+        main = np.argmax(np.bincount(labels[i0], n, len(months)))
+        inside = labels[i0] == main
+        kept = np.flatnonzero(labels == main)
+        remap = np.full(len(months), -1)
+        remap[kept] = np.arange(len(kept))
+        months, i0, i1 = months[kept], remap[i0[inside]], remap[i1[inside]]
+        n, sum_y, sum_y2, gap = n[inside], sum_y[inside], sum_y2[inside], (t1 - t0)[inside].astype(np.float64)
+
+        # Étape 1: MCO; étape 2: variance des résidus ~ a + b × écart de détention; étape 3: MCO pondérés
+        beta = _normal_solve(i0, i1, n, sum_y, len(months))
+        d = beta[i1] - beta[i0]
+        squared = sum_y2 - 2 * d * sum_y + n * d * d
+        moments = np.array([[n.sum(), (n * gap).sum()], [(n * gap).sum(), (n * gap * gap).sum()]])
+        try:
+            a, b = np.linalg.solve(moments, [squared.sum(), (squared * gap).sum()])
+            weight = 1.0 / np.maximum(a + b * gap, MIN_VARIANCE)
+        except np.linalg.LinAlgError:
+            weight = np.ones(len(gap))  # un seul écart de détention: pondération uniforme
+        beta = _normal_solve(i0, i1, n * weight, sum_y * weight, len(months))
+        pairs = np.bincount(i1, n, len(months))
+        return months, beta, pairs
+
+    def panel(self, price_level: bool = True) -> MarketPanel:
+        # Indice base 100 par segment × mois, ou (price_level) ramené au prix moyen géométrique des ventes
+        # récentes du segment: prix à qualité constante comparable aux médianes
+        with self._lock:
+            solved = [self._solve(s) for s in range(len(self.segments))]
+            statistic = "repeat_sales" if price_level else "repeat_sales_index"
+            observed = [months for months, _, _ in solved if len(months)]
+            if not observed:
+                empty = np.empty((len(self.segments), 0))
+                return MarketPanel(self.segment_by, list(self.segments), 0, empty, empty.astype(np.int64), statistic)
+            first = int(min(m[0] for m in observed))
+            width = int(max(m[-1] for m in observed)) - first + 1
+            values = np.full((len(self.segments), width), np.nan)
+            counts = np.zeros((len(self.segments), width), dtype=np.int64)
+            for s, (months, beta, pairs) in enumerate(solved):
+                if not len(months):
+                    continue
+                offset = self._anchor(s, months, beta) if price_level else np.log(BASE_INDEX)
+                values[s, months - first] = np.exp(beta + offset)
+                counts[s, months - first] = pairs.astype(np.int64)
+            return MarketPanel(self.segment_by, list(self.segments), first, values, counts, statistic)
+
+    def _anchor(self, segment: int, months: np.ndarray, beta: np.ndarray) -> float:
+        # Décalage log tel que l'indice égale le log-prix moyen des ventes des ANCHOR_MONTHS derniers mois indexés
+        start, stop = np.searchsorted(self.level_keys, [segment << MONTH_BITS, (segment + 1) << MONTH_BITS])
+        level_months = self.level_keys[start:stop] & MONTH_MASK
+        n, sum_log = self.level_stats[start:stop].T
+        recent = months[-ANCHOR_MONTHS:]
+        position = np.searchsorted(months, level_months)
+        inside = np.isin(level_months, recent)
+        if not inside.any():
+            inside = np.isin(level_months, months)
+        if not inside.any():
+            return float(np.log(BASE_INDEX))
+        weights = n[inside]
+        log_level = sum_log[inside].sum() / weights.sum()
+        return float(log_level - np.average(beta[position[inside]], weights=weights))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "segment_by": list(self.segment_by),
+            "segments": len(self.segments),
+            "sales": self.sales,
+            "pairs": self.pairs,
+            "properties": len(self.last),
+            "cells": len(self.cell_keys),
+        }
+
+
+_index: Optional[RepeatSalesIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_repeat_sales_index() -> RepeatSalesIndex:
+    # Indice incrémental partagé (par région) alimenté au fil des ventes
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RepeatSalesIndex()
+        return _index
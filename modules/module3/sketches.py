@@ -0,0 +1,358 @@
+# =============================
+# sketches.py - Market Analysis Module
+# Sketches de quantiles fusionnables (seaux logarithmiques à erreur relative bornée): médianes, percentiles, tranches de prix
+# =============================
+import base64
+import os
+import struct
+import sys
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from ..common.fulltext import varint_decode, varint_encode, varint_sizes
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.fulltext import varint_decode, varint_encode, varint_sizes
+
+
+# Une valeur v tombe dans le seau k = ceil(log_gamma(v + offset)) et se lit au centre du seau: tout quantile
+# est restitué à SKETCH_ALPHA près en relatif, quelle que soit l'échelle, et deux sketches se fusionnent en
+# additionnant leurs comptes (lots, processus, partitions temporelles).
+SKETCH_ALPHA = 0.01
+GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+LOG_GAMMA = np.log(GAMMA)
+MIN_VALUE = 1e-9  # v + offset plus petit: rabattu (prix nuls ou négatifs)
+MAX_BUCKETS = 2048  # seaux par groupe; au-delà les plus bas sont fusionnés (les hauts quantiles restent exacts à α)
+BUCKET_BITS = 24  # clé de table = groupe << BUCKET_BITS | seau + BUCKET_BIAS
+BUCKET_BIAS = 1 << (BUCKET_BITS - 1)
+BUCKET_MASK = (1 << BUCKET_BITS) - 1
+SKETCH_FORMAT = 1
+_HEADER = struct.Struct("<Bdddd")  # format, alpha, offset, min, max
+
+
+def bucket_index(values: np.ndarray, offset: float = 0.0) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logs = np.log(np.maximum(np.asarray(values, dtype=np.float64) + offset, MIN_VALUE))
+    return np.ceil(logs / LOG_GAMMA).astype(np.int64)
+
+
+def bucket_value(buckets: np.ndarray, offset: float = 0.0) -> np.ndarray:
+    # Centre du seau ]gamma^(k-1), gamma^k] au sens de l'erreur relative
+    return 2.0 * np.exp(buckets * LOG_GAMMA) / (GAMMA + 1.0) - offset
+
+
+def _sum_sorted(keys: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Clés quelconques -> clés triées uniques, comptes additionnés. Les seaux d'une table couvrent une plage
+    # étroite: si la grille dense groupes × seaux reste petite, un bincount remplace le tri
+    if not len(keys):
+        return keys, counts
+    low, high = keys.min(), keys.max()
+    first, rows = low >> BUCKET_BITS, (high >> BUCKET_BITS) - (low >> BUCKET_BITS) + 1
+    buckets = keys & BUCKET_MASK
+    floor = buckets.min()
+    width = int(buckets.max() - floor) + 1
+    if rows * width <= 8 * len(keys) + (1 << 16):
+        dense = np.bincount(((keys >> BUCKET_BITS) - first) * width + (buckets - floor), counts, rows * width)
+        filled = np.flatnonzero(dense)
+        unique = ((filled // width + first) << BUCKET_BITS) | (filled % width + floor)
+        return unique, dense[filled].astype(np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, counts, len(unique)).astype(np.int64)
+
+
+def _fold_sorted(keys: np.ndarray, counts: np.ndarray, new_keys: np.ndarray, new_counts: np.ndarray):
+    # Fusion de clés triées uniques dans l'état trié: comptes ajoutés aux clés connues, autres insérées
+    # (une recherche dichotomique par nouvelle clé et une recopie, pas de retri de l'état)
+    if not len(keys):
+        return new_keys, new_counts
+    position = np.searchsorted(keys, new_keys)
+    known = position < len(keys)
+    known[known] = keys[position[known]] == new_keys[known]
+    counts = counts.copy()
+    counts[position[known]] += new_counts[known]
+    fresh = ~known
+    if fresh.any():
+        keys = np.insert(keys, position[fresh], new_keys[fresh])
+        counts = np.insert(counts, position[fresh], new_counts[fresh])
+    return keys, counts
+
+
+def _collapse(keys: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Groupes de plus de MAX_BUCKETS seaux: les seaux les plus bas rejoignent le plus bas conservé
+    if len(keys) <= MAX_BUCKETS:
+        return keys, counts
+    groups = keys >> BUCKET_BITS
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    if (ends - starts).max() <= MAX_BUCKETS:
+        return keys, counts
+    owner = np.repeat(np.arange(len(starts)), ends - starts)
+    floor = np.maximum(ends - MAX_BUCKETS, starts)[owner]
+    keys = np.where(np.arange(len(keys)) < floor, keys[floor], keys)
+    return _sum_sorted(keys, counts)
+
+
+def _rank_values(values: np.ndarray, cumulative: np.ndarray, before: np.ndarray, total: np.ndarray,
+                 qs: Sequence[float]) -> List[np.ndarray]:
+    # Rang q × (n - 1) de chaque groupe (seaux [before, before + total[ du cumul) interpolé entre ses deux voisins
+    for q in qs:
+        if not 0.0 <= q <= 1.0:
+            raise ValueError(f"Quantile attendu entre 0 et 1: {q}")
+    last = len(values) - 1
+
+    def value_at(rank: np.ndarray) -> np.ndarray:
+        return values[np.minimum(np.searchsorted(cumulative, before + rank, side="right"), last)]
+
+    table = []
+    for q in qs:
+        rank = np.maximum(total - 1, 0) * q
+        lower = np.floor(rank)
+        low_value = value_at(lower)
+        table.append(np.where(total > 0, low_value + (rank - lower) * (value_at(np.ceil(rank)) - low_value), np.nan))
+    return table
+
+
+def _pack_blocks(buckets: np.ndarray, counts: np.ndarray, sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Blocs consécutifs de seaux triés (sizes[i] seaux dans le bloc i) -> [n, premier seau (zigzag), écarts,
+    # comptes] par bloc, tous encodés en une passe varint; renvoie les octets et la longueur de chaque bloc
+    sizes = np.asarray(sizes, dtype=np.int64)
+    width = np.maximum(2 * sizes + 1, 2)
+    base = np.cumsum(width) - width
+    block = np.repeat(np.arange(len(sizes)), sizes)
+    rank = np.arange(len(buckets)) - (np.cumsum(sizes) - sizes)[block]
+    values = np.zeros(int(width.sum()), dtype=np.int64)
+    values[base] = sizes
+    step = buckets - np.r_[0, buckets[:-1]]
+    step[rank == 0] = (buckets[rank == 0] << 1) ^ (buckets[rank == 0] >> 63)
+    values[base[block] + 1 + rank] = step
+    values[base[block] + 1 + sizes[block] + rank] = counts
+    if not len(values):
+        return np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.int64)
+    values = values.astype(np.uint64)
+    return varint_encode(values), np.add.reduceat(varint_sizes(values), base)
+
+
+def _unpack_blocks(values: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Inverse de _pack_blocks sur les entiers décodés: (bloc, seau, compte) de chaque seau
+    starts, sizes, position = np.zeros(count, dtype=np.int64), np.zeros(count, dtype=np.int64), 0
+    for i in range(count):
+        n = values.item(position)
+        starts[i], sizes[i] = position, n
+        position += max(2 * n + 1, 2)
+    block = np.repeat(np.arange(count), sizes)
+    first = np.cumsum(sizes) - sizes
+    rank = np.arange(int(sizes.sum())) - first[block]
+    step = values[starts[block] + 1 + rank]
+    step[rank == 0] = (step[rank == 0] >> 1) ^ -(step[rank == 0] & 1)
+    running = np.cumsum(step)
+    buckets = running - (running - step)[first[block]]
+    return block, buckets, values[starts[block] + 1 + sizes[block] + rank]
+
+
+# =============================
+# Sketch d'un groupe
+# =============================
+class QuantileSketch:
+    # Seaux non vides triés et leurs comptes, plus min / max exacts (bornes des quantiles restitués).
+    # Mémoire: un seau par tranche de 2 % de prix occupée, au plus MAX_BUCKETS, indépendamment du nombre de ventes.
+    def __init__(self, offset: float = 0.0):
+        self.offset = offset
+        self.buckets = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.low = np.inf
+        self.high = -np.inf
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def nbytes(self) -> int:
+        return self.buckets.nbytes + self.counts.nbytes
+
+    def add(self, values: Sequence[float]) -> "QuantileSketch":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            buckets, counts = np.unique(bucket_index(values, self.offset), return_counts=True)
+            self._fold(buckets, counts, float(values.min()), float(values.max()))
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.offset != self.offset:
+            raise ValueError(f"Sketches incompatibles (décalage {self.offset} / {other.offset})")
+        if len(other.buckets):
+            self._fold(other.buckets, other.counts, other.low, other.high)
+        return self
+
+    def _fold(self, buckets: np.ndarray, counts: np.ndarray, low: float, high: float) -> None:
+        keys, counts = _fold_sorted(self.buckets + BUCKET_BIAS, self.counts, buckets + BUCKET_BIAS, counts)
+        keys, self.counts = _collapse(keys, counts)
+        self.buckets = keys - BUCKET_BIAS
+        self.low, self.high = min(self.low, low), max(self.high, high)
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        if not len(self.buckets):
+            return np.full(len(qs), np.nan)
+        cumulative = np.cumsum(self.counts)
+        zero, total = np.zeros(1), cumulative[-1:]
+        table = _rank_values(bucket_value(self.buckets, self.offset), cumulative, zero, total, qs)
+        return np.clip(np.concatenate(table), self.low, self.high)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def bands(self, edges: Sequence[float]) -> np.ndarray:
+        # Comptes par tranche ]-inf, e0[, [e0, e1[, ..., [e_last, +inf[ (bord de tranche connu à α près)
+        values = bucket_value(self.buckets, self.offset)
+        return np.bincount(np.searchsorted(np.asarray(edges, dtype=np.float64), values, side="right"),
+                           self.counts, len(edges) + 1).astype(np.int64)
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(SKETCH_FORMAT, SKETCH_ALPHA, self.offset, self.low, self.high)
+        return header + _pack_blocks(self.buckets, self.counts, [len(self.buckets)])[0].tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        version, alpha, offset, low, high = _HEADER.unpack_from(data)
+        if version != SKETCH_FORMAT or alpha != SKETCH_ALPHA:
+            raise ValueError(f"Sketch incompatible (format {version}, alpha {alpha})")
+        sketch = cls(offset)
+        values = varint_decode(np.frombuffer(data, dtype=np.uint8, offset=_HEADER.size))
+        _, sketch.buckets, sketch.counts = _unpack_blocks(values, 1)
+        sketch.low, sketch.high = low, high
+        return sketch
+
+    def encode(self) -> str:
+        # Texte base64 transportable dans les sorties JSON des tools
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def decode(cls, text: str) -> "QuantileSketch":
+        return cls.from_bytes(base64.b64decode(text))
+
+
+def merge_sketches(encoded: Sequence[Optional[str]], offset: float = 0.0) -> QuantileSketch:
+    # Sketches sérialisés (ex. colonne price_sketch de plusieurs groupes) -> un seul sketch
+    merged = QuantileSketch(offset)
+    for text in encoded:
+        if text:
+            merged.merge(QuantileSketch.decode(text))
+    return merged
+
+
+# =============================
+# Sketches de nombreux groupes
+# =============================
+class SketchTable:
+    # Sketches de tous les groupes d'un accumulateur dans deux tableaux triés (clé groupe | seau, compte):
+    # ajout d'un lot, fusion, regroupement et quantiles de tous les groupes sont vectorisés. Les min / max
+    # exacts restent à l'appelant (MarketAccumulator les tient déjà par groupe).
+    def __init__(self, offset: float = 0.0):
+        self.offset = offset
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.counts.nbytes
+
+    def _fold(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        self.keys, self.counts = _collapse(*_fold_sorted(self.keys, self.counts, keys, counts))
+
+    def add(self, groups: np.ndarray, values: np.ndarray) -> None:
+        # Valeurs (sans NaN) et numéro de groupe de chacune
+        keys = (np.asarray(groups, dtype=np.int64) << BUCKET_BITS) | (bucket_index(values, self.offset) + BUCKET_BIAS)
+        self._fold(*_sum_sorted(keys, np.ones(len(keys), dtype=np.int64)))
+
+    def add_buckets(self, groups: np.ndarray, buckets: np.ndarray, counts: np.ndarray) -> None:
+        # Seaux déjà comptés (état persisté): groupe, seau et compte de chacun
+        if len(buckets):
+            keys = (np.asarray(groups, dtype=np.int64) << BUCKET_BITS) | (buckets + BUCKET_BIAS)
+            if not (keys[1:] > keys[:-1]).all():
+                keys, counts = _sum_sorted(keys, counts)
+            self._fold(keys, counts)
+
+    def merge(self, other: "SketchTable", target: np.ndarray) -> None:
+        # Table d'un autre accumulateur dont le groupe g devient target[g]
+        if other.offset != self.offset:
+            raise ValueError(f"Sketches incompatibles (décalage {self.offset} / {other.offset})")
+        if len(other):
+            self._fold(*_sum_sorted(self._renumber(other.keys, target), other.counts))
+
+    def regroup(self, target: np.ndarray) -> "SketchTable":
+        # Nouvelle table: groupe g -> target[g] (roll-up), groupes à -1 écartés
+        table = SketchTable(self.offset)
+        kept = target[self.keys >> BUCKET_BITS] >= 0
+        if kept.any():
+            table.keys, table.counts = _collapse(*_sum_sorted(self._renumber(self.keys[kept], target), self.counts[kept]))
+        return table
+
+    def entries(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (groupe, seau, compte) de chaque seau stocké, pour une renumérotation libre (add_buckets)
+        return self.keys >> BUCKET_BITS, (self.keys & BUCKET_MASK) - BUCKET_BIAS, self.counts
+
+    @staticmethod
+    def _renumber(keys: np.ndarray, target: np.ndarray) -> np.ndarray:
+        return (np.asarray(target, dtype=np.int64)[keys >> BUCKET_BITS] << BUCKET_BITS) | (keys & BUCKET_MASK)
+
+    def _group(self, group: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, stop = np.searchsorted(self.keys, [group << BUCKET_BITS, (group + 1) << BUCKET_BITS])
+        return (self.keys[start:stop] & BUCKET_MASK) - BUCKET_BIAS, self.counts[start:stop]
+
+    def quantiles(self, qs: Sequence[float], groups: np.ndarray) -> List[np.ndarray]:
+        # Quantiles (non bornés par min / max) des groupes demandés; NaN pour un groupe vide
+        groups = np.asarray(groups, dtype=np.int64)
+        if not len(self.keys):
+            return [np.full(len(groups), np.nan) for _ in qs]
+        owner = self.keys >> BUCKET_BITS
+        cumulative = np.cumsum(self.counts)
+        start, stop = np.searchsorted(owner, groups, "left"), np.searchsorted(owner, groups, "right")
+        before = np.where(start > 0, cumulative[np.maximum(start - 1, 0)], 0)
+        total = np.where(stop > start, cumulative[np.maximum(stop - 1, 0)], 0) - before
+        values = bucket_value((self.keys & BUCKET_MASK) - BUCKET_BIAS, self.offset)
+        return _rank_values(values, cumulative, before, total, qs)
+
+    def sketch(self, group: int, low: Optional[float] = None, high: Optional[float] = None) -> QuantileSketch:
+        # Sketch autonome d'un groupe; min / max exacts fournis par l'appelant, sinon centres des seaux extrêmes
+        sketch = QuantileSketch(self.offset)
+        sketch.buckets, sketch.counts = self._group(group)
+        if len(sketch.buckets):
+            edges = bucket_value(sketch.buckets[[0, -1]], self.offset)
+            sketch.low = float(edges[0]) if low is None else float(low)
+            sketch.high = float(edges[1]) if high is None else float(high)
+        return sketch
+
+    def pack(self, groups: np.ndarray) -> List[bytes]:
+        # Sketches (seaux, comptes) des groupes demandés, sérialisés en une passe: un bloc d'octets par groupe
+        owner = self.keys >> BUCKET_BITS
+        groups = np.asarray(groups, dtype=np.int64)
+        start, stop = np.searchsorted(owner, groups, "left"), np.searchsorted(owner, groups, "right")
+        sizes = stop - start
+        entries = np.arange(int(sizes.sum())) + np.repeat(start - (np.cumsum(sizes) - sizes), sizes)
+        encoded, lengths = _pack_blocks((self.keys[entries] & BUCKET_MASK) - BUCKET_BIAS, self.counts[entries], sizes)
+        data, ends = encoded.tobytes(), np.cumsum(lengths).tolist()
+        return [data[end - length : end] for end, length in zip(ends, lengths.tolist())]
+
+    def encode(self, groups: np.ndarray, lows: np.ndarray, highs: np.ndarray) -> List[Optional[str]]:
+        # Même texte que QuantileSketch.encode (min / max exacts de l'appelant); None pour un groupe vide
+        return [
+            base64.b64encode(_HEADER.pack(SKETCH_FORMAT, SKETCH_ALPHA, self.offset, lo, hi) + payload).decode("ascii")
+            if np.isfinite(lo) else None
+            for payload, lo, hi in zip(self.pack(groups), lows, highs)
+        ]
+
+
+def unpack_groups(blobs: Sequence[bytes], per_blob: int) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    # Blobs de per_blob sketches concaténés (un par table) -> pour chaque table: (n° de blob, seau, compte)
+    if not blobs:
+        return [(np.zeros(0, dtype=np.int64),) * 3 for _ in range(per_blob)]
+    values = varint_decode(np.frombuffer(b"".join(blobs), dtype=np.uint8))
+    block, buckets, counts = _unpack_blocks(values, len(blobs) * per_blob)
+    blob, table = np.divmod(block, per_blob)
+    return [(blob[table == j], buckets[table == j], counts[table == j]) for j in range(per_blob)]
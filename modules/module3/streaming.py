@@ -0,0 +1,382 @@
+# =============================
+# streaming.py - Market Analysis Module
+# Ingestion par blocs des gros flux de marché (JSON Lines, CSV, Parquet, JSON): mémoire bornée, agrégats cumulés
+# =============================
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from agno.utils.log import log_debug
+
+try:
+    import resource  # pic mémoire du processus (absent sous Windows)
+except ImportError:
+    resource = None
+
+try:
+    from .aggregation import (
+        GROUP_KEYS, SKETCH_METRICS, check_group_by, normalize_market_frame, read_market_file, resolve_market_path,
+    )
+    from .sketches import QuantileSketch, SketchTable
+except ImportError:
+    from aggregation import (
+        GROUP_KEYS, SKETCH_METRICS, check_group_by, normalize_market_frame, read_market_file, resolve_market_path,
+    )
+    from sketches import QuantileSketch, SketchTable
+
+
+CHUNK_ROWS = int(os.getenv("MARKET_CHUNK_ROWS", "200000"))
+# Au-delà de cette taille, aggregate_market_data lit le fichier par blocs plutôt qu'en une fois
+STREAM_THRESHOLD_BYTES = int(os.getenv("MARKET_STREAM_THRESHOLD_MB", "256")) * 1024 * 1024
+JSON_BLOCK_BYTES = 1 << 20
+
+
+# =============================
+# Lecture par blocs
+# =============================
+def _iter_json_array(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    # Tableau JSON décodé objet par objet dans un tampon de 1 Mo (pas de chargement du fichier entier)
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer, pos, eof = f.read(JSON_BLOCK_BYTES).lstrip(), 1, False
+        if not buffer.startswith("["):
+            raise ValueError(f"{path}: tableau JSON attendu")
+        rows: List[Dict[str, Any]] = []
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                break
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError("fin de tampon", buffer, pos)
+                row, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Objet coupé par la fin du tampon: on complète avec le bloc suivant
+                if eof:
+                    raise
+                more = f.read(JSON_BLOCK_BYTES)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            rows.append(row)
+            if len(rows) >= chunk_rows:
+                yield pd.DataFrame.from_records(rows)
+                rows = []
+        if rows:
+            yield pd.DataFrame.from_records(rows)
+
+
+def _iter_json_lines(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    # Lecteur Arrow par blocs (plusieurs fois plus rapide que pandas). Son schéma est inféré sur le premier
+    # bloc: un champ nouveau ou de type différent plus loin fait basculer sur pandas après les lignes déjà lues
+    consumed = 0
+    try:
+        import pyarrow as pa
+        import pyarrow.json as pj
+
+        batches, pending = [], 0
+        for batch in pj.open_json(path, read_options=pj.ReadOptions(block_size=2 * JSON_BLOCK_BYTES)):
+            batches.append(batch)
+            pending += batch.num_rows
+            if pending >= chunk_rows:
+                yield pa.Table.from_batches(batches).to_pandas()
+                consumed, batches, pending = consumed + pending, [], 0
+        if batches:
+            yield pa.Table.from_batches(batches).to_pandas()
+        return
+    except (ImportError, AttributeError) as e:
+        log_debug(f"Lecteur JSON Lines Arrow indisponible ({e})")
+    except pa.ArrowInvalid as e:
+        log_debug(f"{path}: schéma JSON Lines variable, suite de la lecture avec pandas ({e})")
+    with pd.read_json(path, lines=True, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            if consumed >= len(chunk):
+                consumed -= len(chunk)
+                continue
+            yield chunk.iloc[consumed:]
+            consumed = 0
+
+
+def iter_market_chunks(path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    # Blocs bruts (colonnes d'origine) d'environ chunk_rows lignes
+    if chunk_rows <= 0:
+        raise ValueError("chunk_rows doit être positif")
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif extension == ".csv":
+        with pd.read_csv(path, chunksize=chunk_rows) as reader:
+            yield from reader
+    elif extension in (".jsonl", ".ndjson"):
+        yield from _iter_json_lines(path, chunk_rows)
+    elif os.path.getsize(path) <= STREAM_THRESHOLD_BYTES:
+        # Petit JSON (éventuellement au format repr Python comme documents3): lecture directe
+        frame = read_market_file(path)
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start : start + chunk_rows]
+    else:
+        yield from _iter_json_array(path, chunk_rows)
+
+
+# =============================
+# Agrégats cumulés
+# =============================
+METRICS = ("price", "price_per_sqm", "days_on_market")
+METRIC_OFFSETS = {"price": 0.0, "price_per_sqm": 0.0, "days_on_market": 1.0}  # log(v + 1): zéro jour possible
+
+
+def _segment_reduce(ufunc: np.ufunc, values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    # Réduction par tranches de lignes consécutives: une réduction contiguë par tranche reste plus rapide que
+    # ufunc.reduceat le long de l'axe 0, même avec des milliers de tranches
+    if len(starts) == len(values):
+        return values
+    ends = np.r_[starts[1:], len(values)]
+    return np.stack([ufunc.reduce(values[s:e], axis=0) for s, e in zip(starts, ends)])
+
+
+class MarketAccumulator:
+    # Une ligne de tableaux numpy par groupe: compte, sommes, min / max et stock exacts, sketches de quantiles
+    # (sketches.py) pour médianes et percentiles à 1 % près. La mémoire dépend du nombre de groupes et de
+    # l'étendue de leurs prix (un seau par tranche de 2 %), pas du nombre de lignes lues; fusionnable (merge).
+    def __init__(self, group_by: Sequence[str] = GROUP_KEYS):
+        check_group_by(group_by)
+        self.group_by = tuple(group_by)
+        self.keys: List[Tuple[Any, ...]] = []
+        self.group_of: Dict[Tuple[Any, ...], int] = {}
+        self.rows = 0
+        self.sketches = {m: SketchTable(METRIC_OFFSETS[m]) for m in METRICS}
+        self._allocate(64)
+
+    def _allocate(self, capacity: int) -> None:
+        old = getattr(self, "counts", None)
+        n = 0 if old is None else len(old)
+        counts = np.zeros(capacity, dtype=np.int64)
+        inventory = np.zeros(capacity, dtype=np.int64)
+        sums = np.zeros((capacity, len(METRICS)))
+        observed = np.zeros((capacity, len(METRICS)), dtype=np.int64)
+        lows = np.full((capacity, len(METRICS)), np.inf)
+        highs = np.full((capacity, len(METRICS)), -np.inf)
+        if old is not None:
+            counts[:n], inventory[:n] = self.counts[:n], self.inventory[:n]
+            sums[:n], observed[:n] = self.sums[:n], self.observed[:n]
+            lows[:n], highs[:n] = self.lows[:n], self.highs[:n]
+        self.counts, self.inventory, self.sums, self.observed = counts, inventory, sums, observed
+        self.lows, self.highs = lows, highs
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.counts, self.inventory, self.sums, self.observed, self.lows, self.highs]
+        return sum(a.nbytes for a in arrays) + sum(t.nbytes for t in self.sketches.values())
+
+    def _group_ids(self, keys: Sequence[Tuple[Any, ...]]) -> np.ndarray:
+        ids = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            gid = self.group_of.get(key)
+            if gid is None:
+                gid = self.group_of[key] = len(self.keys)
+                self.keys.append(key)
+            ids[i] = gid
+        if len(self.keys) > len(self.counts):
+            self._allocate(max(2 * len(self.counts), len(self.keys)))
+        return ids
+
+    def _chunk_groups(self, frame: pd.DataFrame) -> Tuple[np.ndarray, List[Tuple[Any, ...]]]:
+        # Clé composite entière (codes catégoriels × mois) factorisée; libellés lus sur la première ligne de chaque groupe
+        combined = np.zeros(len(frame), dtype=np.int64)
+        for key in self.group_by:
+            if key == "month":
+                codes = frame["month"].to_numpy(dtype=np.int64) + 1
+                size = int(codes.max()) + 1 if len(codes) else 1
+            else:
+                codes = frame[key].cat.codes.to_numpy(dtype=np.int64)
+                size = len(frame[key].cat.categories)
+            combined = combined * size + codes
+        local, uniques = pd.factorize(combined)
+        first = np.full(len(uniques), len(frame), dtype=np.int64)
+        np.minimum.at(first, local, np.arange(len(frame)))
+        columns = [
+            frame[key].to_numpy()[first].astype(object if key != "month" else np.int64)
+            for key in self.group_by
+        ]
+        labels = [
+            tuple(str(c[i]) if key != "month" else int(c[i]) for key, c in zip(self.group_by, columns))
+            for i in range(len(uniques))
+        ]
+        return local, labels
+
+    def fold(self, frame: pd.DataFrame) -> "MarketAccumulator":
+        self.fold_groups(frame)
+        return self
+
+    def fold_groups(self, frame: pd.DataFrame) -> np.ndarray:
+        # frame normalisée (normalize_market_frame): une passe bincount par métrique, seaux des sketches comptés
+        # sur le lot puis fusionnés dans l'état; renvoie les groupes touchés
+        if frame.empty:
+            return np.zeros(0, dtype=np.int64)
+        local, labels = self._chunk_groups(frame)
+        touched = self._group_ids(labels)
+        gid = touched[local]
+        size = len(self.counts)
+        self.counts += np.bincount(gid, minlength=size)
+        self.inventory += np.bincount(gid, weights=frame["active"].to_numpy(), minlength=size).astype(np.int64)
+        for j, metric in enumerate(METRICS):
+            values = frame[metric].to_numpy(dtype=np.float64)
+            ok = ~np.isnan(values)
+            rows, values = gid[ok], values[ok]
+            self.sums[:, j] += np.bincount(rows, weights=values, minlength=size)
+            self.observed[:, j] += np.bincount(rows, minlength=size)
+            np.minimum.at(self.lows[:, j], rows, values)
+            np.maximum.at(self.highs[:, j], rows, values)
+            self.sketches[metric].add(rows, values)
+        self.rows += len(frame)
+        return touched
+
+    def merge(self, other: "MarketAccumulator") -> "MarketAccumulator":
+        # Agrégats de deux lectures (fichiers / partitions en parallèle) additionnés groupe à groupe
+        if other.group_by != self.group_by:
+            raise ValueError(f"Regroupements incompatibles: {self.group_by} / {other.group_by}")
+        n = len(other)
+        if not n:
+            return self
+        target = self._group_ids(other.keys)
+        self.counts[target] += other.counts[:n]
+        self.inventory[target] += other.inventory[:n]
+        self.sums[target] += other.sums[:n]
+        self.observed[target] += other.observed[:n]
+        self.lows[target] = np.minimum(self.lows[target], other.lows[:n])
+        self.highs[target] = np.maximum(self.highs[target], other.highs[:n])
+        for metric in METRICS:
+            self.sketches[metric].merge(other.sketches[metric], target)
+        self.rows += other.rows
+        return self
+
+    def rollup(self, group_by: Sequence[str], rows: Optional[np.ndarray] = None) -> "MarketAccumulator":
+        # Groupes fins -> groupes plus grossiers (sous-ensemble des clés), sur toutes les lignes ou une sélection
+        missing = set(group_by) - set(self.group_by)
+        if missing:
+            raise ValueError(f"Clés absentes de l'accumulateur: {sorted(missing)} (disponibles: {self.group_by})")
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        positions = [self.group_by.index(key) for key in group_by]
+        coarse = MarketAccumulator(group_by)
+        target = coarse._group_ids([tuple(self.keys[r][p] for p in positions) for r in rows])
+        if not len(rows):
+            return coarse
+        # Lignes triées par groupe cible puis réduites par tranches; seaux des sketches renumérotés et additionnés
+        order = np.argsort(target, kind="stable")
+        rows, target = rows[order], target[order]
+        starts = np.flatnonzero(np.r_[True, target[1:] != target[:-1]])
+        groups = target[starts]
+        coarse.counts[groups] = _segment_reduce(np.add, self.counts[rows], starts)
+        coarse.inventory[groups] = _segment_reduce(np.add, self.inventory[rows], starts)
+        coarse.sums[groups] = _segment_reduce(np.add, self.sums[rows], starts)
+        coarse.observed[groups] = _segment_reduce(np.add, self.observed[rows], starts)
+        coarse.lows[groups] = _segment_reduce(np.minimum, self.lows[rows], starts)
+        coarse.highs[groups] = _segment_reduce(np.maximum, self.highs[rows], starts)
+        mapping = np.full(len(self), -1, dtype=np.int64)
+        mapping[rows] = target
+        for metric in METRICS:
+            coarse.sketches[metric] = self.sketches[metric].regroup(mapping)
+        coarse.rows = int(coarse.counts.sum())
+        return coarse
+
+    def quantiles(self, metric: str, q: float) -> np.ndarray:
+        return self._quantile_table(metric, [q])[0]
+
+    def _quantile_table(self, metric: str, qs: Sequence[float]) -> List[np.ndarray]:
+        # Quantiles de tous les groupes lus sur leurs sketches (erreur relative ≤ SKETCH_ALPHA), bornés par min / max
+        n = len(self)
+        j = METRICS.index(metric)
+        table = self.sketches[metric].quantiles(qs, np.arange(n))
+        return [np.clip(values, self.lows[:n, j], self.highs[:n, j]) for values in table]
+
+    def sketch(self, metric: str, group: int) -> QuantileSketch:
+        # Sketch autonome d'un groupe (min / max exacts), à fusionner ou sérialiser
+        j = METRICS.index(metric)
+        return self.sketches[metric].sketch(group, self.lows[group, j], self.highs[group, j])
+
+    def _medians(self, metric: str) -> np.ndarray:
+        return self.quantiles(metric, 0.5)
+
+    def result(self, quantiles: Sequence[float] = (), sketches: bool = False) -> pd.DataFrame:
+        # Même colonnes qu'aggregate_market (médianes approchées, le reste exact), plus les quantiles
+        # demandés du prix et du prix au m² (ex. 0.25 -> p25_price, p25_price_per_sqm) et, avec sketches,
+        # les sketches sérialisés (price_sketch, price_per_sqm_sketch) à fusionner ailleurs
+        n = len(self)
+        keys = pd.DataFrame(self.keys, columns=list(self.group_by)) if n else pd.DataFrame(columns=list(self.group_by))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = self.sums[:n] / self.observed[:n]
+        price = self._quantile_table("price", [0.5, *quantiles])
+        price_per_sqm = self._quantile_table("price_per_sqm", [0.5, *quantiles])
+        result = keys.assign(
+            count=self.counts[:n],
+            median_price=price[0],
+            mean_price=means[:, 0],
+            median_price_per_sqm=price_per_sqm[0],
+            mean_price_per_sqm=means[:, 1],
+            median_days_on_market=self._medians("days_on_market"),
+            mean_days_on_market=means[:, 2],
+            inventory=self.inventory[:n],
+        )
+        for i, q in enumerate(quantiles, start=1):
+            label = f"p{round(q * 100):g}"
+            result[f"{label}_price"] = price[i]
+            result[f"{label}_price_per_sqm"] = price_per_sqm[i]
+        for metric in SKETCH_METRICS if sketches else ():
+            j = METRICS.index(metric)
+            encoded = self.sketches[metric].encode(np.arange(n), self.lows[:n, j], self.highs[:n, j])
+            result[f"{metric}_sketch"] = encoded
+        return result.sort_values(list(self.group_by), kind="stable").reset_index(drop=True)
+
+
+# =============================
+# Ingestion
+# =============================
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # Ko sous Linux
+
+
+def ingest_market_file(
+    path: Optional[str] = None,
+    group_by: Sequence[str] = GROUP_KEYS,
+    chunk_rows: int = CHUNK_ROWS,
+    accumulator: Optional[MarketAccumulator] = None,
+) -> Tuple[MarketAccumulator, Dict[str, Any]]:
+    # Lecture bloc par bloc: normalisation puis repli dans l'accumulateur; le bloc est libéré avant le suivant
+    path = resolve_market_path(path)
+    accumulator = accumulator if accumulator is not None else MarketAccumulator(group_by)
+    size = os.path.getsize(path)
+    started = time.perf_counter()
+    rows = chunks = 0
+    for raw in iter_market_chunks(path, chunk_rows):
+        accumulator.fold(normalize_market_frame(raw))
+        rows += len(raw)
+        chunks += 1
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return accumulator, {
+        "path": path,
+        "rows": rows,
+        "chunks": chunks,
+        "chunk_rows": chunk_rows,
+        "file_mb": round(size / 1e6, 1),
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed),
+        "mb_per_second": round(size / 1e6 / elapsed, 1),
+        "state_mb": round(accumulator.nbytes / 1e6, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def should_stream(path: Optional[str] = None) -> bool:
+    return os.path.getsize(resolve_market_path(path)) > STREAM_THRESHOLD_BYTES
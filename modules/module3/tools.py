@@ -4,48 +4,395 @@
 from agno.tools import tool
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+import json
+import os
 import random
+import altair as alt
+import numpy as np
 import pandas as pd
 
+try:
+    from .aggregation import (
+        GROUP_KEYS, SKETCH_METRICS, aggregate_market, groups_to_records, load_market_frame, month_label,
+    )
+    from .charts import (
+        chart_key, forecast_chart, forecast_table, get_chart_renderer, history_table, segment_chart, segment_table,
+        trend_chart, view_key,
+    )
+    from .cube import get_market_cube
+    from .history import filter_market_frame, get_history_store
+    from .repeat_sales import REPEAT_SEGMENT_KEYS, RepeatSalesIndex, get_repeat_sales_index
+    from .sketches import merge_sketches
+    from .streaming import CHUNK_ROWS, ingest_market_file, iter_market_chunks, should_stream
+    from .forecasting import forecast_panel, get_forecast_store
+    from .trends import (
+        SEGMENT_KEYS, SHORT_WINDOW, OnlineTrendEngine, compute_trends, get_trend_engine, panel_from_frame,
+        panel_from_groups, trend_records,
+    )
+except ImportError:
+    from aggregation import (
+        GROUP_KEYS, SKETCH_METRICS, aggregate_market, groups_to_records, load_market_frame, month_label,
+    )
+    from charts import (
+        chart_key, forecast_chart, forecast_table, get_chart_renderer, history_table, segment_chart, segment_table,
+        trend_chart, view_key,
+    )
+    from cube import get_market_cube
+    from history import filter_market_frame, get_history_store
+    from repeat_sales import REPEAT_SEGMENT_KEYS, RepeatSalesIndex, get_repeat_sales_index
+    from sketches import merge_sketches
+    from streaming import CHUNK_ROWS, ingest_market_file, iter_market_chunks, should_stream
+    from forecasting import forecast_panel, get_forecast_store
+    from trends import (
+        SEGMENT_KEYS, SHORT_WINDOW, OnlineTrendEngine, compute_trends, get_trend_engine, panel_from_frame,
+        panel_from_groups, trend_records,
+    )
+
+# =============================
+# Historique partitionné (source par défaut)
+# =============================
+PANEL_COLUMNS = ["region", "property_type", "month", "price"]
+REPEAT_COLUMNS = PANEL_COLUMNS + ["property_id"]
+TREND_METHODS = ("median", "repeat_sales")
+
+
+def _market_frame(source, source_path, region=None, month_from=None, month_to=None, columns=None):
+    # Ventes fournies > fichier explicite > historique partitionné (filtres et colonnes poussés à la lecture)
+    # > documents3. Renvoie (frame normalisée, statistiques de lecture de l'historique ou None)
+    store = get_history_store()
+    if source is None and source_path is None and store:
+        return store.read(columns, region=region, month_from=month_from, month_to=month_to)
+    frame = load_market_frame(source if source is not None else source_path)
+    return filter_market_frame(frame, region, month_from=month_from, month_to=month_to), None
+
+
+@tool(
+    name="update_market_history",
+    description="Ajoute des transactions (datasets ou fichier de documents3) à l'historique de marché local partitionné par région et mois (Parquet); les tools du module le lisent ensuite directement, en ne chargeant que les partitions utiles",
+    show_result=True,
+)
+def update_market_history(
+    datasets: Optional[List[Dict[str, Any]]] = None,
+    source_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    # L'historique ne dédoublonne pas: n'envoyer que les transactions non encore intégrées
+    store = get_history_store()
+    if datasets is not None:
+        update = store.append(load_market_frame(datasets))
+        update["partitions_compacted"] = store.compact()
+    else:
+        update = store.ingest_file(source_path)
+    return {"update": update, "history": store.summary(), "updated_at": datetime.now().isoformat()}
+
 # =============================
 # Tool 1: Aggregate Market Data (Data Aggregator Agent)
 # =============================
 @tool(
     name="aggregate_market_data",
-    description="Agrège les données de marché à partir de datasets, listings publics et historiques",
+    description="Agrège les données de marché (datasets fournis, fichier de documents3: JSON, JSON Lines, CSV, Parquet, ou par défaut l'historique partitionné filtré par region / month_from / month_to): nombre, prix médian / moyen, prix au m², délai de vente et stock par région, type et mois. Les gros fichiers sont lus par blocs (mémoire bornée, médianes approchées à ~1 %). sketches=True ajoute à chaque groupe ses sketches de quantiles de prix sérialisés (price_sketch, price_per_sqm_sketch), fusionnables par price_distribution et analyze_trends",
     show_result=True,
 )
 def aggregate_market_data(
-    datasets: List[Dict[str, Any]],
-    max_entries: int = 1000
+    datasets: Optional[List[Dict[str, Any]]] = None,
+    source_path: Optional[str] = None,
+    group_by: Optional[List[str]] = None,
+    stream: Optional[bool] = None,
+    chunk_rows: int = CHUNK_ROWS,
+    region: Optional[List[str]] = None,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+    sketches: bool = False,
 ) -> Dict[str, Any]:
-    # Exemple simulé
-    aggregated = []
-    for d in datasets[:max_entries]:
-        aggregated.append({**d, "aggregated_at": datetime.now().isoformat()})
-    return {
-        "aggregated_market_data": aggregated,
-        "entries_count": len(aggregated),
+    # Sans datasets ni source_path: historique partitionné s'il existe, sinon documents3/market_data.json.
+    # Un fichier est lu par blocs au-delà du seuil MARKET_STREAM_THRESHOLD_MB ou si stream=True
+    group_by = list(group_by or GROUP_KEYS)
+    # (les filtres region / mois ne s'appliquent qu'aux lectures complètes et à l'historique)
+    filtered = region is not None or month_from is not None or month_to is not None
+    history = datasets is None and source_path is None and bool(get_history_store())
+    if datasets is None and not history and not filtered and (stream or (stream is None and should_stream(source_path))):
+        accumulator, ingestion = ingest_market_file(source_path, group_by, chunk_rows)
+        groups = accumulator.result(sketches=sketches)
+        return {
+            "aggregated_market_data": groups_to_records(groups),
+            "group_by": group_by,
+            "entries_count": accumulator.rows,
+            "groups_count": len(groups),
+            "approximate_medians": True,
+            "ingestion": ingestion,
+            "aggregated_at": datetime.now().isoformat(),
+        }
+    frame, scan = _market_frame(datasets, source_path, region, month_from, month_to)
+    groups = aggregate_market(frame, group_by, sketches)
+    result = {
+        "aggregated_market_data": groups_to_records(groups),
+        "group_by": group_by,
+        "entries_count": len(frame),
+        "groups_count": len(groups),
         "aggregated_at": datetime.now().isoformat(),
     }
+    if scan is not None:
+        result["history_scan"] = scan
+    return result
+
+# =============================
+# Tool 1 bis: Market Cube (Data Aggregator / Trend Analysis Agents)
+# =============================
+@tool(
+    name="update_market_cube",
+    description="Ajoute de nouvelles transactions (datasets ou fichier de documents3) au cube de marché persistant région × type × mois; seules les cellules touchées sont recalculées et réécrites",
+    show_result=True,
+)
+def update_market_cube(
+    datasets: Optional[List[Dict[str, Any]]] = None,
+    source_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    # Le cube ne dédoublonne pas: n'envoyer que les transactions non encore intégrées
+    cube = get_market_cube()
+    if datasets is not None:
+        update = {"rows": len(datasets), "cells_updated": cube.add(load_market_frame(datasets))}
+    else:
+        update = cube.ingest_file(source_path)
+    return {"update": update, "cube": cube.summary(), "updated_at": datetime.now().isoformat()}
+
+
+@tool(
+    name="query_market_cube",
+    description="Interroge le cube de marché matérialisé: roll-up (group_by plus grossier, ex. ['region']) ou drill-down (filtre region / property_type / période + group_by plus fin, ex. ['property_type', 'month']). Renvoie nombre, prix médian / moyen / quartiles, prix au m², délai de vente et stock sans relire les transactions; sketches=True ajoute les sketches de prix sérialisés de chaque groupe",
+    show_result=True,
+)
+def query_market_cube(
+    group_by: Optional[List[str]] = None,
+    region: Optional[List[str]] = None,
+    property_type: Optional[List[str]] = None,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+    sketches: bool = False,
+) -> Dict[str, Any]:
+    # Mois au format "AAAA-MM" (bornes incluses); médianes et quartiles approchés (~1 %) par sketches de quantiles
+    cube = get_market_cube()
+    group_by = list(group_by or ["region"])
+    groups = cube.query(group_by, region, property_type, month_from, month_to, sketches=sketches)
+    return {
+        "aggregated_market_data": groups_to_records(groups),
+        "group_by": group_by,
+        "filters": {"region": region, "property_type": property_type, "month_from": month_from, "month_to": month_to},
+        "groups_count": len(groups),
+        "entries_count": int(groups["count"].sum()) if len(groups) else 0,
+        "approximate_medians": True,
+        "cube": cube.summary(),
+        "queried_at": datetime.now().isoformat(),
+    }
+
+# =============================
+# Tool 1 ter: Price Distribution (Data Aggregator / Trend Analysis Agents)
+# =============================
+DISTRIBUTION_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+PRICE_BANDS = {
+    "price": (500_000, 1_000_000, 2_000_000, 5_000_000),
+    "price_per_sqm": (5_000, 10_000, 15_000, 20_000),
+}
+
+
+def _sketch_groups(market_data, source_path, group_by, region, month_from, month_to) -> pd.DataFrame:
+    # Groupes portant leurs sketches sérialisés: agrégats fournis (sketches=True), sinon agrégation des ventes
+    # (fichier volumineux lu par blocs, ventes fournies, historique partitionné ou documents3)
+    if market_data and _is_aggregated(market_data):
+        return filter_market_frame(pd.DataFrame.from_records(market_data), region, None, month_from, month_to)
+    keys = group_by or ["region"]
+    filtered = region is not None or month_from is not None or month_to is not None
+    if market_data is None and source_path is not None and not filtered and should_stream(source_path):
+        groups = ingest_market_file(source_path, keys)[0].result(sketches=True)
+    else:
+        frame, _ = _market_frame(market_data, source_path, region, month_from, month_to)
+        groups = aggregate_market(frame, keys, sketches=True)
+    if "month" in groups:
+        groups = groups.assign(month=[month_label(int(m)) for m in groups["month"]])
+    return groups
+
+
+def _distribution(sketch, quantiles: List[float], bands: List[float]) -> Dict[str, Any]:
+    values = sketch.quantiles(quantiles)
+    counts = sketch.bands(bands)
+    edges = [None, *bands, None]
+    total = max(sketch.count, 1)
+    return {
+        "count": sketch.count,
+        "min": round(float(sketch.low), 2) if sketch.count else None,
+        "max": round(float(sketch.high), 2) if sketch.count else None,
+        "quantiles": {
+            f"p{round(q * 100):g}": None if np.isnan(v) else round(float(v), 2) for q, v in zip(quantiles, values)
+        },
+        "bands": [
+            {"from": edges[i], "to": edges[i + 1], "count": int(c), "share_pct": round(100.0 * c / total, 1)}
+            for i, c in enumerate(counts)
+        ],
+        "sketch": sketch.encode(),
+    }
+
+
+@tool(
+    name="price_distribution",
+    description="Distribution des prix par groupe (group_by parmi region, property_type, month; [] pour le marché entier): percentiles et répartition par tranches de prix, lus sur des sketches de quantiles fusionnables (~1 % près). Accepte les sorties d'aggregate_market_data / query_market_cube avec sketches=True, y compris réunies depuis plusieurs appels, lots ou périodes, des ventes, un fichier ou par défaut l'historique partitionné; renvoie les sketches fusionnés, réutilisables tels quels",
+    show_result=True,
+)
+def price_distribution(
+    market_data: Optional[List[Dict[str, Any]]] = None,
+    source_path: Optional[str] = None,
+    group_by: Optional[List[str]] = None,
+    metric: str = "price",
+    quantiles: Optional[List[float]] = None,
+    bands: Optional[List[float]] = None,
+    region: Optional[List[str]] = None,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+) -> Dict[str, Any]:
+    # metric: "price" ou "price_per_sqm"; bands: bornes des tranches (défaut PRICE_BANDS). Les groupes d'entrée
+    # plus fins que group_by (ex. mois -> année entière) sont fusionnés sketch à sketch, sans revenir aux ventes
+    if metric not in SKETCH_METRICS:
+        raise ValueError(f"Métrique inconnue: {metric} (attendu: {SKETCH_METRICS})")
+    group_by = ["region"] if group_by is None else list(group_by)
+    quantiles = list(quantiles or DISTRIBUTION_QUANTILES)
+    bands = sorted(bands or PRICE_BANDS[metric])
+    groups = _sketch_groups(market_data, source_path, group_by, region, month_from, month_to)
+    column = f"{metric}_sketch"
+    if column not in groups:
+        raise ValueError(f"Agrégats sans {column}: les produire avec sketches=True (aggregate_market_data, query_market_cube)")
+    missing = set(group_by) - set(groups.columns)
+    if missing:
+        raise ValueError(f"Colonnes absentes des données agrégées: {sorted(missing)}")
+    groups = groups[groups[column].notna()]
+    distributions = []
+    if group_by and len(groups):
+        for key, encoded in groups.groupby(group_by, sort=True)[column]:
+            key = key if isinstance(key, tuple) else (key,)
+            labels = {k: v if isinstance(v, str) else str(v) for k, v in zip(group_by, key)}
+            distributions.append({**labels, **_distribution(merge_sketches(encoded), quantiles, bands)})
+    return {
+        "price_distribution": distributions,
+        "market": _distribution(merge_sketches(groups[column]), quantiles, bands),
+        "metric": metric,
+        "group_by": group_by,
+        "groups_count": len(distributions),
+        "merged_sketches": len(groups),
+        "generated_at": datetime.now().isoformat(),
+    }
 
 # =============================
 # Tool 2: Trend Analysis (Trend Analysis Agent)
 # =============================
+def _is_aggregated(market_data: List[Dict[str, Any]]) -> bool:
+    # Sortie d'aggregate_market_data (un groupe par ligne) plutôt que des ventes brutes
+    return bool(market_data) and "median_price" in market_data[0]
+
+
+def _segment_keys(market_data, segment_by, method) -> List[str]:
+    # Segments demandés, sinon ceux par défaut de la méthode; des agrégats sont segmentés par défaut selon
+    # leurs propres clés de groupe (ex. sortie de query_market_cube avec group_by=['property_type', 'month'])
+    if segment_by is not None:
+        return list(segment_by)
+    if method == "repeat_sales":
+        return list(REPEAT_SEGMENT_KEYS)
+    if market_data and _is_aggregated(market_data):
+        return [k for k in SEGMENT_KEYS if k in market_data[0]]
+    return list(SEGMENT_KEYS)
+
+
+def _check_method(method: str) -> None:
+    if method not in TREND_METHODS:
+        raise ValueError(f"Méthode inconnue: {method} (attendu: {TREND_METHODS})")
+
+
+def _repeat_sales_frame(market_data, source_path, region, month_from, month_to):
+    # Ventes individuelles avec property_id (les agrégats ne permettent pas d'apparier les ventes)
+    if market_data and _is_aggregated(market_data):
+        raise ValueError("L'indice de ventes répétées demande des ventes individuelles avec property_id, pas des agrégats")
+    frame, _ = _market_frame(market_data, source_path, region, month_from, month_to, REPEAT_COLUMNS)
+    return frame
+
+
 @tool(
     name="analyze_trends",
-    description="Analyse les tendances du marché et les fluctuations de prix",
+    description="Analyse les tendances du marché par segment (région, type): médiane glissante, variations mensuelle et annuelle, volatilité, momentum. Accepte des ventes brutes, la sortie d'aggregate_market_data, un fichier ou par défaut l'historique partitionné (filtres region / month_from / month_to); online=True met à jour l'état incrémental; method='repeat_sales' mesure les prix à qualité constante (indice de ventes répétées, ventes avec property_id)",
     show_result=True,
 )
 def analyze_trends(
-    market_data: List[Dict[str, Any]]
+    market_data: Optional[List[Dict[str, Any]]] = None,
+    source_path: Optional[str] = None,
+    segment_by: Optional[List[str]] = None,
+    window: int = SHORT_WINDOW,
+    online: bool = False,
+    region: Optional[List[str]] = None,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+    method: str = "median",
 ) -> Dict[str, Any]:
-    prices = [item.get("price", 0) for item in market_data if "price" in item]
-    trend_indicator = round(sum(prices)/len(prices), 2) if prices else 0
-    fluctuation = round(max(prices)-min(prices), 2) if prices else 0
+    # online: les ventes reçues sont ajoutées à l'état en ligne (Welford, sketches) et les indicateurs portent
+    # sur tout l'historique accumulé (médianes mensuelles des sketches); sinon calcul sur les seules données fournies.
+    # method="repeat_sales": indice de ventes répétées (par région par défaut), insensible au mix des biens vendus
+    _check_method(method)
+    segment_by = _segment_keys(market_data, segment_by, method)
+    if method == "repeat_sales":
+        # online: ventes ajoutées à l'indice partagé (sans ventes fournies, lecture de l'état seul)
+        index = get_repeat_sales_index() if online else RepeatSalesIndex(segment_by)
+        if online and tuple(segment_by) != index.segment_by:
+            raise ValueError(f"Le mode en ligne suit les segments {index.segment_by}")
+        frame = None
+        if not online or market_data is not None:
+            frame = _repeat_sales_frame(market_data, source_path, region, month_from, month_to)
+            index.update(frame)
+        panel, source = index.panel(), "ventes_répétées"
+        prices = frame["price"].dropna() if frame is not None else pd.Series(dtype=float)
+        average = float(prices.mean()) if len(prices) else None
+        spread = np.nanmax(panel.values) - np.nanmin(panel.values) if np.isfinite(panel.values).any() else None
+    elif market_data and _is_aggregated(market_data):
+        groups = filter_market_frame(pd.DataFrame.from_records(market_data), region, None, month_from, month_to)
+        panel, source = panel_from_groups(groups, segment_by), "agrégats"
+        weights = groups["count"] if "count" in groups else pd.Series(1, index=groups.index)
+        known = groups["mean_price"].notna()
+        average = float(np.average(groups["mean_price"][known], weights=weights[known])) if known.any() else None
+        spread = groups["median_price"].max() - groups["median_price"].min()
+    elif online or (market_data is None and source_path is not None and should_stream(source_path)):
+        # État en ligne partagé, ou fichier volumineux replié bloc par bloc dans un état jetable
+        engine = get_trend_engine() if online else OnlineTrendEngine(segment_by)
+        if online and tuple(segment_by) != engine.segment_by:
+            raise ValueError(f"Le mode en ligne suit les segments {engine.segment_by}")
+        if market_data is not None:
+            engine.update(filter_market_frame(load_market_frame(market_data), region, None, month_from, month_to))
+        elif source_path is not None:
+            for raw in iter_market_chunks(source_path):
+                engine.update(filter_market_frame(load_market_frame(raw), region, None, month_from, month_to))
+        panel, source = engine.panel(), "en_ligne" if online else "flux"
+        average = engine.average()
+        spread = np.nanmax(panel.values) - np.nanmin(panel.values) if panel.counts.sum() else None
+    else:
+        frame, scan = _market_frame(market_data, source_path, region, month_from, month_to, PANEL_COLUMNS)
+        panel, source = panel_from_frame(frame, segment_by), "historique" if scan is not None else "ventes"
+        prices = frame["price"].dropna()
+        average = float(prices.mean()) if len(prices) else None
+        spread = prices.max() - prices.min() if len(prices) else None
+
+    records = trend_records(panel, compute_trends(panel, window))
+    records.sort(key=lambda r: -r["sales"])
+    volatile = sorted((r for r in records if r["volatility_pct"] is not None), key=lambda r: -r["volatility_pct"])
+    volatilities = [r["volatility_pct"] for r in volatile]
     return {
-        "trend_indicators": {"average_price": trend_indicator},
-        "price_fluctuation_metrics": {"range": fluctuation},
+        "trend_indicators": {
+            "average_price": round(average, 2) if average is not None else 0,
+            "segments": records,
+            "segment_by": segment_by,
+            "window_months": window,
+            "source": source,
+            "method": method,
+        },
+        "price_fluctuation_metrics": {
+            "range": round(float(spread), 2) if spread is not None and np.isfinite(spread) else 0,
+            "median_volatility_pct": float(np.median(volatilities)) if volatilities else None,
+            "high_variation_segments": [
+                {**{k: r[k] for k in segment_by}, "volatility_pct": r["volatility_pct"], "yoy_change_pct": r["yoy_change_pct"]}
+                for r in volatile[:5]
+            ],
+        },
+        "segments_count": len(records),
         "analyzed_at": datetime.now().isoformat(),
     }
 
@@ -53,22 +400,69 @@ def analyze_trends(
 # Tool 3: Forecast Market (Forecasting Agent)
 # =============================
 
+def _history_panels(market_data, source_path, segment_by, region=None, month_from=None, month_to=None, method="median"):
+    # Historique mensuel par segment et pour l'ensemble du marché (ventes brutes, agrégats ou fichier)
+    if method == "repeat_sales":
+        frame = _repeat_sales_frame(market_data, source_path, region, month_from, month_to)
+        indices = RepeatSalesIndex(segment_by), RepeatSalesIndex([])
+        for index in indices:
+            index.update(frame)
+        return indices[0].panel(), indices[1].panel()
+    if market_data and _is_aggregated(market_data):
+        groups = filter_market_frame(pd.DataFrame.from_records(market_data), region, None, month_from, month_to)
+        return panel_from_groups(groups, segment_by), panel_from_groups(groups, [])
+    if market_data is None and source_path is not None and should_stream(source_path):
+        engines = OnlineTrendEngine(segment_by), OnlineTrendEngine([])
+        for raw in iter_market_chunks(source_path):
+            frame = filter_market_frame(load_market_frame(raw), region, None, month_from, month_to)
+            for engine in engines:
+                engine.update(frame)
+        return engines[0].panel(), engines[1].panel()
+    frame, _ = _market_frame(market_data, source_path, region, month_from, month_to, PANEL_COLUMNS)
+    return panel_from_frame(frame, segment_by), panel_from_frame(frame, [])
+
+
 @tool(
     name="forecast_market",
-    description="Prévoit les prix futurs du marché en utilisant des modèles simples",
+    description="Prévoit les prix du marché par segment (région, type) avec un modèle de Holt-Winters saisonnier amorti et des intervalles de prévision; historique issu de market_data (ventes ou agrégats), de source_path ou par défaut de l'historique partitionné (filtres region / month_from / month_to); method='repeat_sales' prévoit les prix à qualité constante (indice de ventes répétées)",
     show_result=True,
 )
 def forecast_market(
-    trend_indicators: Dict[str, Any],
-    months_ahead: int = 12
+    trend_indicators: Optional[Dict[str, Any]] = None,
+    months_ahead: int = 12,
+    market_data: Optional[List[Dict[str, Any]]] = None,
+    source_path: Optional[str] = None,
+    segment_by: Optional[List[str]] = None,
+    confidence: int = 80,
+    max_segments: int = 50,
+    region: Optional[List[str]] = None,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+    method: str = "median",
 ) -> Dict[str, Any]:
-    base = trend_indicators.get("average_price", 1000000)
-    future_predictions = [
-        {"month": i+1, "forecast_price": round(base*(1+0.01*(i+1)), 2)}
-        for i in range(months_ahead)
-    ]
+    # Les modèles ajustés sont conservés (forecasts/models.sqlite): un nouveau mois ne relance qu'un
+    # raffinement local des paramètres, une série inchangée reprend ses paramètres tels quels.
+    # method="repeat_sales": prévision de l'indice de ventes répétées exprimé en prix à qualité constante
+    _check_method(method)
+    if segment_by is None:
+        segment_by = (trend_indicators or {}).get("segment_by") or None
+    segment_by = _segment_keys(market_data, segment_by, method)
+    segment_panel, market_panel = _history_panels(
+        market_data, source_path, segment_by, region, month_from, month_to, method
+    )
+    store = get_forecast_store()
+    segments, stats = forecast_panel(segment_panel, months_ahead, confidence, store=store)
+    market, _ = forecast_panel(market_panel, months_ahead, confidence, store=store, workers=1)
+    predictions = market[0]["forecast"] if market else []
+    segments.sort(key=lambda r: -r["history_months"])
     return {
-        "future_market_predictions": future_predictions,
+        "future_market_predictions": [{"horizon": h + 1, **p} for h, p in enumerate(predictions)],
+        "segment_forecasts": segments[:max_segments],
+        "segment_by": list(segment_by),
+        "segments_count": len(segments),
+        "confidence": confidence,
+        "method": method,
+        "model_stats": stats,
         "forecast_generated_at": datetime.now().isoformat(),
     }
 
@@ -76,15 +470,40 @@ def forecast_market(
 # Tool 4: Visualization (Visualization Agent)
 # =============================
 
+def _report_charts(forecast_data: Dict[str, Any], market_data: Optional[List[Dict[str, Any]]]) -> List[tuple]:
+    # (type, empreinte, constructeur) des graphiques disponibles; tables préparées ici, specs construites au rendu
+    inputs = []
+    forecast = forecast_table(forecast_data.get("future_market_predictions", []))
+    segments = segment_table(forecast_data.get("segment_forecasts", []), forecast_data.get("segment_by") or [])
+    trend = market = None
+    if market_data:
+        region_panel, market_panel = _history_panels(market_data, None, ["region"])
+        trend, market = history_table(region_panel), history_table(market_panel)
+    if trend is not None:
+        inputs.append(("trend", chart_key("trend", {"history": trend}), lambda: trend_chart(trend)))
+    if forecast is not None:
+        history = market[["month", "price"]] if market is not None else None
+        key = chart_key("forecast", {"forecast": forecast, "history": history})
+        inputs.append(("forecast", key, lambda: forecast_chart(forecast, history)))
+    if segments is not None:
+        inputs.append(("segments", chart_key("segments", {"segments": segments}), lambda: segment_chart(segments)))
+    return inputs
+
+
 @tool(
     name="generate_visual_reports",
-    description="Génère des graphiques et rapports visuels à partir des prévisions de marché",
+    description="Génère les graphiques du marché dans reports3 (HTML interactifs): évolution des prix par région, prévision avec intervalle, comparaison des segments et tableau de bord. Les rendus sont mis en cache: une vue répétée est immédiate",
     show_result=True,
 )
 def generate_visual_reports(
-    forecast_data: Dict[str, Any],
-    output_file: Optional[str] = None
+    forecast_data: Optional[Dict[str, Any]] = None,
+    market_data: Optional[List[Dict[str, Any]]] = None,
+    output_file: Optional[str] = None,
+    wait: bool = False,
 ) -> Dict[str, Any]:
+    # forecast_data: sortie de forecast_market; market_data: ventes ou agrégats mensuels pour l'historique.
+    # Rendus absents lancés en tâche de fond (status "rendering"), wait=True pour les attendre.
+    forecast_data = forecast_data or {}
     predictions = forecast_data.get("future_market_predictions", [])
     prices = [f["forecast_price"] for f in predictions]
     report_summary = {
@@ -92,8 +511,29 @@ def generate_visual_reports(
         "min_predicted": min(prices) if prices else 0,
         "mean_predicted": round(sum(prices)/len(prices), 2) if prices else 0,
     }
+    renderer = get_chart_renderer()
+    view = view_key(forecast_data, market_data)
+    charts = renderer.cached_view(view)
+    if charts is None:
+        inputs = _report_charts(forecast_data, market_data)
+        if len(inputs) > 1:
+            builders = [build for _, _, build in inputs]
+            key = chart_key("dashboard", {}, {"charts": ",".join(key for _, key, _ in inputs)})
+            inputs.append(("dashboard", key, lambda: alt.vconcat(*(b() for b in builders))))
+        charts = [renderer.submit(kind, key, build) for kind, key, build in inputs]
+        renderer.remember_view(view, [(kind, key) for kind, key, _ in inputs])
+    if wait:
+        renderer.wait(charts)
+    for chart in charts:
+        chart.pop("future", None)
+        chart["file"] = os.path.basename(chart.pop("path"))
+
+    output_file = output_file or "forecast_summary.json"
+    os.makedirs(renderer.directory, exist_ok=True)
+    with open(os.path.join(renderer.directory, os.path.basename(output_file)), "w", encoding="utf-8") as handle:
+        json.dump({"visual_reports": report_summary, "charts": charts}, handle, ensure_ascii=False, indent=2)
     return {
-        "visual_reports": report_summary,
+        "visual_reports": {**report_summary, "charts": charts},
         "generated_at": datetime.now().isoformat(),
-        "output_file": output_file or "forecast_summary.json",
+        "output_file": output_file,
     }
@@ -0,0 +1,383 @@
+# =============================
+# trends.py - Market Analysis Module
+# Moteur de tendances: panneau segment × mois, médianes glissantes, variations M-1 / N-1, volatilité, momentum
+# =============================
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from .aggregation import month_label
+    from .sketches import SketchTable, merge_sketches
+except ImportError:
+    from aggregation import month_label
+    from sketches import SketchTable, merge_sketches
+
+
+SEGMENT_KEYS = ("region", "property_type")
+SHORT_WINDOW = 3  # médiane glissante / momentum court terme (mois)
+LONG_WINDOW = 12  # volatilité / momentum long terme (mois)
+STABLE_BAND = 0.01  # |momentum| sous 1 %: marché stable
+CELL_MONTH_BITS = 20  # groupe de sketch en ligne = ligne du segment << CELL_MONTH_BITS | code mois
+
+
+def check_segment_by(segment_by: Sequence[str]) -> None:
+    unknown = set(segment_by) - set(SEGMENT_KEYS)
+    if unknown:
+        raise ValueError(f"Clés de segment inconnues: {sorted(unknown)} (attendu: {SEGMENT_KEYS})")
+
+
+def month_code(label: Any) -> int:
+    # "AAAA-MM" (sortie d'aggregate_market_data) ou code entier -> année × 12 + mois - 1
+    if label is None or (isinstance(label, float) and np.isnan(label)):
+        return -1
+    if isinstance(label, (int, np.integer)):
+        return int(label)
+    year, month = str(label)[:7].split("-")
+    return int(year) * 12 + int(month) - 1
+
+
+# =============================
+# Panneau segment × mois
+# =============================
+@dataclass
+class MarketPanel:
+    # values[s, t]: prix représentatif du segment s au mois first_month + t (NaN si aucune vente)
+    segment_by: Tuple[str, ...]
+    segments: List[Tuple[str, ...]]
+    first_month: int
+    values: np.ndarray
+    counts: np.ndarray
+    statistic: str = "median"  # médiane mensuelle (ventes, agrégats, état en ligne) ou indice (repeat_sales)
+
+    @property
+    def months(self) -> np.ndarray:
+        return self.first_month + np.arange(self.values.shape[1])
+
+
+def _pivot(table: pd.DataFrame, segment_by: Sequence[str], value: str, count: str) -> MarketPanel:
+    table = table[(table["month"] >= 0) & table[value].notna()]
+    if table.empty:
+        return MarketPanel(tuple(segment_by), [], 0, np.empty((0, 0)), np.empty((0, 0), dtype=np.int64))
+    if segment_by:
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(table[list(segment_by)].astype(str)))
+        segments = [tuple(u) for u in uniques]
+    else:
+        codes, segments = np.zeros(len(table), dtype=np.int64), [()]
+    months = table["month"].to_numpy(dtype=np.int64)
+    first = int(months.min())
+    shape = (len(segments), int(months.max()) - first + 1)
+    values = np.full(shape, np.nan)
+    counts = np.zeros(shape, dtype=np.int64)
+    values[codes, months - first] = table[value].to_numpy(dtype=np.float64)
+    counts[codes, months - first] = table[count].to_numpy(dtype=np.int64)
+    return MarketPanel(tuple(segment_by), segments, first, values, counts)
+
+
+def panel_from_frame(frame: pd.DataFrame, segment_by: Sequence[str] = SEGMENT_KEYS) -> MarketPanel:
+    # Ventes normalisées (normalize_market_frame): médiane mensuelle du prix par segment
+    check_segment_by(segment_by)
+    frame = frame[(frame["month"] >= 0) & frame["price"].notna()]
+    table = (
+        frame.groupby(list(segment_by) + ["month"], observed=True, sort=False)["price"]
+        .agg(["size", "median"])
+        .reset_index()
+    )
+    return _pivot(table, segment_by, "median", "size")
+
+
+def panel_from_groups(groups: pd.DataFrame, segment_by: Sequence[str] = SEGMENT_KEYS) -> MarketPanel:
+    # Groupes déjà agrégés (aggregate_market_data): médiane du groupe. Si plusieurs groupes retombent dans le
+    # même segment × mois (ex. agrégé par type, analysé par région), leurs sketches de prix sont fusionnés
+    # (médiane à SKETCH_ALPHA près), ou à défaut leurs médianes moyennées pondérées par les ventes
+    check_segment_by(segment_by)
+    missing = set(segment_by) - set(groups.columns)
+    if missing:
+        raise ValueError(f"Colonnes absentes des données agrégées: {sorted(missing)}")
+    groups = groups.assign(month=[month_code(m) for m in groups["month"]])
+    if "count" not in groups:
+        groups = groups.assign(count=1)
+    keys = list(segment_by) + ["month"]
+    if groups.duplicated(keys).any() and "price_sketch" in groups and groups["price_sketch"].notna().all():
+        merged = groups.groupby(keys, sort=False).agg(sketches=("price_sketch", list), count=("count", "sum"))
+        merged["median_price"] = [merge_sketches(encoded).quantile(0.5) for encoded in merged["sketches"]]
+        groups = merged.reset_index()
+    elif groups.duplicated(keys).any():
+        # Moyenne des médianes pondérée par le nombre de ventes: approximation documentée
+        weighted = groups.assign(weighted=groups["median_price"] * groups["count"])
+        groups = weighted.groupby(keys, sort=False).agg(weighted=("weighted", "sum"), count=("count", "sum"))
+        groups = groups.assign(median_price=groups["weighted"] / groups["count"]).reset_index()
+    return _pivot(groups, segment_by, "median_price", "count")
+
+
+# =============================
+# Opérations de fenêtre
+# =============================
+def _shift(values: np.ndarray, lag: int) -> np.ndarray:
+    shifted = np.full_like(values, np.nan)
+    if lag < values.shape[1]:
+        shifted[:, lag:] = values[:, : values.shape[1] - lag]
+    return shifted
+
+
+def rolling_nanmedian(values: np.ndarray, window: int) -> np.ndarray:
+    # Fenêtre glissante sur l'axe des mois, mois manquants ignorés: tri des fenêtres (NaN en fin) puis
+    # lecture des rangs centraux, bien plus rapide que np.nanmedian dès qu'il y a des NaN
+    padded = np.concatenate([np.full((values.shape[0], window - 1), np.nan), values], axis=1)
+    ordered = np.sort(sliding_window_view(padded, window, axis=1), axis=2)
+    n = (~np.isnan(ordered)).sum(axis=2)
+    lower = np.take_along_axis(ordered, np.maximum((n - 1) // 2, 0)[..., None], axis=2)[..., 0]
+    upper = np.take_along_axis(ordered, (n // 2)[..., None].clip(max=window - 1), axis=2)[..., 0]
+    return np.where(n > 0, (lower + upper) / 2.0, np.nan)
+
+
+def _rolling_sums(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Sommes glissantes (n, Σx, Σx²) par différence de cumuls: O(S × T) quelle que soit la fenêtre
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    stacked = np.stack([present.astype(np.float64), filled, filled * filled])
+    cumulative = np.cumsum(stacked, axis=2)
+    sums = cumulative.copy()
+    sums[:, :, window:] -= cumulative[:, :, :-window]
+    return sums[0], sums[1], sums[2]
+
+
+def rolling_nanmean(values: np.ndarray, window: int, min_periods: int = 1) -> np.ndarray:
+    n, total, _ = _rolling_sums(values, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(n >= min_periods, total / n, np.nan)
+
+
+def rolling_nanstd(values: np.ndarray, window: int, min_periods: int = 3) -> np.ndarray:
+    # Écart-type échantillon (ddof = 1)
+    n, total, squares = _rolling_sums(values, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (squares - total * total / n) / (n - 1)
+    return np.where(n >= min_periods, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+
+def pct_change(values: np.ndarray, lag: int) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return values / _shift(values, lag) - 1.0
+
+
+# =============================
+# Indicateurs
+# =============================
+def compute_trends(
+    panel: MarketPanel, window: int = SHORT_WINDOW, long_window: int = LONG_WINDOW
+) -> Dict[str, np.ndarray]:
+    # Toutes les séries S × T en quelques opérations vectorisées, puis lecture au dernier mois observé
+    if window < 1 or long_window < window:
+        raise ValueError("Fenêtres attendues: 1 <= window <= long_window")
+    values = panel.values
+    smoothed = rolling_nanmedian(values, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.log(values / _shift(values, 1))
+        momentum = rolling_nanmean(values, window) / rolling_nanmean(values, long_window) - 1.0
+    series = {
+        "rolling_median": smoothed,
+        "mom_change": pct_change(smoothed, 1),
+        "yoy_change": pct_change(smoothed, 12),
+        "volatility": rolling_nanstd(returns, long_window),
+        "momentum": momentum,
+    }
+    observed = ~np.isnan(values)
+    last = values.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1) if values.size else np.zeros(0, dtype=int)
+    rows = np.arange(values.shape[0])
+    latest = {name: s[rows, last] for name, s in series.items()}
+    latest["last_month"] = panel.first_month + last
+    latest["last_value"] = values[rows, last]
+    latest["sales"] = panel.counts.sum(axis=1)
+    return latest
+
+
+def _round(value: float, decimals: int) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), decimals)
+
+
+def _direction(momentum: float) -> str:
+    if not np.isfinite(momentum):
+        return "indéterminée"
+    return "hausse" if momentum > STABLE_BAND else ("baisse" if momentum < -STABLE_BAND else "stable")
+
+
+def trend_records(panel: MarketPanel, latest: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    records = []
+    for i, segment in enumerate(panel.segments):
+        records.append(
+            {
+                **dict(zip(panel.segment_by, segment)),
+                "last_month": month_label(int(latest["last_month"][i])),
+                "sales": int(latest["sales"][i]),
+                f"last_{panel.statistic}_price": _round(latest["last_value"][i], 2),
+                "rolling_median_price": _round(latest["rolling_median"][i], 2),
+                "mom_change_pct": _round(latest["mom_change"][i] * 100, 2),
+                "yoy_change_pct": _round(latest["yoy_change"][i] * 100, 2),
+                "volatility_pct": _round(latest["volatility"][i] * 100, 2),  # écart-type mensuel des log-rendements
+                "momentum_pct": _round(latest["momentum"][i] * 100, 2),
+                "direction": _direction(latest["momentum"][i]),
+            }
+        )
+    return records
+
+
+# =============================
+# Mode en ligne
+# =============================
+def merge_moments(
+    n_a: np.ndarray, mean_a: np.ndarray, m2_a: np.ndarray, n_b: np.ndarray, mean_b: np.ndarray, m2_b: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Fusion de deux accumulateurs de Welford (Chan et al.): exacte, associative, vectorisée
+    n = n_a + n_b
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = mean_b - mean_a
+        mean = np.where(n > 0, mean_a + delta * n_b / n, 0.0)
+        m2 = np.where(n > 0, m2_a + m2_b + delta * delta * n_a * n_b / n, 0.0)
+    return n, mean, m2
+
+
+class OnlineTrendEngine:
+    # Accumulateurs de Welford (n, moyenne, M2) et sketch de quantiles des prix par segment × mois: une vente =
+    # mise à jour de sa cellule, un lot = une fusion vectorisée. Les indicateurs se lisent sur le panneau des
+    # médianes mensuelles restituées par les sketches (à SKETCH_ALPHA près, sans garder l'historique).
+    def __init__(self, segment_by: Sequence[str] = SEGMENT_KEYS):
+        check_segment_by(segment_by)
+        self.segment_by = tuple(segment_by)
+        self._lock = threading.RLock()
+        self.segments: List[Tuple[str, ...]] = []
+        self.segment_of: Dict[Tuple[str, ...], int] = {}
+        self.first_month: Optional[int] = None
+        self.n = np.zeros((0, 0), dtype=np.int64)
+        self.mean = np.zeros((0, 0))
+        self.m2 = np.zeros((0, 0))
+        self.sketches = SketchTable()
+
+    def __len__(self) -> int:
+        return int(self.n.sum())
+
+    def _cells(self, segments: Sequence[Tuple[str, ...]], months: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Indices (ligne, colonne) des cellules, tableaux agrandis si segment ou mois nouveau
+        rows = np.empty(len(segments), dtype=np.int64)
+        for i, segment in enumerate(segments):
+            row = self.segment_of.get(segment)
+            if row is None:
+                row = self.segment_of[segment] = len(self.segments)
+                self.segments.append(segment)
+            rows[i] = row
+        low, high = int(months.min()), int(months.max())
+        first = low if self.first_month is None else min(low, self.first_month)
+        old_first = first if self.first_month is None else self.first_month
+        width = max(high - first + 1, old_first - first + self.n.shape[1])
+        height = len(self.segments)
+        if height > self.n.shape[0] or width > self.n.shape[1] or first != old_first:
+            self._resize(height, width, old_first - first)
+        self.first_month = first
+        return rows, months - first
+
+    def _resize(self, height: int, width: int, offset: int) -> None:
+        # Capacité doublée pour amortir les agrandissements (un mois de plus = pas de recopie à chaque vente)
+        old_h, old_w = self.n.shape
+        cap_h = max(height, 2 * old_h if height > old_h else old_h)
+        cap_w = max(width, 2 * old_w if width > old_w else old_w, offset + old_w)
+        n, mean, m2 = np.zeros((cap_h, cap_w), dtype=np.int64), np.zeros((cap_h, cap_w)), np.zeros((cap_h, cap_w))
+        n[:old_h, offset : offset + old_w] = self.n
+        mean[:old_h, offset : offset + old_w] = self.mean
+        m2[:old_h, offset : offset + old_w] = self.m2
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, segment: Tuple[str, ...], month: int, price: float) -> None:
+        # Une vente: mise à jour de Welford d'une seule cellule
+        if month < 0 or not np.isfinite(price):
+            return
+        with self._lock:
+            rows, cols = self._cells([tuple(segment)], np.array([month]))
+            r, c = rows[0], cols[0]
+            self.n[r, c] += 1
+            delta = price - self.mean[r, c]
+            self.mean[r, c] += delta / self.n[r, c]
+            self.m2[r, c] += delta * (price - self.mean[r, c])
+            self.sketches.add(np.array([(r << CELL_MONTH_BITS) | month]), np.array([price]))
+
+    def update(self, frame: pd.DataFrame) -> int:
+        # Lot de ventes normalisées: moments par cellule (groupby), puis fusion de Chan dans l'état
+        frame = frame[(frame["month"] >= 0) & frame["price"].notna()]
+        if frame.empty:
+            return 0
+        keys = list(self.segment_by) + ["month"]
+        grouped = frame.groupby(keys, observed=True, sort=False)
+        stats = grouped["price"].agg(["size", "mean", "var"]).reset_index()
+        segments = [tuple(map(str, row)) for row in stats[list(self.segment_by)].itertuples(index=False)]
+        with self._lock:
+            months = stats["month"].to_numpy(dtype=np.int64)
+            rows, cols = self._cells(segments, months)
+            cells = (rows << CELL_MONTH_BITS) | months
+            self.sketches.add(cells[grouped.ngroup().to_numpy()], frame["price"].to_numpy(dtype=np.float64))
+            size = stats["size"].to_numpy(dtype=np.int64)
+            m2 = stats["var"].fillna(0.0).to_numpy() * (size - 1)
+            self.n[rows, cols], self.mean[rows, cols], self.m2[rows, cols] = merge_moments(
+                self.n[rows, cols], self.mean[rows, cols], self.m2[rows, cols], size, stats["mean"].to_numpy(), m2
+            )
+        return len(frame)
+
+    def merge(self, other: "OnlineTrendEngine") -> "OnlineTrendEngine":
+        # État d'un autre processus / d'une autre partition
+        if other.segment_by != self.segment_by:
+            raise ValueError(f"Segmentations incompatibles: {self.segment_by} / {other.segment_by}")
+        with self._lock:
+            rows_b, cols_b = np.nonzero(other.n)
+            if not len(rows_b):
+                return self
+            segments = [other.segments[r] for r in rows_b]
+            rows, cols = self._cells(segments, other.first_month + cols_b)
+            self.n[rows, cols], self.mean[rows, cols], self.m2[rows, cols] = merge_moments(
+                self.n[rows, cols], self.mean[rows, cols], self.m2[rows, cols],
+                other.n[rows_b, cols_b], other.mean[rows_b, cols_b], other.m2[rows_b, cols_b],
+            )
+            # Sketches: cellule (ligne de l'autre état, mois) -> (ligne de cet état, mois)
+            row_of = np.full(len(other.segments), -1, dtype=np.int64)
+            row_of[rows_b] = rows
+            cells, buckets, counts = other.sketches.entries()
+            cells = (row_of[cells >> CELL_MONTH_BITS] << CELL_MONTH_BITS) | (cells & ((1 << CELL_MONTH_BITS) - 1))
+            self.sketches.add_buckets(cells, buckets, counts)
+        return self
+
+    def panel(self) -> MarketPanel:
+        with self._lock:
+            if self.first_month is None:
+                return MarketPanel(self.segment_by, [], 0, np.empty((0, 0)), np.empty((0, 0), dtype=np.int64))
+            observed = np.flatnonzero(self.n[: len(self.segments)].any(axis=0))
+            width = int(observed.max()) + 1
+            counts = self.n[: len(self.segments), :width].copy()
+            rows, cols = np.nonzero(counts)
+            values = np.full(counts.shape, np.nan)
+            cells = (rows << CELL_MONTH_BITS) | (self.first_month + cols)
+            values[rows, cols] = self.sketches.quantiles([0.5], cells)[0]
+            return MarketPanel(self.segment_by, list(self.segments), self.first_month, values, counts)
+
+    def average(self) -> Optional[float]:
+        # Prix moyen exact de toutes les ventes accumulées
+        total = self.n.sum()
+        return float((self.mean * self.n).sum() / total) if total else None
+
+    def monthly_std(self) -> np.ndarray:
+        # Dispersion intra-mois des prix (écart-type échantillon) par cellule
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.n > 1, np.sqrt(self.m2 / (self.n - 1)), np.nan)
+
+
+_engine: Optional[OnlineTrendEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_trend_engine() -> OnlineTrendEngine:
+    # État en ligne partagé (segments région × type) alimenté au fil des ventes
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = OnlineTrendEngine()
+        return _engine
@@ -1,11 +1,11 @@
 # module4.py - Investment Analysis Module
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from agno.knowledge import Knowledge
 from agno.vectordb.pgvector import PgVector
-from agno.knowledge.embedder.mistral import MistralEmbedder
 from agno.knowledge.reader.markdown_reader import MarkdownReader
 from agno.agent import Agent
 from agno.team.team import Team
@@ -19,6 +19,12 @@ try:
 except ImportError:
     from tools import roi_calculator, risk_analysis, cash_flow_projection
 
+try:
+    from ..common.embedding_cache import cached_mistral_embedder
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    from common.embedding_cache import cached_mistral_embedder
+
 # ----------------------------
 # Load environment variables
 # ----------------------------
@@ -36,7 +42,7 @@ markdown_reader = MarkdownReader(name="Investment Analysis Reader")
 vector_db = PgVector(
     table_name="investment_docs",
     db_url=db_url,
-    embedder=MistralEmbedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024)
+    embedder=cached_mistral_embedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024)
 )
 
 knowledge_base = Knowledge(
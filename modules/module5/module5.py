@@ -1,6 +1,7 @@
 # module5.py - Mortgage & Financing Module
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -12,9 +13,7 @@ from agno.tools.pandas import PandasTools
 from agno.tools.calculator import CalculatorTools
 
 from agno.knowledge.reader.markdown_reader import MarkdownReader
-from agno.knowledge import Knowledge
 from agno.vectordb.lancedb import LanceDb
-from agno.knowledge.embedder.mistral import MistralEmbedder
 
 # Import des outils custom
 try:
@@ -30,6 +29,14 @@ except ImportError:
         payment_simulator_engine,
     )
 
+try:
+    from ..common.embedding_cache import cached_mistral_embedder
+    from ..common.hybrid_search import HybridKnowledge
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    from common.embedding_cache import cached_mistral_embedder
+    from common.hybrid_search import HybridKnowledge
+
 # ----------------------------
 # Load environment variables
 # ----------------------------
@@ -45,10 +52,11 @@ markdown_reader = MarkdownReader(name="Mortgage & Financing Reader")
 vector_db = LanceDb(
     uri=db_uri,
     table_name="mortgage_financing_docs",
-    embedder=MistralEmbedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024),
+    embedder=cached_mistral_embedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024),
 )
 
-knowledge_base = Knowledge(
+# Recherche hybride: BM25 local (noms de produits de prêt, termes exacts) + vecteurs, fusionnés par RRF
+knowledge_base = HybridKnowledge(
     name="Mortgage & Financing KB",
     vector_db=vector_db,
     max_results=5,
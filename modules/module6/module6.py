@@ -1,6 +1,7 @@
 # module6.py - Legal & Compliance Module
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -10,9 +11,7 @@ from agno.models.mistral import MistralChat
 from agno.tools.file import FileTools
 
 from agno.knowledge.reader.markdown_reader import MarkdownReader
-from agno.knowledge import Knowledge
 from agno.vectordb.pgvector import PgVector
-from agno.knowledge.embedder.mistral import MistralEmbedder
 
 # Import des outils custom
 try:
@@ -28,6 +27,14 @@ except ImportError:
         contract_nlp_tool,
     )
 
+try:
+    from ..common.embedding_cache import cached_mistral_embedder
+    from ..common.hybrid_search import HybridKnowledge
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    from common.embedding_cache import cached_mistral_embedder
+    from common.hybrid_search import HybridKnowledge
+
 # ----------------------------
 # Load environment variables
 # ----------------------------
@@ -43,13 +50,14 @@ markdown_reader = MarkdownReader(name="Legal & Compliance Reader")
 vector_db = PgVector(
     table_name="legal_docs",
     db_url=db_url,
-    embedder=MistralEmbedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024)
+    embedder=cached_mistral_embedder(api_key=os.getenv("MISTRAL_API_KEY"), dimensions=1024)
 )
 
-legal_kb = Knowledge(
+# Recherche hybride: BM25 local (numéros d'articles, termes juridiques exacts) + vecteurs, fusionnés par RRF
+legal_kb = HybridKnowledge(
     name="Legal KB",
     vector_db=vector_db,
-    max_results=5
+    max_results=5,
 )
 
 # =============================
@@ -4,7 +4,15 @@
 from agno.tools import tool
 from typing import Dict, Any, Optional
 from datetime import datetime
+import os
 import re
+import sys
+
+try:
+    from ..common.feature_store import get_feature_store
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.feature_store import get_feature_store
 
 # =============================
 # Tool 1: Document Parser Tool (Document Verification Agent)
@@ -67,9 +75,14 @@ def document_parser_tool(file_path: str, doc_type: Optional[str] = None) -> Dict
     show_result=True,
 )
 def compliance_checker_tool(property_data: Dict[str, Any], transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Complète property_data avec les caractéristiques déjà connues du feature store
+    if property_data.get("property_id"):
+        stored = get_feature_store().get_record(str(property_data["property_id"])) or {}
+        property_data = {**{k: v for k, v in stored.items() if v is not None}, **property_data}
+
     # Exemple simplifié : vérification fictive
     compliance_issues = []
-    if property_data.get("year_built", 0) < 1900:
+    if (property_data.get("year_built") or 0) < 1900:
         compliance_issues.append("Property older than 1900, check historical regulations.")
     if transaction_data.get("sale_price", 0) <= 0:
         compliance_issues.append("Sale price missing or invalid.")